@@ -10,6 +10,7 @@ import yaml
 import json
 import time
 from pathlib import Path
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
@@ -21,18 +22,69 @@ from src.postgres_tester import PostgresTester
 from src.logger import Logger
 from src.report_generator import ReportGenerator
 from src.ai_converter import AIConverter
+from src.ai_router import get_provider_router
+from src.script_classifier import CATEGORIES, SKIP, format_histogram, get_script_classifier
+from src.param_types import ensure_param_types
+from src.sql_alias_analyzer import get_alias_cache
+from src import regex_registry
+from src.rule_guard import warn_if_unguarded
 
-def process_script(script_path, output_dir, params=None, retry_count=3, verbose=False, ai_provider='anthropic', max_iterations=3):
+def try_rule_conversion(parsed_script, parser, rule_converter, tester, script_params, script_class=None):
     """
-    Обрабатывает один SQL скрипт с заданными параметрами
+    Конвертирует скрипт правилами и выполняет быструю проверку в PostgreSQL.
+    script_class — результат предварительной классификации, чтобы не искать конструкции повторно
+    
+    Returns:
+        tuple: (сконвертированный скрипт или None, причина перехода к нейросети)
+    """
+    unsupported = rule_converter.find_unsupported_constructs(
+        parsed_script, script_class.constructs if script_class else None)
+    if unsupported:
+        return None, f"Конструкции, не поддерживаемые правилами: {', '.join(unsupported)}"
+    
+    converted_script = rule_converter.convert(parsed_script)
+    script_with_params = parser.replace_params(converted_script, script_params)
+    test_result = tester.test_script(script_with_params)
+    if test_result['success']:
+        return converted_script, None
+    return None, f"Ошибка после конвертации правилами: {test_result['error']}"
+
+def collect_rule_budget_events(script_name, logger, *guarded):
+    """
+    События превышения бюджета времени правилами конвертеров скрипта (rule_guard.events).
+    Если они есть, записываются в лог скрипта
+    """
+    events = [event for converter in guarded for event in converter.rule_guard.events]
+    if events:
+        logger.log_script_processing(script_name, 'rule_budget', 'exceeded', events)
+    return events
+
+def process_script(script_path, output_dir, params=None, retry_count=3, verbose=False, ai_provider='anthropic', max_iterations=3, rule_first=True,
+                   hedge_candidates=1, hedge_providers=None, routing=None, tester_factory=None, script_class=None):
     """
+    Обрабатывает один SQL скрипт с заданными параметрами.
+    При rule_first скрипт сначала конвертируется правилами, нейросеть используется
+    только если правила не справились или скрипт содержит неподдерживаемые ими конструкции.
+    При hedge_candidates > 1 нейросеть генерирует несколько вариантов параллельно.
+    При routing запросы распределяются между всеми провайдерами с API ключами.
+    tester_factory позволяет подменить проверку в PostgreSQL (например, в бенчмарке без базы).
+    script_class — классификация из предварительного прохода process_batch, чтобы не сканировать скрипт повторно.
+    """
+    script_start = time.time()
     script_name = "conv_" + os.path.basename(script_path)
     
     # Создаем объекты для работы со скриптом
     parser = SQLParser(config)
-    converter = AIConverter(config)
-    tester = PostgresTester(config)
+    converter = AIConverter(config, ai_provider=ai_provider)
+    if routing is not None:
+        converter.routing = routing
+    converter.hedge_candidates = hedge_candidates
+    if hedge_providers:
+        converter.hedge_providers = hedge_providers
+    rule_converter = SQLConverter(config)
+    tester = (tester_factory or PostgresTester)(config)
     logger = Logger(config)
+    prices = getattr(config, 'AI_TOKEN_PRICES', {})
     
     try:
         # Читаем содержимое скрипта
@@ -43,17 +95,64 @@ def process_script(script_path, output_dir, params=None, retry_count=3, verbose=
         # logger.log_script_processing(script_name, 'start', 'success')
         
         # Парсим скрипт
+        parse_start = time.time()
         parsed_script = parser.parse_script(script_content)
+        stage_times = {'parse': time.time() - parse_start, 'rules': 0.0, 'ai': 0.0, 'test': 0.0}
         # logger.log_script_processing(script_name, 'parsing', 'success')
         
-        # Конвертация через нейросеть
-        # Временно подменяем config.AI_PROVIDER
-        orig_provider = getattr(config, 'AI_PROVIDER', None)
-        config.AI_PROVIDER = ai_provider
+        script_params = config.DEFAULT_PARAMS.copy()
+        if params:
+            script_params.update(params)
+        
+        # Маршрутизация: сначала правила, нейросеть — только при необходимости
+        script_class = converter.classify_script(parsed_script, script_class)
+        routing = {'route': 'ai', 'route_reason': None, 'rule_time': 0.0, 'ai_time': 0.0,
+                   'script_class': script_class.category}
+        if rule_first:
+            if script_class.category == SKIP:
+                routing['route_reason'] = "Скрипт требует ручной обработки"
+            else:
+                rule_start = time.time()
+                try:
+                    rule_script, reason = try_rule_conversion(parsed_script, parser, rule_converter, tester, script_params,
+                                                              script_class)
+                except Exception as e:
+                    rule_script, reason = None, f"Ошибка при конвертации правилами: {str(e)}"
+                routing['rule_time'] = time.time() - rule_start
+                stage_times['rules'] = routing['rule_time']
+                routing['route_reason'] = reason
+                
+                if rule_script is not None:
+                    if verbose:
+                        print(f"✅ {script_name}: Сконвертирован правилами без нейросети")
+                    output_path = os.path.join(output_dir, script_name)
+                    with open(output_path, 'w', encoding='utf-8') as f:
+                        f.write(rule_script)
+                    routing['route'] = 'rules'
+                    stage_times['total'] = time.time() - script_start
+                    return {
+                        'script': script_name,
+                        'success': True,
+                        'error': None,
+                        'manual_processing': False,
+                        'missing_table': False,
+                        'retries': 0,
+                        'original_size': len(script_content),
+                        'converted_size': len(rule_script),
+                        **routing,
+                        'ai_usage': converter.usage.as_dict(prices),
+                        'rule_budget': collect_rule_budget_events(script_name, logger, rule_converter, converter),
+                        'stage_times': stage_times
+                    }
+                if verbose:
+                    print(f"↪️ {script_name}: Передаем нейросети. {reason}")
+        
+        ai_start = time.time()
+        
+        # Конвертация через нейросеть (провайдер задан в конвертере, глобальная конфигурация не меняется)
         success, converted_script, message = converter.convert_with_ai(parsed_script, error_message=None, max_iterations=max_iterations)
-        if orig_provider is not None:
-            config.AI_PROVIDER = orig_provider
-            
+        stage_times['ai'] = time.time() - ai_start
+        
         # Проверяем, требуется ли ручная обработка
         requires_manual = False
         if not success and "требует ручной обработки" in message:
@@ -61,6 +160,8 @@ def process_script(script_path, output_dir, params=None, retry_count=3, verbose=
             if verbose:
                 print(f"⚠️ {script_name}: {message}")
             logger.log_script_processing(script_name, 'conversion', 'skipped', message)
+            routing['ai_time'] = time.time() - ai_start
+            stage_times['total'] = time.time() - script_start
             return {
                 'script': script_name,
                 'success': False,
@@ -68,20 +169,22 @@ def process_script(script_path, output_dir, params=None, retry_count=3, verbose=
                 'manual_processing': True,
                 'retries': 0,
                 'original_size': len(script_content),
-                'converted_size': len(converted_script)
+                'converted_size': len(converted_script),
+                **routing,
+                'ai_usage': converter.usage.as_dict(prices),
+                'hedge': converter.hedge_stats,
+                'rule_budget': collect_rule_budget_events(script_name, logger, rule_converter, converter),
+                'stage_times': stage_times
             }
             
         # logger.log_script_processing(script_name, 'conversion', 'success' if success else 'failed', message)
         
         # Заменяем параметры на значения
-        script_params = config.DEFAULT_PARAMS.copy()
-        if params:
-            script_params.update(params)
-            
         script_with_params = parser.replace_params(converted_script, script_params)
         # logger.log_script_processing(script_name, 'parameter_replacement', 'success')
         
         # Тестируем в PostgreSQL
+        test_start = time.time()
         retries = 0
         last_error = None
         test_success = False
@@ -120,6 +223,8 @@ def process_script(script_path, output_dir, params=None, retry_count=3, verbose=
                     print(f"Попытка {retries+1}: Исключение при выполнении {script_name}: {last_error}")
                 retries += 1
         
+        stage_times['test'] = time.time() - test_start
+        
         # Лог только если ошибка
         if missing_table:
             logger.log_script_processing(script_name, 'error', 'missing_table', last_error)
@@ -138,6 +243,8 @@ def process_script(script_path, output_dir, params=None, retry_count=3, verbose=
             f.write(converted_script)
         # logger.log_script_processing(script_name, 'saving', 'success')
         
+        routing['ai_time'] = time.time() - ai_start
+        stage_times['total'] = time.time() - script_start
         return {
             'script': script_name,
             'success': test_success and success,
@@ -146,7 +253,15 @@ def process_script(script_path, output_dir, params=None, retry_count=3, verbose=
             'missing_table': missing_table,
             'retries': retries,
             'original_size': len(script_content),
-            'converted_size': len(converted_script)
+            'converted_size': len(converted_script),
+            **routing,
+            'ai_usage': converter.usage.as_dict(prices),
+            'hedge': converter.hedge_stats,
+            'ai_iterations': converter.ai_iterations,
+            'examples_used': converter.examples_used,
+            'learned_fixes': converter.learned_fix_stats,
+            'rule_budget': collect_rule_budget_events(script_name, logger, rule_converter, converter),
+            'stage_times': stage_times
         }
             
     except Exception as e:
@@ -165,7 +280,99 @@ def process_script(script_path, output_dir, params=None, retry_count=3, verbose=
             'converted_size': 0
         }
 
-def process_batch(config_file, verbose=False, ai_provider='anthropic', skip_docker_check=False, max_iterations=3, limit=None, offset=0):
+def summarize_routing(results):
+    """
+    Сводка по маршрутам обработки: сколько скриптов обработано правилами и нейросетью,
+    время и стоимость каждого маршрута
+    """
+    summary = {}
+    for route in ('rules', 'ai'):
+        route_results = [r for r in results if r.get('route') == route]
+        total_time = sum(r.get('rule_time', 0.0) + r.get('ai_time', 0.0) for r in route_results)
+        usage = [r.get('ai_usage') or {} for r in route_results]
+        summary[route] = {
+            'count': len(route_results),
+            'success_count': sum(1 for r in route_results if r['success']),
+            'total_time': total_time,
+            'average_time': total_time / len(route_results) if route_results else 0.0,
+            'rule_time': sum(r.get('rule_time', 0.0) for r in route_results),
+            'ai_time': sum(r.get('ai_time', 0.0) for r in route_results),
+            'ai_requests': sum(u.get('requests', 0) for u in usage),
+            'input_tokens': sum(u.get('input_tokens', 0) for u in usage),
+            'output_tokens': sum(u.get('output_tokens', 0) for u in usage),
+            'cache_read_tokens': sum(u.get('cache_read_tokens', 0) for u in usage),
+            'cache_write_tokens': sum(u.get('cache_write_tokens', 0) for u in usage),
+            'compaction_saved_tokens': sum(u.get('compaction_saved_tokens', 0) for u in usage),
+            'cost': round(sum(u.get('cost', 0.0) for u in usage), 6),
+        }
+    # Скрипты, которые сначала пробовали правилами и затем передали нейросети
+    summary['ai']['escalated_count'] = sum(
+        1 for r in results if r.get('route') == 'ai' and r.get('rule_time', 0.0) > 0
+    )
+    return summary
+
+def summarize_hedging(results):
+    """
+    Сводка по параллельной генерации вариантов: сэкономленное время ожидания
+    против лишних токенов, потраченных на неиспользованные варианты
+    """
+    hedged = [r['hedge'] for r in results if r.get('hedge')]
+    return {
+        'count': len(hedged),
+        'verified_count': sum(1 for h in hedged if h['verified']),
+        'wins_by_candidate': {
+            str(index): sum(1 for h in hedged if h['winner'] == index)
+            for index in sorted({h['winner'] for h in hedged if h['winner'] is not None})
+        },
+        'wall_time': round(sum(h['wall_time'] for h in hedged), 3),
+        'sequential_time': round(sum(h['sequential_time'] for h in hedged), 3),
+        'time_saved': round(sum(h['time_saved'] for h in hedged), 3),
+        'cancelled': sum(h['cancelled'] for h in hedged),
+        'extra_input_tokens': sum(h['extra_input_tokens'] for h in hedged),
+        'extra_output_tokens': sum(h['extra_output_tokens'] for h in hedged),
+    }
+
+def summarize_retrieval(results):
+    """
+    Сводка по примерам в промптах: среднее количество запросов к нейросети
+    на скрипт с найденными похожими конвертациями и без них
+    """
+    summary = {}
+    for name, with_examples in (('with_examples', True), ('without_examples', False)):
+        scripts = [r for r in results if r.get('ai_iterations') and bool(r.get('examples_used')) == with_examples]
+        summary[name] = {
+            'count': len(scripts),
+            'success_count': sum(1 for r in scripts if r['success']),
+            'average_iterations': (sum(r['ai_iterations'] for r in scripts) / len(scripts)) if scripts else 0.0,
+        }
+    return summary
+
+def summarize_learned_fixes(results):
+    """
+    Сводка по выученным правилам исправления: сколько ошибок встретилось при проверке,
+    сколько раз применялись правила и сколько ошибок они исправили без нейросети
+    """
+    stats = [r['learned_fixes'] for r in results if r.get('learned_fixes')]
+    summary = {key: sum(s[key] for s in stats) for key in ('errors', 'applied', 'hits', 'learned')}
+    summary['hit_rate'] = summary['hits'] / summary['errors'] if summary['errors'] else 0.0
+    return summary
+
+def summarize_rule_budget(results):
+    """
+    Сводка по превышениям бюджета времени правилами: сколько скриптов отмечено,
+    сколько правил пропущено и какие правила превышали бюджет чаще всего
+    """
+    events = [event for r in results for event in r.get('rule_budget') or []]
+    rules = Counter(event['rule'] for event in events)
+    return {
+        'scripts': sum(1 for r in results if r.get('rule_budget')),
+        'skipped': sum(1 for event in events if event['skipped']),
+        'slow': sum(1 for event in events if not event['skipped']),
+        'rules': dict(rules.most_common()),
+    }
+
+def process_batch(config_file, verbose=False, ai_provider='anthropic', skip_docker_check=False, max_iterations=3, limit=None, offset=0, rule_first=None,
+                  tester_factory=None):
     """
     Обрабатывает пакет скриптов по конфигурации
     """
@@ -191,6 +398,11 @@ def process_batch(config_file, verbose=False, ai_provider='anthropic', skip_dock
     retry_count = batch_config.get('retry_count', 3)
     parallel = batch_config.get('parallel', 4)
     params = batch_config.get('params', {})
+    if rule_first is None:
+        rule_first = batch_config.get('rule_first', getattr(config, 'RULE_FIRST_ROUTING', True))
+    hedge_candidates = max(1, int(batch_config.get('hedge_candidates', getattr(config, 'AI_HEDGE_CANDIDATES', 1))))
+    hedge_providers = batch_config.get('hedge_providers')
+    routing = batch_config.get('routing', getattr(config, 'AI_ROUTING', False))
     limit = limit or batch_config.get('limit')
     offset = offset or batch_config.get('offset', 0)
     
@@ -199,6 +411,11 @@ def process_batch(config_file, verbose=False, ai_provider='anthropic', skip_dock
     print(f"Выходная директория: {output_dir}")
     print(f"Количество повторных попыток: {retry_count}")
     print(f"Параллельных потоков: {parallel}")
+    print(f"Сначала правила, затем нейросеть: {'да' if rule_first else 'нет'}")
+    if hedge_candidates > 1:
+        print(f"Параллельных вариантов конвертации: {hedge_candidates}")
+    if routing:
+        print("Распределение запросов между провайдерами: включено")
     if params:
         print(f"Пользовательские параметры: {json.dumps(params, indent=2)}")
     
@@ -212,6 +429,7 @@ def process_batch(config_file, verbose=False, ai_provider='anthropic', skip_dock
     
     # Находим все SQL-скрипты и сортируем по имени
     scripts = sorted(input_dir.glob('*.sql'), key=lambda p: p.name)
+    all_scripts = scripts
     
     # Применяем offset (пропускаем первые N файлов)
     if offset > 0:
@@ -228,6 +446,31 @@ def process_batch(config_file, verbose=False, ai_provider='anthropic', skip_dock
     
     print(f"Найдено {len(scripts)} SQL-скриптов для обработки")
     
+    # Предварительная классификация: гистограмма нагрузки до начала конвертации
+    classifier = get_script_classifier(config)
+    classify_start = time.time()
+    script_classes = {script: classifier.classify(script.read_text(encoding='utf-8', errors='replace'))
+                      for script in scripts}
+    counts = Counter(script_class.category for script_class in script_classes.values())
+    classes = {category: counts.get(category, 0) for category in CATEGORIES}
+    print(f"Классификация скриптов ({time.time() - classify_start:.2f} с):")
+    print(format_histogram(classes))
+    
+    # Словарь типов параметров по всей входной директории (перестраивается при изменении скриптов)
+    param_types_start = time.time()
+    param_types, param_types_rebuilt = ensure_param_types(config, all_scripts, workers=parallel)
+    param_types_summary = None
+    if param_types is not None:
+        param_types_summary = {
+            'params': len(param_types),
+            'scripts': param_types.scripts,
+            'rebuilt': param_types_rebuilt,
+            'time': time.time() - param_types_start,
+            'kinds': param_types.histogram(),
+        }
+        print(f"📚 Словарь типов параметров: {len(param_types)} параметров из {param_types.scripts} скриптов "
+              f"({'построен' if param_types_rebuilt else 'загружен'} за {param_types_summary['time']:.2f} с)")
+    
     # Проверяем Docker
     tester = PostgresTester(config)
     if not skip_docker_check:
@@ -240,13 +483,17 @@ def process_batch(config_file, verbose=False, ai_provider='anthropic', skip_dock
             return False
     
     # Обрабатываем скрипты параллельно
+    regex_registry.configure(config)
+    regex_registry.reset_regex_stats()
+    warn_if_unguarded(config)
     start_time = time.time()
     results = []
     
     with ThreadPoolExecutor(max_workers=parallel) as executor:
         # Запускаем обработку всех скриптов
         future_to_script = {
-            executor.submit(process_script, str(script), str(output_dir), params, retry_count, verbose, ai_provider, max_iterations): script
+            executor.submit(process_script, str(script), str(output_dir), params, retry_count, verbose, ai_provider, max_iterations, rule_first,
+                            hedge_candidates, hedge_providers, routing, tester_factory, script_classes[script]): script
             for script in scripts
         }
         
@@ -281,6 +528,50 @@ def process_batch(config_file, verbose=False, ai_provider='anthropic', skip_dock
     print(f"  - Отсутствующие таблицы: {missing_table_count}")
     print(f"  - Ошибки: {failed_count}")
     
+    routing = summarize_routing(results)
+    print("Маршрутизация:")
+    print(f"  - Правила: {routing['rules']['count']} (успешно {routing['rules']['success_count']}, "
+          f"среднее время {routing['rules']['average_time']:.2f} с)")
+    print(f"  - Нейросеть: {routing['ai']['count']} (успешно {routing['ai']['success_count']}, "
+          f"среднее время {routing['ai']['average_time']:.2f} с, после правил {routing['ai']['escalated_count']}, "
+          f"токенов {routing['ai']['input_tokens']}/{routing['ai']['output_tokens']}, стоимость ${routing['ai']['cost']:.4f})")
+    
+    hedging = summarize_hedging(results)
+    if hedging['count']:
+        print(f"Параллельные варианты: {hedging['count']} скриптов, экономия {hedging['time_saved']:.2f} с "
+              f"(ожидание {hedging['wall_time']:.2f} с против ~{hedging['sequential_time']:.2f} с последовательно), "
+              f"лишних токенов {hedging['extra_input_tokens']}/{hedging['extra_output_tokens']}")
+    
+    retrieval = summarize_retrieval(results)
+    if retrieval['with_examples']['count']:
+        print(f"Примеры в промптах: {retrieval['with_examples']['count']} скриптов, "
+              f"в среднем {retrieval['with_examples']['average_iterations']:.2f} запросов к нейросети на скрипт "
+              f"(без примеров: {retrieval['without_examples']['average_iterations']:.2f} "
+              f"на {retrieval['without_examples']['count']} скриптов)")
+    
+    learned_fixes = summarize_learned_fixes(results)
+    if learned_fixes['errors']:
+        print(f"Выученные правила: исправлено {learned_fixes['hits']} из {learned_fixes['errors']} ошибок "
+              f"({learned_fixes['hit_rate']:.0%}) без нейросети, применялись {learned_fixes['applied']} раз, "
+              f"новых правил {learned_fixes['learned']}")
+    
+    alias_cache = get_alias_cache(config).stats()
+    if alias_cache['hits'] + alias_cache['disk_hits'] + alias_cache['misses']:
+        print(f"Кэш алиасов: попаданий {alias_cache['hits']} в памяти и {alias_cache['disk_hits']} на диске, "
+              f"промахов {alias_cache['misses']} ({alias_cache['hit_ratio']:.0%}), "
+              f"записей {alias_cache['entries']}/{alias_cache['max_entries']}")
+    
+    rule_budget = summarize_rule_budget(results)
+    if rule_budget['scripts']:
+        print(f"Бюджет времени правил превышен в {rule_budget['scripts']} скриптах: пропущено правил "
+              f"{rule_budget['skipped']}, завершились с превышением {rule_budget['slow']} "
+              f"({', '.join(f'{rule} ×{count}' for rule, count in rule_budget['rules'].items())})")
+    
+    regex_stats = regex_registry.regex_stats(getattr(config, 'REGEX_TIMING_TOP', 10)) if regex_registry.timing_enabled() else []
+    if regex_stats:
+        print("Самые медленные регулярные выражения:")
+        print(regex_registry.format_regex_stats(regex_stats))
+    
     # Сохраняем отчет
     report_path = output_dir / f"{batch_name}_report.json"
     report = {
@@ -294,6 +585,17 @@ def process_batch(config_file, verbose=False, ai_provider='anthropic', skip_dock
         'failed_count': failed_count,
         'total_count': len(results),
         'elapsed_time': elapsed_time,
+        'parallel': parallel,
+        'classes': classes,
+        'param_types': param_types_summary,
+        'routing': routing,
+        'hedging': hedging,
+        'retrieval': retrieval,
+        'learned_fixes': learned_fixes,
+        'alias_cache': alias_cache,
+        'regex': regex_stats,
+        'rule_budget': rule_budget,
+        'providers': get_provider_router(config).snapshot(),
         'results': results
     }
     
@@ -329,6 +631,7 @@ def main():
     parser.add_argument('--max-iterations', type=int, default=3, help='Максимум итераций AI-конвертации')
     parser.add_argument('--limit', type=int, default=None, help='Максимальное количество файлов для обработки')
     parser.add_argument('--offset', type=int, default=0, help='Пропустить первые N файлов и начать с (N+1)-го')
+    parser.add_argument('--ai-only', action='store_true', help='Не пробовать конвертацию правилами, сразу использовать нейросеть')
     
     args = parser.parse_args()
     
@@ -339,7 +642,8 @@ def main():
         return 1
     
     # Запускаем пакетную обработку
-    success = process_batch(config_file, args.verbose, args.provider, args.skip_docker_check, args.max_iterations, args.limit, args.offset)
+    success = process_batch(config_file, args.verbose, args.provider, args.skip_docker_check, args.max_iterations, args.limit, args.offset,
+                            rule_first=False if args.ai_only else None)
     
     return 0 if success else 1
 
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк определения таблиц по алиасам (src/sql_alias_analyzer.py).
+Сравниваются прежний способ — разбор всего скрипта sqlglot без диалекта и, при ошибке
+в любом запросе, регулярные выражения по всему скрипту с поиском алиаса без учета места
+использования — и разбор каждого запроса в диалекте T-SQL с деревом областей видимости.
+
+Для директорий со скриптами (по умолчанию scripts/examples) выводятся время разбора
+(без разбиения на запросы, которое общее с остальными этапами через ParsedScript),
+доля запросов, разобранных sqlglot, и доля ссылок alias.column, для которых найдена таблица.
+Точность проверяется на синтетических скриптах T-SQL, где один и тот же алиас используется
+для разных таблиц в запросе и подзапросах, а имя колонки содержит ожидаемую таблицу.
+"""
+
+import io
+import re
+import sys
+import time
+import random
+import argparse
+import contextlib
+from pathlib import Path
+
+# Добавляем корневой каталог проекта в путь поиска модулей
+sys.path.append(str(Path(__file__).resolve().parent))
+
+import sqlglot
+from collections import defaultdict
+
+from src.parsed_script import ParsedScript
+from src.sql_alias_analyzer import AliasCache, SQLAliasAnalyzer
+
+TABLES = ['WM_PERSONAL_CARD', 'SPR_DOC', 'ESRN_SERV_SERV', 'PPR_CALC', 'WM_ADDRESS', 'REQ_SERV']
+
+# Ссылка alias.column; префиксы параметров {params.x} ссылками на таблицы не считаются
+COLUMN_RE = re.compile(r'(?<![\w\.\{])([A-Za-z_][A-Za-z0-9_]*)\.([A-Za-z_][A-Za-z0-9_]*)')
+PARAM_PREFIXES = {'params', 'pprconst', 'doc', 'default_params', 'dbo'}
+
+COMMENT_RE = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+
+# Ссылка в синтетическом скрипте: alias.A_<колонка>__<ожидаемая таблица>
+EXPECTED_RE = re.compile(r'(?<![\w\.])(\w+)\.\w+?__(\w+)')
+
+
+def legacy_table_aliases(analyzer, text):
+    """Прежний способ: весь скрипт sqlglot, при любой ошибке — регулярные выражения по всему скрипту"""
+    try:
+        table_aliases = defaultdict(list)
+        for statement in sqlglot.parse(text):
+            if statement is None:
+                continue
+            for table in statement.find_all(sqlglot.exp.Table):
+                if table.alias and table.alias not in table_aliases[table.name]:
+                    table_aliases[table.name].append(table.alias)
+        return dict(table_aliases), False
+    except Exception:
+        return analyzer._extract_aliases_with_regex(text), True
+
+
+def legacy_index(table_aliases):
+    index = {}
+    for table, aliases in table_aliases.items():
+        # Алиасы подзапросов прежний способ относил к ключу SUBQUERY, а не к таблице
+        if table == "SUBQUERY":
+            continue
+        for alias in aliases:
+            index.setdefault(alias.lower(), table)
+    return index
+
+
+def column_references(text):
+    # Комментарии заменяются пробелами той же длины, чтобы позиции ссылок не сдвигались
+    code = COMMENT_RE.sub(lambda match: ' ' * len(match.group(0)), text)
+    return [(match.group(1), match.start()) for match in COLUMN_RE.finditer(code)
+            if match.group(1).lower() not in PARAM_PREFIXES]
+
+
+def make_statement(rng, n):
+    """Запрос T-SQL с повторным использованием алиаса t в подзапросах"""
+    outer, inner, exists = rng.sample(TABLES, 3)
+    return (f"SELECT TOP 10 t.A_ID__{outer}, x.cnt, ISNULL(t.A_NAME__{outer}, '') AS name\n"
+            f"FROM [dbo].[{outer}] t WITH (NOLOCK)\n"
+            f"JOIN (SELECT t.A_OWNER__{inner} AS owner, COUNT(*) cnt FROM {inner} t\n"
+            f"      WHERE t.A_STATUS__{inner} = {{params.status{n}}} GROUP BY t.A_OWNER__{inner}) x "
+            f"ON x.owner = t.A_ID__{outer}\n"
+            f"WHERE t.A_DATE__{outer} >= {{params.date{n}}}\n"
+            f"  AND EXISTS (SELECT 1 FROM {exists} t WHERE t.A_CARD__{exists} = 1)")
+
+
+def make_script(statements, seed):
+    rng = random.Random(seed)
+    parts = ["DECLARE @limit INT = 10;",
+             "IF OBJECT_ID('tempdb..#tmp') IS NOT NULL DROP TABLE #tmp;"]
+    parts += [make_statement(rng, n) + ';' for n in range(statements)]
+    return '\n\n'.join(parts)
+
+
+def measure(texts, expected=False):
+    stats = defaultdict(float)
+    for text in texts:
+        analyzer = SQLAliasAnalyzer(AliasCache())
+        start = time.perf_counter()
+        table_aliases, fell_back = legacy_table_aliases(analyzer, text)
+        stats['legacy_time'] += time.perf_counter() - start
+        stats['legacy_fallbacks'] += fell_back
+        index = legacy_index(table_aliases)
+
+        parsed = ParsedScript(text)
+        # Разбиение на запросы общее с остальными этапами (parse_script) и в замер не входит
+        parsed.statements
+        start = time.perf_counter()
+        tree = analyzer.get_scope_tree(parsed)
+        stats['time'] += time.perf_counter() - start
+        stats['statements'] += len(parsed.statements)
+        stats['regex_statements'] += tree.fallbacks
+
+        references = ([(m.group(1), m.start(), m.group(2)) for m in EXPECTED_RE.finditer(text)] if expected
+                      else [(alias, position, None) for alias, position in column_references(text)])
+        for alias, position, table in references:
+            old = index.get(alias.lower())
+            new = analyzer.get_table_by_alias(parsed, alias, position)
+            stats['references'] += 1
+            stats['legacy_resolved'] += old is not None
+            stats['resolved'] += new is not None
+            if expected:
+                stats['legacy_correct'] += old == table
+                stats['correct'] += new == table
+    return stats
+
+
+def print_row(name, texts, stats, expected):
+    references = max(stats['references'], 1)
+    row = (f"{name:<22} {len(texts):>7} {int(stats['statements']):>9} {int(stats['regex_statements']):>9} "
+           f"{int(stats['legacy_fallbacks']):>9} {stats['legacy_time'] * 1000:>10.1f} {stats['time'] * 1000:>10.1f} "
+           f"{int(stats['references']):>7} {stats['legacy_resolved'] / references:>8.0%} {stats['resolved'] / references:>8.0%}")
+    if expected:
+        row += f" {stats['legacy_correct'] / references:>9.0%} {stats['correct'] / references:>9.0%}"
+    print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк определения таблиц по алиасам')
+    parser.add_argument('dirs', nargs='*', default=['scripts/examples'], help='Директории со скриптами')
+    parser.add_argument('--synthetic', type=int, default=20, help='Количество синтетических скриптов')
+    parser.add_argument('--statements', type=int, default=10, help='Запросов в синтетическом скрипте')
+    args = parser.parse_args()
+
+    print(f"{'набор':<22} {'скриптов':>7} {'запросов':>9} {'regex':>9} {'прежн.rx':>9} "
+          f"{'прежн. мс':>10} {'мс':>10} {'ссылок':>7} {'прежн.%':>8} {'найдено':>8} "
+          f"{'прежн.верн':>9} {'верно':>9}")
+    # Предупреждения sqlglot о неподдерживаемом синтаксисе не выводятся
+    with contextlib.redirect_stderr(io.StringIO()):
+        for directory in args.dirs:
+            paths = sorted(Path(directory).rglob('*.sql'))
+            if not paths:
+                print(f"{directory:<22} скрипты не найдены")
+                continue
+            texts = [path.read_text(encoding='utf-8', errors='ignore') for path in paths]
+            print_row(directory, texts, measure(texts), expected=False)
+        texts = [make_script(args.statements, seed) for seed in range(args.synthetic)]
+        print_row('синтетические', texts, measure(texts, expected=True), expected=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
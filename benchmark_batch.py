@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пропускной способности пакетной обработки без платных API.
+Запускает локальную имитацию API нейросетей (src/mock_llm_server.py), прогоняет
+пакет скриптов через batch_process при разных значениях parallel и выводит
+скриптов в секунду, p50/p95 по этапам (разбор, правила, нейросеть, проверка)
+и загрузку потоков.
+
+Пример:
+    python benchmark_batch.py scripts/examples --parallel 1,4,8 --repeat 10 --latency lognormal:-0.7,0.5
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+
+import yaml
+
+# Добавляем корневой каталог проекта в путь поиска модулей
+sys.path.append(str(Path(__file__).resolve().parent))
+
+import config
+import batch_process
+from src.mock_llm_server import MockLLMServer
+
+STAGES = ('parse', 'rules', 'ai', 'test', 'total')
+
+
+class SimulatedTester:
+    """Проверка в PostgreSQL без базы: фиксированная задержка и успешный результат"""
+
+    delay = 0.05
+
+    def __init__(self, config):
+        self.config = config
+
+    def test_script(self, script):
+        time.sleep(self.delay)
+        return {'success': True, 'error': None, 'execution_time': self.delay, 'row_count': 0}
+
+
+def percentile(values, share):
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(share * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def prepare_input(source_dir, target_dir, repeat):
+    """Копирует скрипты repeat раз, чтобы пакет был достаточно большим"""
+    paths = sorted(Path(source_dir).glob('*.sql'))
+    target_dir.mkdir(parents=True, exist_ok=True)
+    for copy in range(repeat):
+        for path in paths:
+            shutil.copy(path, target_dir / f"{copy:03d}_{path.name}")
+    return len(paths) * repeat
+
+
+def run_batch(work_dir, input_dir, parallel, args):
+    """Выполняет пакет с заданным parallel и возвращает отчет"""
+    batch_name = f"bench_p{parallel}"
+    output_dir = work_dir / f"out_p{parallel}"
+    batch_config = {
+        'name': batch_name,
+        'input_dir': str(input_dir),
+        'output_dir': str(output_dir),
+        'parallel': parallel,
+        'retry_count': 1,
+        'generate_html_report': False,
+        'rule_first': not args.ai_only,
+    }
+    config_path = work_dir / f"{batch_name}.yaml"
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(batch_config, f, allow_unicode=True)
+
+    tester_factory = None if args.db else SimulatedTester
+    # Свое хранилище примеров на каждый прогон: прогоны не подсказывают друг другу
+    config.AI_EXAMPLES_FILE = str(work_dir / f"examples_p{parallel}.jsonl")
+    config.PARAM_TYPES_FILE = str(work_dir / "param_types.json")
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output if not args.verbose else sys.stdout):
+        batch_process.process_batch(config_path, verbose=args.verbose, ai_provider=args.provider,
+                                    skip_docker_check=True, max_iterations=args.max_iterations,
+                                    tester_factory=tester_factory)
+    with open(output_dir / f"{batch_name}_report.json", 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def summarize(report, parallel):
+    """Скриптов в секунду, p50/p95 по этапам и загрузка потоков"""
+    results = [r for r in report['results'] if r.get('stage_times')]
+    wall = report['elapsed_time'] or 1e-9
+    stages = {}
+    for stage in STAGES:
+        if stage in ('ai', 'test'):
+            values = [r['stage_times'][stage] for r in results if r.get('route') == 'ai']
+        else:
+            values = [r['stage_times'].get(stage, 0.0) for r in results]
+        stages[stage] = {'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95), 'count': len(values)}
+    busy = sum(r['stage_times'].get('total', 0.0) for r in results)
+    return {
+        'parallel': parallel,
+        'scripts': report['total_count'],
+        'success': report['success_count'],
+        'wall_time': wall,
+        'scripts_per_sec': report['total_count'] / wall,
+        'utilisation': busy / (parallel * wall),
+        'ai_scripts': report['routing']['ai']['count'],
+        'input_tokens': report['routing']['ai']['input_tokens'],
+        'cache_read_tokens': report['routing']['ai']['cache_read_tokens'],
+        'cache_write_tokens': report['routing']['ai']['cache_write_tokens'],
+        'retrieval': report['retrieval'],
+        'stages': stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк пакетной обработки на имитации API нейросетей')
+    parser.add_argument('input', nargs='?', default='scripts/examples', help='Директория со скриптами')
+    parser.add_argument('--parallel', default='1,2,4,8', help='Значения parallel через запятую')
+    parser.add_argument('--repeat', type=int, default=5, help='Сколько раз повторить каждый скрипт в пакете')
+    parser.add_argument('--provider', default='anthropic', help='AI провайдер: anthropic или openai')
+    parser.add_argument('--latency', default='uniform:0.2,0.8', help='Распределение задержки ответа нейросети')
+    parser.add_argument('--tps', type=float, default=0.0, help='Скорость выдачи токенов имитацией (0 — мгновенно)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Доля ответов 429')
+    parser.add_argument('--seed', type=int, default=42, help='Зерно генератора случайных чисел')
+    parser.add_argument('--max-iterations', type=int, default=3, help='Максимум итераций AI-конвертации')
+    parser.add_argument('--ai-only', action='store_true', help='Все скрипты через нейросеть, без правил')
+    parser.add_argument('--examples', type=int, default=config.AI_EXAMPLES_TOP_K,
+                        help='Сколько похожих проверенных конвертаций добавлять в промпт (0 — не добавлять)')
+    parser.add_argument('--db', action='store_true', help='Проверять скрипты в реальном PostgreSQL')
+    parser.add_argument('--db-latency', type=float, default=0.05, help='Время имитации проверки без базы, с')
+    parser.add_argument('--json', help='Сохранить результаты в JSON-файл')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Не скрывать вывод пакетной обработки')
+    args = parser.parse_args()
+
+    settings = [int(p) for p in args.parallel.split(',') if p.strip()]
+    work_dir = Path(tempfile.mkdtemp(prefix='batch_bench_'))
+    input_dir = work_dir / 'input'
+    total = prepare_input(args.input, input_dir, args.repeat)
+    if not total:
+        print(f"В директории {args.input} не найдено SQL-скриптов")
+        return 1
+
+    server = MockLLMServer(latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                           responder='rules', tokens_per_second=args.tps, seed=args.seed).start()
+    config.OPENAI_BASE_URL = server.url
+    config.ANTHROPIC_BASE_URL = server.url
+    # Настоящие ключи из .env имитации не нужны
+    for key in ('OPENAI_API_KEY', 'ANTHROPIC_API_KEY'):
+        os.environ[key] = 'mock-key'
+    config.AI_EXAMPLES_TOP_K = args.examples
+    if not args.db:
+        # Внутренние проверки конвертера — синтаксические, проверка пакета — имитация
+        config.USE_REAL_DB_TESTING = False
+        SimulatedTester.delay = args.db_latency
+
+    print(f"Имитация API: {server.url}, задержка {server.latency}, {args.tps:g} ток/с, "
+          f"ошибки {args.error_rate:.0%}, 429 {args.rate_limit_rate:.0%}")
+    print(f"Скриптов в пакете: {total}, проверка: {'PostgreSQL' if args.db else f'имитация {args.db_latency} с'}")
+
+    summaries = []
+    try:
+        for parallel in settings:
+            requests_before = len(server.requests)
+            report = run_batch(work_dir, input_dir, parallel, args)
+            summary = summarize(report, parallel)
+            summary['ai_requests'] = len(server.requests) - requests_before
+            summaries.append(summary)
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("\n" + "=" * 100)
+    header = f"{'parallel':>8} {'скр/с':>8} {'загрузка':>9} {'AI':>5} {'запр.':>6}  "
+    header += "  ".join(f"{stage + ' p50/p95, мс':>19}" for stage in STAGES)
+    print(header)
+    for summary in summaries:
+        line = (f"{summary['parallel']:>8} {summary['scripts_per_sec']:>8.2f} {summary['utilisation']:>8.0%} "
+                f"{summary['ai_scripts']:>5} {summary['ai_requests']:>6}  ")
+        line += "  ".join(f"{s['p50'] * 1000:.0f}/{s['p95'] * 1000:.0f}".rjust(19)
+                          for s in (summary['stages'][stage] for stage in STAGES))
+        print(line)
+    for summary in summaries:
+        print(f"parallel={summary['parallel']}: токенов запроса {summary['input_tokens']}, "
+              f"из кэша промпта {summary['cache_read_tokens']}, записано в кэш {summary['cache_write_tokens']}")
+        retrieval = summary['retrieval']
+        print(f"parallel={summary['parallel']}: запросов к нейросети на скрипт с примерами "
+              f"{retrieval['with_examples']['average_iterations']:.2f} ({retrieval['with_examples']['count']} скр.), "
+              f"без примеров {retrieval['without_examples']['average_iterations']:.2f} "
+              f"({retrieval['without_examples']['count']} скр.)")
+    print(f"Коды ответов имитации: {dict(sorted(server.status_counts.items()))}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summaries, f, indent=2, ensure_ascii=False)
+        print(f"Результаты сохранены в {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
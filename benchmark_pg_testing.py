@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Скрипт для замера задержки одной проверки скрипта в PostgreSQL:
+запуск внешнего psql на каждую итерацию против выполнения через пул соединений
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Добавляем корневой каталог проекта в путь поиска модулей
+sys.path.append(str(Path(__file__).resolve().parent))
+
+import config
+from src.ai_converter import AIConverter
+from src.parser import SQLParser
+from src.pg_pool import close_all_pools
+
+
+def measure(converter, scripts, executor, iterations):
+    """
+    Выполняет проверку всех скриптов заданное число раз
+
+    Returns:
+        list: Время каждой проверки в секундах
+    """
+    config.PG_TEST_EXECUTOR = executor
+    timings = []
+    for _ in range(iterations):
+        for script in scripts:
+            start = time.perf_counter()
+            converter._test_in_real_postgres(script)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение psql и пула соединений при проверке скриптов')
+    parser.add_argument('input', nargs='?', default='scripts/examples', help='Директория со скриптами')
+    parser.add_argument('--iterations', type=int, default=3, help='Количество итераций на скрипт')
+    args = parser.parse_args()
+
+    sql_parser = SQLParser(config)
+    scripts = []
+    for path in sorted(Path(args.input).glob('*.sql')):
+        with open(path, 'r', encoding='utf-8') as f:
+            scripts.append(sql_parser.replace_params(f.read()))
+
+    if not scripts:
+        print(f"В директории {args.input} не найдено SQL-скриптов")
+        return 1
+
+    converter = AIConverter(config)
+    results = {}
+    for executor in ('psql', 'pool'):
+        timings = measure(converter, scripts, executor, args.iterations)
+        results[executor] = sum(timings) / len(timings)
+
+    close_all_pools()
+
+    total = len(scripts) * args.iterations
+    saved = results['psql'] - results['pool']
+    print("\n" + "=" * 60)
+    print(f"Проверок: {total} ({len(scripts)} скриптов x {args.iterations} итераций)")
+    print(f"psql: {results['psql'] * 1000:.1f} мс на итерацию")
+    print(f"pool: {results['pool'] * 1000:.1f} мс на итерацию")
+    print(f"Экономия: {saved * 1000:.1f} мс на итерацию, {saved * total:.2f} с на весь пакет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Микро-бенчмарк постобработки SQL, полученного от нейросети.
+Замеряет время каждого прохода правил на сохраненных ответах нейросети,
+чтобы регрессии производительности были видны при изменении правил.
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Добавляем корневой каталог проекта в путь поиска модулей
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from src.schema_catalog import SchemaCatalog
+from src.sql_alias_analyzer import SQLAliasAnalyzer
+from src.sql_post_processor import RulePass, get_post_processor
+
+
+def pass_name(rule_pass):
+    if isinstance(rule_pass, RulePass):
+        return '+'.join(rule.name for rule in rule_pass.rules)
+    return rule_pass.__name__
+
+
+def run_passes(processor, sql, context, timings):
+    """Выполняет проходы постобработчика, накапливая время каждого прохода"""
+    upper_sql = sql.upper()
+    for rule_pass in processor.passes:
+        start = time.perf_counter()
+        if isinstance(rule_pass, RulePass):
+            if rule_pass.applies_to(upper_sql):
+                context['sql'] = sql
+                sql, count = rule_pass.run(sql, context)
+                if count:
+                    upper_sql = sql.upper()
+        else:
+            new_sql = rule_pass(sql)
+            if new_sql != sql:
+                sql = new_sql
+                upper_sql = sql.upper()
+        name = pass_name(rule_pass)
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+    return sql
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Микро-бенчмарк постобработки SQL')
+    parser.add_argument('input', nargs='?', default='scripts/ai_outputs', help='Директория с ответами нейросети')
+    parser.add_argument('--iterations', type=int, default=200, help='Количество повторов на файл')
+    parser.add_argument('--scale', type=int, default=1, help='Во сколько раз увеличить каждый файл')
+    args = parser.parse_args()
+
+    paths = sorted(Path(args.input).glob('*.sql'))
+    if not paths:
+        print(f"В директории {args.input} не найдено SQL-файлов")
+        return 1
+
+    processor = get_post_processor()
+    # Каталог без подключения к базе: бенчмарк измеряет только постобработку
+    catalog = SchemaCatalog()
+    catalog.ensure_loaded()
+    context = {'alias_analyzer': SQLAliasAnalyzer(), 'catalog': catalog}
+
+    timings = {}
+    total_bytes = 0
+    start = time.perf_counter()
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            sql = '\n'.join([f.read()] * args.scale)
+        file_start = time.perf_counter()
+        for _ in range(args.iterations):
+            run_passes(processor, sql, context, timings)
+        elapsed = time.perf_counter() - file_start
+        total_bytes += len(sql) * args.iterations
+        print(f"{path.name:<30} {len(sql):>8} байт  {elapsed / args.iterations * 1000:8.3f} мс на вызов")
+    total = time.perf_counter() - start
+
+    print("\n" + "=" * 60)
+    print("Время по проходам:")
+    for name, value in sorted(timings.items(), key=lambda item: -item[1]):
+        print(f"  {name:<40} {value * 1000:10.1f} мс ({value / total * 100:5.1f}%)")
+    print(f"Всего: {total:.3f} с, {total_bytes / total / 1024 / 1024:.2f} МБ/с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк подстановки параметров SQLParser.replace_params на синтетических
+скриптах со 100 и более параметрами {...}: сравнения с колонками, IN-списки,
+приведения типов, арифметика и параметры без контекста (подбор по каталогу схемы).
+Каталог схемы строится из синтетического снимка, подключение к базе не нужно.
+Второй замер — с готовым словарем типов параметров (src/param_types.py),
+построенным по набору из нескольких таких скриптов.
+"""
+
+import io
+import sys
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем корневой каталог проекта в путь поиска модулей
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from src.parser import SQLParser
+from src.param_types import build_param_types
+from src.schema_catalog import SchemaCatalog
+
+TABLES = ['WM_PERSONAL_CARD', 'SPR_DOC', 'ESRN_SERV_SERV', 'PPR_CALC', 'WM_ADDRESS']
+
+# Шаблоны условий: {table}, {alias}, {n} и имя параметра {p}
+CONDITIONS = [
+    "{alias}.A_ID = {{params.cardId{n}}}",
+    "{{params.regDate{n}}} <= {alias}.A_DATE_REG",
+    "{alias}.A_STATUS IN ({{DOC.statuses{n}}})",
+    "{alias}.A_SUM * {{PPRCONST.koef{n}}} > 0",
+    "{alias}.A_NAME LIKE {{params.name{n}}}",
+    "{{params.limit{n}}}::integer > 0",
+    "{alias}.A_VALUE = {{params.value{n}}}",
+    "{{params.a{n}}} = {{params.b{n}}}",
+    "CASE WHEN {alias}.A_FLAG = 1 THEN {{PPRCONST.flag{n}}} ELSE 0 END = 1",
+    "'text' = {{params.text{n}}}",
+]
+
+
+def make_script(placeholders, seed=0):
+    """Синтетический скрипт примерно с заданным количеством параметров"""
+    rng = random.Random(seed)
+    lines = []
+    count = 0
+    n = 0
+    while count < placeholders:
+        table = rng.choice(TABLES)
+        alias = f"t{n}"
+        condition = CONDITIONS[n % len(CONDITIONS)].format(alias=alias, n=n)
+        lines.append(f"SELECT {alias}.A_ID FROM {table} {alias} WHERE {condition}")
+        count += condition.count('{')
+        n += 1
+    return '\nUNION ALL\n'.join(lines) + ';'
+
+
+def make_catalog(path):
+    """Снимок каталога схемы с колонками синтетических таблиц"""
+    catalog = SchemaCatalog()
+    rows = []
+    for table in TABLES:
+        for column, data_type in (('a_id', 'integer'), ('a_date_reg', 'timestamp without time zone'),
+                                  ('a_status', 'integer'), ('a_sum', 'numeric'), ('a_name', 'text'),
+                                  ('a_value', 'character varying'), ('a_flag', 'integer')):
+            rows.append(('public', table.lower(), column, data_type))
+    catalog._set_rows(rows)
+    catalog.save(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк подстановки параметров')
+    parser.add_argument('--sizes', default='100,300,1000', help='Количество параметров в скриптах через запятую')
+    parser.add_argument('--iterations', type=int, default=5, help='Количество повторов на скрипт')
+    parser.add_argument('--corpus', type=int, default=8, help='Скриптов в наборе для словаря типов')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = Path(tmp) / 'catalog.json'
+        make_catalog(snapshot)
+        config = SimpleNamespace(PG_CONFIG=None, DB_CONN=None, SCHEMA_CATALOG_FILE=str(snapshot))
+        sql_parser = SQLParser(config)
+
+        catalog = SchemaCatalog(snapshot_path=str(snapshot))
+        catalog.ensure_loaded()
+
+        print(f"{'параметров':>10} {'уникальных':>10} {'байт':>8} {'мс на вызов':>12} {'мкс на параметр':>16} "
+              f"{'мс со словарем':>15}")
+        for size in [int(s) for s in args.sizes.split(',')]:
+            script = make_script(size)
+            parsed = sql_parser.parse_script(script)
+            placeholders = script.count('{')
+
+            corpus = []
+            for seed in range(args.corpus):
+                path = Path(tmp) / f"corpus_{size}_{seed}.sql"
+                path.write_text(make_script(size, seed), encoding='utf-8')
+                corpus.append(path)
+            param_types = build_param_types(corpus, workers=1, catalog=catalog)
+
+            timings = []
+            for dictionary in (None, param_types):
+                sql_parser.param_types = dictionary
+                elapsed = 0.0
+                for _ in range(args.iterations):
+                    # Отладочный вывод replace_params не учитывается в замере
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        start = time.perf_counter()
+                        result = sql_parser.replace_params(script)
+                        elapsed += time.perf_counter() - start
+                assert '{' not in result, "Остались неподставленные параметры"
+                timings.append(elapsed / args.iterations)
+            per_call, with_dictionary = timings
+            print(f"{placeholders:>10} {len(parsed['params']):>10} {len(script):>8} {per_call * 1000:>12.2f} "
+                  f"{per_call / placeholders * 1e6:>16.1f} {with_dictionary * 1000:>15.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
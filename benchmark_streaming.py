@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк памяти потоковой конвертации больших скриптов (src/script_stream.py).
+Как и test_large_script.py, берет scripts/examples/example11.sql и собирает из его копий,
+разделенных GO, скрипт заданного размера. Затем в отдельных процессах сравнивает
+конвертацию всего скрипта одной строкой (parse_script + SQLConverter.convert) и потоковую
+конвертацию по запросам: пиковая память процесса (ru_maxrss) сверх памяти после импорта
+модулей и время.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем корневой каталог проекта в путь поиска модулей
+sys.path.append(str(Path(__file__).resolve().parent))
+
+BASE_SCRIPT = Path(__file__).resolve().parent / 'scripts' / 'examples' / 'example11.sql'
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в Linux — в килобайтах, в macOS — в байтах
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def build_script(path: Path, size_mb: float) -> int:
+    """Записывает копии базового скрипта, разделенные GO, пока размер не достигнет size_mb"""
+    base = BASE_SCRIPT.read_text(encoding='utf-8').lstrip('﻿')
+    copies = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while f.tell() < size_mb * 1024 * 1024:
+            f.write(base)
+            f.write('\nGO\n')
+            copies += 1
+    return copies
+
+
+def run_mode(mode: str, input_path: str, output_path: str) -> dict:
+    """Выполняется в дочернем процессе: конвертирует скрипт и возвращает память и время"""
+    import config
+    from src.parser import SQLParser
+    from src.converter import SQLConverter
+    from src.script_stream import convert_file_streaming
+
+    converter = SQLConverter(config)
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == 'whole':
+        parser = SQLParser(SimpleNamespace(PG_CONFIG=None, DB_CONN=None, SCHEMA_CATALOG_FILE=None))
+        with open(input_path, 'r', encoding='utf-8') as f:
+            parsed = parser.parse_script(f.read())
+        # Параметры и запросы parse_script нужны конвертации всего скрипта
+        parsed['params'], parsed['statements']
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(converter.convert(parsed))
+        statements = len(parsed['statements'])
+    elif mode == 'stream':
+        statements = convert_file_streaming(input_path, output_path, converter)['statements']
+    else:
+        statements = 0
+    return {'mode': mode, 'time': time.perf_counter() - start, 'baseline_mb': baseline,
+            'peak_mb': peak_rss_mb(), 'statements': statements}
+
+
+def measure(mode: str, input_path: str, output_path: str) -> dict:
+    result = subprocess.run([sys.executable, __file__, '--child', mode, '--input', input_path, '--output', output_path],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк памяти потоковой конвертации')
+    parser.add_argument('--sizes', default='1,4,16', help='Размеры собранных скриптов в МБ через запятую')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--input', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(args.child, args.input, args.output)))
+        return 0
+
+    print(f"{'размер, МБ':>10} {'копий':>7} {'режим':>8} {'запросов':>9} {'память, МБ':>11} {'время, с':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in [float(s) for s in args.sizes.split(',') if s.strip()]:
+            input_path = os.path.join(directory, 'large.sql')
+            copies = build_script(Path(input_path), size)
+            outputs = {}
+            for mode in ('whole', 'stream'):
+                outputs[mode] = os.path.join(directory, f'{mode}.sql')
+                result = measure(mode, input_path, outputs[mode])
+                print(f"{size:>10.0f} {copies:>7} {mode:>8} {result['statements']:>9} "
+                      f"{result['peak_mb'] - result['baseline_mb']:>11.1f} {result['time']:>9.2f}")
+            print(f"{'':>10} {'':>7} размер результата: {os.path.getsize(outputs['whole']) / 2**20:.1f} МБ "
+                  f"и {os.path.getsize(outputs['stream']) / 2**20:.1f} МБ")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
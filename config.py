@@ -129,6 +129,23 @@ OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4')
 # Настройки Anthropic
 ANTHROPIC_MODEL = os.getenv('ANTHROPIC_MODEL', 'claude-3-sonnet-20240229')
 
+# Адреса API (например, локальная имитация: python -m src.mock_llm_server)
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com')
+ANTHROPIC_BASE_URL = os.getenv('ANTHROPIC_BASE_URL', 'https://api.anthropic.com')
+
+# Распределение запросов между провайдерами: при AI_ROUTING запросы направляются на
+# лучшую точку подключения из всех провайдеров с API ключами, с переключением при сбоях.
+# Без AI_ROUTING используется только AI_PROVIDER (переключение между его моделями сохраняется)
+AI_ROUTING = os.getenv('AI_ROUTING', 'false').lower() == 'true'
+# Точки подключения: "провайдер:модель[@адрес],..."; пусто — по одной на провайдера
+AI_ROUTER_ENDPOINTS = os.getenv('AI_ROUTER_ENDPOINTS', '')
+# Размер скользящего окна статистики, допустимая доля ошибок, во сколько раз точка
+# может быть медленнее самой быстрой и пауза после 429 без retry-after (секунды)
+AI_ROUTER_WINDOW = int(os.getenv('AI_ROUTER_WINDOW', 20))
+AI_ROUTER_MAX_ERROR_RATE = float(os.getenv('AI_ROUTER_MAX_ERROR_RATE', 0.5))
+AI_ROUTER_SLOW_FACTOR = float(os.getenv('AI_ROUTER_SLOW_FACTOR', 3.0))
+AI_ROUTER_COOLDOWN = float(os.getenv('AI_ROUTER_COOLDOWN', 30))
+
 # Общие настройки для нейросетей
 # Низкая температура для более предсказуемых результатов
 AI_TEMPERATURE = float(os.getenv('AI_TEMPERATURE', 1))
@@ -138,6 +155,84 @@ AI_MAX_TOKENS = int(os.getenv('AI_MAX_TOKENS', 64000))
 AI_RETRY_COUNT = int(os.getenv('AI_RETRY_COUNT', 2))
 # Таймаут для API запросов в секундах
 API_TIMEOUT = int(os.getenv('API_TIMEOUT', 60))
+# Потоковое получение ответов нейросети: API_TIMEOUT ограничивает общее время ответа,
+# а поток без новых данных дольше AI_STREAM_IDLE_TIMEOUT секунд прерывается
+AI_STREAMING = os.getenv('AI_STREAMING', 'true').lower() == 'true'
+AI_STREAM_IDLE_TIMEOUT = int(os.getenv('AI_STREAM_IDLE_TIMEOUT', 30))
+# Прекращать чтение ответа сразу после закрытия блока ```sql
+AI_STREAM_STOP_AFTER_CODE_BLOCK = os.getenv('AI_STREAM_STOP_AFTER_CODE_BLOCK', 'true').lower() == 'true'
+# Сколько раз делить пополам часть скрипта, ответ на которую обрезан по лимиту токенов
+AI_TRUNCATION_SPLIT_DEPTH = int(os.getenv('AI_TRUNCATION_SPLIT_DEPTH', 2))
+# Удалять комментарии и лишние пробелы из скрипта перед отправкой нейросети
+# (комментарии возвращаются в сконвертированный скрипт)
+PROMPT_COMPACTION = os.getenv('PROMPT_COMPACTION', 'true').lower() == 'true'
+# Кэширование неизменной части промпта (системный промпт и правила конвертации) на стороне
+# провайдера: для Anthropic запрос размечается cache_control, OpenAI кэширует префикс сам
+AI_PROMPT_CACHING = os.getenv('AI_PROMPT_CACHING', 'true').lower() == 'true'
+# Примеры в промпте: сколько похожих проверенных конвертаций прошлых запусков добавлять
+# (0 — не добавлять и не сохранять), минимальное сходство, файл хранилища и предельный размер пары
+AI_EXAMPLES_TOP_K = int(os.getenv('AI_EXAMPLES_TOP_K', 2))
+AI_EXAMPLES_MIN_SIMILARITY = float(os.getenv('AI_EXAMPLES_MIN_SIMILARITY', 0.2))
+AI_EXAMPLES_FILE = os.getenv('AI_EXAMPLES_FILE', str(CONVERTED_DIR / 'verified_examples.jsonl'))
+AI_EXAMPLES_MAX_CHARS = int(os.getenv('AI_EXAMPLES_MAX_CHARS', 4000))
+# Правила исправления, выученные на исправлениях нейросети: правка, повторившаяся для одной
+# и той же ошибки LEARNED_FIX_RULES_PROMOTE_AFTER раз, применяется до обращения к нейросети
+LEARNED_FIX_RULES = os.getenv('LEARNED_FIX_RULES', 'true').lower() == 'true'
+LEARNED_FIX_RULES_FILE = os.getenv('LEARNED_FIX_RULES_FILE', str(BASE_DIR / 'configs' / 'learned_fix_rules.json'))
+LEARNED_FIX_RULES_PROMOTE_AFTER = int(os.getenv('LEARNED_FIX_RULES_PROMOTE_AFTER', 2))
+# Шаблоны предварительной классификации скриптов (ручная обработка, только правила,
+# нейросеть целиком или по частям), проверяемые одним регулярным выражением
+SCRIPT_CLASSES_FILE = os.getenv('SCRIPT_CLASSES_FILE', str(BASE_DIR / 'configs' / 'script_classes.yaml'))
+# Словарь типов параметров по всему набору скриптов: строится предварительным проходом
+# пакетной обработки (перестраивается при изменении скриптов) и используется до анализа
+# отдельного скрипта и запросов к каталогу схемы
+PARAM_TYPES = os.getenv('PARAM_TYPES', 'true').lower() == 'true'
+PARAM_TYPES_FILE = os.getenv('PARAM_TYPES_FILE', str(CONVERTED_DIR / 'param_types.json'))
+# Общий кэш алиасов таблиц: сколько скриптов хранить в памяти и необязательный каталог
+# на диске для переиспользования между процессами и запусками (пусто — только память)
+ALIAS_CACHE_SIZE = int(os.getenv('ALIAS_CACHE_SIZE', 2048))
+ALIAS_CACHE_DIR = os.getenv('ALIAS_CACHE_DIR', '')
+# Замер количества вызовов и времени каждого регулярного выражения из общего реестра
+# (src/regex_registry.py): самые медленные выражения выводятся в конце пакета и попадают в отчет
+REGEX_TIMING = os.getenv('REGEX_TIMING', 'false').lower() == 'true'
+REGEX_TIMING_TOP = int(os.getenv('REGEX_TIMING_TOP', 10))
+# Бюджет времени (секунды) на одно правило переписывания для одного скрипта: правило,
+# превысившее его, пропускается, скрипт отмечается в отчете, а входной текст сохраняется
+# в RULE_TIMEOUT_DIR (0 — без ограничения). В потоках пакетной обработки правило
+# прерывается только при установленном модуле regex
+RULE_TIME_BUDGET = float(os.getenv('RULE_TIME_BUDGET', 5))
+RULE_TIMEOUT_DIR = os.getenv('RULE_TIMEOUT_DIR', str(LOGS_DIR / 'rule_timeouts'))
+# Потоковая конвертация больших скриптов (main.py --stream): размер читаемой части файла в символах
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 1 << 20))
+# Пакеты, разделенные строками GO, конвертируются независимо (правилами и нейросетью по частям):
+# сколько пакетов или частей конвертировать одновременно (1 — по очереди)
+GO_BATCH_WORKERS = int(os.getenv('GO_BATCH_WORKERS', 1))
+
+# Параллельная генерация вариантов конвертации: сколько вариантов запрашивать одновременно
+# (1 — обычный режим; требует AI_STREAMING), с какими температурами и у каких провайдеров (по кругу)
+AI_HEDGE_CANDIDATES = int(os.getenv('AI_HEDGE_CANDIDATES', 1))
+AI_HEDGE_TEMPERATURES = [float(t) for t in os.getenv('AI_HEDGE_TEMPERATURES', '0.1,0.5,0.9').split(',') if t.strip()]
+AI_HEDGE_PROVIDERS = [p.strip() for p in os.getenv('AI_HEDGE_PROVIDERS', '').split(',') if p.strip()]
+
+# Маршрутизация в пакетной обработке: сначала конвертация правилами и быстрая проверка,
+# нейросеть используется только при ошибке или неподдерживаемых правилами конструкциях
+RULE_FIRST_ROUTING = os.getenv('RULE_FIRST_ROUTING', 'true').lower() == 'true'
+
+# Цены нейросетей в долларах за 1 млн токенов (для оценки стоимости в отчетах)
+AI_TOKEN_PRICES = {
+    'openai': {
+        'input': float(os.getenv('OPENAI_PRICE_INPUT', 2.5)),
+        'output': float(os.getenv('OPENAI_PRICE_OUTPUT', 10.0)),
+        'cache_read': float(os.getenv('OPENAI_PRICE_CACHE_READ', 1.25)),
+        'cache_write': float(os.getenv('OPENAI_PRICE_CACHE_WRITE', 2.5)),
+    },
+    'anthropic': {
+        'input': float(os.getenv('ANTHROPIC_PRICE_INPUT', 3.0)),
+        'output': float(os.getenv('ANTHROPIC_PRICE_OUTPUT', 15.0)),
+        'cache_read': float(os.getenv('ANTHROPIC_PRICE_CACHE_READ', 0.3)),
+        'cache_write': float(os.getenv('ANTHROPIC_PRICE_CACHE_WRITE', 3.75)),
+    },
+}
 
 # Порог использования нейросети
 # Если стандартные методы не справляются после этого количества попыток, 
@@ -148,5 +243,30 @@ AI_FALLBACK_THRESHOLD = int(os.getenv('AI_FALLBACK_THRESHOLD', 2))
 # Если False, то будет использоваться только синтаксическая проверка
 USE_REAL_DB_TESTING = os.getenv('USE_REAL_DB_TESTING', 'true').lower() == 'true'
 
+# Способ выполнения скриптов при проверке: 'pool' (внутри процесса через пул соединений)
+# или 'psql' (запуск внешнего процесса psql на каждую проверку)
+PG_TEST_EXECUTOR = os.getenv('PG_TEST_EXECUTOR', 'pool')
+# Максимальное количество соединений в пуле для проверки скриптов
+PG_POOL_MAX_CONNECTIONS = int(os.getenv('PG_POOL_MAX_CONNECTIONS', 8))
+# Файл снимка каталога схемы (таблица, колонка, тип). Если файл существует, каталог
+# читается из него без обращения к базе данных; пустое значение — только из базы
+SCHEMA_CATALOG_FILE = os.getenv('SCHEMA_CATALOG_FILE', '')
+# Возраст снимка каталога схемы в секундах, после которого он перечитывается из базы (0 — без ограничения)
+SCHEMA_CATALOG_MAX_AGE = int(os.getenv('SCHEMA_CATALOG_MAX_AGE', 24 * 60 * 60))
+# Пауза в секундах перед повторной загрузкой каталога схемы после ошибки базы данных
+SCHEMA_CATALOG_RETRY_INTERVAL = int(os.getenv('SCHEMA_CATALOG_RETRY_INTERVAL', 60))
+
+# Исправление ошибок: отправлять нейросети только оператор, в котором возникла ошибка
+ERROR_LOCALIZED_FIX = os.getenv('ERROR_LOCALIZED_FIX', 'true').lower() == 'true'
+# Количество строк контекста до и после оператора с ошибкой
+ERROR_FIX_CONTEXT_LINES = int(os.getenv('ERROR_FIX_CONTEXT_LINES', 5))
+
 # Включить улучшенный парсер для анализа контекста параметров
 USE_IMPROVED_PARSER = True
+
+# Детерминированная конвертация блоков загрузки данных (INSERT ... VALUES) без нейросети
+DATA_LOAD_FAST_PATH = os.getenv('DATA_LOAD_FAST_PATH', 'true').lower() == 'true'
+# Формат вывода данных: 'insert' (многострочные INSERT) или 'copy' (COPY ... FROM STDIN, только для psql)
+DATA_LOAD_OUTPUT_FORMAT = os.getenv('DATA_LOAD_OUTPUT_FORMAT', 'insert')
+# Максимальное количество строк в одном INSERT
+DATA_LOAD_BATCH_ROWS = int(os.getenv('DATA_LOAD_BATCH_ROWS', 1000))
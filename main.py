@@ -23,6 +23,11 @@ from src.converter import SQLConverter
 from src.postgres_tester import PostgresTester
 from src.logger import Logger
 from src.report_generator import ReportGenerator
+from src.schema_catalog import get_schema_catalog
+from src.sql_alias_analyzer import get_alias_cache
+from src import regex_registry
+from src.rule_guard import warn_if_unguarded
+from src.script_stream import convert_file_streaming
 
 def process_script(script_path, output_dir, config_obj, max_retry=3, use_ai=True):
     """
@@ -63,6 +68,8 @@ def process_script(script_path, output_dir, config_obj, max_retry=3, use_ai=True
         try:
             converted_script = converter.convert(parsed_script)
             logger.log_script_processing(script_name, 'conversion', 'success')
+            if converter.rule_guard.events:
+                logger.log_script_processing(script_name, 'rule_budget', 'exceeded', converter.rule_guard.events)
         except Exception as e:
             logger.log_script_processing(script_name, 'conversion', 'failed', str(e))
             return False
@@ -164,6 +171,26 @@ def process_script(script_path, output_dir, config_obj, max_retry=3, use_ai=True
         logger.log_script_processing(script_name, 'processing', 'failed', f"{str(e)}\n{traceback.format_exc()}")
         return False
 
+def stream_scripts(scripts, output_dir):
+    """
+    Потоковая конвертация скриптов правилами: файл читается частями, каждый запрос
+    конвертируется отдельно и сразу записывается, память ограничена самым большим запросом
+    """
+    converter = SQLConverter(config)
+    for script in scripts:
+        output_path = Path(output_dir) / script.name
+        try:
+            stats = convert_file_streaming(str(script), str(output_path), converter)
+        except Exception as e:
+            print(f"Ошибка при обработке {script}: {str(e)}")
+            return 1
+        print(f"✅ {script.name}: {stats['statements']} запросов в {stats['batches']} пакетах, "
+              f"самый большой запрос {stats['largest_statement']} символов, "
+              f"{stats['elapsed_time']:.2f} с -> {output_path}")
+    if converter.rule_guard.skipped_rules:
+        print(f"Пропущены правила, превысившие бюджет времени: {', '.join(converter.rule_guard.skipped_rules)}")
+    return 0
+
 def main():
     """
     Основная функция для запуска конвертации
@@ -178,6 +205,10 @@ def main():
     parser.add_argument('--no-ai', action='store_true', help='Не использовать нейросеть даже если она включена в конфигурации')
     parser.add_argument('--ai-provider', choices=['openai', 'anthropic'], help='Указать провайдера нейросети')
     parser.add_argument('--env', help='Путь к .env файлу с настройками')
+    parser.add_argument('--refresh-schema-catalog', action='store_true',
+                        help='Перечитать каталог схемы из PostgreSQL и обновить файл снимка')
+    parser.add_argument('--stream', action='store_true',
+                        help='Потоковая конвертация правилами по запросам без проверки в PostgreSQL (для очень больших скриптов)')
     
     args = parser.parse_args()
     
@@ -218,6 +249,9 @@ def main():
     
     print(f"Найдено {len(scripts)} SQL скриптов для обработки")
     
+    if args.stream:
+        return stream_scripts(scripts, output_dir)
+    
     # Проверяем API ключи для нейросетей, если они используются
     if config.USE_AI_CONVERSION:
         openai_key = os.getenv('OPENAI_API_KEY')
@@ -251,6 +285,13 @@ def main():
         print("Запустите 'docker-compose up -d' перед использованием конвертера")
         return 1
     
+    regex_registry.configure(config)
+    warn_if_unguarded(config)
+    
+    # Каталог схемы загружается один раз и используется всеми потоками
+    if args.refresh_schema_catalog:
+        get_schema_catalog(config).refresh()
+    
     # Обрабатываем скрипты
     start_time = time.time()
     successful = 0
@@ -287,6 +328,12 @@ def main():
     print(f"Обработка завершена за {elapsed_time:.2f} секунд")
     print(f"Успешно обработано: {successful}")
     print(f"Не удалось обработать: {failed}")
+    alias_cache = get_alias_cache(config).stats()
+    print(f"Кэш алиасов: доля попаданий {alias_cache['hit_ratio']:.0%} "
+          f"({alias_cache['hits']} в памяти, {alias_cache['disk_hits']} на диске, {alias_cache['misses']} промахов)")
+    if regex_registry.timing_enabled():
+        print("Самые медленные регулярные выражения:")
+        print(regex_registry.format_regex_stats(regex_registry.regex_stats(getattr(config, 'REGEX_TIMING_TOP', 10))))
     
     # Генерируем отчет, если требуется
     if args.report:
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Просмотр и управление правилами исправления, выученными на исправлениях нейросети
+(src/fix_rules.py).
+
+Примеры:
+    python manage_fix_rules.py list
+    python manage_fix_rules.py list --status candidate
+    python manage_fix_rules.py show a16736a1f2
+    python manage_fix_rules.py enable a16736a1f2
+    python manage_fix_rules.py disable a16736a1f2
+    python manage_fix_rules.py delete a16736a1f2
+"""
+
+import sys
+import argparse
+from datetime import datetime
+
+from tabulate import tabulate
+
+import config
+from src.fix_rules import FixRuleBook, STATUSES, STATUS_DISABLED, STATUS_ENABLED
+
+
+def _short(text, width=40):
+    text = ' '.join(text.split())
+    return text if len(text) <= width else text[:width - 1] + '…'
+
+
+def list_rules(book, status=None):
+    rules = sorted(book.rules.values(), key=lambda r: (r.status != STATUS_ENABLED, -r.count, r.created))
+    if status:
+        rules = [r for r in rules if r.status == status]
+    if not rules:
+        print("Правил нет")
+        return 0
+    rows = [[r.id, r.status, r.count, r.applied, r.hits, f"{r.hit_rate:.0%}",
+             _short(r.signature), _short(r.before, 25), _short(r.after, 25)] for r in rules]
+    print(tabulate(rows, headers=['ID', 'Статус', 'Исправлений', 'Применено', 'Успешно', 'Доля',
+                                  'Ошибка', 'До', 'После']))
+    return 0
+
+
+def show_rule(book, rule_id):
+    rule = book.find(rule_id)
+    if rule is None:
+        print(f"Правило {rule_id} не найдено (или идентификатор неоднозначен)")
+        return 1
+    print(f"ID:          {rule.id}")
+    print(f"Статус:      {rule.status}")
+    print(f"Создано:     {datetime.fromtimestamp(rule.created):%Y-%m-%d %H:%M:%S}")
+    print(f"Ошибка:      {rule.signature}")
+    print(f"Исправлений нейросети: {rule.count}")
+    print(f"Применено:   {rule.applied}, успешно: {rule.hits} ({rule.hit_rate:.0%})")
+    print(f"До:\n{rule.before}")
+    print(f"После:\n{rule.after}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Управление выученными правилами исправления')
+    parser.add_argument('--file', default=config.LEARNED_FIX_RULES_FILE, help='Файл правил')
+    commands = parser.add_subparsers(dest='command', required=True)
+    list_parser = commands.add_parser('list', help='Список правил')
+    list_parser.add_argument('--status', choices=STATUSES, help='Только правила с этим статусом')
+    for name, help_text in (('show', 'Подробности правила'), ('enable', 'Включить правило'),
+                            ('disable', 'Отключить правило'), ('delete', 'Удалить правило')):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('rule_id', help='Идентификатор правила (или его начало)')
+    args = parser.parse_args()
+
+    book = FixRuleBook(args.file)
+    if args.command == 'list':
+        return list_rules(book, args.status)
+    if args.command == 'show':
+        return show_rule(book, args.rule_id)
+    if args.command == 'delete':
+        rule = book.remove(args.rule_id)
+    else:
+        rule = book.set_status(args.rule_id, STATUS_ENABLED if args.command == 'enable' else STATUS_DISABLED)
+    if rule is None:
+        print(f"Правило {args.rule_id} не найдено (или идентификатор неоднозначен)")
+        return 1
+    print(f"Правило {rule.id}: {'удалено' if args.command == 'delete' else rule.status}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
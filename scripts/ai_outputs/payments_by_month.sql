@@ -0,0 +1,13 @@
+SELECT
+    YEAR(pay.a_paydate) AS pay_year,
+    MONTH(pay.a_paydate) AS pay_month,
+    SUM(COALESCE(pay.a_amount, 0)) AS total_amount,
+    COUNT(DISTINCT pay.a_pc) AS persons,
+    DATEDIFF(DAY, MIN(pay.a_paydate), MAX(pay.a_paydate)) AS period_days
+FROM wm_payment pay
+INNER JOIN wm_personal_card pc ON pc.ouid = pay.a_pc
+WHERE TO_TIMESTAMP(pay.a_paydate::text, 'YYYY-MM-DD') >= '2023-01-01'
+  AND pay.a_status = 10
+  AND pc.a_status <> 2
+GROUP BY YEAR(pay.a_paydate), MONTH(pay.a_paydate)
+ORDER BY pay_year, pay_month;
@@ -0,0 +1,23 @@
+DO $$
+DECLARE
+    v_count integer := 0;
+    v_status text;
+BEGIN
+    SELECT COUNT(*) INTO v_count
+    FROM wm_petition p
+    WHERE p.a_status = 1;
+
+    CASE
+        WHEN v_count > 100 THEN v_status := 'many';
+        WHEN v_count > 0 THEN v_status := 'some';
+        ELSE v_status := 'none';
+    END CASE;
+
+    IF v_count > 0 THEN
+        UPDATE wm_petition
+        SET a_processed = CASE WHEN a_status = 1 THEN 1 ELSE 0 END
+        WHERE a_status IN (1, 2);
+    END IF;
+
+    RAISE NOTICE 'Статус: %, количество: %', v_status, v_count;
+END $$;
@@ -0,0 +1,20 @@
+-- Отчет по статусам заявлений
+SELECT
+    p.ouid,
+    p.a_status,
+    CASE
+        WHEN p.a_status = 1 THEN 'Новое'
+        WHEN p.a_status = 2 THEN 'В работе'
+        WHEN p.a_status IS NULL THEN 0
+        ELSE CASE WHEN p.a_closed = 1 THEN 'Закрыто' ELSE 3 END
+    END AS status_name,
+    COALESCE(p.a_status, 0) AS status_code,
+    COALESCE(pc.a_regioncoeff, 1.0) AS coeff,
+    DATE_PART('day', COALESCE(p.a_date_end, CURRENT_DATE) - p.a_date_start) AS days_total,
+    EXTRACT(YEAR FROM p.a_date_start::timestamp) AS start_year
+FROM wm_petition p
+LEFT JOIN wm_personal_card pc ON pc.ouid = p.a_msp_holder
+WHERE p.a_status::text = 1
+  AND COALESCE(pc.a_snils::text, '') = 0
+  AND pc.a_name = ''
+  AND p.a_date_start >= '2023-01-01'::date;
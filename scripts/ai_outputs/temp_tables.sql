@@ -0,0 +1,28 @@
+DROP TABLE IF EXISTS temp_fact;
+CREATE TEMP TABLE temp_fact (
+    ouid integer,
+    a_name varchar(255),
+    a_type varchar(10),
+    a_sum numeric(18, 2),
+    a_date timestamp
+);
+
+INSERT INTO temp_fact (ouid, a_name, a_type, a_sum, a_date)
+SELECT
+    s.ouid,
+    s.a_name,
+    CASE s.a_kind WHEN 1 THEN 'M' WHEN 2 THEN 'F' ELSE 0 END,
+    COALESCE(s.a_sum, 0.0),
+    CURRENT_TIMESTAMP
+FROM spr_source s
+WHERE s.a_kind::varchar = 1
+  AND 'active' = 1;
+
+UPDATE temp_fact
+SET a_date = '2023-12-31'::TIMESTAMP
+WHERE a_type = 'M';
+
+SELECT t.a_type, COUNT(*), SUM(t.a_sum)
+FROM temp_fact t
+WHERE t.a_sum = ''
+GROUP BY t.a_type;
@@ -4,35 +4,103 @@
 """
 
 import os
+import copy
+import threading
 import time
 import json
 import requests
 import re
 import subprocess
 import tempfile
+import psycopg2
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Any, Optional, Tuple, List
 from pathlib import Path
 from dotenv import load_dotenv
-from src.sql_alias_analyzer import SQLAliasAnalyzer
+from src.sql_alias_analyzer import SQLAliasAnalyzer, get_alias_cache
+from src.data_load_converter import DataLoadConverter
+from src.pg_pool import execute_script, ExecutionStats
+from src.schema_catalog import get_schema_catalog
+from src.sql_post_processor import get_post_processor
+from src.ai_usage import AIUsage, extract_usage
+from src.ai_stream import StreamAborted, TRUNCATED_MESSAGE, read_stream
+from src.ai_router import ProviderEndpoint, get_provider_router, route_key
+from src.ai_hedge import (HEDGE_CANCELLED_MESSAGE, HedgeCandidate, build_candidates, hedge_outcome,
+                          settle_hedge_tokens)
+from src.error_localizer import ErrorFragment, estimate_tokens, locate_error
+from src.prompt_compactor import CompactedScript, compact_sql
+from src.example_store import get_example_store
+from src.fix_rules import get_fix_rule_book
+from src.script_classifier import SKIP, ScriptClass, get_script_classifier
+from src.parsed_script import ParsedScript
+from src.regex_registry import regex
+from src.rule_guard import RuleGuard, make_rule_guard
+from src.script_stream import join_batches
 
 # Загружаем переменные из .env файла
 env_path = Path(__file__).resolve().parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
+_PROVIDER_NAMES = {'openai': 'OpenAI', 'anthropic': 'Anthropic Claude'}
+
+# Форматы параметров для старой логики подстановки: {params.x}, {x}, default_params.x, params.x
+_PARAM_RES = [
+    regex('ai_converter.param_braced', r'\{params\.([^}]+)\}'),
+    regex('ai_converter.param_placeholder', r'\{([^}]+)\}'),
+    regex('ai_converter.param_default', r'default_params\.([a-zA-Z0-9_]+)'),
+    regex('ai_converter.param_dotted', r'params\.([a-zA-Z0-9_]+)'),
+]
+_PARAM_FORMATS = ['{{params.{}}}', '{{{}}}', 'default_params.{}', 'params.{}']
+
+# Типичные проблемы типов, которые видны без PostgreSQL
+_COALESCE_RE = regex('ai_converter.coalesce', r"COALESCE\s*\(\s*([^,]+),\s*([^)]+)\)")
+_SET_CAST_RE = regex('ai_converter.set_cast', r"SET\s+\w+\s*=\s*'[^']*'::(\w+)")
+_WHERE_TEXT_NUMBER_RE = regex('ai_converter.where_text_number',
+                              r"WHERE\s+.*?([^\s]+(?:::(?:ci)?text|::varchar))\s*=\s*(\d+)(?!\s*::)", re.IGNORECASE)
+
+# Блоки кода в ответе нейросети
+_FENCE_SQL_START_RE = regex('ai_converter.fence_sql_start', r'^```sql\s*\n', re.MULTILINE)
+_FENCE_START_RE = regex('ai_converter.fence_start', r'^```\s*\n', re.MULTILINE)
+_FENCE_END_RE = regex('ai_converter.fence_end', r'\n```\s*$', re.MULTILINE)
+_SQL_BLOCK_RE = regex('ai_converter.sql_block', r"```sql\s*([\s\S]*?)\s*```")
+_CODE_BLOCK_RE = regex('ai_converter.code_block', r"```\s*([\s\S]*?)\s*```")
+_FENCE_RE = regex('ai_converter.fence', r'```sql|```')
+
+# Начало новой SQL-конструкции в строке при разбиении больших скриптов на логические блоки
+_BLOCK_START_RE = regex('ai_converter.block_start',
+                        r"^\s*(?:(?:CREATE|ALTER|DROP|INSERT|UPDATE|DELETE|SELECT|DECLARE|SET|IF|BEGIN|EXEC|USE|PRINT)\s+"
+                        r"|END\s*$)", re.IGNORECASE)
+_CREATE_TABLE_RE = regex('ai_converter.create_table', r"^\s*CREATE\s+TABLE", re.IGNORECASE)
+_INSERT_INTO_RE = regex('ai_converter.insert_into', r"^\s*INSERT\s+INTO", re.IGNORECASE)
+_VALUES_OR_SELECT_RE = regex('ai_converter.values_or_select', r'\bVALUES\b|\bSELECT\b', re.IGNORECASE)
+_SELECT_RE = regex('ai_converter.select', r'\bSELECT\b', re.IGNORECASE)
+_TABLE_CONTINUATION_RE = regex('ai_converter.table_continuation',
+                               r'\s*-- Часть таблицы, продолжение в следующем блоке\s*\)\s*CREATE\s+TABLE.*?\(\s*-- Продолжение таблицы',
+                               re.DOTALL)
+_REPEATED_INSERT_RE = regex('ai_converter.repeated_insert',
+                            r'(INSERT\s+INTO\s+[^\s(]+(?:\s*\([^)]+\))?\s+VALUES\s+)(?:\([^;]+;\s*)(\1)',
+                            re.DOTALL | re.IGNORECASE)
+
+
 class AIConverter:
     """
     Класс для конвертации SQL с использованием нейросетей через API
     с автоматической проверкой и исправлением результатов
     """
     
-    def __init__(self, config):
+    def __init__(self, config, ai_provider: str = None):
         """
         Инициализация с настройками из конфигурации
         
         Args:
             config: Объект конфигурации с настройками для конвертации
+            ai_provider: Провайдер нейросети (по умолчанию AI_PROVIDER из конфигурации)
         """
         self.config = config
+        self.ai_provider = (ai_provider or getattr(config, 'AI_PROVIDER', 'openai')).lower()
+        # Распределение запросов между провайдерами с переключением при сбоях
+        self.routing = getattr(config, 'AI_ROUTING', False)
+        self.router = get_provider_router(config)
         self.api_keys = {
             'openai': os.getenv('OPENAI_API_KEY', ''),
             'anthropic': os.getenv('ANTHROPIC_API_KEY', ''),
@@ -47,18 +115,43 @@ class AIConverter:
         self.api_timeout = getattr(self.config, 'API_TIMEOUT', 60)
         print(f"Установлен таймаут API запросов: {self.api_timeout} секунд")
         # Инициализируем анализатор алиасов SQL
-        self.alias_analyzer = SQLAliasAnalyzer()
+        self.alias_analyzer = SQLAliasAnalyzer(get_alias_cache(config))
+        # Детерминированный конвертер блоков загрузки данных (INSERT ... VALUES)
+        self.data_load_converter = DataLoadConverter(config)
+        # Статистика времени проверок скриптов в PostgreSQL
+        self.test_stats = ExecutionStats()
+        # Учет запросов к нейросети и токенов
+        self.usage = AIUsage()
+        # Параллельная генерация вариантов: количество, провайдеры и сводка последнего запуска
+        self.hedge_candidates = getattr(self.config, 'AI_HEDGE_CANDIDATES', 1)
+        self.hedge_providers = getattr(self.config, 'AI_HEDGE_PROVIDERS', None)
+        self.hedge_stats = None
+        # Проверенные конвертации прошлых запусков как примеры в промпте
+        self.example_store = get_example_store(config)
+        self.examples_used = 0
+        # Запросы конвертации и исправления к нейросети для последнего скрипта
+        self.ai_iterations = 0
+        # Правила, выученные на исправлениях нейросети, и статистика их применения
+        self.fix_rules = get_fix_rule_book(config)
+        self.learned_fix_stats = {'errors': 0, 'applied': 0, 'hits': 0, 'learned': 0}
+        # Бюджет времени на каждое правило постобработки для скрипта; события превышения — в rule_guard.events
+        self.rule_guard = make_rule_guard(config)
+        # Предварительная классификация скриптов (configs/script_classes.yaml)
+        self.classifier = get_script_classifier(config)
+        self._script_class = None
         
     def extract_sql_text(self, script):
         """
         Извлекает текст SQL из различных форматов входящего объекта.
         
         Args:
-            script: Входной объект (строка или словарь)
+            script: Входной объект (строка, словарь или ParsedScript)
             
         Returns:
             str: Текст SQL-запроса
         """
+        if isinstance(script, ParsedScript):
+            return script.text
         if isinstance(script, dict):
             # Если есть ключ 'original', используем его (это наиболее вероятный вариант из парсера)
             if 'original' in script:
@@ -93,48 +186,32 @@ class AIConverter:
         Returns:
             Tuple[bool, str]: (нужно_пропустить, причина_пропуска)
         """
-        # Список паттернов, которые указывают на то, что скрипт может быть частью 
-        # более крупного скрипта или требует ручной обработки
-        patterns = [
-            # Скрипт начинается с CASE
-            (r'^\s*CASE\s+WHEN', 'Скрипт начинается с CASE WHEN и может быть частью более крупного скрипта'),
-            (r'^\s*case', 'Скрипт начинается с CASE (любой регистр) и может быть фрагментом'),
-            
-            # Содержит специфические функции
-            (r'SQL\.equalBeforeInDay', 'Скрипт содержит специфическую функцию SQL.equalBeforeInDay'),
-            
-            # Содержит конкретные SQL.* паттерны
-            (r'SQL\.endMonth', 'Скрипт содержит специфическую функцию SQL.endMonth'),
-            (r'SQL\.addYear', 'Скрипт содержит специфическую функцию SQL.addYear'),
-            (r'SQL\.getDate', 'Скрипт содержит специфическую функцию SQL.getDate'),
-            (r'SQL\.getYearOld', 'Скрипт содержит специфическую функцию SQL.getYearOld'),
-            
-            # Общий паттерн для всех SQL.* функций
-            (r'\{SQL\.[^\}]+\}', 'Скрипт содержит динамические SQL-функции вида {SQL.*}'),
-            
-            # Содержит специфические параметры
-            (r'ALG\.[a-zA-Z]+', 'Скрипт содержит динамические параметры вида ALG.*'),
-            
-            # Вызовы хранимых процедур из схемы public
-            (r'public\.[a-zA-Z0-9_]+\s*\(', 'Скрипт содержит вызов хранимой процедуры public.*'),
-            
-            # Вызов специфичной функции check_documents_in_personal_card
-            (r'check_documents_in_personal_card\s*\(', 'Скрипт содержит вызов специфической функции check_documents_in_personal_card'),
-            
-            # Другие шаблоны, которые можно добавить позже...
-            # (r'другой_паттерн', 'другое_сообщение'),
-        ]
-        
-        # Извлекаем текст скрипта
-        script_text = self.extract_sql_text(script)
-
-        # Проверяем каждый паттерн
-        for pattern, message in patterns:
-            if re.search(pattern, script_text, re.IGNORECASE):
-                return True, message
-        
-        # Ничего не найдено
+        # Шаблоны ручной обработки задаются в SCRIPT_CLASSES_FILE и проверяются
+        # одним скомпилированным регулярным выражением
+        script_class = self.classify_script(script)
+        if script_class.category == SKIP:
+            return True, script_class.reason
         return False, ""
+
+    def classify_script(self, script, script_class: Optional[ScriptClass] = None) -> ScriptClass:
+        """
+        Классифицирует скрипт: ручная обработка, только правила, нейросеть целиком или по частям
+
+        Args:
+            script: Содержимое скрипта (может быть строкой или словарем)
+            script_class: Готовая классификация скрипта (например, из предварительного прохода
+                пакетной обработки); запоминается без повторного сканирования
+
+        Returns:
+            ScriptClass: Категория скрипта
+        """
+        script_text = self.extract_sql_text(script)
+        # Маршрутизация и конвертация одного скрипта используют одну классификацию
+        if script_class is not None:
+            self._script_class = (script_text, script_class)
+        elif self._script_class is None or self._script_class[0] != script_text:
+            self._script_class = (script_text, self.classifier.classify(script_text))
+        return self._script_class[1]
         
     def convert_with_ai(self, original_script, error_message: str = None, 
                          max_iterations: int = 3) -> Tuple[bool, str, str]:
@@ -171,20 +248,35 @@ class AIConverter:
             # Извлекаем текст скрипта
             script_text = self.extract_sql_text(original_script)
             
-            # Определяем какой API использовать из конфигурации
-            ai_provider = getattr(self.config, 'AI_PROVIDER', 'openai').lower()
-            
-            print(f"\n--- Начинаем конвертацию с помощью {ai_provider.upper()} ---")
+            ai_provider = self.ai_provider
+            if ai_provider not in _PROVIDER_NAMES:
+                return False, script_text, f"Неизвестный провайдер AI: {ai_provider}"
             
-            # Первичная конвертация
-            if ai_provider == 'openai':
-                success, converted_script, message = self._convert_with_openai(script_text, error_message)
-            elif ai_provider == 'anthropic':
-                success, converted_script, message = self._convert_with_anthropic(script_text, error_message)
+            print(f"\n--- Начинаем конвертацию с помощью {'маршрутизатора провайдеров' if self.routing else ai_provider.upper()} ---")
+            self.ai_iterations = 1
+            
+            # Первичная конвертация. Лишние варианты отменяются только при потоковом чтении ответа,
+            # без него каждый вариант дочитывается до конца и параллельная генерация не экономит время
+            hedge_candidates = self.hedge_candidates
+            if hedge_candidates > 1 and not getattr(self.config, 'AI_STREAMING', True):
+                print("⚠️ Параллельная генерация вариантов требует AI_STREAMING, запрашиваем один вариант")
+                hedge_candidates = 1
+            # Результат проверки первичной конвертации, если вариант уже проверен при параллельной генерации
+            tested = None
+            if hedge_candidates > 1:
+                success, converted_script, message, verified, tested = self._hedged_conversion(
+                    script_text, error_message, ai_provider)
+                if verified:
+                    self._remember_example(script_text, converted_script)
+                    return True, converted_script, message
             else:
-                return False, script_text, f"Неизвестный провайдер AI: {ai_provider}"
+                success, converted_script, message = self._convert_script(script_text, error_message)
             
             if not success:
+                if TRUNCATED_MESSAGE in message:
+                    # Ответ не поместился в лимит токенов — конвертируем скрипт по частям
+                    print(f"✂️ {message}, повторяем конвертацию по частям")
+                    return self.convert_large_script(original_script, error_message, max_iterations)
                 return False, script_text, message
             
             print(f"✅ Первичная конвертация успешно выполнена")
@@ -192,12 +284,32 @@ class AIConverter:
             # Итеративное улучшение скрипта с проверкой его работоспособности
             iteration = 0
             current_script = converted_script
+            # Исправления нейросети, еще не подтвержденные проверкой: (скрипт с ошибкой, ошибка, результат)
+            pending_fixes = []
             
             while iteration < max_iterations:
                 print(f"\n--- Итерация {iteration+1}/{max_iterations} ---")
                 
                 # Проверяем работоспособность скрипта
-                script_works, error = self._test_script_in_postgres(current_script)
+                if tested is not None:
+                    script_works, error = tested
+                    tested = None
+                else:
+                    script_works, error = self._test_script_in_postgres(current_script)
+                
+                # Правки запоминаются только когда исправленный скрипт прошел проверку:
+                # правка, заменившая одну ошибку другой, сама по себе успешной не считается
+                if script_works:
+                    for before, fixed_error, after in pending_fixes:
+                        self._learn_fix(before, fixed_error, after)
+                    pending_fixes = []
+                
+                if not script_works and error:
+                    self.learned_fix_stats['errors'] += 1
+                    fixed_by_rules = self._apply_learned_rules(current_script, error)
+                    if fixed_by_rules is not None:
+                        self._remember_example(script_text, fixed_by_rules)
+                        return True, fixed_by_rules, "Успешно сконвертировано и проверено в PostgreSQL (исправлено выученными правилами)"
 
                 # Проверка на type mismatch — если да, сразу выходим
                 type_mismatch_patterns = [
@@ -216,6 +328,7 @@ class AIConverter:
 
                 if script_works:
                     print(f"✅ Скрипт успешно проверен в PostgreSQL (итерация {iteration+1})")
+                    self._remember_example(script_text, current_script)
                     return True, current_script, "Успешно сконвертировано и проверено в PostgreSQL"
                 
                 # Если скрипт не работает, пытаемся исправить с помощью AI
@@ -224,17 +337,16 @@ class AIConverter:
                 print(f"🔄 Отправляем скрипт на доработку...")
                 
                 # Конвертируем снова, но с сообщением об ошибке
-                if ai_provider == 'openai':
-                    success, fixed_script, message = self._convert_with_openai(current_script, error)
-                else:
-                    success, fixed_script, message = self._convert_with_anthropic(current_script, error)
+                success, fixed_script, message = self._fix_script_with_ai(current_script, error)
                 
                 if not success:
                     # Если не удалось исправить, возвращаем последнюю версию и сообщение
                     return False, current_script, f"Не удалось исправить скрипт: {message}"
                 
+                pending_fixes.append((current_script, error, fixed_script))
                 current_script = fixed_script
                 iteration += 1
+                self.ai_iterations += 1
             
             # Если после всех итераций скрипт все еще не работает, возвращаем последнюю версию
             return False, current_script, f"Достигнуто максимальное количество итераций ({max_iterations}), скрипт может содержать ошибки"
@@ -246,6 +358,189 @@ class AIConverter:
             script_text = self.extract_sql_text(original_script)
             return False, script_text, f"Ошибка при конвертации: {str(e)}"
     
+    def _hedged_conversion(self, script_text: str, error_message: str,
+                           ai_provider: str) -> Tuple[bool, str, str, bool, Optional[Tuple[bool, str]]]:
+        """
+        Запрашивает несколько вариантов конвертации параллельно (AI_HEDGE_CANDIDATES)
+        с разной температурой или у разных провайдеров. Каждый вариант проверяется
+        в PostgreSQL сразу после получения; первый прошедший проверку побеждает,
+        остальные запросы отменяются. Если ни один не прошел проверку, возвращается
+        первый проверенный вариант с результатом его проверки для обычных итераций исправления.
+        
+        Args:
+            script_text: Текст скрипта
+            error_message: Сообщение об ошибке, если есть
+            ai_provider: Провайдер по умолчанию
+            
+        Returns:
+            Tuple: (успех, скрипт, сообщение, прошел ли скрипт проверку,
+                результат проверки (работает, ошибка) для непрошедшего варианта или None)
+        """
+        temperatures = getattr(self.config, 'AI_HEDGE_TEMPERATURES', None) or [getattr(self.config, 'AI_TEMPERATURE', 0.1)]
+        candidates = build_candidates(self.hedge_candidates, ai_provider, temperatures, self.hedge_providers)
+        unknown = [c.provider for c in candidates if c.provider not in ('openai', 'anthropic')]
+        if unknown:
+            return False, script_text, f"Неизвестный провайдер AI: {unknown[0]}", False, None
+        
+        print(f"🔀 Запрашиваем {len(candidates)} варианта конвертации параллельно: "
+              + ", ".join(f"{c.provider} t={c.temperature}" for c in candidates))
+        
+        # Варианты проверяются в одной тестовой БД, поэтому проверки идут по очереди.
+        # Прошедший проверку вариант отменяет остальные, не отпуская блокировку,
+        # так что после принятия решения новые проверки не начинаются
+        test_lock = threading.Lock()
+        
+        def run(candidate: HedgeCandidate):
+            candidate.started = time.time()
+            try:
+                success, converted, message = self._convert_script(script_text, error_message, candidate=candidate)
+                works, error = False, message
+                if success and not candidate.cancelled:
+                    with test_lock:
+                        if not candidate.cancelled:
+                            works, error = self._test_script_in_postgres(converted)
+                            if works:
+                                for other in candidates:
+                                    if other is not candidate:
+                                        other.cancel()
+                if candidate.cancelled:
+                    candidate.status = 'cancelled'
+                else:
+                    candidate.status = 'passed' if works else ('failed' if success else 'error')
+                return success, converted, error
+            finally:
+                candidate.finished = time.time()
+        
+        started = time.time()
+        winner = None
+        fallback = None
+        executor = ThreadPoolExecutor(max_workers=len(candidates))
+        futures = {executor.submit(run, candidate): candidate for candidate in candidates}
+        try:
+            for future in as_completed(futures):
+                candidate = futures[future]
+                try:
+                    success, converted, error = future.result()
+                except Exception as e:
+                    candidate.status = 'error'
+                    print(f"⚠️ Вариант {candidate.index + 1}: ошибка {str(e)}")
+                    continue
+                if candidate.status == 'passed':
+                    winner = (candidate, converted)
+                    break
+                print(f"Вариант {candidate.index + 1} ({candidate.provider}, t={candidate.temperature}) не прошел проверку: {error}")
+                if candidate.status == 'failed' and fallback is None:
+                    fallback = (candidate, converted, error)
+        finally:
+            decided = time.time()
+            for candidate in candidates:
+                if winner is None or candidate is not winner[0]:
+                    candidate.cancel()
+            # Отмененные потоки прерываются на следующем фрагменте ответа; их не ждем
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        chosen = winner or fallback
+        chosen_candidate = chosen[0] if chosen else None
+        self.hedge_stats = stats = hedge_outcome(candidates, chosen_candidate, started, decided)
+        # Токены вариантов, завершившихся после решения, учитываются в сводке по их завершении
+        stats_lock = threading.Lock()
+        
+        def settle(_future):
+            with stats_lock:
+                settle_hedge_tokens(stats, candidates, chosen_candidate)
+        
+        for future in futures:
+            future.add_done_callback(settle)
+        print(f"🔀 Параллельная генерация: ожидание {self.hedge_stats['wall_time']:.2f} с, "
+              f"последовательно ~{self.hedge_stats['sequential_time']:.2f} с, "
+              f"экономия {self.hedge_stats['time_saved']:.2f} с, лишних токенов "
+              f"{self.hedge_stats['extra_input_tokens']}/{self.hedge_stats['extra_output_tokens']}")
+        
+        if winner:
+            candidate, converted = winner
+            print(f"✅ Вариант {candidate.index + 1} ({candidate.provider}, t={candidate.temperature}) прошел проверку первым")
+            return True, converted, "Успешно сконвертировано и проверено в PostgreSQL", True, None
+        if fallback:
+            return True, fallback[1], "Успешно сконвертировано", False, (False, fallback[2])
+        return False, script_text, "Ни один из вариантов конвертации не получен", False, None
+    
+    def _fix_script_with_ai(self, script: str, error: str) -> Tuple[bool, str, str]:
+        """
+        Отправляет скрипт с ошибкой на исправление. Если ошибку удается привязать
+        к конкретному оператору, нейросети отправляется только этот оператор
+        с несколькими строками контекста, а исправление вставляется обратно в скрипт.
+        
+        Args:
+            script: Текущая версия скрипта
+            error: Сообщение об ошибке из PostgreSQL
+            
+        Returns:
+            Tuple[bool, str, str]: (успех, исправленный скрипт, сообщение)
+        """
+        fragment = None
+        if getattr(self.config, 'ERROR_LOCALIZED_FIX', True):
+            fragment = locate_error(script, error)
+        
+        if fragment is not None and fragment.total > 1:
+            prompt = self._create_fragment_fix_prompt(fragment, error)
+            full_tokens = estimate_tokens(self._create_improved_prompt(script, error))
+            fragment_tokens = estimate_tokens(prompt)
+            saved = full_tokens - fragment_tokens
+            print(f"🎯 Ошибка локализована: оператор {fragment.index + 1}/{fragment.total} "
+                  f"(строки {fragment.start_line}-{fragment.end_line})")
+            print(f"💰 Токенов в запросе: ~{fragment_tokens} вместо ~{full_tokens} "
+                  f"(экономия ~{saved}, {saved * 100 // max(full_tokens, 1)}%)")
+            
+            success, fixed_fragment, message = self._convert_chunk(fragment.text, prompt)
+            
+            if success and fixed_fragment.strip():
+                return True, fragment.splice(fixed_fragment), message
+            print(f"⚠️ Не удалось исправить фрагмент ({message}), отправляем скрипт целиком")
+        
+        return self._convert_script(script, error)
+    
+    def _create_fragment_fix_prompt(self, fragment: ErrorFragment, error_message: str) -> str:
+        """
+        Создает промпт для исправления одного оператора PostgreSQL-скрипта
+        
+        Args:
+            fragment: Оператор, в котором возникла ошибка
+            error_message: Сообщение об ошибке из PostgreSQL
+            
+        Returns:
+            str: Промпт для модели
+        """
+        context_before, context_after = fragment.context(getattr(self.config, 'ERROR_FIX_CONTEXT_LINES', 5))
+        
+        prompt = f"""
+Скрипт уже сконвертирован из MS SQL в PostgreSQL, но при выполнении оператора {fragment.index + 1} из {fragment.total} возникла ошибка:
+```
+{error_message}
+```
+
+Исправь только этот оператор и верни его целиком. Остальная часть скрипта не меняется.
+Соблюдай те же правила, что и при конвертации:
+1. НЕ ДОБАВЛЯЙ приведения типов в условиях JOIN
+2. Параметры в формате {{params.someValue}} или {{someValue}} должны остаться без изменений
+3. Исправляй типы данных явными преобразованиями (CAST или ::) там, где это нужно для устранения ошибки
+4. Не пиши текстовых объяснений вне кода
+
+Оператор с ошибкой (строки {fragment.start_line}-{fragment.end_line}):
+```sql
+{fragment.text}
+```
+"""
+        if context_before or context_after:
+            prompt += f"""
+Контекст скрипта (только для справки, не возвращай его):
+```sql
+{context_before}
+-- <оператор с ошибкой>
+{context_after}
+```
+"""
+        return prompt
+    
     def _test_script_in_postgres(self, script: str) -> Tuple[bool, str]:
         """
         Тестирует скрипт в PostgreSQL
@@ -269,8 +564,10 @@ class AIConverter:
                 # Используем улучшенный парсер с анализом контекста
                 from src.parser import SQLParser
                 parser = SQLParser(self.config)
+                # Анализ алиасов и замена параметров используют один разбор скрипта
+                parsed = ParsedScript.of(script)
                 # Анализируем алиасы таблиц перед заменой параметров
-                table_aliases = self.alias_analyzer.get_table_aliases(script)
+                table_aliases = self.alias_analyzer.get_table_aliases(parsed)
                 print("\n✅ Анализ алиасов таблиц:")
                 for table, aliases in table_aliases.items():
                     if aliases:
@@ -278,7 +575,7 @@ class AIConverter:
                     else:
                         print(f"  {table}: Нет алиаса")
                         
-                script = parser.replace_params(script)
+                script = parser.replace_params(parsed)
                 print("✅ Параметры заменены с использованием улучшенного анализа контекста")
             except Exception as e:
                 print(f"❌ Ошибка при использовании улучшенного парсера: {str(e)}")
@@ -289,16 +586,9 @@ class AIConverter:
         if not use_improved_parser:
             # Старая логика замены параметров
             # Перед тестированием, найдем все параметры в скрипте
-            param_patterns = [
-                r'\{params\.([^}]+)\}',           # {params.someValue}
-                r'\{([^}]+)\}',                   # {someValue}
-                r'default_params\.([a-zA-Z0-9_]+)', # default_params.someValue
-                r'params\.([a-zA-Z0-9_]+)'         # params.someValue
-            ]
-            
             # Простая замена всех параметров на тестовые значения
-            for pattern in param_patterns:
-                matches = re.findall(pattern, script)
+            for pattern, param_format in zip(_PARAM_RES, _PARAM_FORMATS):
+                matches = pattern.findall(script)
                 for param_name in matches:
                     test_value = '1'  # Значение по умолчанию для ID
                     
@@ -311,29 +601,16 @@ class AIConverter:
                         test_value = "'test'"  # Строковое значение
                     
                     # Формируем паттерн замены в зависимости от формата параметра
-                    if pattern == param_patterns[0]:
-                        replace_pattern = f"{{params.{param_name}}}"
-                    elif pattern == param_patterns[1]:
-                        replace_pattern = f"{{{param_name}}}"
-                    elif pattern == param_patterns[2]:
-                        replace_pattern = f"default_params.{param_name}"
-                    else:
-                        replace_pattern = f"params.{param_name}"
+                    replace_pattern = param_format.format(param_name)
                     
                     # Заменяем параметр
                     print(f"Заменяем параметр '{replace_pattern}' на '{test_value}'")
                     script = script.replace(replace_pattern, test_value)
         
         # Проверяем, остались ли параметры
-        remaining_patterns = [
-            r'\{params\.([^}]+)\}',
-            r'\{([^}]+)\}',
-            r'default_params\.([a-zA-Z0-9_]+)',
-            r'params\.([a-zA-Z0-9_]+)'
-        ]
-        for pattern in remaining_patterns:
-            if re.search(pattern, script):
-                print(f"⚠️ Внимание: в скрипте все еще есть параметры: {re.findall(pattern, script)}")
+        for pattern in _PARAM_RES:
+            if pattern.search(script):
+                print(f"⚠️ Внимание: в скрипте все еще есть параметры: {pattern.findall(script)}")
         
         # Проверяем с тестовыми значениями
         if use_real_db:
@@ -365,12 +642,58 @@ class AIConverter:
         """
         Тестирует скрипт в реальной базе данных PostgreSQL
         
+        Скрипт выполняется внутри процесса через общий пул соединений с семантикой
+        psql -v ON_ERROR_STOP=1. Ошибки возвращаются в формате psql.
+        Запуск через внешний psql доступен при PG_TEST_EXECUTOR=psql.
+        
         Args:
             script: SQL скрипт для выполнения
             
         Returns:
             Tuple[bool, str]: (успех, сообщение об ошибке если есть)
         """
+        if getattr(self.config, 'PG_TEST_EXECUTOR', 'pool') == 'psql':
+            return self._test_with_psql(script)
+        
+        pg_config = getattr(self.config, 'PG_CONFIG', None)
+        if not pg_config:
+            print("⚠️ Параметры подключения PG_CONFIG не заданы. Используем синтаксический анализ.")
+            return self._test_with_syntax_checking(script)
+        
+        timeout = getattr(self.config, 'MAX_EXECUTION_TIME', 30)
+        max_connections = getattr(self.config, 'PG_POOL_MAX_CONNECTIONS', 8)
+        start_time = time.perf_counter()
+        try:
+            success, error = execute_script(script, pg_config, timeout, max_connections)
+        except psycopg2.OperationalError as e:
+            print(f"⚠️ Не удалось подключиться к PostgreSQL: {e}")
+            print(f"Используем синтаксический анализ вместо реального тестирования.")
+            return self._test_with_syntax_checking(script)
+        except Exception as e:
+            print(f"❌ Ошибка при тестировании SQL: {str(e)}")
+            return False, str(e)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.test_stats.record(elapsed)
+        
+        print(f"⏱ Проверка в PostgreSQL заняла {elapsed * 1000:.1f} мс")
+        if success:
+            print(f"✅ SQL скрипт успешно выполнен в PostgreSQL")
+        else:
+            print(f"❌ Ошибка при выполнении SQL: {error}")
+        return success, error
+    
+    def _test_with_psql(self, script: str) -> Tuple[bool, str]:
+        """
+        Тестирует скрипт в PostgreSQL через внешний процесс psql
+        
+        Args:
+            script: SQL скрипт для выполнения
+            
+        Returns:
+            Tuple[bool, str]: (успех, сообщение об ошибке если есть)
+        """
+        start_time = time.perf_counter()
         # Создаем временный файл со скриптом
         with tempfile.NamedTemporaryFile(mode='w', suffix='.sql', delete=False) as temp_file:
             temp_file.write(script)
@@ -405,25 +728,8 @@ class AIConverter:
                     print(f"⚠️ Не удалось подключиться к PostgreSQL: {result.stderr}")
                     print(f"Используем синтаксический анализ вместо реального тестирования.")
                     return self._test_with_syntax_checking(script)
-                # Если ошибка несовпадения типов — выводим traceback и сразу возвращаем ошибку
-                type_mismatch_patterns = [
-                    "could not identify an equality operator",
-                    "operator does not exist",
-                    "cannot compare",
-                    "ОШИБКА:  оператор не существует",
-                    "types ",
-                    "cannot be matched"
-                ]
-                def is_type_mismatch_error(error_msg):
-                    return any(pat in error_msg for pat in type_mismatch_patterns)
-                if is_type_mismatch_error(result.stderr):
-                    import traceback
-                    print("❌ Обнаружена ошибка несовпадения типов в JOIN/WHERE!")
-                    traceback.print_exc()
-                    return False, result.stderr
-                else:
-                    print(f"❌ Ошибка при выполнении SQL: {result.stderr}")
-                    return False, result.stderr
+                print(f"❌ Ошибка при выполнении SQL: {result.stderr}")
+                return False, result.stderr
         except subprocess.TimeoutExpired:
             print(f"⚠️ Превышен таймаут выполнения SQL ({getattr(self.config, 'MAX_EXECUTION_TIME', 30)} секунд)")
             return False, f"Превышен таймаут выполнения ({getattr(self.config, 'MAX_EXECUTION_TIME', 30)} секунд)"
@@ -431,6 +737,7 @@ class AIConverter:
             print(f"❌ Ошибка при тестировании SQL: {str(e)}")
             return False, str(e)
         finally:
+            self.test_stats.record(time.perf_counter() - start_time)
             # Удаляем временный файл
             if os.path.exists(temp_file_path):
                 os.unlink(temp_file_path)
@@ -450,8 +757,7 @@ class AIConverter:
         problems = []
         
         # Проверка на смешивание citext и integer типов в COALESCE
-        coalesce_pattern = r"COALESCE\s*\(\s*([^,]+),\s*([^)]+)\)"
-        for match in re.finditer(coalesce_pattern, script):
+        for match in _COALESCE_RE.finditer(script):
             arg1, arg2 = match.groups()
             # Примитивное определение типов по содержимому
             if (('::citext' in arg1 or '::CITEXT' in arg1) and 
@@ -464,13 +770,11 @@ class AIConverter:
                 problems.append(f"COALESCE смешивает текст и числа без приведения типов: {match.group(0)}")
         
         # Проверка на другие типичные проблемы
-        type_cast_pattern = r"SET\s+\w+\s*=\s*'[^']*'::(\w+)"
-        for match in re.finditer(type_cast_pattern, script):
+        for match in _SET_CAST_RE.finditer(script):
             problems.append(f"Неправильное приведение типов в SET: {match.group(0)}")
         
         # Проверка на возможные проблемы с типами в условиях WHERE
-        where_pattern = r"WHERE\s+.*?([^\s]+(?:::(?:ci)?text|::varchar))\s*=\s*(\d+)(?!\s*::)"
-        for match in re.finditer(where_pattern, script, re.IGNORECASE):
+        for match in _WHERE_TEXT_NUMBER_RE.finditer(script):
             problems.append(f"Возможно несоответствие типов в WHERE: {match.group(0)}")
         
         # Если найдены проблемы, возвращаем False и список проблем
@@ -479,95 +783,248 @@ class AIConverter:
         
         return True, ""
     
-    def _convert_with_openai(self, original_script: str, error_message: str = None) -> Tuple[bool, str, str]:
+    def _convert_script(self, original_script: str, error_message: str = None,
+                        candidate: HedgeCandidate = None) -> Tuple[bool, str, str]:
         """
-        Конвертирует скрипт используя OpenAI API
+        Конвертирует скрипт с помощью нейросети
         
         Args:
             original_script: Исходный SQL скрипт
             error_message: Сообщение об ошибке, если есть
+            candidate: Вариант параллельной генерации (провайдер, температура, отмена), если есть
             
         Returns:
             Tuple[bool, str, str]: (успех, сконвертированный скрипт, сообщение)
         """
-        api_key = self.api_keys.get('openai')
-        if not api_key:
-            return False, original_script, "API ключ OpenAI не найден. Проверьте файл .env или переменную окружения OPENAI_API_KEY."
-        
-        model = getattr(self.config, 'OPENAI_MODEL', 'gpt-4') 
-        temperature = getattr(self.config, 'AI_TEMPERATURE', 0.1)
-        max_tokens = getattr(self.config, 'AI_MAX_TOKENS', 64000)
+        compacted = self._compact_for_prompt(original_script, error_message)
+        # Формируем промпт для модели с улучшенным описанием для типов данных
+        prompt = self._create_improved_prompt(compacted.text, error_message)
         
-        print(f"Максимальное количество токенов для ответа: {max_tokens}")
+        success, response_text, message = self._request_ai(prompt, candidate)
+        if not success:
+            return False, original_script, message
         
-        # Формируем промпт для модели с улучшенным описанием для типов данных
-        prompt = self._create_improved_prompt(original_script, error_message)
+        # Извлекаем SQL из ответа (может содержать пояснения)
+        converted_script = self._extract_sql_from_response(response_text)
         
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
+        # Постобработка результата и возврат комментариев исходного скрипта
+        converted_script = compacted.restore(self._post_process_sql(converted_script))
         
-        data = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": self._get_system_prompt()},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": temperature,
-            "max_tokens": max_tokens
-        }
+        return True, converted_script, message
+    
+    def _compact_for_prompt(self, script: str, error_message: str = None) -> CompactedScript:
+        """
+        Удаляет из скрипта комментарии и лишние пробелы перед отправкой нейросети
+        (при PROMPT_COMPACTION) и выводит оценку токенов до и после.
+        Скрипт с сообщением об ошибке не сжимается: номера строк в сообщении
+        (psql:...:N:, LINE N:) относятся к несжатому скрипту
         
-        try:
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=self.api_timeout  # Используем настраиваемый таймаут
-            )
-            
-            if response.status_code != 200:
-                return False, original_script, f"Ошибка API OpenAI: {response.status_code} - {response.text}"
+        Args:
+            script: SQL скрипт
+            error_message: Сообщение об ошибке из PostgreSQL, если есть
             
-            response_data = response.json()
-            converted_script = response_data['choices'][0]['message']['content']
+        Returns:
+            CompactedScript: Сжатый скрипт; restore() возвращает комментарии в ответ
+        """
+        if error_message or not getattr(self.config, 'PROMPT_COMPACTION', True):
+            return CompactedScript(script, script, [])
+        
+        compacted = compact_sql(script)
+        tokens_before = estimate_tokens(script)
+        tokens_after = estimate_tokens(compacted.text)
+        self.usage.record_compaction(tokens_before, tokens_after)
+        if tokens_before > tokens_after:
+            saved = tokens_before - tokens_after
+            print(f"🗜️ Сжатие скрипта для промпта: ~{tokens_before} → ~{tokens_after} токенов "
+                  f"(-{saved * 100 // tokens_before}%, комментариев: {len(compacted.comments)})")
+        return compacted
+    
+    def _apply_learned_rules(self, script: str, error: str) -> Optional[str]:
+        """
+        Применяет выученные правила для ошибки и проверяет результат
+        
+        Args:
+            script: Скрипт с ошибкой
+            error: Сообщение об ошибке PostgreSQL
             
-            # Извлекаем SQL из ответа (может содержать пояснения)
-            converted_script = self._extract_sql_from_response(converted_script)
+        Returns:
+            Optional[str]: Исправленный скрипт, прошедший проверку, или None
+        """
+        if self.fix_rules is None:
+            return None
+        patched, applied = self.fix_rules.apply(script, error)
+        if not applied:
+            return None
+        self.learned_fix_stats['applied'] += 1
+        script_works, _ = self._test_script_in_postgres(patched)
+        if not script_works:
+            print(f"📏 Выученные правила ({', '.join(applied)}) не устранили ошибку")
+            return None
+        self.fix_rules.mark_hit(applied)
+        self.learned_fix_stats['hits'] += 1
+        print(f"📏 Ошибка исправлена выученными правилами ({', '.join(applied)}) без обращения к нейросети")
+        return patched
+    
+    def _learn_fix(self, before: str, error: str, after: str):
+        """Запоминает правку нейросети, устранившую ошибку (LEARNED_FIX_RULES)"""
+        if self.fix_rules is None:
+            return
+        promoted = self.fix_rules.record_fix(error, before, after)
+        self.learned_fix_stats['learned'] += len(promoted)
+        for rule in promoted:
+            print(f"📏 Новое правило исправления {rule.id}: {rule.before!r} → {rule.after!r} "
+                  f"для ошибки «{rule.signature}»")
+    
+    def _remember_example(self, original: str, converted: str):
+        """Сохраняет проверенную конвертацию для поиска примеров (AI_EXAMPLES_TOP_K > 0)"""
+        if self.example_store is not None and self.example_store.add(original, converted):
+            print(f"📚 Конвертация сохранена как пример (всего примеров: {len(self.example_store)})")
+    
+    def _create_examples_section(self, script: str) -> str:
+        """
+        Находит похожие проверенные конвертации и оформляет их как примеры для промпта
+        
+        Args:
+            script: Скрипт для конвертации
             
-            # Постобработка результата
-            converted_script = self._post_process_sql(converted_script)
+        Returns:
+            str: Раздел промпта с примерами (пустая строка, если похожих нет)
+        """
+        if self.example_store is None:
+            return ''
+        found = self.example_store.search(
+            script,
+            top_k=getattr(self.config, 'AI_EXAMPLES_TOP_K', 2),
+            min_similarity=getattr(self.config, 'AI_EXAMPLES_MIN_SIMILARITY', 0.2),
+        )
+        self.examples_used = len(found)
+        if not found:
+            return ''
+        
+        print(f"📚 Найдено похожих проверенных конвертаций: {len(found)} "
+              f"(сходство: {', '.join(f'{score:.2f}' for score, _ in found)})")
+        section = "### Похожие скрипты, уже сконвертированные и проверенные в PostgreSQL (используй как образец):\n"
+        for number, (score, example) in enumerate(found, 1):
+            section += f"""
+Пример {number} (сходство {score:.2f}). Исходный MS SQL:
+```sql
+{compact_sql(example.original).text}
+```
+Результат для PostgreSQL:
+```sql
+{compact_sql(example.converted).text}
+```
+"""
+        return section + "\n"
+    
+    def _convert_chunk(self, chunk: str, prompt: str) -> Tuple[bool, str, str]:
+        """
+        Конвертирует часть скрипта с помощью нейросети, используя специальный промт
+        
+        Args:
+            chunk: Часть скрипта для конвертации
+            prompt: Специальный промт для этой части
             
-            return True, converted_script, "Успешно сконвертировано с помощью OpenAI"
+        Returns:
+            Tuple[bool, str, str]: (успех, сконвертированная часть, сообщение)
+        """
+        success, response_text, message = self._request_ai(prompt)
+        if not success:
+            return False, chunk, message
+        
+        # Извлекаем SQL из ответа
+        converted_chunk = self._extract_sql_from_response(response_text)
+        
+        # Постобработка результата
+        converted_chunk = self._post_process_sql(converted_chunk)
+        
+        return True, converted_chunk, message
+    
+    def _routing_providers(self, candidate: HedgeCandidate = None) -> List[str]:
+        """
+        Провайдеры, между которыми распределяется запрос: провайдер варианта,
+        все провайдеры с API ключами при AI_ROUTING или выбранный провайдер
+        """
+        if candidate:
+            return [candidate.provider]
+        if self.routing:
+            providers = [p for p in ('openai', 'anthropic') if self.api_keys.get(p)]
+            if providers:
+                return providers
+        return [self.ai_provider]
+    
+    def _request_ai(self, prompt: str, candidate: HedgeCandidate = None) -> Tuple[bool, str, str]:
+        """
+        Отправляет промпт нейросети через маршрутизатор провайдеров. Точки подключения
+        перебираются в порядке, выбранном маршрутизатором: при перегрузке, исчерпании
+        квоты, таймауте или ошибке сервера запрос переходит на следующую точку.
+        
+        Args:
+            prompt: Промпт пользователя
+            candidate: Вариант параллельной генерации, если есть
             
-        except requests.exceptions.Timeout:
-            return False, original_script, f"Превышен таймаут запроса к OpenAI API ({self.api_timeout} секунд). Попробуйте увеличить таймаут с помощью параметра --timeout."
-        except Exception as e:
-            return False, original_script, f"Ошибка при запросе к OpenAI: {str(e)}"
+        Returns:
+            Tuple[bool, str, str]: (успех, текст ответа, сообщение)
+        """
+        providers = self._routing_providers(candidate)
+        endpoints = self.router.route(route_key(self._get_system_prompt(), prompt), providers)
+        if not endpoints:
+            return False, '', f"Неизвестный провайдер AI: {', '.join(providers)}"
+        
+        message = ''
+        for attempt, endpoint in enumerate(endpoints):
+            if attempt:
+                print(f"🔁 Переключаемся на {endpoint.name}: {message}")
+            headers, data, message = self._build_ai_request(endpoint, prompt, candidate)
+            if headers is None:
+                continue
+            success, response_text, message, retryable = self._send_ai_request(
+                endpoint, headers, data, candidate, retry_overload=attempt == len(endpoints) - 1)
+            if success:
+                return True, response_text, f"Успешно сконвертировано с помощью {_PROVIDER_NAMES[endpoint.provider]} ({endpoint.model})"
+            if not retryable:
+                return False, response_text, message
+        return False, '', message
     
-    def _convert_with_anthropic(self, original_script: str, error_message: str = None) -> Tuple[bool, str, str]:
+    def _build_ai_request(self, endpoint: ProviderEndpoint, prompt: str,
+                          candidate: HedgeCandidate = None) -> Tuple[Optional[dict], Optional[dict], str]:
         """
-        Конвертирует скрипт используя Anthropic API
+        Формирует заголовки и тело запроса для точки подключения
         
         Args:
-            original_script: Исходный SQL скрипт
-            error_message: Сообщение об ошибке, если есть
+            endpoint: Точка подключения
+            prompt: Промпт пользователя
+            candidate: Вариант параллельной генерации (температура), если есть
             
         Returns:
-            Tuple[bool, str, str]: (успех, сконвертированный скрипт, сообщение)
+            Tuple[Optional[dict], Optional[dict], str]: (заголовки, тело, сообщение об ошибке)
         """
-        api_key = self.api_keys.get('anthropic')
+        api_key = self.api_keys.get(endpoint.provider)
         if not api_key:
-            return False, original_script, "API ключ Anthropic не найден. Проверьте файл .env или переменную окружения ANTHROPIC_API_KEY."
+            env_name = f"{endpoint.provider.upper()}_API_KEY"
+            return None, None, (f"API ключ {_PROVIDER_NAMES[endpoint.provider]} не найден. "
+                                f"Проверьте файл .env или переменную окружения {env_name}.")
         
-        model = getattr(self.config, 'ANTHROPIC_MODEL', 'claude-3-sonnet-20240229')
-        temperature = getattr(self.config, 'AI_TEMPERATURE', 0.1)
+        temperature = candidate.temperature if candidate else getattr(self.config, 'AI_TEMPERATURE', 0.1)
         max_tokens = getattr(self.config, 'AI_MAX_TOKENS', 64000)
         
         print(f"Максимальное количество токенов для ответа: {max_tokens}")
         
-        # Формируем промпт для модели с улучшенным описанием для типов данных
-        prompt = self._create_improved_prompt(original_script, error_message)
+        if endpoint.provider == 'openai':
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {api_key}"
+            }
+            data = {
+                "model": endpoint.model,
+                "messages": [
+                    {"role": "system", "content": self._get_system_prompt()},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            }
+            return headers, data, ''
         
         # Заголовки для Anthropic API
         headers = {
@@ -580,63 +1037,165 @@ class AIConverter:
         key_preview = api_key[:10] + "..." if len(api_key) > 10 else api_key
         print(f"Используем ключ API Anthropic (первые символы): {key_preview}")
         
+        system = self._get_system_prompt()
+        content = prompt
+        if getattr(self.config, 'AI_PROMPT_CACHING', True):
+            # Системный промпт и правила конвертации — кэшируемый префикс,
+            # скрипт передается отдельным блоком после него
+            cache_control = {"type": "ephemeral"}
+            system = [{"type": "text", "text": system, "cache_control": cache_control}]
+            rules = self._get_conversion_rules()
+            if prompt.startswith(rules) and len(prompt) > len(rules):
+                content = [
+                    {"type": "text", "text": rules, "cache_control": cache_control},
+                    {"type": "text", "text": prompt[len(rules):]},
+                ]
+        
         data = {
-            "model": model,
+            "model": endpoint.model,
             "max_tokens": max_tokens,
             "temperature": temperature,
-            "system": self._get_system_prompt(),
+            "system": system,
             "messages": [
-                {"role": "user", "content": prompt}
+                {"role": "user", "content": content}
             ]
         }
+        return headers, data, ''
+    
+    def _send_ai_request(self, endpoint: ProviderEndpoint, headers: dict, data: dict,
+                         candidate: HedgeCandidate = None, retry_overload: bool = True) -> Tuple[bool, str, str, bool]:
+        """
+        Выполняет запрос к API нейросети. При AI_STREAMING ответ читается потоком:
+        зависший поток прерывается по таймауту простоя (AI_STREAM_IDLE_TIMEOUT),
+        а обрыв по лимиту токенов определяется сразу, без ожидания конца ответа.
+        Результат запроса (задержка, код ответа, квоты) передается маршрутизатору.
         
-        # Повторные попытки для обработки ошибок перегрузки сервера
-        max_retries = 3
+        Args:
+            endpoint: Точка подключения
+            headers: Заголовки запроса
+            data: Тело запроса
+            candidate: Вариант параллельной генерации; отмененный вариант прерывает чтение потока
+            retry_overload: Повторять запрос при перегрузке сервера (если нет другой точки подключения)
+            
+        Returns:
+            Tuple[bool, str, str, bool]: (успех, текст ответа, сообщение об ошибке,
+                                          имеет ли смысл повторить запрос на другой точке)
+        """
+        provider = endpoint.provider
+        name = 'OpenAI' if provider == 'openai' else 'Anthropic'
+        streaming = getattr(self.config, 'AI_STREAMING', True)
+        idle_timeout = getattr(self.config, 'AI_STREAM_IDLE_TIMEOUT', 30)
+        if streaming:
+            data = dict(data, stream=True)
+            if provider == 'openai':
+                data['stream_options'] = {"include_usage": True}
+        
+        # Повторные попытки для обработки ошибок перегрузки сервера (Anthropic 529)
+        max_retries = 3 if provider == 'anthropic' else 1
         base_delay = 5  # базовая задержка в секундах
         
+        def check_cancelled(_delta):
+            if candidate and candidate.cancelled:
+                raise StreamAborted(HEDGE_CANCELLED_MESSAGE)
+        
         for attempt in range(max_retries):
+            if candidate and candidate.cancelled:
+                return False, '', HEDGE_CANCELLED_MESSAGE, False
+            start_time = time.time()
+            
+            def failed(message, status_code=None, response_headers=None, retryable=True):
+                self.router.record(endpoint, time.time() - start_time, False, status_code, response_headers)
+                return False, '', message, retryable
+            
             try:
-                response = requests.post(
-                    "https://api.anthropic.com/v1/messages",
-                    headers=headers,
-                    json=data,
-                    timeout=self.api_timeout  # Используем настраиваемый таймаут
-                )
+                if streaming:
+                    response = requests.post(endpoint.url, headers=headers, json=data, stream=True,
+                                             timeout=(min(self.api_timeout, 10), idle_timeout))
+                else:
+                    response = requests.post(endpoint.url, headers=headers, json=data,
+                                             timeout=self.api_timeout)  # Используем настраиваемый таймаут
                 
-                print(f"Код ответа от Anthropic API: {response.status_code}")
+                if provider == 'anthropic':
+                    print(f"Код ответа от Anthropic API: {response.status_code}")
                 
                 # Обработка ошибки 529 (Overloaded)
-                if response.status_code == 529:
-                    if attempt < max_retries - 1:
+                if provider == 'anthropic' and response.status_code == 529:
+                    response.close()
+                    if attempt < max_retries - 1 and retry_overload:
                         delay = base_delay * (2 ** attempt)  # экспоненциальная задержка
                         print(f"⚠️ Сервера Anthropic перегружены (529). Повторная попытка {attempt + 2}/{max_retries} через {delay} секунд...")
+                        self.router.record(endpoint, time.time() - start_time, False, 529, response.headers)
                         time.sleep(delay)
                         continue
                     else:
-                        return False, original_script, f"Сервера Anthropic перегружены. Попробуйте позже или используйте --provider openai"
+                        return failed(f"Сервера Anthropic перегружены. Попробуйте позже или используйте --provider openai",
+                                      529, response.headers)
                 
                 # Обработка других ошибок HTTP
                 if response.status_code != 200:
-                    return False, original_script, f"Ошибка API Anthropic: {response.status_code} - {response.text}"
-                
-                response_data = response.json()
-                converted_script = response_data['content'][0]['text']
+                    # Лимиты запросов и ошибки сервера — повод перейти на другую точку
+                    retryable = response.status_code in (408, 409, 429) or response.status_code >= 500
+                    return failed(f"Ошибка API {name}: {response.status_code} - {response.text}",
+                                  response.status_code, response.headers, retryable)
                 
-                # Извлекаем SQL из ответа (может содержать пояснения)
-                converted_script = self._extract_sql_from_response(converted_script)
-                
-                # Постобработка результата
-                converted_script = self._post_process_sql(converted_script)
+                if streaming:
+                    result = read_stream(
+                        response, provider,
+                        deadline=start_time + self.api_timeout,
+                        stop_after_code_block=getattr(self.config, 'AI_STREAM_STOP_AFTER_CODE_BLOCK', True),
+                        on_text=check_cancelled if candidate else None
+                    )
+                    usage = result.usage
+                    self._record_usage(provider, candidate=candidate, **usage)
+                    print(f"📡 {name}: {result.summary()}")
+                    response_text, truncated = result.text, result.truncated
+                else:
+                    response_data = response.json()
+                    usage = extract_usage(provider, response_data)
+                    self._record_usage(provider, candidate=candidate, **usage)
+                    if provider == 'openai':
+                        choice = response_data['choices'][0]
+                        response_text = choice['message']['content']
+                        truncated = choice.get('finish_reason') == 'length'
+                    else:
+                        response_text = response_data['content'][0]['text']
+                        truncated = response_data.get('stop_reason') == 'max_tokens'
+                    print(f"⏱ {name}: ответ получен за {time.time() - start_time:.2f} с")
+                if usage['cache_read_tokens'] or usage['cache_write_tokens']:
+                    print(f"💾 Кэш промпта {name}: прочитано {usage['cache_read_tokens']}, "
+                          f"записано {usage['cache_write_tokens']} токенов")
                 
-                return True, converted_script, "Успешно сконвертировано с помощью Anthropic Claude"
+                self.router.record(endpoint, time.time() - start_time, True, response.status_code, response.headers)
+                if truncated:
+                    return False, response_text, f"{TRUNCATED_MESSAGE} ({name}, max_tokens={data['max_tokens']})", False
+                return True, response_text, "", False
                 
             except requests.exceptions.Timeout:
-                return False, original_script, f"Превышен таймаут запроса к Anthropic API ({self.api_timeout} секунд)"
+                return failed(f"Превышен таймаут запроса к {name} API ({self.api_timeout} секунд). Попробуйте увеличить таймаут с помощью параметра --timeout.")
+            except StreamAborted as e:
+                if e.result is not None:
+                    self._record_usage(provider, candidate=candidate, **e.result.usage)
+                if candidate and candidate.cancelled:
+                    return False, '', HEDGE_CANCELLED_MESSAGE, False
+                return failed(f"Превышен таймаут запроса к {name} API ({self.api_timeout} секунд): ответ генерировался слишком долго")
+            except requests.exceptions.ConnectionError as e:
+                # При чтении потока таймаут простоя приходит как ConnectionError
+                if streaming and 'timed out' in str(e).lower():
+                    return failed(f"Поток ответа {name} API простаивал дольше {idle_timeout} секунд, запрос прерван")
+                return failed(f"Ошибка при запросе к {name}: {str(e)}")
             except Exception as e:
-                return False, original_script, f"Ошибка при запросе к Anthropic: {str(e)}"
+                return failed(f"Ошибка при запросе к {name}: {str(e)}", retryable=False)
         
         # Если все попытки исчерпаны
-        return False, original_script, "Не удалось выполнить запрос к Anthropic API после нескольких попыток"
+        return False, '', f"Не удалось выполнить запрос к {name} API после нескольких попыток", True
+    
+    def _record_usage(self, provider: str, input_tokens: int = 0, output_tokens: int = 0,
+                      candidate: HedgeCandidate = None, cache_read_tokens: int = 0, cache_write_tokens: int = 0):
+        """Учитывает токены запроса в общей статистике и в статистике варианта"""
+        tokens = (input_tokens, output_tokens, cache_read_tokens, cache_write_tokens)
+        self.usage.record(provider, *tokens)
+        if candidate:
+            candidate.usage.record(provider, *tokens)
     
     def _get_system_prompt(self) -> str:
         """
@@ -703,18 +1262,16 @@ class AIConverter:
 
 """
     
-    def _create_improved_prompt(self, original_script: str, error_message: str = None) -> str:
+    def _get_conversion_rules(self) -> str:
         """
-        Создает улучшенный промпт для нейросети
+        Возвращает неизменную часть промпта конвертации (правила и примеры).
+        Промпты конвертации начинаются с нее, поэтому вместе с системным промптом
+        она образует префикс, который кэшируется на стороне провайдера
         
-        Args:
-            original_script: Исходный SQL скрипт
-            error_message: Сообщение об ошибке, если есть
-            
         Returns:
-            str: Улучшенный промпт для модели
+            str: Правила конвертации
         """
-        prompt = """
+        return """
 Я хочу конвертировать скрипт из MS SQL в PostgreSQL. Пожалуйста, произведи конвертацию, учитывая следующие правила:
 
 ### Обязательные преобразования:
@@ -744,9 +1301,9 @@ class AIConverter:
 2. COALESCE(numeric_field, 0) вместо COALESCE(numeric_field, '0')
 3. CAST('2023-01-01' AS TIMESTAMP) вместо '2023-01-01'::TIMESTAMP в операторах SET
 4. field::text = '123' вместо field = 123 (когда field - текстовый тип)
-5. Параметры в фигурных скобках {{params.someValue}} оставлять без изменений
+5. Параметры в фигурных скобках {params.someValue} оставлять без изменений
 6. WHERE numeric_field = 123::numeric вместо WHERE numeric_field = '123'
-7. Параметры вида {{params.someValue}} оставляй без изменений
+7. Параметры вида {params.someValue} оставляй без изменений
 8. ON t1.id = t2.id оставлять как есть, без добавления ::TEXT
 
 ### Известные проблемные паттерны:
@@ -764,11 +1321,26 @@ class AIConverter:
 
 Вставляй комментарии в стиле /* было: ... стало: ... */ или /* изменено: ... */ прямо в SQL, но не пиши никаких текстовых объяснений вне кода.
 
-Вот исходный MS SQL скрипт для конвертации:
+"""
+    
+    def _create_improved_prompt(self, original_script: str, error_message: str = None) -> str:
+        """
+        Создает улучшенный промпт для нейросети
+        
+        Args:
+            original_script: Исходный SQL скрипт
+            error_message: Сообщение об ошибке, если есть
+            
+        Returns:
+            str: Улучшенный промпт для модели
+        """
+        # Примеры подбираются только для первичной конвертации и идут после неизменных правил
+        examples = '' if error_message else self._create_examples_section(original_script)
+        prompt = self._get_conversion_rules() + examples + f"""Вот исходный MS SQL скрипт для конвертации:
 ```sql
-{0}
+{original_script}
 ```
-""".format(original_script)
+"""
 
         # Если есть сообщение об ошибке, добавляем его с подробностями
         if error_message:
@@ -802,20 +1374,18 @@ class AIConverter:
             str: Извлеченный SQL-код
         """
         # Удалим все маркеры обратных кавычек, если они находятся в начале или конце строки
-        response = re.sub(r'^```sql\s*\n', '', response, flags=re.MULTILINE)
-        response = re.sub(r'^```\s*\n', '', response, flags=re.MULTILINE)
-        response = re.sub(r'\n```\s*$', '', response, flags=re.MULTILINE)
+        response = _FENCE_SQL_START_RE.sub('', response)
+        response = _FENCE_START_RE.sub('', response)
+        response = _FENCE_END_RE.sub('', response)
 
         # Пытаемся найти SQL между тройными обратными кавычками
-        sql_pattern = r"```sql\s*([\s\S]*?)\s*```"
-        sql_match = re.search(sql_pattern, response)
+        sql_match = _SQL_BLOCK_RE.search(response)
         
         if sql_match:
             sql_code = sql_match.group(1).strip()
         else:
             # Если не нашли в формате ```sql, ищем просто между тройными кавычками
-            sql_pattern = r"```\s*([\s\S]*?)\s*```"
-            sql_match = re.search(sql_pattern, response)
+            sql_match = _CODE_BLOCK_RE.search(response)
             
             if sql_match:
                 sql_code = sql_match.group(1).strip()
@@ -824,13 +1394,14 @@ class AIConverter:
                 sql_code = response.strip()
         
         # Финальная проверка, чтобы убедиться, что в тексте не остались маркеры ```
-        sql_code = re.sub(r'```sql|```', '', sql_code)
+        sql_code = _FENCE_RE.sub('', sql_code)
 
         return sql_code
     
     def _post_process_sql(self, sql_code: str) -> str:
         """
-        Постобработка SQL после конвертации для исправления типичных проблем
+        Постобработка SQL после конвертации для исправления типичных проблем.
+        Правила собраны в src/sql_post_processor.py и компилируются один раз на процесс.
         
         Args:
             sql_code: Сконвертированный SQL-код
@@ -838,207 +1409,12 @@ class AIConverter:
         Returns:
             str: Обработанный SQL-код с исправлениями
         """
-        # Исправляем неправильное использование ::TIMESTAMP в операторах SET
-        sql_code = re.sub(
-            r"(SET\s+\w+\s*=\s*'[^']*')::TIMESTAMP", 
-            r"SET \1::TIMESTAMP", 
-            sql_code
-        )
-        
-        # После всех замен: убираем ::text/::varchar у COALESCE, если оба аргумента — int-поля или числа
-        int_fields = ['a_status', 'status', 'petitionid', 'id', 'ouid', 'from_id', 'to_id', 'a_ouid', 'a_id', 'a_count_all_work_day']
-        float_fields = ['a_regioncoeff']
-        def is_int_field(arg):
-            name = arg.split('.')[-1].lower()
-            return name in int_fields
-        def is_float_field(arg):
-            name = arg.split('.')[-1].lower()
-            return name in float_fields
-        def clean_coalesce_casts(m):
-            arg1 = m.group(1).strip()
-            arg2 = m.group(2).strip()
-            arg1_is_number = arg1.replace('.', '', 1).isdigit()
-            arg2_is_number = arg2.replace('.', '', 1).isdigit()
-            arg1_is_float = bool(re.fullmatch(r"\d+\.\d+", arg1.strip())) or is_float_field(arg1)
-            arg2_is_float = bool(re.fullmatch(r"\d+\.\d+", arg2.strip())) or is_float_field(arg2)
-            # Если оба — int/float-поля или числа, убираем ::text/::varchar
-            if ((is_int_field(arg1) or arg1_is_number or arg1_is_float) and
-                (is_int_field(arg2) or arg2_is_number or arg2_is_float)):
-                arg1_clean = re.sub(r'::(text|varchar|citext)', '', arg1, flags=re.IGNORECASE)
-                arg2_clean = re.sub(r'::(text|varchar|citext)', '', arg2, flags=re.IGNORECASE)
-                return f"COALESCE({arg1_clean}, {arg2_clean})"
-            return m.group(0)
-        sql_code = re.sub(
-            r"COALESCE\s*\(\s*([^,]+?)\s*,\s*([^\)]+?)\s*\)",
-            clean_coalesce_casts,
-            sql_code
-        )
-        
-        # Исправляем сравнения в WHERE
-        def fix_where_comparison(match):
-            full_match = match.group(0)
-            field = match.group(1)
-            value = match.group(2)
-            
-            # Если поле имеет тип text или varchar, а значение числовое
-            if ('::text' in field.lower() or '::varchar' in field.lower() or '::citext' in field.lower()) and value.isdigit():
-                return f"{field} = '{value}'"
-            
-            return full_match
-        
-        sql_code = re.sub(
-            r"([\w.]+(?:::(?:ci)?text|::varchar))\s*=\s*(\d+)(?!\s*::)", 
-            fix_where_comparison, 
-            sql_code
-        )
-        
-        # Исправляем случаи, когда строки сравниваются с числами
-        def fix_string_number_comparison(match):
-            full_match = match.group(0)
-            string_lit = match.group(1)
-            number = match.group(2)
-            
-            return f"{string_lit} = '{number}'"
-        
-        sql_code = re.sub(
-            r"('[^']*')\s*=\s*(\d+)(?!\s*::)", 
-            fix_string_number_comparison, 
-            sql_code
-        )
-
-        # Список имен полей, для которых не нужно добавлять приведение типов
-        id_fields = ['ouid', 'a_ouid', 'a_id', 'id', 'from_id', 'to_id', 'a_mspholder', 'documentstype']
-        
-        # Добавляем явное приведение типов в CASE выражениях
-        def fix_case_expression(match):
-            full_match = match.group(0)
-            case_body = match.group(1)
-
-            # Собираем все THEN/ELSE значения
-            then_else_values = re.findall(r"THEN\s+([^\s]+)|ELSE\s+([^\s]+)", case_body)
-            values = [v[0] or v[1] for v in then_else_values]
-            has_number = any(re.fullmatch(r"\d+", v) for v in values if v is not None)
-            has_string = any("'" in v for v in values if v is not None)
-            has_null = any(v.upper() == 'NULL' for v in values if v is not None)
-
-            # Если есть и строки, и числа — приводим числа к ::text
-            if has_string and has_number:
-                def repl(m):
-                    val = m.group(1)
-                    if re.fullmatch(r"\d+", val):
-                        return f"THEN {val}::text"
-                    return m.group(0)
-                case_body = re.sub(r"THEN\s+(\d+)", repl, case_body)
-                def repl_else(m):
-                    val = m.group(1)
-                    if re.fullmatch(r"\d+", val):
-                        return f"ELSE {val}::text"
-                    return m.group(0)
-                case_body = re.sub(r"ELSE\s+(\d+)", repl_else, case_body)
-                return f"CASE {case_body} END"
-            # Если все числа или NULL — ничего не делаем
-            return full_match
-        
-        sql_code = re.sub(
-            r"CASE\s+(.*?)\s+END", 
-            fix_case_expression, 
+        return get_post_processor().process(
             sql_code,
-            flags=re.DOTALL
-        )
-        
-        # Исправляем случаи, когда COALESCE с текстовым результатом сравнивается с числом
-        coalesce_comparison_pattern = r"(COALESCE\s*\([^)]*?::text[^)]*\))\s*=\s*(\d+)(?!\s*::)"
-        sql_code = re.sub(
-            coalesce_comparison_pattern,
-            lambda m: f"{m.group(1)} = '{m.group(2)}'",
-            sql_code
-        )
-        
-        # Приводим DATEDIFF(DAY, ...) к DATEDIFF('day', ...)
-        sql_code = re.sub(r"DATEDIFF\s*\(\s*DAY\s*,", "DATEDIFF('day',", sql_code, flags=re.IGNORECASE)
-        
-        # DATEDIFF(DAY, X, Y) и DATEDIFF('day', X, Y) -> DATE_PART('day', Y - X), ISNULL -> COALESCE
-        def datediff_to_datepart(m):
-            x = m.group(1).strip()
-            y = m.group(2).strip()
-            x = re.sub(r'ISNULL\s*\(', 'COALESCE(', x, flags=re.IGNORECASE)
-            y = re.sub(r'ISNULL\s*\(', 'COALESCE(', y, flags=re.IGNORECASE)
-            return f"DATE_PART('day', {y} - {x})"
-        sql_code = re.sub(
-            r"DATEDIFF\s*\(\s*(?:DAY|'day')\s*,\s*([^,]+?)\s*,\s*([^)]+?)\s*\)",
-            datediff_to_datepart,
-            sql_code,
-            flags=re.IGNORECASE
-        )
-
-        # YEAR(X) -> EXTRACT(YEAR FROM X::timestamp)
-        sql_code = re.sub(
-            r"YEAR\s*\(\s*([^\)]+)\s*\)",
-            r"EXTRACT(YEAR FROM \1::timestamp)",
-            sql_code,
-            flags=re.IGNORECASE
-        )
-        # MONTH(X) -> EXTRACT(MONTH FROM X::timestamp)
-        sql_code = re.sub(
-            r"MONTH\s*\(\s*([^\)]+)\s*\)",
-            r"EXTRACT(MONTH FROM \1::timestamp)",
-            sql_code,
-            flags=re.IGNORECASE
-        )
-        
-        # TO_TIMESTAMP(X::text, 'YYYY-MM-DD') -> DATE_TRUNC('day', X)
-        sql_code = re.sub(r"TO_TIMESTAMP\(([^)]+?)::text,\s*'YYYY-MM-DD'\)", r"DATE_TRUNC('day', \1)", sql_code)
-        
-        # --- Новый блок: исправляем сравнения числовых полей с пустой строкой ---
-        from src.parser import SQLParser
-        parser = SQLParser(self.config)
-        alias_analyzer = self.alias_analyzer
-        import psycopg2
-        pg = self.config.PG_CONFIG
-        def get_column_type(table, column):
-            try:
-                with psycopg2.connect(
-                    host=pg['host'], port=pg['port'], database=pg['database'], user=pg['user'], password=pg['password']
-                ) as conn, conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT data_type
-                        FROM information_schema.columns
-                        WHERE table_name = %s AND column_name = %s
-                        LIMIT 1
-                    """, (table.lower(), column.lower()))
-                    row = cur.fetchone()
-                    if row:
-                        return row[0]
-            except Exception as e:
-                print(f"[post_process_sql] Ошибка при получении типа для {table}.{column}: {e}")
-            return None
-
-        def fix_empty_string_comparison(match):
-            field = match.group(1)
-            # Попробуем вытащить alias и column
-            if '.' in field:
-                alias, column = field.split('.', 1)
-                table = alias_analyzer.get_table_by_alias(sql_code, alias)
-            else:
-                table, column = None, field
-            col_type = None
-            if table:
-                col_type = get_column_type(table, column)
-            # Если числовой тип — исправляем
-            if col_type and col_type.lower() in [
-                'double precision', 'numeric', 'integer', 'float', 'real', 'bigint', 'smallint', 'decimal']:
-                return f"{field} IS NULL"
-            else:
-                return match.group(0)
-
-        sql_code = re.sub(
-            r"([\w\.]+)\s*=\s*''(::text)?",
-            fix_empty_string_comparison,
-            sql_code
+            alias_analyzer=self.alias_analyzer,
+            catalog=get_schema_catalog(self.config),
+            guard=self.rule_guard
         )
-        # --- конец нового блока ---
-
-        return sql_code
         
     def is_large_script(self, script: str) -> bool:
         """
@@ -1081,38 +1457,48 @@ class AIConverter:
             # Извлекаем текст скрипта
             script_text = self.extract_sql_text(original_script)
             
-            # Разделяем скрипт на логические блоки
-            logical_blocks = self._split_to_logical_blocks(script_text)
-            
-            # Группируем логические блоки в чанки подходящего размера
+            # Пакеты, разделенные строками GO, независимы: каждый делится на логические блоки
+            # отдельно, поэтому части не переходят через границу пакета.
+            # Блоки загрузки данных конвертируются без нейросети и в чанки не попадают
             chunk_size = getattr(self.config, 'LARGE_SCRIPT_CHUNK_SIZE', 200)
-            chunks = self._group_blocks_into_chunks(logical_blocks, chunk_size)
+            batches = ParsedScript.of(script_text).batches
+            parts = []
+            for batch_number, batch in enumerate(batches):
+                logical_blocks = self._split_to_logical_blocks(batch)
+                for kind, payload in self._separate_data_load_blocks(script_text, logical_blocks):
+                    if kind == 'data':
+                        parts.append(('data', payload, batch_number))
+                    else:
+                        parts.extend(('ai', chunk, batch_number)
+                                     for chunk in self._group_blocks_into_chunks(payload, chunk_size))
+            
+            chunks = [text for kind, text, _ in parts if kind == 'ai']
+            data_parts_count = len(parts) - len(chunks)
             
-            print(f"Скрипт разделен на {len(chunks)} логических частей")
+            print(f"Скрипт разделен на {len(chunks)} логических частей для AI")
+            if len(batches) > 1:
+                print(f"Пакетов, разделенных GO: {len(batches)}")
+            if data_parts_count:
+                print(f"Блоков загрузки данных, сконвертированных без AI: {data_parts_count}")
             
-            # Создаем директорию для сохранения промежуточных результатов
-            chunks_dir = Path("chunks")
-            chunks_dir.mkdir(exist_ok=True)
+            if chunks and self.ai_provider not in _PROVIDER_NAMES:
+                return False, script_text, f"Неизвестный провайдер AI: {self.ai_provider}"
+            
+            # Промежуточные результаты каждого вызова — в отдельном временном каталоге,
+            # чтобы одновременно конвертируемые скрипты не затирали файлы друг друга
+            chunks_dir = Path(tempfile.mkdtemp(prefix="chunks_"))
             
             # Создаем подпапки для исходных и конвертированных частей
             original_chunks_dir = chunks_dir / "original"
             converted_chunks_dir = chunks_dir / "converted"
-            original_chunks_dir.mkdir(exist_ok=True)
-            converted_chunks_dir.mkdir(exist_ok=True)
-            
-            # Очищаем папки от предыдущих результатов
-            for file in original_chunks_dir.glob("*.sql"):
-                file.unlink()
-            for file in converted_chunks_dir.glob("*.sql"):
-                file.unlink()
-                
-            print(f"Промежуточные результаты будут сохранены в папке {chunks_dir.absolute()}")
+            original_chunks_dir.mkdir()
+            converted_chunks_dir.mkdir()
             
-            converted_chunks = []
-            failed_chunks = []
+            print(f"Промежуточные результаты будут сохранены в папке {chunks_dir.absolute()}")
             
-            # Обрабатываем каждый чанк отдельно
-            for i, chunk in enumerate(chunks):
+            def convert_chunk(i: int) -> Tuple[bool, str, str, 'AIConverter']:
+                chunk = chunks[i]
+                worker = self._part_converter()
                 print(f"\n--- Обработка части {i+1}/{len(chunks)} ---")
                 
                 # Сохраняем оригинальный чанк
@@ -1120,39 +1506,59 @@ class AIConverter:
                 with open(original_chunks_dir / chunk_filename, "w", encoding="utf-8") as f:
                     f.write(chunk)
                 
-                # Определяем какой API использовать из конфигурации
-                ai_provider = getattr(self.config, 'AI_PROVIDER', 'openai').lower()
-                
-                # Создаем специальный промт для части большого скрипта
-                part_prompt = self._create_part_prompt(chunk, i+1, len(chunks), error_message)
-                
                 # Конвертируем чанк с модифицированным промтом
-                if ai_provider == 'openai':
-                    success, converted_chunk, message = self._convert_chunk_with_openai(chunk, part_prompt)
-                elif ai_provider == 'anthropic':
-                    success, converted_chunk, message = self._convert_chunk_with_anthropic(chunk, part_prompt)
-                else:
-                    return False, script_text, f"Неизвестный провайдер AI: {ai_provider}"
+                success, converted_chunk, message = worker._convert_part(chunk, i+1, len(chunks), error_message)
                 
                 # Сохраняем результат конвертации чанка
                 with open(converted_chunks_dir / chunk_filename, "w", encoding="utf-8") as f:
                     f.write(converted_chunk)
                 
                 if success:
-                    converted_chunks.append(converted_chunk)
                     print(f"✅ Часть {i+1}/{len(chunks)} успешно сконвертирована и сохранена в {converted_chunks_dir / chunk_filename}")
                 else:
-                    # Если не удалось сконвертировать, сохраняем оригинальный чанк
-                    converted_chunks.append(chunk)
-                    failed_chunks.append(i)
                     print(f"❌ Ошибка при конвертации части {i+1}/{len(chunks)}: {message}")
+                return success, converted_chunk, message, worker
             
-            # Объединяем все сконвертированные чанки
-            converted_script = "\n".join(converted_chunks)
+            # Части независимы и конвертируются одновременно (до GO_BATCH_WORKERS запросов к нейросети)
+            workers = min(int(getattr(self.config, 'GO_BATCH_WORKERS', 1)), len(chunks))
+            if workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(convert_chunk, range(len(chunks))))
+            else:
+                results = [convert_chunk(i) for i in range(len(chunks))]
             
-            # Постобработка объединенного скрипта для исправления возможных проблем
+            # Состояние скрипта, накопленное частями, собирается после завершения всех потоков
+            self.examples_used = sum(worker.examples_used for *_, worker in results)
+            for *_, worker in results:
+                self.rule_guard.merge(worker.rule_guard)
+            
+            # Собираем части в исходном порядке по пакетам
+            batch_parts = [[] for _ in batches]
+            failed_chunks = []
+            chunk_index = 0
+            for part_number, (kind, chunk, batch_number) in enumerate(parts, start=1):
+                if kind == 'data':
+                    # Блок загрузки данных уже сконвертирован детерминированно
+                    data_filename = f"data_{part_number:03d}.sql"
+                    with open(converted_chunks_dir / data_filename, "w", encoding="utf-8") as f:
+                        f.write(chunk)
+                    batch_parts[batch_number].append(('data', chunk))
+                    continue
+                
+                success, converted_chunk, _, _ = results[chunk_index]
+                if success:
+                    batch_parts[batch_number].append(('ai', converted_chunk))
+                else:
+                    # Если не удалось сконвертировать, сохраняем оригинальный чанк
+                    batch_parts[batch_number].append(('ai', chunk))
+                    failed_chunks.append(chunk_index)
+                chunk_index += 1
+            
+            # Объединяем все сконвертированные части; пакеты собираются без строк GO.
+            # Постобработка применяется только к результатам AI, данные не трогаем
             try:
-                converted_script = self._post_process_large_script(converted_script)
+                converted_script = join_batches([self._join_converted_parts(parts_of_batch, post_process=True)
+                                                 for parts_of_batch in batch_parts])
                 
                 # Сохраняем итоговый объединенный результат
                 with open(chunks_dir / "combined_result.sql", "w", encoding="utf-8") as f:
@@ -1162,6 +1568,8 @@ class AIConverter:
             except Exception as e:
                 print(f"⚠️ Ошибка при постобработке объединенного скрипта: {str(e)}")
                 print("Возвращаем необработанный объединенный результат")
+                converted_script = join_batches([self._join_converted_parts(parts_of_batch, post_process=False)
+                                                 for parts_of_batch in batch_parts])
                 # Сохраняем необработанную версию
                 with open(chunks_dir / "combined_raw.sql", "w", encoding="utf-8") as f:
                     f.write(converted_script)
@@ -1181,6 +1589,121 @@ class AIConverter:
             script_text = self.extract_sql_text(original_script)
             return False, script_text, f"Ошибка при конвертации большого скрипта: {str(e)}"
     
+    def _part_converter(self) -> 'AIConverter':
+        """
+        Конвертер для одной части большого скрипта: клиенты, маршрутизатор и учет токенов
+        общие, а состояние скрипта (примеры, итерации, классификация, события правил) свое,
+        поэтому части можно конвертировать в разных потоках
+        """
+        worker = copy.copy(self)
+        worker.examples_used = 0
+        worker.ai_iterations = 0
+        worker._script_class = None
+        worker.rule_guard = RuleGuard(self.rule_guard.budget, self.rule_guard.log_dir)
+        return worker
+    
+    def _convert_part(self, chunk: str, part_index: int, total_parts: int, error_message: str,
+                      depth: int = 0) -> Tuple[bool, str, str]:
+        """
+        Конвертирует часть большого скрипта. Если ответ нейросети обрезан по лимиту
+        токенов, часть делится пополам по логическим блокам и конвертируется заново
+        (не глубже AI_TRUNCATION_SPLIT_DEPTH уровней)
+        
+        Args:
+            chunk: Часть скрипта
+            part_index: Номер части
+            total_parts: Общее количество частей
+            error_message: Сообщение об ошибке, если есть
+            depth: Текущая глубина деления
+            
+        Returns:
+            Tuple[bool, str, str]: (успех, сконвертированная часть, сообщение)
+        """
+        compacted = self._compact_for_prompt(chunk, error_message)
+        part_prompt = self._create_part_prompt(compacted.text, part_index, total_parts, error_message)
+        success, converted_chunk, message = self._convert_chunk(chunk, part_prompt)
+        if success:
+            converted_chunk = compacted.restore(converted_chunk)
+        
+        max_depth = getattr(self.config, 'AI_TRUNCATION_SPLIT_DEPTH', 2)
+        if success or TRUNCATED_MESSAGE not in message or depth >= max_depth:
+            return success, converted_chunk, message
+        
+        half_size = max(1, len(chunk.splitlines()) // 2)
+        halves = self._group_blocks_into_chunks(self._split_to_logical_blocks(chunk), half_size)
+        if len(halves) < 2:
+            return success, converted_chunk, message
+        
+        print(f"✂️ Ответ обрезан по лимиту токенов, делим часть {part_index} на {len(halves)} меньшие части")
+        converted_halves = []
+        for half in halves:
+            success, converted_half, message = self._convert_part(
+                half, part_index, total_parts, error_message, depth + 1)
+            if not success:
+                return False, chunk, message
+            converted_halves.append(converted_half)
+        return True, "\n\n".join(converted_halves), message
+    
+    def _separate_data_load_blocks(self, script_text: str, blocks: List[str]) -> List[Tuple[str, Any]]:
+        """
+        Отделяет блоки загрузки данных (INSERT ... VALUES с литералами) от остальных блоков
+        
+        Args:
+            script_text: Полный текст скрипта (для определения типов колонок из CREATE TABLE)
+            blocks: Логические блоки скрипта
+            
+        Returns:
+            List[Tuple[str, Any]]: Последовательность сегментов в исходном порядке:
+            ('data', сконвертированный_sql) или ('ai', [логические_блоки])
+        """
+        if not getattr(self.config, 'DATA_LOAD_FAST_PATH', True):
+            return [('ai', blocks)] if blocks else []
+        
+        # Типы колонок собираются по всему скрипту один раз, даже если блоки передаются по пакетам
+        column_types = ParsedScript.of(script_text).cached(
+            'column_types', lambda: self.data_load_converter.collect_column_types(script_text))
+        segments = []
+        pending_blocks = []
+        for block in blocks:
+            converted = self.data_load_converter.convert_block(block, column_types)
+            if converted is None:
+                pending_blocks.append(block)
+                continue
+            if pending_blocks:
+                segments.append(('ai', pending_blocks))
+                pending_blocks = []
+            segments.append(('data', converted))
+        if pending_blocks:
+            segments.append(('ai', pending_blocks))
+        return segments
+    
+    def _join_converted_parts(self, parts: List[Tuple[str, str]], post_process: bool = True) -> str:
+        """
+        Объединяет сконвертированные части в итоговый скрипт
+        
+        Args:
+            parts: Список (тип_части, текст), где тип 'ai' или 'data'
+            post_process: Применять ли постобработку к последовательностям частей от AI
+            
+        Returns:
+            str: Итоговый скрипт
+        """
+        result = []
+        ai_run = []
+        for kind, text in parts:
+            if kind == 'ai':
+                ai_run.append(text)
+                continue
+            if ai_run:
+                joined = "\n".join(ai_run)
+                result.append(self._post_process_large_script(joined) if post_process else joined)
+                ai_run = []
+            result.append(text)
+        if ai_run:
+            joined = "\n".join(ai_run)
+            result.append(self._post_process_large_script(joined) if post_process else joined)
+        return "\n".join(result)
+    
     def _split_to_logical_blocks(self, script: str) -> List[str]:
         """
         Разделяет SQL-скрипт на логические блоки по границам SQL-конструкций
@@ -1191,25 +1714,6 @@ class AIConverter:
         Returns:
             List[str]: Список логических блоков SQL
         """
-        # Паттерны для определения начала новых SQL-конструкций
-        start_patterns = [
-            r"^\s*CREATE\s+", 
-            r"^\s*ALTER\s+", 
-            r"^\s*DROP\s+", 
-            r"^\s*INSERT\s+", 
-            r"^\s*UPDATE\s+", 
-            r"^\s*DELETE\s+", 
-            r"^\s*SELECT\s+",
-            r"^\s*DECLARE\s+",
-            r"^\s*SET\s+",
-            r"^\s*IF\s+",
-            r"^\s*BEGIN\s+",
-            r"^\s*END\s*$",
-            r"^\s*EXEC\s+",
-            r"^\s*USE\s+",
-            r"^\s*PRINT\s+"
-        ]
-        
         # Разбиваем скрипт на строки
         lines = script.splitlines()
         
@@ -1236,11 +1740,9 @@ class AIConverter:
             # Если найдено начало новой SQL-конструкции и текущий блок не пуст,
             # завершаем текущий блок и начинаем новый
             if current_block and not in_comment_block:
-                for pattern in start_patterns:
-                    if re.match(pattern, line_stripped, re.IGNORECASE):
-                        blocks.append("\n".join(current_block))
-                        current_block = [line]
-                        break
+                if _BLOCK_START_RE.match(line_stripped):
+                    blocks.append("\n".join(current_block))
+                    current_block = [line]
                 else:
                     # Если это не начало новой конструкции, добавляем строку к текущему блоку
                     current_block.append(line)
@@ -1312,11 +1814,11 @@ class AIConverter:
         lines = block.splitlines()
         
         # Если блок - CREATE TABLE, ищем логические разделы внутри него
-        if re.match(r"^\s*CREATE\s+TABLE", lines[0], re.IGNORECASE):
+        if _CREATE_TABLE_RE.match(lines[0]):
             return self._split_create_table(block, chunk_size)
         
         # Если блок - INSERT, ищем логические разделы VALUES
-        if re.match(r"^\s*INSERT\s+INTO", lines[0], re.IGNORECASE):
+        if _INSERT_INTO_RE.match(lines[0]):
             return self._split_insert_values(block, chunk_size)
         
         # Для других типов блоков, просто разбиваем по размеру с учетом скобок и точек с запятой
@@ -1442,7 +1944,7 @@ class AIConverter:
         # Находим заголовок INSERT (до VALUES или SELECT)
         header_end = 0
         for i, line in enumerate(lines):
-            if re.search(r'\bVALUES\b|\bSELECT\b', line, re.IGNORECASE):
+            if _VALUES_OR_SELECT_RE.search(line):
                 header_end = i
                 break
         
@@ -1450,7 +1952,7 @@ class AIConverter:
         body_lines = lines[header_end+1:]
         
         # Если INSERT содержит SELECT, обрабатываем как один блок
-        if any(re.search(r'\bSELECT\b', line, re.IGNORECASE) for line in header):
+        if any(_SELECT_RE.search(line) for line in header):
             return [block]
         
         # Разделяем VALUES на отдельные наборы
@@ -1529,166 +2031,10 @@ class AIConverter:
 Ниже приведена часть {part_index} из {total_parts} для конвертации:
 """
         
-        # Вставляем информацию о части скрипта после первого абзаца базового промта
-        lines = base_prompt.splitlines()
-        insert_index = 4  # Примерно после первого абзаца
-        
-        modified_prompt = "\n".join(lines[:insert_index]) + part_info + "\n".join(lines[insert_index:])
-        
-        return modified_prompt
-    
-    def _convert_chunk_with_openai(self, chunk: str, prompt: str) -> Tuple[bool, str, str]:
-        """
-        Конвертирует часть скрипта с помощью OpenAI API, используя специальный промт
-        
-        Args:
-            chunk: Часть скрипта для конвертации
-            prompt: Специальный промт для этой части
-            
-        Returns:
-            Tuple[bool, str, str]: (успех, сконвертированная часть, сообщение)
-        """
-        api_key = self.api_keys.get('openai')
-        if not api_key:
-            return False, chunk, "API ключ OpenAI не найден. Проверьте файл .env или переменную окружения OPENAI_API_KEY."
-        
-        model = getattr(self.config, 'OPENAI_MODEL', 'gpt-4') 
-        temperature = getattr(self.config, 'AI_TEMPERATURE', 0.1)
-        max_tokens = getattr(self.config, 'AI_MAX_TOKENS', 64000)
-        
-        print(f"Максимальное количество токенов для ответа: {max_tokens}")
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-        
-        data = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": self._get_system_prompt()},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": temperature,
-            "max_tokens": max_tokens
-        }
-        
-        try:
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=self.api_timeout
-            )
-            
-            if response.status_code != 200:
-                return False, chunk, f"Ошибка API OpenAI: {response.status_code} - {response.text}"
-            
-            response_data = response.json()
-            converted_chunk = response_data['choices'][0]['message']['content']
-            
-            # Извлекаем SQL из ответа
-            converted_chunk = self._extract_sql_from_response(converted_chunk)
-            
-            # Постобработка результата
-            converted_chunk = self._post_process_sql(converted_chunk)
-            
-            return True, converted_chunk, "Успешно сконвертировано с помощью OpenAI"
-            
-        except requests.exceptions.Timeout:
-            return False, chunk, f"Превышен таймаут запроса к OpenAI API ({self.api_timeout} секунд)"
-        except Exception as e:
-            return False, chunk, f"Ошибка при запросе к OpenAI: {str(e)}"
-    
-    def _convert_chunk_with_anthropic(self, chunk: str, prompt: str) -> Tuple[bool, str, str]:
-        """
-        Конвертирует часть скрипта с помощью Anthropic API, используя специальный промт
-        
-        Args:
-            chunk: Часть скрипта для конвертации
-            prompt: Специальный промт для этой части
-            
-        Returns:
-            Tuple[bool, str, str]: (успех, сконвертированная часть, сообщение)
-        """
-        api_key = self.api_keys.get('anthropic')
-        if not api_key:
-            return False, chunk, "API ключ Anthropic не найден. Проверьте файл .env или переменную окружения ANTHROPIC_API_KEY."
-        
-        model = getattr(self.config, 'ANTHROPIC_MODEL', 'claude-3-sonnet-20240229')
-        temperature = getattr(self.config, 'AI_TEMPERATURE', 0.1)
-        max_tokens = getattr(self.config, 'AI_MAX_TOKENS', 64000)
-        
-        print(f"Максимальное количество токенов для ответа: {max_tokens}")
-        
-        # Заголовки для Anthropic API
-        headers = {
-            "Content-Type": "application/json",
-            "anthropic-version": "2023-06-01",
-            "x-api-key": api_key
-        }
-        
-        # Печатаем первые 10 символов ключа для отладки
-        key_preview = api_key[:10] + "..." if len(api_key) > 10 else api_key
-        print(f"Используем ключ API Anthropic (первые символы): {key_preview}")
-        
-        data = {
-            "model": model,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-            "system": self._get_system_prompt(),
-            "messages": [
-                {"role": "user", "content": prompt}
-            ]
-        }
-        
-        # Повторные попытки для обработки ошибок перегрузки сервера
-        max_retries = 3
-        base_delay = 5  # базовая задержка в секундах
-        
-        for attempt in range(max_retries):
-            try:
-                response = requests.post(
-                    "https://api.anthropic.com/v1/messages",
-                    headers=headers,
-                    json=data,
-                    timeout=self.api_timeout  # Используем настраиваемый таймаут
-                )
-                
-                print(f"Код ответа от Anthropic API: {response.status_code}")
-                
-                # Обработка ошибки 529 (Overloaded)
-                if response.status_code == 529:
-                    if attempt < max_retries - 1:
-                        delay = base_delay * (2 ** attempt)  # экспоненциальная задержка
-                        print(f"⚠️ Сервера Anthropic перегружены (529). Повторная попытка {attempt + 2}/{max_retries} через {delay} секунд...")
-                        time.sleep(delay)
-                        continue
-                    else:
-                        return False, chunk, f"Сервера Anthropic перегружены. Попробуйте позже или используйте --provider openai"
-                
-                # Обработка других ошибок HTTP
-                if response.status_code != 200:
-                    return False, chunk, f"Ошибка API Anthropic: {response.status_code} - {response.text}"
-                
-                response_data = response.json()
-                converted_chunk = response_data['content'][0]['text']
-                
-                # Извлекаем SQL из ответа
-                converted_chunk = self._extract_sql_from_response(converted_chunk)
-                
-                # Постобработка результата
-                converted_chunk = self._post_process_sql(converted_chunk)
-                
-                return True, converted_chunk, "Успешно сконвертировано с помощью Anthropic Claude"
-                
-            except requests.exceptions.Timeout:
-                return False, chunk, f"Превышен таймаут запроса к Anthropic API ({self.api_timeout} секунд)"
-            except Exception as e:
-                return False, chunk, f"Ошибка при запросе к Anthropic: {str(e)}"
-        
-        # Если все попытки исчерпаны
-        return False, chunk, "Не удалось выполнить запрос к Anthropic API после нескольких попыток"
+        # Вставляем информацию о части скрипта сразу после неизменных правил,
+        # чтобы они оставались общим префиксом для кэша промпта
+        rules = self._get_conversion_rules()
+        return rules + part_info + base_prompt[len(rules):]
     
     def _post_process_large_script(self, script: str) -> str:
         """
@@ -1701,13 +2047,11 @@ class AIConverter:
             str: Обработанный скрипт с исправлениями
         """
         # Удаляем дублирующиеся комментарии о том, что это часть таблицы
-        script = re.sub(r'\s*-- Часть таблицы, продолжение в следующем блоке\s*\)\s*CREATE\s+TABLE.*?\(\s*-- Продолжение таблицы', 
-                        '', script, flags=re.DOTALL)
+        script = _TABLE_CONTINUATION_RE.sub('', script)
         
         # Удаляем дублирующиеся INSERT INTO одной и той же таблицы, если они идут подряд
         # Исправленная версия без использования \K
-        pattern = r'(INSERT\s+INTO\s+[^\s(]+(?:\s*\([^)]+\))?\s+VALUES\s+)(?:\([^;]+;\s*)(\1)'
-        script = re.sub(pattern, r'\2', script, flags=re.DOTALL | re.IGNORECASE)
+        script = _REPEATED_INSERT_RE.sub(r'\2', script)
         
         # Применяем стандартную постобработку SQL
         script = self._post_process_sql(script)
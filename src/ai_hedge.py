@@ -0,0 +1,136 @@
+"""
+Модуль для параллельной генерации нескольких вариантов конвертации.
+Варианты запрашиваются одновременно с разной температурой или у разных провайдеров,
+каждый проверяется сразу после получения (проверки в общей тестовой БД идут по очереди),
+первый прошедший проверку побеждает, остальные запросы отменяются. Отмена срабатывает
+на следующем фрагменте потокового ответа, поэтому без AI_STREAMING варианты не запрашиваются.
+"""
+
+import threading
+import time
+from typing import List, Optional, Sequence
+
+from src.ai_usage import AIUsage
+
+# Сообщение об отмене варианта, когда другой вариант уже прошел проверку
+HEDGE_CANCELLED_MESSAGE = "Запрос отменен: другой вариант уже прошел проверку"
+
+# Максимальная температура, которую принимает API провайдера
+_MAX_TEMPERATURE = {'openai': 2.0, 'anthropic': 1.0}
+
+
+class HedgeCandidate:
+    """Один вариант конвертации: провайдер, температура, учет токенов и отмена"""
+
+    def __init__(self, index: int, provider: str, temperature: float):
+        self.index = index
+        self.provider = provider
+        self.temperature = temperature
+        self.usage = AIUsage()
+        self.started = None
+        self.finished = None
+        self.status = 'pending'
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Отменяет вариант: потоковое чтение ответа прервется на следующем фрагменте"""
+        self._cancel_event.set()
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def as_dict(self) -> dict:
+        return {
+            'index': self.index,
+            'provider': self.provider,
+            'temperature': self.temperature,
+            'status': self.status,
+            'duration': round(self.duration, 3) if self.duration is not None else None,
+            'input_tokens': self.usage.input_tokens,
+            'output_tokens': self.usage.output_tokens,
+        }
+
+
+def build_candidates(count: int, provider: str, temperatures: Sequence[float],
+                     providers: Optional[Sequence[str]] = None) -> List[HedgeCandidate]:
+    """
+    Формирует варианты конвертации
+
+    Args:
+        count: Количество вариантов
+        provider: Провайдер по умолчанию
+        temperatures: Температуры, назначаемые вариантам по кругу
+        providers: Провайдеры, назначаемые вариантам по кругу (по умолчанию только provider)
+
+    Returns:
+        List[HedgeCandidate]: Варианты; первый всегда соответствует обычному запросу
+    """
+    providers = [p.lower() for p in providers] if providers else [provider]
+    temperatures = list(temperatures) or [0.1]
+    candidates = []
+    for index in range(max(1, count)):
+        candidate_provider = providers[index % len(providers)]
+        temperature = min(float(temperatures[index % len(temperatures)]),
+                          _MAX_TEMPERATURE.get(candidate_provider, 1.0))
+        candidates.append(HedgeCandidate(index, candidate_provider, temperature))
+    return candidates
+
+
+def settle_hedge_tokens(stats: dict, candidates: List[HedgeCandidate], winner: Optional[HedgeCandidate]):
+    """
+    Обновляет в сводке hedge_outcome токены и состояние вариантов, завершившихся
+    после принятия решения (отмененные запросы учитывают токены по завершении)
+    """
+    extra = [c for c in candidates if c is not winner]
+    stats.update({
+        # Вариант, отмененный до завершения, считается отмененным, даже если его поток еще работает
+        'cancelled': sum(1 for c in candidates
+                         if c.status == 'cancelled' or (c.status == 'pending' and c.cancelled)),
+        'extra_input_tokens': sum(c.usage.input_tokens for c in extra),
+        'extra_output_tokens': sum(c.usage.output_tokens for c in extra),
+        'details': [c.as_dict() for c in candidates],
+    })
+
+
+def hedge_outcome(candidates: List[HedgeCandidate], winner: Optional[HedgeCandidate],
+                  started: float, finished: float) -> dict:
+    """
+    Сводка по параллельной генерации для одного скрипта
+
+    Экономия времени оценивается относительно последовательного перебора тех же
+    вариантов: сумма длительности вариантов, завершившихся до победителя включительно,
+    минус фактическое время ожидания. Лишние токены — токены всех вариантов, кроме
+    использованного.
+
+    Args:
+        candidates: Все варианты
+        winner: Вариант, результат которого использован (или None)
+        started: Время запуска вариантов
+        finished: Время принятия решения
+
+    Returns:
+        dict: Сводка для отчета
+    """
+    wall_time = finished - started
+    completed = [c for c in candidates
+                 if c.duration is not None and c.finished <= finished and c.status != 'cancelled']
+    sequential_time = sum(c.duration for c in completed)
+    stats = {
+        'candidates': len(candidates),
+        'winner': winner.index if winner else None,
+        'winner_provider': winner.provider if winner else None,
+        'winner_temperature': winner.temperature if winner else None,
+        'verified': bool(winner and winner.status == 'passed'),
+        'wall_time': round(wall_time, 3),
+        'sequential_time': round(sequential_time, 3),
+        'time_saved': round(max(0.0, sequential_time - wall_time), 3),
+    }
+    settle_hedge_tokens(stats, candidates, winner)
+    return stats
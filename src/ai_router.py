@@ -0,0 +1,286 @@
+"""
+Модуль для распределения запросов к нейросетям между провайдерами и моделями.
+Для каждой точки подключения (провайдер + модель + адрес API) ведется скользящая
+статистика задержки, доли ошибок и оставшейся квоты из заголовков ответа.
+Запрос направляется на здоровую точку, выбранную детерминированно по ключу
+запроса (rendezvous hashing), а при ошибке — на следующую по порядку.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_BASE_URLS = {
+    'openai': 'https://api.openai.com',
+    'anthropic': 'https://api.anthropic.com',
+}
+
+_API_PATHS = {
+    'openai': '/v1/chat/completions',
+    'anthropic': '/v1/messages',
+}
+
+# Заголовки с оставшейся квотой запросов и токенов
+_QUOTA_HEADERS = {
+    'openai': ('x-ratelimit-remaining-requests', 'x-ratelimit-remaining-tokens'),
+    'anthropic': ('anthropic-ratelimit-requests-remaining', 'anthropic-ratelimit-tokens-remaining'),
+}
+
+
+def route_key(*parts: str) -> str:
+    """
+    Ключ маршрутизации запроса. Совпадает для одинаковых промптов, поэтому
+    один и тот же скрипт направляется на одну и ту же точку, пока она здорова.
+
+    Returns:
+        str: SHA-256 от частей запроса
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ProviderEndpoint:
+    """Точка подключения к нейросети: провайдер, модель и адрес API"""
+
+    def __init__(self, provider: str, model: str, base_url: Optional[str] = None, weight: float = 1.0):
+        self.provider = provider.lower()
+        self.model = model
+        self.base_url = (base_url or DEFAULT_BASE_URLS.get(self.provider, '')).rstrip('/')
+        self.weight = weight
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+    @property
+    def url(self) -> str:
+        return self.base_url + _API_PATHS[self.provider]
+
+    def __repr__(self):
+        return f"ProviderEndpoint({self.name}, {self.base_url})"
+
+
+class EndpointStats:
+    """Скользящая статистика одной точки подключения"""
+
+    def __init__(self, window: int = 20):
+        self.samples = deque(maxlen=window)
+        self.remaining_requests = None
+        self.remaining_tokens = None
+        self.cooldown_until = 0.0
+        self.total_requests = 0
+        self.total_errors = 0
+
+    def record(self, latency: float, ok: bool):
+        self.samples.append((latency, ok))
+        self.total_requests += 1
+        if not ok:
+            self.total_errors += 1
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Средняя задержка успешных запросов в окне"""
+        latencies = [latency for latency, ok in self.samples if ok]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    def as_dict(self) -> dict:
+        latency = self.latency
+        return {
+            'requests': self.total_requests,
+            'errors': self.total_errors,
+            'error_rate': round(self.error_rate, 3),
+            'latency': round(latency, 3) if latency is not None else None,
+            'remaining_requests': self.remaining_requests,
+            'remaining_tokens': self.remaining_tokens,
+            'cooling_down': self.cooldown_until > time.time(),
+        }
+
+
+def _header_int(headers, name: str) -> Optional[int]:
+    value = headers.get(name) if headers else None
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class ProviderRouter:
+    """
+    Потокобезопасный маршрутизатор запросов между точками подключения
+
+    Порядок точек для запроса: сначала здоровые, упорядоченные по весу rendezvous-хеша
+    от ключа запроса (стабильно для одного скрипта), затем деградировавшие —
+    по доле ошибок и задержке. Точка считается деградировавшей, если она на паузе
+    после 429, исчерпала квоту, доля ошибок в окне выше порога или она медленнее
+    самой быстрой точки больше чем в slow_factor раз.
+    """
+
+    def __init__(self, endpoints: Iterable[ProviderEndpoint], window: int = 20, max_error_rate: float = 0.5,
+                 slow_factor: float = 3.0, cooldown: float = 30.0, min_samples: int = 3):
+        self.endpoints = list(endpoints)
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.slow_factor = slow_factor
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self._stats: Dict[str, EndpointStats] = {e.name: EndpointStats(window) for e in self.endpoints}
+        self._lock = threading.Lock()
+
+    def stats(self, endpoint: ProviderEndpoint) -> EndpointStats:
+        with self._lock:
+            return self._stats.setdefault(endpoint.name, EndpointStats(self.window))
+
+    def record(self, endpoint: ProviderEndpoint, latency: float, ok: bool,
+               status_code: Optional[int] = None, headers=None):
+        """
+        Учитывает результат запроса
+
+        Args:
+            endpoint: Точка подключения
+            latency: Время запроса в секундах
+            ok: Успешен ли запрос
+            status_code: HTTP-код ответа, если получен
+            headers: Заголовки ответа (квоты, retry-after)
+        """
+        stats = self.stats(endpoint)
+        with self._lock:
+            stats.record(latency, ok)
+            requests_header, tokens_header = _QUOTA_HEADERS.get(endpoint.provider, (None, None))
+            remaining = _header_int(headers, requests_header) if requests_header else None
+            if remaining is not None:
+                stats.remaining_requests = remaining
+            remaining = _header_int(headers, tokens_header) if tokens_header else None
+            if remaining is not None:
+                stats.remaining_tokens = remaining
+            if status_code == 429 or stats.remaining_requests == 0:
+                retry_after = _header_int(headers, 'retry-after')
+                stats.cooldown_until = time.time() + (retry_after if retry_after is not None else self.cooldown)
+
+    def _degraded(self, stats: EndpointStats, best_latency: Optional[float], now: float) -> bool:
+        if stats.cooldown_until > now:
+            return True
+        if len(stats.samples) < self.min_samples:
+            return False
+        if stats.error_rate > self.max_error_rate:
+            return True
+        latency = stats.latency
+        return bool(best_latency and latency and latency > best_latency * self.slow_factor)
+
+    def route(self, key: str, providers: Optional[Iterable[str]] = None) -> List[ProviderEndpoint]:
+        """
+        Возвращает точки подключения в порядке попыток
+
+        Args:
+            key: Ключ запроса (см. route_key)
+            providers: Допустимые провайдеры (по умолчанию все)
+
+        Returns:
+            List[ProviderEndpoint]: Точки подключения, лучшая первой
+        """
+        allowed = {p.lower() for p in providers} if providers else None
+        endpoints = [e for e in self.endpoints if allowed is None or e.provider in allowed]
+        now = time.time()
+        with self._lock:
+            stats = {e.name: self._stats.setdefault(e.name, EndpointStats(self.window)) for e in endpoints}
+            latencies = [s.latency for s in stats.values()
+                         if s.latency is not None and len(s.samples) >= self.min_samples]
+            best_latency = min(latencies) if latencies else None
+            degraded = {e.name for e in endpoints if self._degraded(stats[e.name], best_latency, now)}
+            health = {e.name: (stats[e.name].cooldown_until > now, stats[e.name].error_rate,
+                               stats[e.name].latency or 0.0) for e in endpoints}
+
+        def rendezvous_score(endpoint: ProviderEndpoint) -> float:
+            digest = hashlib.sha256(f"{key}:{endpoint.name}".encode('utf-8')).digest()
+            uniform = (int.from_bytes(digest[:8], 'big') + 1) / (2 ** 64 + 1)
+            return -endpoint.weight / math.log(uniform)
+
+        healthy = sorted((e for e in endpoints if e.name not in degraded), key=rendezvous_score, reverse=True)
+        fallback = sorted((e for e in endpoints if e.name in degraded), key=lambda e: health[e.name])
+        return healthy + fallback
+
+    def snapshot(self) -> dict:
+        """Статистика по всем точкам подключения для отчета"""
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+
+def parse_endpoints(spec: str, config) -> List[ProviderEndpoint]:
+    """
+    Разбирает список точек подключения вида "openai:gpt-4o,anthropic:claude-3-5-sonnet@http://host:port".
+    Пустая строка — по одной точке на провайдера с моделью и адресом из конфигурации.
+
+    Args:
+        spec: Описание точек подключения
+        config: Объект конфигурации
+
+    Returns:
+        List[ProviderEndpoint]: Точки подключения
+    """
+    base_urls = {
+        'openai': getattr(config, 'OPENAI_BASE_URL', None),
+        'anthropic': getattr(config, 'ANTHROPIC_BASE_URL', None),
+    }
+    if not spec or not spec.strip():
+        return [
+            ProviderEndpoint('openai', getattr(config, 'OPENAI_MODEL', 'gpt-4'), base_urls['openai']),
+            ProviderEndpoint('anthropic', getattr(config, 'ANTHROPIC_MODEL', 'claude-3-sonnet-20240229'),
+                             base_urls['anthropic']),
+        ]
+    endpoints = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        item, _, base_url = item.partition('@')
+        provider, _, model = item.partition(':')
+        provider = provider.strip().lower()
+        if provider not in _API_PATHS:
+            raise ValueError(f"Неизвестный провайдер AI в AI_ROUTER_ENDPOINTS: {provider}")
+        if not model:
+            model = getattr(config, f'{provider.upper()}_MODEL', '')
+        endpoints.append(ProviderEndpoint(provider, model.strip(), base_url.strip() or base_urls[provider]))
+    return endpoints
+
+
+_routers: Dict[tuple, ProviderRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_provider_router(config) -> ProviderRouter:
+    """
+    Возвращает общий для всех потоков маршрутизатор для данной конфигурации
+
+    Args:
+        config: Объект конфигурации
+
+    Returns:
+        ProviderRouter: Маршрутизатор
+    """
+    endpoints = parse_endpoints(getattr(config, 'AI_ROUTER_ENDPOINTS', ''), config)
+    key = tuple((e.name, e.base_url) for e in endpoints)
+    with _routers_lock:
+        router = _routers.get(key)
+        if router is None:
+            router = ProviderRouter(
+                endpoints,
+                window=getattr(config, 'AI_ROUTER_WINDOW', 20),
+                max_error_rate=getattr(config, 'AI_ROUTER_MAX_ERROR_RATE', 0.5),
+                slow_factor=getattr(config, 'AI_ROUTER_SLOW_FACTOR', 3.0),
+                cooldown=getattr(config, 'AI_ROUTER_COOLDOWN', 30.0),
+            )
+            _routers[key] = router
+        return router
@@ -0,0 +1,243 @@
+"""
+Модуль для чтения потоковых ответов нейросетей (Server-Sent Events).
+Текст ответа накапливается по мере поступления, блоки кода извлекаются
+инкрементально, обрыв ответа по лимиту токенов определяется сразу,
+а для каждого вызова считаются время до первого токена и скорость генерации.
+"""
+
+import json
+import time
+from typing import Callable, Iterator, Optional, Tuple
+
+import requests
+
+from src.ai_usage import parse_usage
+
+# Сообщение об ответе, обрезанном по лимиту токенов; по нему вызывающий код
+# понимает, что запрос нужно повторить с частью скрипта меньшего размера
+TRUNCATED_MESSAGE = "Ответ нейросети обрезан по лимиту токенов"
+
+
+class StreamAborted(Exception):
+    """Поток прерван: превышено общее время ответа или запрос отменен"""
+
+    def __init__(self, message: str = '', result: 'StreamResult' = None):
+        super().__init__(message)
+        # Частично прочитанный ответ (для учета потраченных токенов)
+        self.result = result
+
+
+class CodeBlockExtractor:
+    """
+    Инкрементально извлекает первый блок кода из текста ответа.
+    Предпочтение отдается блоку ```sql; после его закрытия дальнейший текст не нужен.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self._scanned = 0
+        self._open_at = None
+        self._is_sql = False
+        self.code = None
+
+    @property
+    def complete(self) -> bool:
+        """True, если блок ```sql полностью получен"""
+        return self.code is not None and self._is_sql
+
+    def feed(self, delta: str) -> bool:
+        """
+        Добавляет фрагмент ответа
+
+        Args:
+            delta: Новый фрагмент текста
+
+        Returns:
+            bool: True, если блок ```sql уже закрыт
+        """
+        self.text += delta
+        while self.code is None:
+            # Ищем только полные строки, чтобы не разрезать маркер ``` между фрагментами
+            line_end = self.text.find('\n', self._scanned)
+            if line_end == -1:
+                break
+            line = self.text[self._scanned:line_end].strip()
+            if line.startswith('```'):
+                if self._open_at is None:
+                    self._open_at = line_end + 1
+                    self._is_sql = line[3:].strip().lower() == 'sql'
+                else:
+                    self.code = self.text[self._open_at:self._scanned].strip()
+            self._scanned = line_end + 1
+        return self.complete
+
+
+class StreamResult:
+    """Результат чтения потокового ответа"""
+
+    def __init__(self):
+        self.text = ''
+        self.finish_reason = None
+        self.truncated = False
+        self.stopped_early = False
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self.started = time.time()
+        self.first_token_at = None
+        self.finished_at = None
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.time()) - self.started
+
+    @property
+    def tokens_per_second(self) -> float:
+        if self.first_token_at is None or not self.output_tokens:
+            return 0.0
+        generation_time = (self.finished_at or time.time()) - self.first_token_at
+        return self.output_tokens / generation_time if generation_time > 0 else 0.0
+
+    @property
+    def usage(self) -> dict:
+        """Токены в формате AIUsage.record"""
+        return {
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'cache_read_tokens': self.cache_read_tokens,
+            'cache_write_tokens': self.cache_write_tokens,
+        }
+
+    def _set_usage(self, provider: str, usage: dict):
+        for key, value in parse_usage(provider, usage).items():
+            setattr(self, key, value)
+
+    def summary(self) -> str:
+        ttft = self.time_to_first_token
+        ttft_text = f"{ttft:.2f} с" if ttft is not None else "нет"
+        return (f"время до первого токена: {ttft_text}, всего: {self.elapsed:.2f} с, "
+                f"токенов: {self.output_tokens}, скорость: {self.tokens_per_second:.1f} ток/с")
+
+
+def iter_sse_events(response: requests.Response) -> Iterator[Tuple[Optional[str], str]]:
+    """
+    Разбирает поток Server-Sent Events
+
+    Yields:
+        Tuple[Optional[str], str]: (тип события, данные)
+    """
+    event = None
+    data_lines = []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == '':
+            if data_lines:
+                yield event, '\n'.join(data_lines)
+            event = None
+            data_lines = []
+            continue
+        if line.startswith(':'):
+            continue
+        field, _, value = line.partition(':')
+        value = value[1:] if value.startswith(' ') else value
+        if field == 'event':
+            event = value
+        elif field == 'data':
+            data_lines.append(value)
+    if data_lines:
+        yield event, '\n'.join(data_lines)
+
+
+def _estimate_output_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def read_stream(response: requests.Response, provider: str, deadline: Optional[float] = None,
+                stop_after_code_block: bool = True,
+                on_text: Optional[Callable[[str], None]] = None) -> StreamResult:
+    """
+    Читает потоковый ответ OpenAI или Anthropic
+
+    Args:
+        response: Ответ requests, открытый с stream=True
+        provider: 'openai' или 'anthropic'
+        deadline: Момент времени (time.time()), после которого чтение прерывается
+        stop_after_code_block: Прекратить чтение после закрытия блока ```sql
+        on_text: Функция, вызываемая для каждого фрагмента текста
+
+    Returns:
+        StreamResult: Накопленный текст, причина завершения, токены и время
+
+    Raises:
+        StreamAborted: Если превышено общее время ответа или on_text прервал чтение;
+            частично прочитанный ответ доступен в атрибуте result
+        requests.exceptions.ConnectionError: Если поток оборвался или простаивал дольше таймаута чтения
+    """
+    result = StreamResult()
+    extractor = CodeBlockExtractor()
+    try:
+        for event, data in iter_sse_events(response):
+            if data == '[DONE]':
+                break
+            payload = json.loads(data)
+            delta = ''
+            if provider == 'openai':
+                for choice in payload.get('choices') or []:
+                    delta += (choice.get('delta') or {}).get('content') or ''
+                    if choice.get('finish_reason'):
+                        result.finish_reason = choice['finish_reason']
+                usage = payload.get('usage')
+                if usage:
+                    result._set_usage(provider, usage)
+            else:
+                kind = payload.get('type', event)
+                if kind == 'message_start':
+                    # Токены ответа приходят в message_delta
+                    usage = dict((payload.get('message') or {}).get('usage') or {}, output_tokens=0)
+                    result._set_usage(provider, usage)
+                elif kind == 'content_block_delta':
+                    delta = (payload.get('delta') or {}).get('text') or ''
+                elif kind == 'message_delta':
+                    result.finish_reason = (payload.get('delta') or {}).get('stop_reason') or result.finish_reason
+                    result.output_tokens = (payload.get('usage') or {}).get('output_tokens', result.output_tokens)
+                elif kind == 'error':
+                    error = payload.get('error') or {}
+                    raise requests.exceptions.HTTPError(
+                        f"{error.get('type', 'error')}: {error.get('message', data)}")
+                elif kind == 'message_stop':
+                    break
+
+            if delta:
+                if result.first_token_at is None:
+                    result.first_token_at = time.time()
+                if on_text:
+                    on_text(delta)
+                if extractor.feed(delta) and stop_after_code_block:
+                    # Блок SQL получен полностью — остальной текст (пояснения) не нужен
+                    result.stopped_early = True
+                    break
+
+            if result.finish_reason in ('length', 'max_tokens'):
+                result.truncated = True
+                break
+
+            if deadline is not None and time.time() > deadline:
+                raise StreamAborted("Превышено общее время ответа нейросети")
+    except StreamAborted as e:
+        e.result = result
+        raise
+    finally:
+        response.close()
+        result.finished_at = time.time()
+        result.text = extractor.text
+        if not result.output_tokens:
+            result.output_tokens = _estimate_output_tokens(result.text)
+    return result
@@ -0,0 +1,143 @@
+"""
+Модуль для учета использования нейросетей: количество запросов, токенов и стоимость.
+"""
+
+import threading
+from typing import Dict, Optional
+
+
+def parse_usage(provider: str, usage: Optional[dict]) -> Dict[str, int]:
+    """
+    Приводит поле usage ответа API к общему виду
+
+    input_tokens — токены запроса без прочитанных из кэша промпта
+    (у OpenAI cached_tokens входят в prompt_tokens и вычитаются).
+
+    Args:
+        provider: Провайдер нейросети ('openai' или 'anthropic')
+        usage: Поле usage из ответа или события потока
+
+    Returns:
+        Dict[str, int]: {'input_tokens', 'output_tokens', 'cache_read_tokens', 'cache_write_tokens'}
+    """
+    usage = usage or {}
+    if provider == 'openai':
+        cached = (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0) or 0
+        return {
+            'input_tokens': (usage.get('prompt_tokens', 0) or 0) - cached,
+            'output_tokens': usage.get('completion_tokens', 0) or 0,
+            'cache_read_tokens': cached,
+            'cache_write_tokens': 0,
+        }
+    return {
+        'input_tokens': usage.get('input_tokens', 0) or 0,
+        'output_tokens': usage.get('output_tokens', 0) or 0,
+        'cache_read_tokens': usage.get('cache_read_input_tokens', 0) or 0,
+        'cache_write_tokens': usage.get('cache_creation_input_tokens', 0) or 0,
+    }
+
+
+def extract_usage(provider: str, response_data: dict) -> Dict[str, int]:
+    """
+    Извлекает количество токенов из ответа API
+
+    Args:
+        provider: Провайдер нейросети ('openai' или 'anthropic')
+        response_data: JSON-ответ API
+
+    Returns:
+        Dict[str, int]: {'input_tokens', 'output_tokens', 'cache_read_tokens', 'cache_write_tokens'}
+    """
+    return parse_usage(provider, response_data.get('usage'))
+
+
+class AIUsage:
+    """Потокобезопасный счетчик использования нейросети"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        # Кэш промпта на стороне провайдера: прочитанные и записанные токены
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self.by_provider: Dict[str, Dict[str, int]] = {}
+        # Сжатие скриптов в промптах: токены до и после удаления комментариев и пробелов
+        self.compacted_requests = 0
+        self.tokens_before_compaction = 0
+        self.tokens_after_compaction = 0
+
+    def record(self, provider: str, input_tokens: int = 0, output_tokens: int = 0,
+               cache_read_tokens: int = 0, cache_write_tokens: int = 0):
+        """
+        Учитывает один запрос к нейросети
+
+        Args:
+            provider: Провайдер нейросети
+            input_tokens: Токены запроса (без прочитанных из кэша)
+            output_tokens: Токены ответа
+            cache_read_tokens: Токены запроса, прочитанные из кэша промпта
+            cache_write_tokens: Токены запроса, записанные в кэш промпта
+        """
+        with self._lock:
+            self.requests += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.cache_read_tokens += cache_read_tokens
+            self.cache_write_tokens += cache_write_tokens
+            stats = self.by_provider.setdefault(provider, {'requests': 0, 'input_tokens': 0, 'output_tokens': 0,
+                                                           'cache_read_tokens': 0, 'cache_write_tokens': 0})
+            stats['requests'] += 1
+            stats['input_tokens'] += input_tokens
+            stats['output_tokens'] += output_tokens
+            stats['cache_read_tokens'] += cache_read_tokens
+            stats['cache_write_tokens'] += cache_write_tokens
+
+    def record_compaction(self, tokens_before: int, tokens_after: int):
+        """
+        Учитывает сжатие скрипта перед запросом к нейросети
+
+        Args:
+            tokens_before: Оценка токенов скрипта до сжатия
+            tokens_after: Оценка токенов после сжатия
+        """
+        with self._lock:
+            self.compacted_requests += 1
+            self.tokens_before_compaction += tokens_before
+            self.tokens_after_compaction += tokens_after
+
+    def cost(self, prices: Optional[dict] = None) -> float:
+        """
+        Оценивает стоимость запросов
+
+        Args:
+            prices: {провайдер: {'input': цена, 'output': цена, 'cache_read': цена, 'cache_write': цена}}
+                    в долларах за 1 млн токенов; без цен кэша он оценивается по цене запроса
+
+        Returns:
+            float: Стоимость в долларах
+        """
+        prices = prices or {}
+        total = 0.0
+        with self._lock:
+            for provider, stats in self.by_provider.items():
+                price = prices.get(provider, {})
+                total += stats['input_tokens'] * price.get('input', 0.0) / 1_000_000
+                total += stats['output_tokens'] * price.get('output', 0.0) / 1_000_000
+                total += stats['cache_read_tokens'] * price.get('cache_read', price.get('input', 0.0)) / 1_000_000
+                total += stats['cache_write_tokens'] * price.get('cache_write', price.get('input', 0.0)) / 1_000_000
+        return total
+
+    def as_dict(self, prices: Optional[dict] = None) -> dict:
+        with self._lock:
+            result = {
+                'requests': self.requests,
+                'input_tokens': self.input_tokens,
+                'output_tokens': self.output_tokens,
+                'cache_read_tokens': self.cache_read_tokens,
+                'cache_write_tokens': self.cache_write_tokens,
+                'compaction_saved_tokens': self.tokens_before_compaction - self.tokens_after_compaction,
+            }
+        result['cost'] = round(self.cost(prices), 6)
+        return result
@@ -1,17 +1,51 @@
 import re
-import sqlparse
+from concurrent.futures import ThreadPoolExecutor
+
+from src.parsed_script import ParsedScript
+from src.regex_registry import regex, template_regex
+from src.rule_guard import make_rule_guard
+from src.script_classifier import get_script_classifier
+from src.script_stream import join_batches
+
+_TOP_RE = regex('converter.top', r'SELECT\s+TOP\b', re.IGNORECASE)
+_CONVERT_RE = regex('converter.convert', r'CONVERT\s*\(\s*([^,]+)\s*,\s*([^,\)]+)(?:\s*,\s*[^\)]+)?\s*\)', re.IGNORECASE)
+_DATEADD_RE = regex('converter.dateadd', r'DATEADD\s*\(\s*([^,]+)\s*,\s*([^,\)]+)\s*,\s*([^,\)]+)\s*\)', re.IGNORECASE)
+_DATEDIFF_RE = regex('converter.datediff', r'DATEDIFF\s*\(\s*([^,]+)\s*,\s*([^,\)]+)\s*,\s*([^,\)]+)\s*\)', re.IGNORECASE)
+_LEFT_JOIN_RE = regex('converter.left_join', r'(\w+\.\w+)\s*=\*\s*(\w+\.\w+)')
+_RIGHT_JOIN_RE = regex('converter.right_join', r'(\w+\.\w+)\s*\*=\s*(\w+\.\w+)')
+_TOP_VALUE_RE = regex('converter.top_value', r'SELECT\s+TOP\s+\(?\s*([^\s\)]+)\s*\)?', re.IGNORECASE)
+_TOP_PARENS_RE = regex('converter.top_parens', r'SELECT\s+TOP\s+\(\s*[^\s\)]+\s*\)', re.IGNORECASE)
+_TOP_NUMBER_RE = regex('converter.top_number', r'SELECT\s+TOP\s+(\d+)', re.IGNORECASE)
+_SCRIPT_END_RE = regex('converter.script_end', r';?\s*$')
+_BRACKETS_RE = regex('converter.brackets', r'\[([^\]]+)\]')
+_DATE_FORMAT_RE = regex('converter.date_format', r"'(\d{2})/(\d{2})/(\d{4})'")
 
 class SQLConverter:
     def __init__(self, config):
         self.config = config
         self.data_type_mapping = config.DATA_TYPE_MAPPING
         self.function_mapping = config.FUNCTION_MAPPING
+        # Бюджет времени на каждое правило для скрипта; события превышения — в rule_guard.events
+        self.rule_guard = make_rule_guard(config)
         
     def convert(self, parsed_script):
         """
-        Конвертирует скрипт MS SQL в скрипт PostgreSQL
+        Конвертирует скрипт MS SQL в скрипт PostgreSQL.
+        Пакеты, разделенные строками GO, конвертируются независимо (до GO_BATCH_WORKERS
+        одновременно) и собираются в исходном порядке
         """
-        converted_script = parsed_script['original']
+        batches = ParsedScript.of(parsed_script).batches
+        if len(batches) == 1:
+            return self._convert_batch(batches[0])
+        workers = min(int(getattr(self.config, 'GO_BATCH_WORKERS', 1)), len(batches))
+        if workers <= 1:
+            return join_batches([self._convert_batch(batch) for batch in batches])
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return join_batches(list(executor.map(self._convert_batch, batches)))
+    
+    def _convert_batch(self, script):
+        """Конвертирует один пакет скрипта правилами"""
+        converted_script = script
         
         # Преобразование синтаксиса
         converted_script = self._convert_data_types(converted_script)
@@ -26,11 +60,29 @@ class SQLConverter:
         
         return converted_script
     
+    def find_unsupported_constructs(self, script, constructs=None):
+        """
+        Возвращает список конструкций скрипта, которые правила конвертера не обрабатывают.
+        Конструкции задаются в SCRIPT_CLASSES_FILE; constructs — уже найденные классификатором.
+        script — строка или ParsedScript (разбиение на запросы берется из него)
+        """
+        parsed = ParsedScript.of(script)
+        if constructs is None:
+            constructs = get_script_classifier(self.config).classify(parsed.text).constructs
+        found = list(constructs)
+        # TOP заменяется одним LIMIT в конце пакета, поэтому допустим только в единственном запросе пакета
+        for batch, statements in zip(parsed.batches, parsed.batch_statements):
+            top_count = len(_TOP_RE.findall(batch))
+            if top_count > 1 or (top_count and len(statements) > 1):
+                found.append('несколько TOP')
+                break
+        return found
+    
     def _convert_data_types(self, script):
         """Конвертирует типы данных из MS SQL в PostgreSQL"""
         for ms_type, pg_type in self.data_type_mapping.items():
             # Используем регулярное выражение для замены типов данных
-            script = re.sub(fr'\b{ms_type}\b', pg_type, script, flags=re.IGNORECASE)
+            script = self.rule_guard.sub(template_regex('converter.data_type', fr'\b{ms_type}\b', re.IGNORECASE), pg_type, script)
         return script
     
     def _convert_functions(self, script):
@@ -40,47 +92,45 @@ class SQLConverter:
             script = script.replace(ms_func, pg_func)
             
         # Специальная обработка CONVERT
-        script = re.sub(r'CONVERT\s*\(\s*([^,]+)\s*,\s*([^,\)]+)(?:\s*,\s*[^\)]+)?\s*\)', 
-                       r'CAST(\2 AS \1)', script, flags=re.IGNORECASE)
+        script = self.rule_guard.sub(_CONVERT_RE, r'CAST(\2 AS \1)', script)
         
         # Специальная обработка DATEADD
-        script = re.sub(r'DATEADD\s*\(\s*([^,]+)\s*,\s*([^,\)]+)\s*,\s*([^,\)]+)\s*\)', 
-                       r'\3 + INTERVAL \'\2 \1\'', script, flags=re.IGNORECASE)
+        script = self.rule_guard.sub(_DATEADD_RE, r'\3 + INTERVAL \'\2 \1\'', script)
         
         # Специальная обработка DATEDIFF
-        script = re.sub(r'DATEDIFF\s*\(\s*([^,]+)\s*,\s*([^,\)]+)\s*,\s*([^,\)]+)\s*\)', 
-                       r'EXTRACT(EPOCH FROM (\3 - \2))/(CASE \'\1\' WHEN \'SECOND\' THEN 1 WHEN \'MINUTE\' THEN 60 WHEN \'HOUR\' THEN 3600 WHEN \'DAY\' THEN 86400 WHEN \'WEEK\' THEN 604800 WHEN \'MONTH\' THEN 2592000 WHEN \'YEAR\' THEN 31536000 END)', 
-                       script, flags=re.IGNORECASE)
+        script = self.rule_guard.sub(_DATEDIFF_RE, r'EXTRACT(EPOCH FROM (\3 - \2))/(CASE \'\1\' WHEN \'SECOND\' THEN 1 WHEN \'MINUTE\' THEN 60 WHEN \'HOUR\' THEN 3600 WHEN \'DAY\' THEN 86400 WHEN \'WEEK\' THEN 604800 WHEN \'MONTH\' THEN 2592000 WHEN \'YEAR\' THEN 31536000 END)', 
+                       script)
         
         return script
     
     def _convert_joins(self, script):
         """Конвертирует синтаксис JOIN из MS SQL в PostgreSQL"""
         # Заменить синтаксис =* и *= на LEFT JOIN и RIGHT JOIN
-        script = re.sub(r'(\w+\.\w+)\s*=\*\s*(\w+\.\w+)', r'LEFT JOIN \2 ON \1 = \2', script)
-        script = re.sub(r'(\w+\.\w+)\s*\*=\s*(\w+\.\w+)', r'RIGHT JOIN \1 ON \1 = \2', script)
+        script = self.rule_guard.sub(_LEFT_JOIN_RE, r'LEFT JOIN \2 ON \1 = \2', script)
+        script = self.rule_guard.sub(_RIGHT_JOIN_RE, r'RIGHT JOIN \1 ON \1 = \2', script)
         return script
     
     def _convert_top_to_limit(self, script):
         """Конвертирует TOP в LIMIT"""
-        # Находим все вхождения TOP и преобразуем их в LIMIT
-        script = re.sub(r'SELECT\s+TOP\s+(\d+)', r'SELECT', script, flags=re.IGNORECASE)
+        # Запоминаем значения TOP до их удаления
+        top_values = _TOP_VALUE_RE.findall(script)
+        if not top_values:
+            return script
         
-        # Обработка TOP с переменными или параметрами
-        script = re.sub(r'SELECT\s+TOP\s+\(\s*([^\s]+)\s*\)', r'SELECT', script, flags=re.IGNORECASE)
+        # Обработка TOP с переменными или параметрами в скобках
+        script = self.rule_guard.sub(_TOP_PARENS_RE, r'SELECT', script)
+        script = self.rule_guard.sub(_TOP_NUMBER_RE, r'SELECT', script)
         
-        # Добавляем LIMIT в конец запроса, если нашли TOP
-        top_matches = re.finditer(r'SELECT\s+TOP\s+(\d+)|\(\s*([^\s]+)\s*\)', script, flags=re.IGNORECASE)
-        for match in top_matches:
-            limit_value = match.group(1) if match.group(1) else match.group(2)
-            # Это упрощенный подход, для реального использования нужно учитывать сложность запросов
-            script = re.sub(r';?\s*$', f' LIMIT {limit_value};', script)
+        # LIMIT добавляется в конец запроса только для единственного TOP,
+        # иначе непонятно, к какому запросу он относится
+        if len(top_values) == 1:
+            script = self.rule_guard.sub(_SCRIPT_END_RE, f' LIMIT {top_values[0]};', script)
             
         return script
     
     def _convert_brackets_to_quotes(self, script):
         """Заменяет квадратные скобки на двойные кавычки для идентификаторов"""
-        script = re.sub(r'\[([^\]]+)\]', r'"\1"', script)
+        script = self.rule_guard.sub(_BRACKETS_RE, r'"\1"', script)
         return script
     
     def _convert_schemas(self, script):
@@ -91,7 +141,7 @@ class SQLConverter:
     def _convert_date_formats(self, script):
         """Конвертирует форматы дат из MS SQL в PostgreSQL"""
         # Заменяем формат даты в стиле MS SQL на PostgreSQL
-        script = re.sub(r"'(\d{2})/(\d{2})/(\d{4})'", r"'\3-\1-\2'", script)
+        script = self.rule_guard.sub(_DATE_FORMAT_RE, r"'\3-\1-\2'", script)
         return script
     
     def _convert_ctes(self, script):
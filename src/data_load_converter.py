@@ -0,0 +1,585 @@
+"""
+Модуль для детерминированной конвертации операторов загрузки данных
+(INSERT ... VALUES) из MS SQL в PostgreSQL без обращения к нейросети.
+
+Строки данных почти не требуют диалектной конвертации, поэтому такие блоки
+обрабатываются локально: нормализуются литералы, убираются префиксы N'...',
+приводятся даты, двоичные значения 0x... и значения BIT -> BOOLEAN.
+Результат можно получить в виде многострочных INSERT или блока COPY ... FROM STDIN.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Лексемы, из которых может состоять оператор загрузки данных
+_WHITESPACE_RE = re.compile(r'\s+')
+_LINE_COMMENT_RE = re.compile(r'--[^\n]*')
+_BLOCK_COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+_GO_RE = re.compile(r'GO\b[ \t]*(?:\d+)?', re.IGNORECASE)
+_KEYWORD_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_IDENTIFIER_PART_RE = re.compile(r'\[([^\]]+)\]|"([^"]+)"|([A-Za-z_@#][A-Za-z0-9_@#$]*)')
+_NUMBER_RE = re.compile(r'[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?')
+_STRING_RE = re.compile(r"[Nn]?'((?:[^']|'')*)'")
+_BINARY_RE = re.compile(r'0[xX]([0-9A-Fa-f]*)')
+_CAST_RE = re.compile(
+    r"CAST\s*\(\s*[Nn]?'((?:[^']|'')*)'\s+AS\s+([A-Za-z0-9_]+)(?:\s*\([^)]*\))?\s*\)",
+    re.IGNORECASE
+)
+_CONVERT_RE = re.compile(
+    r"CONVERT\s*\(\s*([A-Za-z0-9_]+)(?:\s*\([^)]*\))?\s*,\s*[Nn]?'((?:[^']|'')*)'\s*(?:,\s*\d+\s*)?\)",
+    re.IGNORECASE
+)
+_NOW_RE = re.compile(r'(?:GETDATE|SYSDATETIME|CURRENT_TIMESTAMP)\s*(?:\(\s*\))?', re.IGNORECASE)
+_NEWID_RE = re.compile(r'NEWID\s*\(\s*\)', re.IGNORECASE)
+_DOT_RE = re.compile(r'\s*\.\s*')
+
+# Разбор CREATE TABLE для определения типов колонок
+_CREATE_TABLE_RE = re.compile(
+    r'CREATE\s+TABLE\s+((?:\[[^\]]+\]|"[^"]+"|[\w#@$]+)(?:\s*\.\s*(?:\[[^\]]+\]|"[^"]+"|[\w#@$]+))*)\s*\(',
+    re.IGNORECASE
+)
+_COLUMN_DEF_RE = re.compile(r'\s*(?:\[([^\]]+)\]|"([^"]+)"|([A-Za-z_][\w$#@]*))\s+\[?([A-Za-z_][A-Za-z0-9_]*)\]?')
+_CONSTRAINT_WORDS = {'CONSTRAINT', 'PRIMARY', 'UNIQUE', 'FOREIGN', 'CHECK', 'INDEX', 'KEY'}
+# Имя, которое PostgreSQL принимает без кавычек (если оно не зарезервировано)
+_PLAIN_IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_$]*')
+# Зарезервированные слова PostgreSQL, которые нельзя использовать как имя без кавычек
+_RESERVED_WORDS = frozenset("""
+    ALL ANALYSE ANALYZE AND ANY ARRAY AS ASC ASYMMETRIC AUTHORIZATION BINARY BOTH CASE CAST CHECK
+    COLLATE COLLATION COLUMN CONCURRENTLY CONSTRAINT CREATE CROSS CURRENT_CATALOG CURRENT_DATE
+    CURRENT_ROLE CURRENT_SCHEMA CURRENT_TIME CURRENT_TIMESTAMP CURRENT_USER DEFAULT DEFERRABLE DESC
+    DISTINCT DO ELSE END EXCEPT FALSE FETCH FOR FOREIGN FREEZE FROM FULL GRANT GROUP HAVING ILIKE IN
+    INITIALLY INNER INTERSECT INTO IS ISNULL JOIN LATERAL LEADING LEFT LIKE LIMIT LOCALTIME
+    LOCALTIMESTAMP NATURAL NOT NOTNULL NULL OFFSET ON ONLY OR ORDER OUTER OVERLAPS PLACING PRIMARY
+    REFERENCES RETURNING RIGHT SELECT SESSION_USER SIMILAR SOME SYMMETRIC SYSTEM_USER TABLE
+    TABLESAMPLE THEN TO TRAILING TRUE UNION UNIQUE USER USING VARIADIC VERBOSE WHEN WHERE WINDOW WITH
+""".split())
+
+# Форматы дат MS SQL, которые приводятся к ISO-виду
+_DATE_FORMATS = [
+    # 20230131 или 20230131 10:20:30.123
+    (re.compile(r'^(\d{4})(\d{2})(\d{2})(?:[ T](\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?))?$'), 'ymd'),
+    # 2023-01-31T10:20:30.123
+    (re.compile(r'^(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?))?$'), 'ymd'),
+    # 01/31/2023 (как в SQLConverter._convert_date_formats)
+    (re.compile(r'^(\d{2})/(\d{2})/(\d{4})(?: (\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?))?$'), 'mdy'),
+]
+
+DATETIME_TYPES = {'DATETIME', 'DATETIME2', 'SMALLDATETIME', 'DATE', 'DATETIMEOFFSET', 'TIMESTAMP'}
+BIT_TYPES = {'BIT', 'BOOLEAN'}
+
+
+class _ParseError(Exception):
+    """Блок не является оператором загрузки данных, который можно обработать без AI"""
+
+
+class _Value:
+    """Значение из списка VALUES"""
+
+    __slots__ = ('kind', 'text')
+
+    def __init__(self, kind: str, text: Optional[str] = None):
+        # kind: null | number | string | binary | datetime | now | uuid
+        self.kind = kind
+        self.text = text
+
+
+class DataLoadStatement:
+    """Разобранный оператор INSERT ... VALUES"""
+
+    def __init__(self, table: str, columns: List[str], rows: List[List[_Value]],
+                 leading: str = '', trailing: str = '', table_parts: Optional[List[str]] = None):
+        self.table = table
+        # Части имени таблицы (_Identifier) для вывода с кавычками
+        self.table_parts = table_parts or table.split('.')
+        self.columns = columns
+        self.rows = rows
+        self.leading = leading
+        self.trailing = trailing
+
+
+class _Identifier(str):
+    """Часть имени; delimited — имя было в квадратных скобках или кавычках"""
+
+    delimited = False
+
+    def __new__(cls, name: str, delimited: bool = False):
+        identifier = super().__new__(cls, name)
+        identifier.delimited = delimited
+        return identifier
+
+
+def _identifier(match) -> _Identifier:
+    """Часть имени из совпадения с группами [имя], "имя" и имя"""
+    if match.group(3) is None:
+        return _Identifier(match.group(1) or match.group(2), delimited=True)
+    return _Identifier(match.group(3))
+
+
+def _quote_identifier(name: str) -> str:
+    """
+    Часть имени для PostgreSQL: в кавычках, если она была в скобках или кавычках,
+    зарезервирована или содержит пробелы и другие символы. Остальные имена выводятся
+    без кавычек и приводятся к нижнему регистру так же, как в DDL из правил и нейросети
+    """
+    if (getattr(name, 'delimited', False) or name.upper() in _RESERVED_WORDS
+            or not _PLAIN_IDENTIFIER_RE.fullmatch(name)):
+        return '"' + name.replace('"', '""') + '"'
+    return name
+
+
+def _normalize_identifier(name: str) -> str:
+    """Убирает квадратные скобки и кавычки из составного идентификатора"""
+    parts = []
+    for part in re.split(r'\s*\.\s*', name.strip()):
+        part = part.strip()
+        if part.startswith('[') and part.endswith(']'):
+            part = part[1:-1]
+        elif part.startswith('"') and part.endswith('"'):
+            part = part[1:-1]
+        parts.append(part)
+    return '.'.join(parts)
+
+
+def normalize_date_literal(value: str) -> Optional[str]:
+    """
+    Приводит строковое представление даты MS SQL к ISO-формату PostgreSQL
+
+    Args:
+        value: Строка даты без кавычек
+
+    Returns:
+        Optional[str]: Дата в формате YYYY-MM-DD[ HH:MM:SS] или None, если формат не распознан
+    """
+    value = value.strip()
+    for pattern, order in _DATE_FORMATS:
+        match = pattern.match(value)
+        if not match:
+            continue
+        if order == 'ymd':
+            year, month, day, time_part = match.groups()
+        else:
+            month, day, year, time_part = match.groups()
+        result = f"{year}-{month}-{day}"
+        if time_part:
+            result += f" {time_part}"
+        return result
+    return None
+
+
+class DataLoadConverter:
+    """
+    Детерминированный конвертер блоков INSERT ... VALUES для больших скриптов.
+    Блоки, которые не удаётся разобрать как чистую загрузку литералов,
+    остаются для обработки нейросетью.
+    """
+
+    def __init__(self, config):
+        """
+        Инициализация с настройками из конфигурации
+
+        Args:
+            config: Объект конфигурации
+        """
+        self.config = config
+        self.output_format = str(getattr(config, 'DATA_LOAD_OUTPUT_FORMAT', 'insert')).lower()
+        self.batch_rows = int(getattr(config, 'DATA_LOAD_BATCH_ROWS', 1000))
+
+    # ------------------------------------------------------------------
+    # Типы колонок
+    # ------------------------------------------------------------------
+
+    def collect_column_types(self, script: str) -> Dict[str, List[Tuple[str, str]]]:
+        """
+        Собирает типы колонок из операторов CREATE TABLE скрипта
+
+        Args:
+            script: Полный текст MS SQL скрипта
+
+        Returns:
+            Dict[str, List[Tuple[str, str]]]: {таблица_в_нижнем_регистре: [(колонка, ТИП), ...]}
+        """
+        tables = {}
+        for match in _CREATE_TABLE_RE.finditer(script):
+            table = _normalize_identifier(match.group(1)).lower()
+            body = self._read_parenthesized(script, match.end() - 1)
+            if body is None:
+                continue
+            columns = []
+            for definition in self._split_top_level(body):
+                def_match = _COLUMN_DEF_RE.match(definition)
+                if not def_match:
+                    continue
+                column = _identifier(def_match)
+                if column.upper() in _CONSTRAINT_WORDS:
+                    continue
+                columns.append((column, def_match.group(4).upper()))
+            tables[table] = columns
+            # Таблицы без схемы ищутся и по короткому имени
+            tables.setdefault(table.split('.')[-1], columns)
+        return tables
+
+    @staticmethod
+    def _read_parenthesized(text: str, open_pos: int) -> Optional[str]:
+        """Возвращает содержимое скобок, начинающихся в позиции open_pos"""
+        depth = 0
+        i = open_pos
+        while i < len(text):
+            char = text[i]
+            if char == "'":
+                end = text.find("'", i + 1)
+                while end != -1 and text[end + 1:end + 2] == "'":
+                    end = text.find("'", end + 2)
+                if end == -1:
+                    return None
+                i = end
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+                if depth == 0:
+                    return text[open_pos + 1:i]
+            i += 1
+        return None
+
+    @staticmethod
+    def _split_top_level(body: str) -> List[str]:
+        """Разделяет определение таблицы на колонки по запятым верхнего уровня"""
+        parts = []
+        depth = 0
+        start = 0
+        body = _BLOCK_COMMENT_RE.sub(' ', body)
+        body = _LINE_COMMENT_RE.sub(' ', body)
+        for i, char in enumerate(body):
+            if char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+            elif char == ',' and depth == 0:
+                parts.append(body[start:i])
+                start = i + 1
+        parts.append(body[start:])
+        return [p for p in parts if p.strip()]
+
+    # ------------------------------------------------------------------
+    # Разбор оператора INSERT
+    # ------------------------------------------------------------------
+
+    def parse_block(self, block: str) -> Optional[DataLoadStatement]:
+        """
+        Разбирает логический блок как оператор INSERT ... VALUES с литералами
+
+        Args:
+            block: Логический блок SQL
+
+        Returns:
+            Optional[DataLoadStatement]: Разобранный оператор или None,
+            если блок нельзя обработать детерминированно
+        """
+        try:
+            return self._parse(block)
+        except _ParseError:
+            return None
+
+    def is_data_load_block(self, block: str) -> bool:
+        """Проверяет, можно ли сконвертировать блок без нейросети"""
+        return self.parse_block(block) is not None
+
+    def _parse(self, text: str) -> DataLoadStatement:
+        pos = self._skip_trivia(text, 0)
+        leading = text[:pos]
+
+        pos = self._expect_keyword(text, pos, 'INSERT')
+        pos = self._skip_trivia(text, pos)
+        keyword = _KEYWORD_RE.match(text, pos)
+        if keyword and keyword.group(0).upper() == 'INTO':
+            pos = self._skip_trivia(text, keyword.end())
+
+        table_parts, pos = self._read_table_name(text, pos)
+        table = '.'.join(table_parts)
+        pos = self._skip_trivia(text, pos)
+
+        columns = []
+        if text.startswith('(', pos):
+            columns, pos = self._read_column_list(text, pos)
+            pos = self._skip_trivia(text, pos)
+
+        pos = self._expect_keyword(text, pos, 'VALUES')
+
+        rows = []
+        while True:
+            pos = self._skip_trivia(text, pos)
+            row, pos = self._read_row(text, pos)
+            if columns and len(row) != len(columns):
+                raise _ParseError("Количество значений не совпадает с количеством колонок")
+            rows.append(row)
+            pos = self._skip_trivia(text, pos)
+            if text.startswith(',', pos):
+                pos += 1
+                continue
+            break
+
+        if text.startswith(';', pos):
+            pos += 1
+
+        # После оператора допускаются только комментарии, пробелы и разделители GO
+        trailing = []
+        while True:
+            trivia_end = self._skip_trivia(text, pos)
+            if trivia_end != pos:
+                trailing.append(text[pos:trivia_end])
+                pos = trivia_end
+            go_match = _GO_RE.match(text, pos)
+            if go_match:
+                pos = go_match.end()
+                continue
+            break
+        if pos != len(text):
+            raise _ParseError("После VALUES найдены другие конструкции")
+
+        return DataLoadStatement(table, columns, rows, leading, ''.join(trailing).rstrip(), table_parts)
+
+    @staticmethod
+    def _skip_trivia(text: str, pos: int) -> int:
+        """Пропускает пробелы и комментарии"""
+        while pos < len(text):
+            match = (_WHITESPACE_RE.match(text, pos) or _LINE_COMMENT_RE.match(text, pos)
+                     or _BLOCK_COMMENT_RE.match(text, pos))
+            if not match:
+                break
+            pos = match.end()
+        return pos
+
+    @staticmethod
+    def _expect_keyword(text: str, pos: int, keyword: str) -> int:
+        match = _KEYWORD_RE.match(text, pos)
+        if not match or match.group(0).upper() != keyword:
+            raise _ParseError(f"Ожидалось ключевое слово {keyword}")
+        return match.end()
+
+    def _read_table_name(self, text: str, pos: int) -> Tuple[List[_Identifier], int]:
+        parts = []
+        while True:
+            match = _IDENTIFIER_PART_RE.match(text, pos)
+            if not match:
+                raise _ParseError("Не удалось прочитать имя таблицы")
+            part = _identifier(match)
+            # Временные таблицы и табличные переменные требуют конвертации через AI
+            if part.startswith('#') or part.startswith('@'):
+                raise _ParseError("Временная таблица или табличная переменная")
+            if part.upper() == 'VALUES' or part.upper() == 'SELECT':
+                raise _ParseError("Не указано имя таблицы")
+            parts.append(part)
+            pos = match.end()
+            dot = _DOT_RE.match(text, pos)
+            if dot:
+                pos = dot.end()
+                continue
+            break
+        return parts, pos
+
+    def _read_column_list(self, text: str, pos: int) -> Tuple[List[str], int]:
+        pos += 1
+        columns = []
+        while True:
+            pos = self._skip_trivia(text, pos)
+            match = _IDENTIFIER_PART_RE.match(text, pos)
+            if not match:
+                raise _ParseError("Не удалось прочитать список колонок")
+            columns.append(_identifier(match))
+            pos = self._skip_trivia(text, match.end())
+            if text.startswith(',', pos):
+                pos += 1
+                continue
+            if text.startswith(')', pos):
+                return columns, pos + 1
+            raise _ParseError("Некорректный список колонок")
+
+    def _read_row(self, text: str, pos: int) -> Tuple[List[_Value], int]:
+        if not text.startswith('(', pos):
+            raise _ParseError("Ожидался набор значений")
+        pos += 1
+        row = []
+        while True:
+            pos = self._skip_trivia(text, pos)
+            value, pos = self._read_value(text, pos)
+            row.append(value)
+            pos = self._skip_trivia(text, pos)
+            if text.startswith(',', pos):
+                pos += 1
+                continue
+            if text.startswith(')', pos):
+                return row, pos + 1
+            raise _ParseError("Значение не является литералом")
+
+    def _read_value(self, text: str, pos: int) -> Tuple[_Value, int]:
+        match = _STRING_RE.match(text, pos)
+        if match:
+            return _Value('string', match.group(1).replace("''", "'")), match.end()
+        match = _BINARY_RE.match(text, pos)
+        if match:
+            return _Value('binary', match.group(1).upper()), match.end()
+        match = _NUMBER_RE.match(text, pos)
+        if match:
+            return _Value('number', match.group(0)), match.end()
+        match = _CAST_RE.match(text, pos)
+        if match:
+            return self._typed_string(match.group(1), match.group(2)), match.end()
+        match = _CONVERT_RE.match(text, pos)
+        if match:
+            return self._typed_string(match.group(2), match.group(1)), match.end()
+        match = _NOW_RE.match(text, pos)
+        if match:
+            return _Value('now'), match.end()
+        match = _NEWID_RE.match(text, pos)
+        if match:
+            return _Value('uuid'), match.end()
+        match = _KEYWORD_RE.match(text, pos)
+        if match and match.group(0).upper() == 'NULL':
+            return _Value('null'), match.end()
+        raise _ParseError("Значение не является литералом")
+
+    @staticmethod
+    def _typed_string(value: str, type_name: str) -> _Value:
+        value = value.replace("''", "'")
+        if type_name.upper() in DATETIME_TYPES:
+            normalized = normalize_date_literal(value)
+            if normalized is None:
+                raise _ParseError(f"Не удалось распознать дату '{value}'")
+            return _Value('datetime', normalized)
+        return _Value('string', value)
+
+    # ------------------------------------------------------------------
+    # Генерация результата
+    # ------------------------------------------------------------------
+
+    def convert_block(self, block: str, column_types: Optional[Dict[str, List[Tuple[str, str]]]] = None,
+                      output_format: Optional[str] = None) -> Optional[str]:
+        """
+        Конвертирует блок загрузки данных в PostgreSQL без обращения к нейросети
+
+        Args:
+            block: Логический блок SQL (INSERT ... VALUES)
+            column_types: Типы колонок, собранные collect_column_types
+            output_format: 'insert' или 'copy' (по умолчанию из конфигурации)
+
+        Returns:
+            Optional[str]: Сконвертированный SQL или None, если блок нужно отправить в AI
+        """
+        statement = self.parse_block(block)
+        if statement is None:
+            return None
+
+        output_format = (output_format or self.output_format).lower()
+        types = self._resolve_column_types(statement, column_types or {})
+        columns = statement.columns or [name for name, _ in (column_types or {}).get(statement.table.lower(), [])]
+
+        # COPY возможен только для чистых литералов и известного списка колонок
+        if output_format == 'copy' and any(v.kind in ('now', 'uuid') for row in statement.rows for v in row):
+            output_format = 'insert'
+
+        if output_format == 'copy':
+            body = self._render_copy(statement, columns, types)
+        else:
+            body = self._render_insert(statement, columns, types)
+
+        parts = []
+        if statement.leading.strip():
+            parts.append(statement.leading.rstrip())
+        parts.append(body)
+        if statement.trailing.strip():
+            parts.append(statement.trailing.strip())
+        return "\n".join(parts)
+
+    def _resolve_column_types(self, statement: DataLoadStatement,
+                              column_types: Dict[str, List[Tuple[str, str]]]) -> List[Optional[str]]:
+        """Определяет типы значений по позиции в строке"""
+        table_columns = column_types.get(statement.table.lower()) or \
+            column_types.get(statement.table.split('.')[-1].lower()) or []
+        by_name = {name.lower(): col_type for name, col_type in table_columns}
+        width = len(statement.rows[0]) if statement.rows else 0
+        if statement.columns:
+            return [by_name.get(column.lower()) for column in statement.columns]
+        return [table_columns[i][1] if i < len(table_columns) else None for i in range(width)]
+
+    def _format_value(self, value: _Value, col_type: Optional[str]) -> str:
+        """Форматирует значение как литерал PostgreSQL"""
+        col_type = (col_type or '').upper()
+        if value.kind == 'null':
+            return 'NULL'
+        if value.kind == 'now':
+            return 'CURRENT_TIMESTAMP'
+        if value.kind == 'uuid':
+            return 'gen_random_uuid()'
+        if value.kind == 'binary':
+            return f"'\\x{value.text}'::bytea"
+        if value.kind == 'datetime':
+            return f"'{value.text}'::timestamp"
+        if col_type in BIT_TYPES:
+            boolean = self._to_boolean(value)
+            if boolean is not None:
+                return boolean
+        if value.kind == 'number':
+            return value.text
+        text = value.text
+        if col_type in DATETIME_TYPES:
+            text = normalize_date_literal(text) or text
+        return "'" + text.replace("'", "''") + "'"
+
+    def _format_copy_value(self, value: _Value, col_type: Optional[str]) -> str:
+        """Форматирует значение для текстового формата COPY"""
+        col_type = (col_type or '').upper()
+        if value.kind == 'null':
+            return '\\N'
+        if value.kind == 'binary':
+            return '\\\\x' + value.text
+        if col_type in BIT_TYPES:
+            boolean = self._to_boolean(value)
+            if boolean is not None:
+                return 't' if boolean == 'true' else 'f'
+        text = value.text
+        if value.kind == 'string' and col_type in DATETIME_TYPES:
+            text = normalize_date_literal(text) or text
+        return (text.replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+
+    @staticmethod
+    def _to_boolean(value: _Value) -> Optional[str]:
+        text = (value.text or '').strip().lower()
+        if text in ('1', 'true'):
+            return 'true'
+        if text in ('0', 'false'):
+            return 'false'
+        return None
+
+    def _column_clause(self, columns: List[str]) -> str:
+        return f" ({', '.join(_quote_identifier(column) for column in columns)})" if columns else ''
+
+    @staticmethod
+    def _table_name(statement: DataLoadStatement) -> str:
+        return '.'.join(_quote_identifier(part) for part in statement.table_parts)
+
+    def _render_insert(self, statement: DataLoadStatement, columns: List[str],
+                       types: List[Optional[str]]) -> str:
+        """Формирует многострочные INSERT пачками по batch_rows строк"""
+        header = f"INSERT INTO {self._table_name(statement)}{self._column_clause(statement.columns)} VALUES"
+        statements = []
+        batch_rows = max(1, self.batch_rows)
+        for start in range(0, len(statement.rows), batch_rows):
+            rows = statement.rows[start:start + batch_rows]
+            rendered = []
+            for row in rows:
+                values = [self._format_value(v, types[i] if i < len(types) else None)
+                          for i, v in enumerate(row)]
+                rendered.append(f"({', '.join(values)})")
+            statements.append(header + "\n" + ",\n".join(rendered) + ";")
+        return "\n".join(statements)
+
+    def _render_copy(self, statement: DataLoadStatement, columns: List[str],
+                     types: List[Optional[str]]) -> str:
+        """Формирует блок COPY ... FROM STDIN в текстовом формате"""
+        lines = [f"COPY {self._table_name(statement)}{self._column_clause(columns)} FROM STDIN;"]
+        for row in statement.rows:
+            lines.append("\t".join(self._format_copy_value(v, types[i] if i < len(types) else None)
+                                   for i, v in enumerate(row)))
+        lines.append("\\.")
+        return "\n".join(lines)
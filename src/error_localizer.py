@@ -0,0 +1,135 @@
+"""
+Модуль для локализации ошибок PostgreSQL в скрипте.
+По сообщению об ошибке (``psql:<файл>:<строка>:``, ``LINE n:``) определяет оператор,
+на котором остановилось выполнение, чтобы отправлять нейросети на исправление
+только этот фрагмент и вставлять исправление обратно в скрипт.
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+from src.pg_pool import statement_spans
+
+_PSQL_LINE_RE = re.compile(r'psql:[^\n:]*:(\d+):')
+_LINE_SNIPPET_RE = re.compile(r'^(?:LINE|СТРОКА) (\d+):\s?(.*)$', re.MULTILINE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Грубая оценка количества токенов в тексте (около 4 символов на токен)
+
+    Args:
+        text: Текст
+
+    Returns:
+        int: Оценка количества токенов
+    """
+    return (len(text) + 3) // 4
+
+
+class ErrorFragment:
+    """Фрагмент скрипта (один оператор), в котором возникла ошибка"""
+
+    def __init__(self, script: str, start: int, end: int, start_line: int, index: int, total: int):
+        self.script = script
+        self.start = start
+        self.end = end
+        self.start_line = start_line
+        self.index = index
+        self.total = total
+
+    @property
+    def text(self) -> str:
+        return self.script[self.start:self.end]
+
+    @property
+    def end_line(self) -> int:
+        return self.start_line + self.text.count('\n')
+
+    def context(self, lines: int) -> Tuple[str, str]:
+        """
+        Возвращает строки скрипта до и после фрагмента
+
+        Args:
+            lines: Количество строк контекста с каждой стороны
+
+        Returns:
+            Tuple[str, str]: (контекст до, контекст после)
+        """
+        if lines <= 0:
+            return '', ''
+        before = self.script[:self.start].rstrip('\n').split('\n')[-lines:]
+        after = self.script[self.end:].lstrip('\n').split('\n')[:lines]
+        return '\n'.join(before).strip('\n'), '\n'.join(after).strip('\n')
+
+    def splice(self, replacement: str) -> str:
+        """
+        Вставляет исправленный фрагмент на место исходного
+
+        Args:
+            replacement: Исправленный текст фрагмента
+
+        Returns:
+            str: Скрипт с замененным фрагментом
+        """
+        replacement = replacement.strip()
+        # Нейросеть может вернуть оператор без завершающей точки с запятой
+        if self.text.rstrip().endswith(';') and not replacement.endswith(';'):
+            replacement += ';'
+        return self.script[:self.start] + replacement + self.script[self.end:]
+
+
+def _line_offsets(script: str) -> List[int]:
+    offsets = [0]
+    for match in re.finditer('\n', script):
+        offsets.append(match.end())
+    return offsets
+
+
+def locate_error(script: str, error_message: str) -> Optional[ErrorFragment]:
+    """
+    Определяет оператор скрипта, в котором возникла ошибка
+
+    Сначала используется номер строки из префикса ``psql:<файл>:<строка>:``, затем
+    текст строки из ``LINE n:``, который ищется в операторах скрипта.
+
+    Args:
+        script: Скрипт, который выполнялся
+        error_message: Сообщение об ошибке в формате psql
+
+    Returns:
+        Optional[ErrorFragment]: Фрагмент с ошибкой или None, если определить не удалось
+    """
+    if not error_message:
+        return None
+    spans = statement_spans(script)
+    if not spans:
+        return None
+
+    offset = None
+    match = _PSQL_LINE_RE.search(error_message)
+    if match:
+        line = int(match.group(1))
+        offsets = _line_offsets(script)
+        if 1 <= line <= len(offsets):
+            offset = offsets[line - 1]
+
+    if offset is None:
+        snippet_match = _LINE_SNIPPET_RE.search(error_message)
+        snippet = snippet_match.group(2).strip() if snippet_match else ''
+        # PostgreSQL обрезает длинные строки многоточием
+        snippet = snippet.strip('.').strip()
+        if len(snippet) >= 8:
+            candidates = [i for i, (start, end, _) in enumerate(spans) if snippet in script[start:end]]
+            if len(candidates) == 1:
+                index = candidates[0]
+                start, end, line = spans[index]
+                return ErrorFragment(script, start, end, line, index, len(spans))
+        return None
+
+    # Оператор, содержащий строку; если строка между операторами — ближайший следующий
+    for index, (start, end, line) in enumerate(spans):
+        if offset < end:
+            return ErrorFragment(script, start, end, line, index, len(spans))
+    start, end, line = spans[-1]
+    return ErrorFragment(script, start, end, line, len(spans) - 1, len(spans))
@@ -0,0 +1,225 @@
+"""
+Модуль для хранения проверенных конвертаций (исходный MS SQL → проверенный PostgreSQL)
+и поиска похожих на новый скрипт. Похожие пары добавляются в промпт как примеры.
+Сходство оценивается по MinHash от шинглов нормализованного SQL, кандидаты
+отбираются через LSH-корзины, поэтому поиск не перебирает все примеры.
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.prompt_compactor import compact_sql
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_STRING_RE = re.compile(r"N?'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+
+def normalize_sql(script: str) -> List[str]:
+    """
+    Приводит SQL к последовательности лексем для сравнения: без комментариев,
+    в нижнем регистре, строковые литералы и числа заменены заглушками,
+    квадратные скобки и кавычки идентификаторов убраны
+
+    Args:
+        script: SQL-скрипт
+
+    Returns:
+        List[str]: Лексемы
+    """
+    text = compact_sql(script).text.lower()
+    text = _STRING_RE.sub(" '?' ", text)
+    text = _NUMBER_RE.sub('0', text)
+    return [token for token in _TOKEN_RE.findall(text) if token not in ('[', ']', '"')]
+
+
+def shingles(tokens: List[str], size: int = 3) -> set:
+    """Хэши шинглов — последовательностей из size лексем"""
+    if len(tokens) < size:
+        tokens = tokens + [''] * (size - len(tokens))
+    result = set()
+    for i in range(len(tokens) - size + 1):
+        digest = hashlib.blake2b(' '.join(tokens[i:i + size]).encode('utf-8'), digest_size=4).digest()
+        result.add(int.from_bytes(digest, 'little'))
+    return result
+
+
+class MinHasher:
+    """MinHash-сигнатуры фиксированной длины с воспроизводимыми хэш-функциями"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [(rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+                        for _ in range(num_perm)]
+
+    def signature(self, values: set) -> List[int]:
+        if not values:
+            return [_MAX_HASH] * self.num_perm
+        return [min(((a * v + b) % _MERSENNE_PRIME) & _MAX_HASH for v in values) for a, b in self._params]
+
+
+def similarity(first: List[int], second: List[int]) -> float:
+    """Оценка коэффициента Жаккара по двум сигнатурам"""
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+class ConversionExample:
+    """Проверенная пара: исходный скрипт и его конвертация"""
+
+    def __init__(self, original: str, converted: str, signature: List[int], key: str):
+        self.original = original
+        self.converted = converted
+        self.signature = signature
+        self.key = key
+
+    def as_dict(self) -> dict:
+        return {'key': self.key, 'original': self.original, 'converted': self.converted,
+                'signature': self.signature}
+
+
+class ExampleStore:
+    """
+    Потокобезопасное хранилище проверенных конвертаций с поиском похожих
+
+    Args:
+        path: JSONL-файл для сохранения между запусками (None — только в памяти)
+        num_perm: Длина MinHash-сигнатуры
+        bands: Количество LSH-корзин (num_perm должно делиться на bands);
+            больше корзин — ниже порог сходства для попадания в кандидаты
+        shingle_size: Длина шингла в лексемах
+        max_chars: Пары длиннее этого (по любой стороне) не сохраняются, чтобы не раздувать промпт
+    """
+
+    def __init__(self, path: Optional[str] = None, num_perm: int = 64, bands: int = 32,
+                 shingle_size: int = 3, max_chars: int = 4000):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) должно делиться на bands ({bands})")
+        self.path = Path(path) if path else None
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_chars = max_chars
+        self.hasher = MinHasher(num_perm)
+        self.examples: List[ConversionExample] = []
+        self._keys = set()
+        self._buckets: Dict[Tuple[int, tuple], List[int]] = {}
+        self._lock = threading.Lock()
+        if self.path and self.path.exists():
+            self._load()
+
+    def __len__(self):
+        return len(self.examples)
+
+    def _signature(self, script: str) -> List[int]:
+        return self.hasher.signature(shingles(normalize_sql(script), self.shingle_size))
+
+    def _band_keys(self, signature: List[int]):
+        for band in range(self.bands):
+            yield band, tuple(signature[band * self.rows:(band + 1) * self.rows])
+
+    def _index(self, example: ConversionExample):
+        position = len(self.examples)
+        self.examples.append(example)
+        self._keys.add(example.key)
+        for band_key in self._band_keys(example.signature):
+            self._buckets.setdefault(band_key, []).append(position)
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                signature = data.get('signature')
+                if not signature or len(signature) != self.hasher.num_perm:
+                    signature = self._signature(data['original'])
+                if data['key'] not in self._keys:
+                    self._index(ConversionExample(data['original'], data['converted'], signature, data['key']))
+
+    def add(self, original: str, converted: str) -> bool:
+        """
+        Сохраняет проверенную конвертацию
+
+        Args:
+            original: Исходный MS SQL скрипт
+            converted: Скрипт PostgreSQL, прошедший проверку
+
+        Returns:
+            bool: True, если пара добавлена (не слишком длинная и не повтор)
+        """
+        if not original.strip() or len(original) > self.max_chars or len(converted) > self.max_chars:
+            return False
+        tokens = normalize_sql(original)
+        key = hashlib.sha256(' '.join(tokens).encode('utf-8')).hexdigest()
+        signature = self.hasher.signature(shingles(tokens, self.shingle_size))
+        example = ConversionExample(original, converted, signature, key)
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._index(example)
+            if self.path:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(example.as_dict(), ensure_ascii=False) + '\n')
+        return True
+
+    def search(self, script: str, top_k: int = 2, min_similarity: float = 0.2) -> List[Tuple[float, ConversionExample]]:
+        """
+        Находит самые похожие проверенные конвертации
+
+        Args:
+            script: Скрипт для конвертации
+            top_k: Сколько примеров вернуть
+            min_similarity: Минимальная оценка сходства
+
+        Returns:
+            List[Tuple[float, ConversionExample]]: (сходство, пример) по убыванию сходства
+        """
+        if top_k <= 0 or not self.examples:
+            return []
+        signature = self._signature(script)
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(signature):
+                candidates.update(self._buckets.get(band_key, ()))
+            scored = [(similarity(signature, self.examples[i].signature), self.examples[i]) for i in candidates]
+        scored = [(score, example) for score, example in scored if score >= min_similarity]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:top_k]
+
+
+_stores: Dict[str, ExampleStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_example_store(config) -> Optional[ExampleStore]:
+    """
+    Возвращает общее для всех потоков хранилище примеров (None, если поиск отключен)
+
+    Args:
+        config: Объект конфигурации
+
+    Returns:
+        Optional[ExampleStore]: Хранилище
+    """
+    if getattr(config, 'AI_EXAMPLES_TOP_K', 0) <= 0:
+        return None
+    path = getattr(config, 'AI_EXAMPLES_FILE', '') or ''
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = ExampleStore(path or None, max_chars=getattr(config, 'AI_EXAMPLES_MAX_CHARS', 4000))
+            _stores[path] = store
+        return store
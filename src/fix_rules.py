@@ -0,0 +1,308 @@
+"""
+Модуль для правил исправления, выученных на исправлениях нейросети.
+Для каждого успешного исправления запоминается нормализованная сигнатура ошибки
+PostgreSQL и минимальная правка (фрагмент до → фрагмент после). Правка, которая
+повторилась для той же ошибки LEARNED_FIX_RULES_PROMOTE_AFTER раз, становится
+детерминированным правилом и применяется до обращения к нейросети.
+Правила хранятся в JSON-файле и просматриваются, включаются и отключаются
+через manage_fix_rules.py.
+"""
+
+import difflib
+import hashlib
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.prompt_compactor import compact_sql
+
+STATUS_CANDIDATE = 'candidate'
+STATUS_ENABLED = 'enabled'
+STATUS_DISABLED = 'disabled'
+STATUSES = (STATUS_CANDIDATE, STATUS_ENABLED, STATUS_DISABLED)
+
+# Ограничения на размер выучиваемой правки (в лексемах) и количество правок в исправлении
+MAX_BEFORE_TOKENS = 6
+MAX_AFTER_TOKENS = 12
+MAX_HUNKS = 3
+
+_TOKEN_RE = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|\w+|::|<>|<=|>=|!=|\|\||\S")
+_ERROR_LINE_RE = re.compile(r'(?:ERROR|ОШИБКА):\s*(.*)', re.IGNORECASE)
+
+
+def error_signature(error_message: str) -> str:
+    """
+    Нормализованная сигнатура ошибки: первая строка с ERROR без номеров строк,
+    имен в кавычках и чисел. Имена функций и типов сохраняются, так как от них
+    зависит исправление
+
+    Args:
+        error_message: Сообщение об ошибке PostgreSQL
+
+    Returns:
+        str: Сигнатура
+    """
+    if not error_message:
+        return ''
+    match = _ERROR_LINE_RE.search(error_message)
+    line = match.group(1) if match else error_message.strip().splitlines()[0]
+    line = line.splitlines()[0].lower()
+    line = re.sub(r'"[^"]*"', '"?"', line)
+    line = re.sub(r"'[^']*'", "'?'", line)
+    line = re.sub(r'\d+', '0', line)
+    return ' '.join(line.split())
+
+
+def _tokens(text: str) -> List[re.Match]:
+    return list(_TOKEN_RE.finditer(text))
+
+
+def minimal_edits(before: str, after: str) -> Optional[List[Tuple[str, str]]]:
+    """
+    Минимальные правки между версиями скрипта по лексемам (комментарии не учитываются)
+
+    Вставки и удаления дополняются соседней лексемой, чтобы правку было к чему привязать.
+
+    Args:
+        before: Скрипт с ошибкой
+        after: Исправленный скрипт
+
+    Returns:
+        Optional[List[Tuple[str, str]]]: [(фрагмент до, фрагмент после)] или None,
+        если правки слишком большие или их слишком много для обобщения
+    """
+    before_text, after_text = compact_sql(before).text, compact_sql(after).text
+    before_tokens, after_tokens = _tokens(before_text), _tokens(after_text)
+    matcher = difflib.SequenceMatcher(
+        None,
+        [t.group(0).lower() for t in before_tokens],
+        [t.group(0).lower() for t in after_tokens],
+        autojunk=False,
+    )
+    edits = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        if i1 == i2 or j1 == j2:
+            # Вставка или удаление: добавляем лексему слева (или справа в начале скрипта)
+            if i1 > 0 and j1 > 0:
+                i1, j1 = i1 - 1, j1 - 1
+            elif i2 < len(before_tokens) and j2 < len(after_tokens):
+                i2, j2 = i2 + 1, j2 + 1
+            else:
+                return None
+        if i2 - i1 > MAX_BEFORE_TOKENS or j2 - j1 > MAX_AFTER_TOKENS:
+            return None
+        edits.append((before_text[before_tokens[i1].start():before_tokens[i2 - 1].end()],
+                      after_text[after_tokens[j1].start():after_tokens[j2 - 1].end()]))
+    if not edits or len(edits) > MAX_HUNKS:
+        return None
+    return edits
+
+
+def _pattern(fragment: str) -> str:
+    """Регулярное выражение для фрагмента: лексемы через необязательные пробелы, без учета регистра"""
+    tokens = [t.group(0) for t in _TOKEN_RE.finditer(fragment)]
+    parts = []
+    for index, token in enumerate(tokens):
+        if index:
+            # Между двумя словами пробел обязателен
+            word_gap = re.match(r'\w', token) and re.search(r'\w$', tokens[index - 1])
+            parts.append(r'\s+' if word_gap else r'\s*')
+        parts.append(re.escape(token))
+    pattern = ''.join(parts)
+    if re.match(r'\w', tokens[0]):
+        pattern = r'(?<![\w@#$])' + pattern
+    if re.search(r'\w$', tokens[-1]):
+        pattern += r'(?![\w$])'
+    return pattern
+
+
+class LearnedRule:
+    """Правило исправления: сигнатура ошибки и замена фрагмента"""
+
+    def __init__(self, signature: str, before: str, after: str, status: str = STATUS_CANDIDATE,
+                 count: int = 0, applied: int = 0, hits: int = 0, created: float = None, rule_id: str = None):
+        self.signature = signature
+        self.before = before
+        self.after = after
+        self.status = status
+        # Сколько раз нейросеть сделала такое исправление
+        self.count = count
+        # Сколько раз правило применялось и сколько раз после него скрипт прошел проверку
+        self.applied = applied
+        self.hits = hits
+        self.created = created or time.time()
+        self.id = rule_id or hashlib.sha1(f"{signature}\n{before}\n{after}".encode('utf-8')).hexdigest()[:10]
+        self._regex = re.compile(_pattern(before), re.IGNORECASE)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.applied if self.applied else 0.0
+
+    def apply(self, script: str) -> str:
+        return self._regex.sub(lambda _: self.after, script)
+
+    def as_dict(self) -> dict:
+        return {'id': self.id, 'signature': self.signature, 'before': self.before, 'after': self.after,
+                'status': self.status, 'count': self.count, 'applied': self.applied, 'hits': self.hits,
+                'created': self.created}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'LearnedRule':
+        return cls(data['signature'], data['before'], data['after'], data.get('status', STATUS_CANDIDATE),
+                   data.get('count', 0), data.get('applied', 0), data.get('hits', 0), data.get('created'),
+                   data.get('id'))
+
+
+class FixRuleBook:
+    """
+    Потокобезопасный набор выученных правил с сохранением в JSON
+
+    Args:
+        path: Файл правил (None — только в памяти)
+        promote_after: После скольких одинаковых исправлений нейросети правило включается
+    """
+
+    def __init__(self, path: Optional[str] = None, promote_after: int = 2):
+        self.path = Path(path) if path else None
+        self.promote_after = promote_after
+        self.rules: Dict[str, LearnedRule] = {}
+        self._lock = threading.RLock()
+        if self.path and self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for data in json.load(f):
+                    rule = LearnedRule.from_dict(data)
+                    self.rules[rule.id] = rule
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            data = [rule.as_dict() for rule in sorted(self.rules.values(), key=lambda r: r.created)]
+            tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            tmp_path.replace(self.path)
+
+    def record_fix(self, error_message: str, before: str, after: str) -> List[LearnedRule]:
+        """
+        Запоминает успешное исправление нейросети
+
+        Args:
+            error_message: Исправленная ошибка
+            before: Скрипт с ошибкой
+            after: Скрипт после исправления
+
+        Returns:
+            List[LearnedRule]: Правила, которые впервые стали включенными
+        """
+        signature = error_signature(error_message)
+        edits = minimal_edits(before, after) if signature else None
+        if not edits:
+            return []
+        promoted = []
+        with self._lock:
+            for old, new in edits:
+                rule = LearnedRule(signature, old, new)
+                rule = self.rules.setdefault(rule.id, rule)
+                rule.count += 1
+                if rule.status == STATUS_CANDIDATE and rule.count >= self.promote_after:
+                    rule.status = STATUS_ENABLED
+                    promoted.append(rule)
+            self.save()
+        return promoted
+
+    def matching(self, error_message: str) -> List[LearnedRule]:
+        """Включенные правила для сигнатуры ошибки"""
+        signature = error_signature(error_message)
+        with self._lock:
+            return [rule for rule in self.rules.values()
+                    if rule.status == STATUS_ENABLED and rule.signature == signature]
+
+    def apply(self, script: str, error_message: str) -> Tuple[str, List[str]]:
+        """
+        Применяет включенные правила для ошибки
+
+        Args:
+            script: Скрипт с ошибкой
+            error_message: Сообщение об ошибке PostgreSQL
+
+        Returns:
+            Tuple[str, List[str]]: (скрипт, идентификаторы примененных правил)
+        """
+        applied = []
+        for rule in self.matching(error_message):
+            patched = rule.apply(script)
+            if patched != script:
+                script = patched
+                applied.append(rule.id)
+        if applied:
+            with self._lock:
+                for rule_id in applied:
+                    self.rules[rule_id].applied += 1
+                self.save()
+        return script, applied
+
+    def mark_hit(self, rule_ids: List[str]):
+        """Отмечает, что после применения правил скрипт прошел проверку"""
+        if not rule_ids:
+            return
+        with self._lock:
+            for rule_id in rule_ids:
+                if rule_id in self.rules:
+                    self.rules[rule_id].hits += 1
+            self.save()
+
+    def find(self, prefix: str) -> Optional[LearnedRule]:
+        """Правило по идентификатору или его началу"""
+        with self._lock:
+            found = [rule for rule_id, rule in self.rules.items() if rule_id.startswith(prefix)]
+        return found[0] if len(found) == 1 else None
+
+    def set_status(self, rule_id: str, status: str) -> Optional[LearnedRule]:
+        if status not in STATUSES:
+            raise ValueError(f"Неизвестный статус правила: {status}")
+        rule = self.find(rule_id)
+        if rule is not None:
+            with self._lock:
+                rule.status = status
+                self.save()
+        return rule
+
+    def remove(self, rule_id: str) -> Optional[LearnedRule]:
+        rule = self.find(rule_id)
+        if rule is not None:
+            with self._lock:
+                del self.rules[rule.id]
+                self.save()
+        return rule
+
+
+_books: Dict[str, FixRuleBook] = {}
+_books_lock = threading.Lock()
+
+
+def get_fix_rule_book(config) -> Optional[FixRuleBook]:
+    """
+    Возвращает общий для всех потоков набор выученных правил (None, если они отключены)
+
+    Args:
+        config: Объект конфигурации
+
+    Returns:
+        Optional[FixRuleBook]: Набор правил
+    """
+    if not getattr(config, 'LEARNED_FIX_RULES', False):
+        return None
+    path = str(getattr(config, 'LEARNED_FIX_RULES_FILE', '') or '')
+    with _books_lock:
+        book = _books.get(path)
+        if book is None:
+            book = FixRuleBook(path or None, promote_after=getattr(config, 'LEARNED_FIX_RULES_PROMOTE_AFTER', 2))
+            _books[path] = book
+        return book
@@ -0,0 +1,390 @@
+"""
+Локальный HTTP-сервер, имитирующий API OpenAI (/v1/chat/completions)
+и Anthropic (/v1/messages). Нужен для проверки маршрутизации, переключения
+между провайдерами и потоковых ответов, а также для замеров пропускной
+способности пакетной обработки без обращения к платным API.
+
+Запуск:
+    python -m src.mock_llm_server --port 8700 --latency lognormal:-0.5,0.4 --error-rate 0.02
+Затем в .env:
+    OPENAI_BASE_URL=http://127.0.0.1:8700
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8700
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import os
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, List, Optional, Tuple, Union
+
+DEFAULT_RESPONSE = "```sql\nSELECT 1;\n```"
+
+_SQL_BLOCK_RE = re.compile(r'```sql\s*\n(.*?)```', re.DOTALL)
+
+
+class LatencyModel:
+    """
+    Распределение задержки ответа. Формат описания:
+        fixed:0.5            — всегда 0.5 с
+        uniform:0.2,1.5      — равномерно от 0.2 до 1.5 с
+        normal:0.8,0.2       — нормальное (среднее, отклонение), не меньше 0
+        lognormal:-0.5,0.4   — логнормальное (mu, sigma натурального логарифма)
+    """
+
+    KINDS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+    def __init__(self, kind: str = 'fixed', params: Iterable[float] = (0.0,), seed: Optional[int] = None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Неизвестное распределение задержки: {kind}")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: Union[str, float, 'LatencyModel', None], seed: Optional[int] = None) -> 'LatencyModel':
+        if isinstance(spec, LatencyModel):
+            return spec
+        if spec is None or isinstance(spec, (int, float)):
+            return cls('fixed', [float(spec or 0.0)], seed)
+        kind, _, params = str(spec).partition(':')
+        if not params:
+            # Просто число — фиксированная задержка
+            return cls('fixed', [float(kind)], seed)
+        return cls(kind.strip(), [p for p in params.split(',') if p.strip()], seed)
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == 'fixed':
+                value = self.params[0]
+            elif self.kind == 'uniform':
+                value = self._random.uniform(self.params[0], self.params[1])
+            elif self.kind == 'normal':
+                value = self._random.gauss(self.params[0], self.params[1])
+            else:
+                value = math.exp(self._random.gauss(self.params[0], self.params[1]))
+        return max(0.0, value)
+
+    def __repr__(self):
+        return f"{self.kind}:{','.join(str(p) for p in self.params)}"
+
+
+def prompt_text(payload: dict) -> str:
+    """Текст последнего сообщения пользователя (строка или список блоков content)"""
+    messages = payload.get('messages') or []
+    if not messages:
+        return ''
+    content = messages[-1].get('content', '')
+    if isinstance(content, list):
+        return '\n'.join(block.get('text', '') for block in content if isinstance(block, dict))
+    return content or ''
+
+
+def _estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def prompt_blocks(payload: dict) -> List[Tuple[str, bool]]:
+    """Блоки промпта по порядку (system, затем сообщения) и наличие в них cache_control"""
+    blocks = []
+
+    def add(content):
+        if isinstance(content, list):
+            blocks.extend((block.get('text', ''), 'cache_control' in block)
+                          for block in content if isinstance(block, dict))
+        elif content:
+            blocks.append((content, False))
+
+    add(payload.get('system'))
+    for message in payload.get('messages') or []:
+        add(message.get('content'))
+    return blocks
+
+
+def rule_based_answer(payload: dict) -> str:
+    """
+    Детерминированный ответ: последний блок ```sql из промпта, сконвертированный
+    правилами (SQLConverter), в том же формате, в котором отвечает нейросеть
+    """
+    from src.converter import SQLConverter
+    import config
+
+    blocks = _SQL_BLOCK_RE.findall(prompt_text(payload))
+    script = blocks[-1] if blocks else 'SELECT 1;'
+    converted = SQLConverter(config).convert({'original': script})
+    return f"```sql\n{converted.strip()}\n```"
+
+
+class MockLLMServer:
+    """
+    Имитация API нейросетей
+
+    Args:
+        host: Адрес
+        port: Порт (0 — свободный порт)
+        latency: Задержка до первого байта ответа: число секунд, описание распределения
+            (см. LatencyModel) или LatencyModel
+        response_text: Текст ответа модели для responder='canned'
+        statuses: Коды ответа для первых запросов по порядку (например, [429, 500]);
+            после их исчерпания действуют error_rate и rate_limit_rate
+        remaining_requests: Значение заголовка оставшейся квоты запросов
+        error_rate: Доля запросов, завершающихся ошибкой 500
+        rate_limit_rate: Доля запросов, получающих 429
+        responder: 'canned' — всегда response_text, 'rules' — конвертация правилами
+        tokens_per_second: Скорость выдачи токенов в потоковом режиме (0 — без задержки)
+        cache_min_tokens: Минимальная длина кэшируемого префикса промпта в токенах
+        seed: Зерно генератора случайных чисел для воспроизводимости
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: Union[float, str, LatencyModel] = 0.0,
+                 response_text: str = DEFAULT_RESPONSE, statuses: Optional[Iterable[int]] = None,
+                 remaining_requests: int = 1000, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 responder: str = 'canned', tokens_per_second: float = 0.0, cache_min_tokens: int = 1024,
+                 seed: Optional[int] = None):
+        self.latency = LatencyModel.parse(latency, seed)
+        self.response_text = response_text
+        self.statuses: List[int] = list(statuses or [])
+        self.remaining_requests = remaining_requests
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.responder = responder
+        self.tokens_per_second = tokens_per_second
+        self.cache_min_tokens = cache_min_tokens
+        # Кэш промптов: префиксы с cache_control (Anthropic) и последние промпты (OpenAI)
+        self._prompt_cache = set()
+        self._recent_prompts = collections.deque(maxlen=64)
+        self.requests: List[dict] = []
+        self.status_counts = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockLLMServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_status(self) -> int:
+        with self._lock:
+            if self.statuses:
+                status = self.statuses.pop(0)
+            else:
+                roll = self._random.random()
+                if roll < self.rate_limit_rate:
+                    status = 429
+                elif roll < self.rate_limit_rate + self.error_rate:
+                    status = 500
+                else:
+                    status = 200
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            return status
+
+    def answer(self, payload: dict) -> str:
+        if self.responder == 'rules':
+            return rule_based_answer(payload)
+        return self.response_text
+
+    def prompt_usage(self, provider: str, payload: dict) -> dict:
+        """
+        Токены запроса с учетом кэша промпта в формате поля usage провайдера.
+        Anthropic кэширует префиксы до блоков с cache_control, OpenAI — общий префикс
+        с недавними промптами (кратно 128 токенам), в обоих случаях не короче cache_min_tokens
+        """
+        blocks = prompt_blocks(payload)
+        text = ''.join(block_text for block_text, _ in blocks)
+        total = _estimate_tokens(text)
+        if provider == 'openai':
+            cached = 0
+            if total >= self.cache_min_tokens:
+                with self._lock:
+                    common = max((len(os.path.commonprefix([seen, text])) for seen in self._recent_prompts), default=0)
+                    self._recent_prompts.append(text)
+                cached = _estimate_tokens(text[:common]) // 128 * 128
+                cached = cached if cached >= self.cache_min_tokens else 0
+            return {'prompt_tokens': total, 'prompt_tokens_details': {'cached_tokens': cached}}
+
+        read = written = 0
+        prefix = ''
+        for block_text, cache_control in blocks:
+            prefix += block_text
+            tokens = _estimate_tokens(prefix)
+            if not cache_control or tokens < self.cache_min_tokens:
+                continue
+            key = hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+            with self._lock:
+                hit = key in self._prompt_cache
+                self._prompt_cache.add(key)
+            if hit:
+                read, written = tokens, 0
+            else:
+                written = tokens - read
+        return {'input_tokens': total - read - written,
+                'cache_read_input_tokens': read, 'cache_creation_input_tokens': written}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                provider = 'anthropic' if self.path.endswith('/v1/messages') else 'openai'
+                with server._lock:
+                    server.requests.append({'provider': provider, 'path': self.path, 'payload': payload})
+
+                delay = server.latency.sample()
+                if delay:
+                    time.sleep(delay)
+
+                status = server._next_status()
+                if status != 200:
+                    body = json.dumps({'error': {'type': 'mock_error', 'message': f'status {status}'}}).encode('utf-8')
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    if status == 429:
+                        self.send_header('retry-after', '1')
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                text = server.answer(payload)
+                usage = server.prompt_usage(provider, payload)
+                output_tokens = _estimate_tokens(text)
+                if payload.get('stream'):
+                    self._send_stream(provider, text, usage, output_tokens)
+                else:
+                    self._send_json(provider, text, usage, output_tokens)
+
+            def _quota_headers(self, provider):
+                if provider == 'openai':
+                    self.send_header('x-ratelimit-remaining-requests', str(server.remaining_requests))
+                else:
+                    self.send_header('anthropic-ratelimit-requests-remaining', str(server.remaining_requests))
+
+            def _send_json(self, provider, text, usage, output_tokens):
+                if provider == 'openai':
+                    data = {
+                        'object': 'chat.completion',
+                        'choices': [{'index': 0, 'finish_reason': 'stop',
+                                     'message': {'role': 'assistant', 'content': text}}],
+                        'usage': dict(usage, completion_tokens=output_tokens),
+                    }
+                else:
+                    data = {
+                        'type': 'message', 'role': 'assistant', 'stop_reason': 'end_turn',
+                        'content': [{'type': 'text', 'text': text}],
+                        'usage': dict(usage, output_tokens=output_tokens),
+                    }
+                body = json.dumps(data).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self._quota_headers(provider)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self, provider, text, usage, output_tokens):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self._quota_headers(provider)
+                self.end_headers()
+                pieces = [text[i:i + 16] for i in range(0, len(text), 16)]
+                if provider == 'openai':
+                    events = [(None, {'choices': [{'delta': {'content': piece}, 'finish_reason': None}]})
+                              for piece in pieces]
+                    events.append((None, {'choices': [{'delta': {}, 'finish_reason': 'stop'}]}))
+                    events.append((None, {'choices': [], 'usage': dict(usage, completion_tokens=output_tokens)}))
+                else:
+                    events = [('message_start', {'type': 'message_start',
+                                                 'message': {'usage': dict(usage, output_tokens=1)}})]
+                    events += [('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                                        'delta': {'type': 'text_delta', 'text': piece}})
+                               for piece in pieces]
+                    events.append(('message_delta', {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'},
+                                                     'usage': {'output_tokens': output_tokens}}))
+                    events.append(('message_stop', {'type': 'message_stop'}))
+                # Фрагмент в 16 символов — около 4 токенов
+                piece_delay = 4 / server.tokens_per_second if server.tokens_per_second else 0.0
+                try:
+                    for event, data in events:
+                        chunk = (f"event: {event}\n" if event else '') + f"data: {json.dumps(data)}\n\n"
+                        self.wfile.write(chunk.encode('utf-8'))
+                        self.wfile.flush()
+                        if piece_delay:
+                            time.sleep(piece_delay)
+                    if provider == 'openai':
+                        self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Клиент прекратил чтение (например, после закрытия блока ```sql)
+                    pass
+                self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная имитация API OpenAI и Anthropic')
+    parser.add_argument('--host', default='127.0.0.1', help='Адрес')
+    parser.add_argument('--port', type=int, default=8700, help='Порт')
+    parser.add_argument('--latency', default='0', help='Задержка ответа: секунды или распределение (uniform:0.2,1.0, lognormal:-0.5,0.4)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Доля ответов 429')
+    parser.add_argument('--responder', choices=['canned', 'rules'], default='rules', help='Фиксированный ответ или конвертация правилами')
+    parser.add_argument('--response-file', help='Файл с фиксированным ответом (для --responder canned)')
+    parser.add_argument('--tps', type=float, default=0.0, help='Скорость выдачи токенов в потоковом режиме')
+    parser.add_argument('--cache-min-tokens', type=int, default=1024, help='Минимальная длина кэшируемого префикса промпта')
+    parser.add_argument('--seed', type=int, default=None, help='Зерно генератора случайных чисел')
+    args = parser.parse_args()
+
+    response_text = DEFAULT_RESPONSE
+    if args.response_file:
+        with open(args.response_file, 'r', encoding='utf-8') as f:
+            response_text = f.read()
+
+    server = MockLLMServer(args.host, args.port, latency=args.latency, response_text=response_text,
+                           error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                           responder=args.responder, tokens_per_second=args.tps,
+                           cache_min_tokens=args.cache_min_tokens, seed=args.seed).start()
+    print(f"Имитация API нейросетей запущена на {server.url} (задержка {server.latency}, ответы: {args.responder})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+Модуль для индекса параметров {...} в скрипте.
+Индекс строится за один проход по скрипту: для каждого вхождения параметра
+запоминаются позиция и окружение — оператор сравнения и операнд слева и справа
+(число, строка, alias.column, поле или другой параметр), IN-список, приведение
+типа, арифметика и THEN перед параметром. Все шаги подбора значений в
+SQLParser.replace_params читают контекст из индекса вместо повторного поиска
+регулярными выражениями для каждого параметра, а подстановка выполняется
+одним проходом по позициям вхождений.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from src.regex_registry import regex
+
+PLACEHOLDER_RE = regex('param_index.placeholder', r'\{([^\}]+)\}')
+
+# Операторы сравнения (от длинных к коротким) и операторы, с которыми проверяется строковый операнд
+COMPARISON_OPS = ('<>', '!=', '>=', '<=', '=', '>', '<')
+STRING_OPS = ('=', '!=', '<>', 'LIKE')
+
+_RIGHT_OP_RE = regex('param_index.right_op', r'\s*(<>|!=|>=|<=|=|>|<|LIKE)\s*', re.IGNORECASE)
+_RIGHT_IN_RE = regex('param_index.right_in', r"\s*IN\s*\(\s*(?:(\d)|'[^']+')", re.IGNORECASE)
+_RIGHT_CAST_RE = regex('param_index.right_cast', r'\s*::\s*(\w+)')
+_RIGHT_ARITHMETIC_RE = regex('param_index.right_arithmetic', r'\s*[\+\-\*/]')
+_NUMBER_RE = regex('param_index.number', r'\d')
+_STRING_RE = regex('param_index.string', r"'[^']+'")
+_COLUMN_RE = regex('param_index.column', r'([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)')
+_FIELD_RE = regex('param_index.field', r'[a-zA-Z_][\w\.]*')
+
+NUMBER_CAST_RE = regex('param_index.number_cast', r'(?:integer|bigint|smallint|numeric|decimal|int)', re.IGNORECASE)
+STRING_CAST_RE = regex('param_index.string_cast', r'(?:varchar|text|citext)', re.IGNORECASE)
+
+_NAME_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_')
+_FIELD_START_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+
+
+class Operand:
+    """Операнд по одну сторону от оператора сравнения"""
+
+    def __init__(self, op: str):
+        self.op = op
+        self.number = False
+        self.string = False
+        # (алиас, колонка) для alias.column
+        self.column: Optional[Tuple[str, str]] = None
+        # Имя поля (с алиасом или схемой) для подбора типа по каталогу схемы
+        self.field: Optional[str] = None
+        # Имя параметра справа, если параметр сравнивается с другим параметром
+        self.param: Optional[str] = None
+
+
+class ParamUsage:
+    """Вхождение параметра {name} и его окружение в скрипте"""
+
+    def __init__(self, name: str, start: int, end: int):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.left: Optional[Operand] = None
+        self.right: Optional[Operand] = None
+        # 'number' или 'string' для {name} IN (1, ...) и {name} IN ('a', ...)
+        self.in_list: Optional[str] = None
+        # Тип в {name}::type
+        self.cast: Optional[str] = None
+        self.arithmetic = False
+        self.after_then = False
+
+    def operands(self, ops=COMPARISON_OPS) -> List[Operand]:
+        """Операнды слева и справа (в порядке следования в скрипте) для заданных операторов"""
+        return [operand for operand in (self.left, self.right) if operand is not None and operand.op in ops]
+
+    def columns(self, ops=('=',)) -> List[Tuple[str, str]]:
+        """Колонки alias.column, с которыми параметр сравнивается (по умолчанию оператором =)"""
+        return [operand.column for operand in self.operands(ops) if operand.column]
+
+    def is_number(self) -> bool:
+        """Контекст указывает на число: сравнение с числом, IN (1, ...) или ::integer"""
+        return (any(operand.number for operand in self.operands())
+                or self.in_list == 'number'
+                or bool(self.cast and NUMBER_CAST_RE.match(self.cast)))
+
+    def is_string(self) -> bool:
+        """Контекст указывает на строку: сравнение со строкой, IN ('a', ...) или ::text"""
+        return (any(operand.string for operand in self.operands(STRING_OPS))
+                or self.in_list == 'string'
+                or bool(self.cast and STRING_CAST_RE.match(self.cast)))
+
+
+def _skip_space_back(text: str, index: int) -> int:
+    while index > 0 and text[index - 1].isspace():
+        index -= 1
+    return index
+
+
+def _op_before(text: str, index: int) -> Optional[str]:
+    if text[max(0, index - 4):index].upper() == 'LIKE':
+        return 'LIKE'
+    for op in COMPARISON_OPS:
+        if index >= len(op) and text.startswith(op, index - len(op)):
+            return op
+    return None
+
+
+def _run_back(text: str, index: int, chars) -> int:
+    """Начало непрерывной последовательности символов chars, заканчивающейся на index"""
+    while index > 0 and text[index - 1] in chars:
+        index -= 1
+    return index
+
+
+def _left_operand(text: str, start: int) -> Optional[Operand]:
+    """Оператор сравнения и операнд перед параметром (чтение в обратную сторону)"""
+    index = _skip_space_back(text, start)
+    op = _op_before(text, index)
+    if op is None:
+        return None
+    operand = Operand(op)
+    end = _skip_space_back(text, index - len(op))
+    if end == 0:
+        return operand
+    last = text[end - 1]
+    operand.number = last.isdecimal()
+    if last == "'":
+        quote = text.rfind("'", 0, end - 1)
+        operand.string = quote >= 0 and end - 1 - quote > 1
+    column_start = _run_back(text, end, _NAME_CHARS)
+    if column_start < end and column_start > 0 and text[column_start - 1] == '.':
+        alias_start = _run_back(text, column_start - 1, _NAME_CHARS)
+        if alias_start < column_start - 1:
+            operand.column = (text[alias_start:column_start - 1], text[column_start:end])
+    field_start = end
+    while field_start > 0 and (text[field_start - 1].isalnum() or text[field_start - 1] in '_.'):
+        field_start -= 1
+    while field_start < end and text[field_start] not in _FIELD_START_CHARS:
+        field_start += 1
+    if field_start < end:
+        operand.field = text[field_start:end]
+    return operand
+
+
+def _right_operand(text: str, end: int) -> Optional[Operand]:
+    """Оператор сравнения и операнд после параметра"""
+    op_match = _RIGHT_OP_RE.match(text, end)
+    if op_match is None:
+        return None
+    operand = Operand(op_match.group(1).upper())
+    position = op_match.end()
+    operand.number = bool(_NUMBER_RE.match(text, position))
+    operand.string = bool(_STRING_RE.match(text, position))
+    column = _COLUMN_RE.match(text, position)
+    if column:
+        operand.column = (column.group(1), column.group(2))
+    field = _FIELD_RE.match(text, position)
+    if field:
+        operand.field = field.group(0)
+    param = PLACEHOLDER_RE.match(text, position)
+    if param:
+        operand.param = param.group(1)
+    return operand
+
+
+class ParamIndex:
+    """
+    Индекс всех вхождений параметров {...} в скрипте
+
+    Args:
+        script: Текст скрипта
+    """
+
+    def __init__(self, script: str):
+        self.script = script
+        self.usages: List[ParamUsage] = []
+        self.by_name: Dict[str, List[ParamUsage]] = {}
+        for match in PLACEHOLDER_RE.finditer(script):
+            usage = ParamUsage(match.group(1), match.start(), match.end())
+            usage.left = _left_operand(script, usage.start)
+            usage.right = _right_operand(script, usage.end)
+            in_list = _RIGHT_IN_RE.match(script, usage.end)
+            if in_list:
+                usage.in_list = 'number' if in_list.group(1) else 'string'
+            cast = _RIGHT_CAST_RE.match(script, usage.end)
+            if cast:
+                usage.cast = cast.group(1)
+            before = _skip_space_back(script, usage.start)
+            usage.arithmetic = (before > 0 and script[before - 1] in '+-*/') or \
+                bool(_RIGHT_ARITHMETIC_RE.match(script, usage.end))
+            usage.after_then = script.endswith('THEN', 0, before)
+            self.usages.append(usage)
+            self.by_name.setdefault(usage.name, []).append(usage)
+
+    @property
+    def names(self) -> List[str]:
+        """Имена параметров в порядке первого вхождения"""
+        return list(self.by_name)
+
+    def usages_of(self, name: str) -> List[ParamUsage]:
+        return self.by_name.get(name, [])
+
+    def param_pairs(self, prefix: str = 'params.') -> List[Tuple[str, str]]:
+        """Сравнения двух параметров {prefix...} = {prefix...}"""
+        return [(usage.name, usage.right.param) for usage in self.usages
+                if usage.right is not None and usage.right.op == '=' and usage.right.param
+                and usage.name.startswith(prefix) and usage.right.param.startswith(prefix)
+                and len(usage.name) > len(prefix) and len(usage.right.param) > len(prefix)]
+
+    def substitute(self, values: Dict[str, object]) -> str:
+        """
+        Подставляет значения всех параметров одним проходом по позициям вхождений
+
+        Args:
+            values: {имя параметра: значение}; параметры без значения остаются как есть
+
+        Returns:
+            str: Скрипт с подставленными значениями
+        """
+        parts = []
+        position = 0
+        for usage in self.usages:
+            if usage.name not in values:
+                continue
+            parts.append(self.script[position:usage.start])
+            parts.append(str(values[usage.name]))
+            position = usage.end
+        parts.append(self.script[position:])
+        return ''.join(parts)
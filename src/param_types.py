@@ -0,0 +1,359 @@
+"""
+Модуль для словаря типов параметров по всему набору скриптов.
+Одни и те же параметры {params.*} и {PPRCONST.*} встречаются в тысячах
+формул, поэтому тип каждого параметра определяется один раз: предварительный
+проход параллельно читает все скрипты входной директории, собирает контекст
+всех вхождений (ParamIndex) и выбирает для каждого имени тип с наибольшим
+числом свидетельств. Поля, с которыми сравниваются параметры, проверяются
+по каталогу схемы один раз на весь набор. Словарь сохраняется в JSON с
+версией формата и отпечатком входных файлов; SQLParser.replace_params
+берет значения из словаря до анализа отдельного скрипта.
+
+    python -m src.param_types scripts/input [--workers 8] [--output converted/param_types.json]
+"""
+
+import re
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.param_index import COMPARISON_OPS, ParamIndex
+from src.regex_registry import regex
+from src.sql_post_processor import FLOAT_FIELDS, INT_FIELDS
+
+DICTIONARY_VERSION = 1
+
+NUMBER = 'number'
+DECIMAL = 'decimal'
+STRING = 'string'
+DATE = 'date'
+TIMESTAMP = 'timestamp'
+# Порядок задает приоритет при равном числе свидетельств
+KINDS = (NUMBER, TIMESTAMP, DATE, DECIMAL, STRING)
+
+KIND_VALUES = {
+    NUMBER: 1,
+    DECIMAL: 1.0,
+    STRING: "'test'",
+    DATE: "'2023-01-01'::date",
+    TIMESTAMP: "'2023-01-01'::timestamp",
+}
+
+_ID_TERMS = ('id', 'ouid', 'code', 'status', 'mspholder')
+_DATE_TERMS = ('date', 'time', 'period')
+# reg — только как отдельная часть имени (a_reg, regdate), а не внутри слова (a_regioncoeff)
+_REG_RE = regex('param_types.reg_term', r'(?:^|_)reg(?:$|_|date)')
+_ALIAS_RE = regex('param_types.alias', r'(?:FROM|JOIN)\s+([a-zA-Z0-9_]+(?:\.[a-zA-Z0-9_]+)?)\s+(?:AS\s+)?([a-zA-Z0-9_]+)',
+                  re.IGNORECASE)
+
+
+def column_kind(column: str) -> Optional[str]:
+    """Тип по имени колонки, с которой сравнивается параметр"""
+    column = column.lower()
+    # Явные списки числовых полей важнее эвристик по частям имени
+    name = column.rsplit('.', 1)[-1]
+    if name in FLOAT_FIELDS:
+        return DECIMAL
+    if name in INT_FIELDS:
+        return NUMBER
+    if any(term in column for term in _ID_TERMS):
+        return NUMBER
+    if any(term in column for term in _DATE_TERMS) or _REG_RE.search(column):
+        return TIMESTAMP
+    if 'name' in column or 'text' in column:
+        return STRING
+    return None
+
+
+def catalog_kind(col_type: Optional[str]) -> Optional[str]:
+    """Тип по типу колонки в каталоге схемы"""
+    if col_type in ('integer', 'bigint', 'smallint'):
+        return NUMBER
+    if col_type in ('double precision', 'numeric', 'real', 'float', 'decimal'):
+        return DECIMAL
+    if col_type in ('character varying', 'text', 'varchar', 'citext'):
+        return STRING
+    if col_type == 'date':
+        return DATE
+    if col_type in ('timestamp without time zone', 'timestamp with time zone'):
+        return TIMESTAMP
+    return None
+
+
+def script_evidence(script: str) -> Dict[str, dict]:
+    """
+    Свидетельства о типах параметров в одном скрипте
+
+    Каждое вхождение дает один голос: по контексту (колонка, число, строка,
+    IN-список, приведение, арифметика) или, если контекста нет, поле
+    таблица.колонка для проверки по каталогу схемы.
+
+    Args:
+        script: Текст скрипта
+
+    Returns:
+        Dict[str, dict]: {имя: {'kinds': {тип: голосов}, 'fields': {таблица.колонка: голосов}}}
+    """
+    index = ParamIndex(script)
+    aliases = None
+    evidence = {}
+    for usage in index.usages:
+        entry = evidence.setdefault(usage.name, {'kinds': Counter(), 'fields': Counter()})
+        kind = next((k for k in (column_kind(column) for _, column in usage.columns(COMPARISON_OPS)) if k), None)
+        if kind is None:
+            if usage.is_number() or (usage.name.startswith('PPRCONST.') and (usage.arithmetic or usage.after_then)):
+                kind = NUMBER
+            elif usage.is_string():
+                kind = STRING
+        if kind is not None:
+            entry['kinds'][kind] += 1
+            continue
+        field = next((operand.field for operand in usage.operands() if operand.field and '.' in operand.field), None)
+        if field:
+            if aliases is None:
+                aliases = {alias.lower(): table for table, alias in _ALIAS_RE.findall(script)}
+            alias, column = field.rsplit('.', 1)
+            table = aliases.get(alias.lower(), alias)
+            entry['fields'][f"{table.lower()}.{column.lower()}"] += 1
+    return evidence
+
+
+def _file_evidence(path: str) -> Dict[str, dict]:
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return script_evidence(f.read())
+
+
+def fingerprint(paths: Iterable[Path]) -> str:
+    """Отпечаток набора скриптов: имена, размеры и время изменения"""
+    digest = hashlib.sha1()
+    for path in sorted(Path(p) for p in paths):
+        stat = path.stat()
+        digest.update(f"{path.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ParamTypeDictionary:
+    """
+    Словарь типов параметров: {имя: {'kind', 'votes', 'scripts'}}
+
+    Args:
+        params: Записи словаря
+        fingerprint: Отпечаток набора скриптов, по которому построен словарь
+    """
+
+    def __init__(self, params: Optional[Dict[str, dict]] = None, fingerprint: str = '', scripts: int = 0,
+                 built_at: Optional[float] = None):
+        self.params = params or {}
+        self.fingerprint = fingerprint
+        self.scripts = scripts
+        self.built_at = built_at or time.time()
+
+    def __len__(self):
+        return len(self.params)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.params
+
+    def kind(self, name: str) -> Optional[str]:
+        entry = self.params.get(name)
+        return entry['kind'] if entry else None
+
+    def value(self, name: str):
+        """Значение для подстановки или None, если по набору скриптов тип не определен"""
+        return KIND_VALUES.get(self.kind(name))
+
+    def histogram(self) -> Dict[str, int]:
+        counts = Counter(entry['kind'] for entry in self.params.values())
+        return {kind or 'unknown': count for kind, count in counts.most_common()}
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            'version': DICTIONARY_VERSION,
+            'fingerprint': self.fingerprint,
+            'scripts': self.scripts,
+            'built_at': self.built_at,
+            'params': dict(sorted(self.params.items())),
+        }
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path) -> Optional['ParamTypeDictionary']:
+        """Загружает словарь; None, если файла нет или версия формата другая"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Не удалось прочитать словарь типов параметров {path}: {e}")
+            return None
+        if data.get('version') != DICTIONARY_VERSION:
+            print(f"⚠️ Словарь типов параметров {path} другой версии ({data.get('version')}), будет перестроен")
+            return None
+        return cls(data.get('params', {}), data.get('fingerprint', ''), data.get('scripts', 0), data.get('built_at'))
+
+
+def merge_evidence(evidence: Iterable[Dict[str, dict]], catalog=None) -> Dict[str, dict]:
+    """
+    Объединяет свидетельства всех скриптов и выбирает тип для каждого параметра
+
+    Args:
+        evidence: Свидетельства скриптов (script_evidence)
+        catalog: Каталог схемы для полей без контекста (SchemaCatalog или None)
+
+    Returns:
+        Dict[str, dict]: Записи словаря {имя: {'kind', 'votes', 'scripts'}}
+    """
+    kinds: Dict[str, Counter] = {}
+    fields: Dict[str, Counter] = {}
+    scripts: Counter = Counter()
+    for script in evidence:
+        for name, entry in script.items():
+            kinds.setdefault(name, Counter()).update(entry['kinds'])
+            fields.setdefault(name, Counter()).update(entry['fields'])
+            scripts[name] += 1
+
+    # Каждое поле проверяется по каталогу один раз на весь набор
+    field_kinds = {}
+    if catalog is not None:
+        for field in {field for counter in fields.values() for field in counter}:
+            table, column = field.rsplit('.', 1)
+            field_kinds[field] = catalog_kind(catalog.get_column_type(table, column))
+
+    params = {}
+    for name, votes in kinds.items():
+        votes = Counter(votes)
+        for field, count in fields[name].items():
+            if field_kinds.get(field):
+                votes[field_kinds[field]] += count
+        kind = max(KINDS, key=lambda k: (votes[k], -KINDS.index(k))) if votes else None
+        params[name] = {'kind': kind, 'votes': dict(votes), 'scripts': scripts[name]}
+    return params
+
+
+def build_param_types(paths: List[Path], workers: int = 4, catalog=None) -> ParamTypeDictionary:
+    """
+    Строит словарь типов параметров по набору скриптов
+
+    Args:
+        paths: Пути к скриптам
+        workers: Количество процессов для чтения скриптов
+        catalog: Каталог схемы (SchemaCatalog или None)
+
+    Returns:
+        ParamTypeDictionary: Словарь
+    """
+    paths = [str(p) for p in paths]
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            evidence = list(executor.map(_file_evidence, paths, chunksize=max(1, len(paths) // (workers * 8))))
+    else:
+        evidence = [_file_evidence(path) for path in paths]
+    return ParamTypeDictionary(merge_evidence(evidence, catalog), fingerprint(paths), len(paths))
+
+
+_dictionaries: Dict[str, ParamTypeDictionary] = {}
+_dictionaries_lock = threading.Lock()
+
+
+def get_param_types(config) -> Optional[ParamTypeDictionary]:
+    """
+    Возвращает общий для всех потоков словарь типов параметров (None, если его нет или он отключен).
+    Словарь используется только после того, как ensure_param_types сверил его с текущим набором
+    скриптов: файл, оставшийся от запуска на другой директории, иначе подменял бы анализ скриптов
+
+    Args:
+        config: Объект конфигурации
+
+    Returns:
+        Optional[ParamTypeDictionary]: Словарь
+    """
+    if not getattr(config, 'PARAM_TYPES', False):
+        return None
+    path = str(getattr(config, 'PARAM_TYPES_FILE', '') or '')
+    if not path:
+        return None
+    with _dictionaries_lock:
+        return _dictionaries.get(path)
+
+
+def ensure_param_types(config, paths: List[Path], workers: int = 4) -> Tuple[Optional[ParamTypeDictionary], bool]:
+    """
+    Возвращает словарь для набора скриптов, перестраивая его, если скрипты изменились
+
+    Args:
+        config: Объект конфигурации (PARAM_TYPES, PARAM_TYPES_FILE)
+        paths: Пути к скриптам пакета
+        workers: Количество процессов для предварительного прохода
+
+    Returns:
+        Tuple[Optional[ParamTypeDictionary], bool]: (словарь, был ли он перестроен)
+    """
+    if not getattr(config, 'PARAM_TYPES', False) or not getattr(config, 'PARAM_TYPES_FILE', None):
+        return None, False
+    path = str(config.PARAM_TYPES_FILE)
+    current = fingerprint(paths)
+    dictionary = get_param_types(config)
+    if dictionary is None or dictionary.fingerprint != current:
+        dictionary = ParamTypeDictionary.load(path)
+    if dictionary is not None and dictionary.fingerprint == current:
+        with _dictionaries_lock:
+            _dictionaries[path] = dictionary
+        return dictionary, False
+
+    from src.schema_catalog import get_schema_catalog
+    catalog = get_schema_catalog(config)
+    if not catalog.ensure_loaded(getattr(config, 'DB_CONN', None)):
+        catalog = None
+    dictionary = build_param_types(paths, workers, catalog)
+    dictionary.save(path)
+    with _dictionaries_lock:
+        _dictionaries[path] = dictionary
+    return dictionary, True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Словарь типов параметров по набору скриптов')
+    parser.add_argument('input_dir', help='Директория со скриптами *.sql')
+    parser.add_argument('--output', default=None, help='Файл словаря (по умолчанию PARAM_TYPES_FILE)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='Количество процессов')
+    parser.add_argument('--no-catalog', action='store_true', help='Не использовать каталог схемы')
+    args = parser.parse_args()
+
+    import config
+    from src.schema_catalog import get_schema_catalog
+    output = args.output or config.PARAM_TYPES_FILE
+    paths = sorted(Path(args.input_dir).glob('*.sql'))
+    catalog = None
+    if not args.no_catalog:
+        catalog = get_schema_catalog(config)
+        if not catalog.ensure_loaded(getattr(config, 'DB_CONN', None)):
+            catalog = None
+
+    start_time = time.time()
+    dictionary = build_param_types(paths, args.workers, catalog)
+    dictionary.save(output)
+    print(f"Словарь типов параметров: {len(dictionary)} параметров из {dictionary.scripts} скриптов "
+          f"за {time.time() - start_time:.2f} с{'' if catalog else ' (без каталога схемы)'}")
+    for kind, count in dictionary.histogram().items():
+        print(f"  - {kind}: {count}")
+    print(f"Сохранен в {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Модуль для разобранного скрипта, общего для всех этапов конвертации.
+ParsedScript лениво вычисляет и запоминает артефакты разбора одной версии
+текста скрипта: пакеты, разделенные строками GO, список запросов (sqlparse.split
+по каждому пакету) и их позиции, токены sqlparse,
+AST sqlglot (диалект T-SQL, отдельно для каждого запроса), карту алиасов FROM/JOIN
+и индекс параметров {...}. Парсер, конвертер правилами,
+проверка в PostgreSQL и конвертер нейросетью получают один и тот же объект,
+поэтому каждый артефакт вычисляется не больше одного раза на версию скрипта.
+Для строк ParsedScript.of возвращает объект из небольшого кэша последних версий,
+так что этапы, которым передается только текст, тоже не разбирают его повторно.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Callable, Dict, List, Optional
+
+import sqlparse
+
+from src.param_index import ParamIndex
+from src.script_stream import split_batches
+
+SQLGLOT_AVAILABLE = False
+try:
+    import sqlglot
+    SQLGLOT_AVAILABLE = True
+except ImportError:
+    pass
+
+# Диалект sqlglot для разбора исходных скриптов MS SQL
+SQLGLOT_DIALECT = 'tsql'
+
+# Количество последних версий скриптов, разборы которых хранятся для ParsedScript.of
+CACHE_SIZE = 16
+
+_recent: 'OrderedDict[str, ParsedScript]' = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+class ParsedScript(Mapping):
+    """
+    Текст скрипта с лениво вычисляемыми артефактами разбора.
+    Поддерживает доступ как к словарю из SQLParser.parse_script: 'original', 'params', 'statements'
+
+    Args:
+        text: Текст скрипта
+    """
+
+    KEYS = ('original', 'params', 'statements')
+
+    def __init__(self, text: str):
+        self.text = text
+        # Причины, по которым запросы не разобраны sqlglot: {номер запроса: сообщение}
+        self.ast_errors: Dict[int, str] = {}
+        self._artefacts: Dict[str, object] = {}
+        # ParsedScript.of отдает один объект разным потокам: каждый артефакт (и ast_errors)
+        # вычисляется одним потоком; RLock, потому что артефакты вычисляются друг через друга
+        self._lock = threading.RLock()
+
+    @classmethod
+    def of(cls, script) -> 'ParsedScript':
+        """
+        Разобранный скрипт для строки, словаря parse_script или готового ParsedScript
+
+        Для одинакового текста возвращается один и тот же объект, пока он в кэше последних версий
+        """
+        if isinstance(script, ParsedScript):
+            return script
+        if isinstance(script, Mapping):
+            script = script['original']
+        with _recent_lock:
+            parsed = _recent.get(script)
+            if parsed is not None:
+                _recent.move_to_end(script)
+                return parsed
+        parsed = cls(script)
+        with _recent_lock:
+            parsed = _recent.setdefault(script, parsed)
+            _recent.move_to_end(script)
+            while len(_recent) > CACHE_SIZE:
+                _recent.popitem(last=False)
+        return parsed
+
+    def cached(self, name: str, compute: Callable[[], object]):
+        """Артефакт name, вычисленный compute() при первом обращении (один раз для всех потоков)"""
+        if name in self._artefacts:
+            return self._artefacts[name]
+        with self._lock:
+            if name not in self._artefacts:
+                self._artefacts[name] = compute()
+            return self._artefacts[name]
+
+    @property
+    def computed(self) -> List[str]:
+        """Имена уже вычисленных артефактов"""
+        return list(self._artefacts)
+
+    @property
+    def digest(self) -> str:
+        """Стабильный (одинаковый во всех процессах) дайджест текста скрипта"""
+        return self.cached('digest', lambda: hashlib.blake2b(self.text.encode('utf-8'), digest_size=16).hexdigest())
+
+    @property
+    def batches(self) -> List[str]:
+        """Пакеты скрипта, разделенные строками GO (без самих строк GO)"""
+        return self.cached('batches', lambda: split_batches(self.text))
+
+    @property
+    def batch_statements(self) -> List[List[str]]:
+        """Запросы каждого пакета (sqlparse.split, строки GO в запросы не входят)"""
+        return self.cached('batch_statements', lambda: [sqlparse.split(batch) for batch in self.batches])
+
+    @property
+    def statements(self) -> List[str]:
+        """Отдельные запросы скрипта по всем пакетам"""
+        return self.cached('statements', lambda: [statement for statements in self.batch_statements
+                                                  for statement in statements])
+
+    @property
+    def tokens(self) -> tuple:
+        """Запросы, разобранные sqlparse на токены"""
+        return self.cached('tokens', lambda: sqlparse.parse(self.text))
+
+    @property
+    def statement_offsets(self) -> List[int]:
+        """Позиции начала запросов statements в тексте скрипта"""
+        return self.cached('statement_offsets', self._find_statement_offsets)
+
+    def _find_statement_offsets(self) -> List[int]:
+        offsets = []
+        search_from = 0
+        for statement in self.statements:
+            position = self.text.find(statement, search_from)
+            if position == -1:
+                position = search_from
+            offsets.append(position)
+            search_from = position + len(statement)
+        return offsets
+
+    @property
+    def ast(self) -> List[Optional[list]]:
+        """
+        AST sqlglot для каждого запроса statements. None — запрос не разобран
+        (причина в ast_errors) или разобран только как Command без структуры
+        """
+        return self.cached('ast', lambda: [self._parse_statement(number, statement)
+                                           for number, statement in enumerate(self.statements)])
+
+    def _parse_statement(self, number: int, statement: str) -> Optional[list]:
+        if not SQLGLOT_AVAILABLE:
+            self.ast_errors[number] = "Библиотека sqlglot не установлена"
+            return None
+        try:
+            # BOM заменяется пробелом: sqlglot его не принимает, а позиции в AST должны совпадать с текстом
+            expressions = [expression for expression in
+                           sqlglot.parse(statement.replace('\ufeff', ' '), read=SQLGLOT_DIALECT)
+                           if expression is not None]
+        except Exception as e:
+            self.ast_errors[number] = str(e)
+            return None
+        if any(isinstance(expression, sqlglot.exp.Command) for expression in expressions):
+            self.ast_errors[number] = "Неподдерживаемый синтаксис (разобран как Command)"
+            return None
+        return expressions
+
+    @property
+    def param_index(self) -> ParamIndex:
+        """Индекс вхождений параметров {...}"""
+        return self.cached('param_index', lambda: ParamIndex(self.text))
+
+    @property
+    def params(self) -> List[str]:
+        """Имена параметров в порядке первого вхождения"""
+        return self.param_index.names
+
+    @property
+    def alias_map(self) -> Dict[str, str]:
+        """Алиасы FROM/JOIN по токенам sqlparse: {алиас: имя таблицы}"""
+        return self.cached('alias_map', self._extract_alias_map)
+
+    def _extract_alias_map(self) -> Dict[str, str]:
+        from sqlparse.sql import Identifier, IdentifierList
+        from sqlparse.tokens import Keyword
+        alias_map = {}
+        for stmt in self.tokens:
+            from_seen = False
+            def process_token(token):
+                nonlocal from_seen
+                if from_seen:
+                    if isinstance(token, IdentifierList):
+                        for identifier in token.get_identifiers():
+                            real = identifier.get_real_name()
+                            alias = identifier.get_alias()
+                            if alias:
+                                alias_map[alias] = real
+                    elif isinstance(token, Identifier):
+                        real = token.get_real_name()
+                        alias = token.get_alias()
+                        if alias:
+                            alias_map[alias] = real
+                    elif hasattr(token, 'is_group') and token.is_group:
+                        for t in token.tokens:
+                            process_token(t)
+                    # Не break — ищем все FROM/JOIN
+                elif token.ttype is Keyword and token.value.upper() in ('FROM', 'JOIN'):
+                    from_seen = True
+            for token in stmt.tokens:
+                process_token(token)
+        return alias_map
+
+    def __getitem__(self, key):
+        if key == 'original':
+            return self.text
+        if key == 'params':
+            return self.params
+        if key == 'statements':
+            return self.statements
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"ParsedScript({len(self.text)} символов, вычислено: {', '.join(self.computed) or 'ничего'})"
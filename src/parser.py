@@ -1,29 +1,27 @@
 import re
 import sqlparse
 import psycopg2
-from src.sql_alias_analyzer import SQLAliasAnalyzer
+from src.sql_alias_analyzer import SQLAliasAnalyzer, get_alias_cache
+from src.schema_catalog import get_schema_catalog
+from src.parsed_script import ParsedScript
+from src.param_types import get_param_types
 
 class SQLParser:
     def __init__(self, config):
         self.config = config
-        self.alias_analyzer = SQLAliasAnalyzer()
+        # Кэш алиасов общий для всех парсеров и потоков
+        self.alias_analyzer = SQLAliasAnalyzer(get_alias_cache(config))
+        # Словарь типов параметров, построенный по всему набору скриптов (src/param_types.py)
+        self.param_types = get_param_types(config)
         
     def parse_script(self, script_content):
         """
-        Парсит SQL скрипт, выделяя параметры и структуру запроса
+        Парсит SQL скрипт, выделяя параметры и структуру запроса.
+        Возвращает ParsedScript: 'params', 'statements' и 'original' доступны как ключи,
+        остальные артефакты разбора вычисляются при первом обращении и переиспользуются
+        всеми этапами конвертации
         """
-        # Найти все параметры в формате {param_name}
-        params = re.findall(r'\{([^\}]+)\}', script_content)
-        unique_params = list(set(params))
-        
-        # Разбить скрипт на отдельные запросы
-        statements = sqlparse.split(script_content)
-        
-        return {
-            'params': unique_params,
-            'statements': statements,
-            'original': script_content
-        }
+        return ParsedScript.of(script_content)
     
     def get_hardcoded_param_value(self, param_name):
         name = param_name.lower()
@@ -42,32 +40,33 @@ class SQLParser:
         # ...добавь свои правила по необходимости
         return None
 
-    def analyze_param_context(self, script_content, param_name):
+    def _table_by_alias(self, script_content, alias, usage):
+        """Таблица по алиасу в области видимости вхождения параметра (запрос или подзапрос)"""
+        return self.alias_analyzer.get_table_by_alias(script_content, alias, usage.start)
+
+    def analyze_param_context(self, script_content, param_name, index=None):
         """
         Анализирует контекст использования параметра в скрипте для определения его типа
         
         Args:
             script_content: Скрипт, в котором используется параметр
             param_name: Имя параметра без фигурных скобок
+            index: Индекс параметров скрипта (ParamIndex), если уже построен
             
         Returns:
             str or None: Предполагаемое значение параметра или None, если тип не определён
         """
-        # Создаем паттерн для поиска параметра в скрипте
-        param_pattern = r'\{' + re.escape(param_name) + r'\}'
+        if index is None:
+            index = ParsedScript.of(script_content).param_index
+        usages = index.usages_of(param_name)
         
-        # Используем SQLAliasAnalyzer для поиска контекста параметра
-        # Ищем паттерны вида alias.column = {param_name}
-        column_param_pattern = rf'([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)\s*=\s*{param_pattern}|{param_pattern}\s*=\s*([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)'
-        for match in re.finditer(column_param_pattern, script_content):
-            if match.group(1) and match.group(2):  # alias.column = {param}
-                alias, column = match.group(1), match.group(2)
-            else:  # {param} = alias.column
-                alias, column = match.group(3), match.group(4)
-            
-            # Определяем таблицу по алиасу
-            table = self.alias_analyzer.get_table_by_alias(script_content, alias)
-            if table:
+        # Ищем сравнения вида alias.column = {param_name} или {param_name} = alias.column
+        for usage in usages:
+            for alias, column in usage.columns():
+                # Определяем таблицу по алиасу
+                table = self._table_by_alias(script_content, alias, usage)
+                if not table:
+                    continue
                 print(f"[analyze_param_context] Найден контекст: {param_name} сравнивается с {alias}.{column} (таблица: {table})")
                 
                 # По имени колонки определяем тип параметра
@@ -81,44 +80,32 @@ class SQLParser:
                     print(f"[analyze_param_context] Колонка {column} похожа на текст, возвращаем строку")
                     return "'test'"
                 
-        # Проверка на числовой тип параметра
-        number_patterns = [
-            rf"{param_pattern}\s*(?:=|!=|<>|>|<|>=|<=)\s*\d+",
-            rf"\d+\s*(?:=|!=|<>|>|<|>=|<=)\s*{param_pattern}",
-            rf"{param_pattern}\s*IN\s*\(\s*\d+",
-            rf"{param_pattern}\s*::\s*(?:integer|bigint|smallint|numeric|decimal|int)"
-        ]
-        
-        for pattern in number_patterns:
-            if re.search(pattern, script_content, re.IGNORECASE):
-                print(f"[analyze_param_context] Определил параметр {param_name} как число на основе контекста")
-                return 1
-        
-        # Проверка на строковый тип по контексту
-        string_patterns = [
-            rf"{param_pattern}\s*(?:=|!=|<>|LIKE)\s*'[^']+'",
-            rf"'[^']+'\s*(?:=|!=|<>|LIKE)\s*{param_pattern}",
-            rf"{param_pattern}\s*IN\s*\(\s*'[^']+'",
-            rf"{param_pattern}\s*::\s*(?:varchar|text|citext)"
-        ]
+        # Проверка на числовой тип параметра: сравнение с числом, IN (1, ...), ::integer
+        if any(usage.is_number() for usage in usages):
+            print(f"[analyze_param_context] Определил параметр {param_name} как число на основе контекста")
+            return 1
         
-        for pattern in string_patterns:
-            if re.search(pattern, script_content, re.IGNORECASE):
-                print(f"[analyze_param_context] Определил параметр {param_name} как строку на основе контекста")
-                return "'test'"
+        # Проверка на строковый тип: сравнение со строкой, IN ('a', ...), ::text
+        if any(usage.is_string() for usage in usages):
+            print(f"[analyze_param_context] Определил параметр {param_name} как строку на основе контекста")
+            return "'test'"
         
         return None
 
     def replace_params(self, script_content, params_dict=None):
         """
-        Заменяет параметры в скрипте на значения по умолчанию или из словаря
+        Заменяет параметры в скрипте на значения по умолчанию или из словаря.
+        Вхождения параметров и их контекст индексируются один раз (ParamIndex),
+        подстановка выполняется одним проходом по скрипту
         """
         if params_dict is None:
             params_dict = {}
+        # Скрипт может быть передан строкой или уже разобранным (ParsedScript)
+        parsed = ParsedScript.of(script_content)
+        script_content = parsed.text
             
         # Анализируем алиасы таблиц для лучшего понимания контекста параметров
-        table_aliases = self.alias_analyzer.get_table_aliases(script_content)
-        column_to_table = self.alias_analyzer.get_column_to_table_mapping(script_content)
+        table_aliases = self.alias_analyzer.get_table_aliases(parsed)
         
         # Выводим найденные алиасы для отладки
         print(f"[replace_params] Обнаружены следующие алиасы таблиц:")
@@ -127,47 +114,56 @@ class SQLParser:
                 print(f"  {table}: {', '.join(aliases)}")
             else:
                 print(f"  {table}: Нет алиаса")
-                
+        
+        index = parsed.param_index
+        
         # 0. Спецобработка: если есть сравнение двух параметров — оба подставлять как 1
-        param_cmp_pattern = r'(\{params\.[^\}]+\})\s*=\s*(\{params\.[^\}]+\})'
-        for m in re.finditer(param_cmp_pattern, script_content):
-            p1 = m.group(1)[1:-1]  # убираем {}
-            p2 = m.group(2)[1:-1]
+        for p1, p2 in index.param_pairs():
             params_dict[p1] = 1
             params_dict[p2] = 1
             print(f"[replace_params] Сравнение двух параметров: {p1} = {p2} -> 1 = 1")
         # 0.1. Спецобработка: если есть {PPRCONST.EdDV1y}, {PPRCONST.EdDV2y}, {PPRCONST.EdDV3y} — всегда подставлять 1
         for eddv in ['PPRCONST.EdDV1y', 'PPRCONST.EdDV2y', 'PPRCONST.EdDV3y']:
-            if f'{{{eddv}}}' in script_content:
+            if eddv in index.by_name:
                 params_dict[eddv] = 1
                 print(f"[replace_params] Спец: {eddv} -> 1")
         # 0.2. Спецобработка: если есть конструкции THEN {PPRCONST.*} — подставлять 1
-        for m in re.finditer(r'THEN\s*\{(PPRCONST\.[^\}]+)\}', script_content):
-            param = m.group(1)
-            params_dict[param] = 1
-            print(f"[replace_params] THEN {{{param}}} -> 1")
         # 0.3. Если параметр {PPRCONST.*} участвует в арифметике — подставлять 1
-        for m in re.finditer(r'[\+\-\*/]\s*\{(PPRCONST\.[^\}]+)\}|\{(PPRCONST\.[^\}]+)\}\s*[\+\-\*/]', script_content):
-            param = m.group(1) or m.group(2)
-            params_dict[param] = 1
-            print(f"[replace_params] Арифметика с {{{param}}} -> 1")
+        for usage in index.usages:
+            if not usage.name.startswith('PPRCONST.') or usage.name == 'PPRCONST.':
+                continue
+            if usage.after_then:
+                params_dict[usage.name] = 1
+                print(f"[replace_params] THEN {{{usage.name}}} -> 1")
+            if usage.arithmetic:
+                params_dict[usage.name] = 1
+                print(f"[replace_params] Арифметика с {{{usage.name}}} -> 1")
         # 1. Собираем все параметры
-        all_params = set(re.findall(r'\{([^\}]+)\}', script_content))
+        all_params = index.names
+        
+        # 1.1. Словарь типов по всему набору скриптов: найденные в нем параметры
+        # не анализируются по отдельному скрипту и не проверяются по БД
+        from_dictionary = set()
+        if self.param_types is not None:
+            for param in all_params:
+                if param in params_dict or param not in self.param_types:
+                    continue
+                from_dictionary.add(param)
+                val = self.param_types.value(param)
+                if val is not None:
+                    params_dict[param] = val
+                    print(f"[replace_params] По словарю типов: {param} = {val}")
         
         # 2. Анализируем алиасы таблиц для параметров в выражениях с таблицами
         # Ищем параметры, используемые в сравнениях с колонками таблиц
         # Паттерн: alias.column = {params.value} или {params.value} = alias.column
-        col_param_pattern = r'([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)\s*=\s*\{([^\}]+)\}|\{([^\}]+)\}\s*=\s*([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)'
-        for m in re.finditer(col_param_pattern, script_content):
-            # Определяем параметр и колонку из выражения
-            if m.group(3):  # alias.column = {params.value}
-                alias, column, param = m.group(1), m.group(2), m.group(3)
-            else:  # {params.value} = alias.column
-                param, alias, column = m.group(4), m.group(5), m.group(6)
-                
-            if param in all_params and param not in params_dict:
+        for usage in index.usages:
+            param = usage.name
+            for alias, column in usage.columns():
+                if param in params_dict or param in from_dictionary:
+                    break
                 # Определяем таблицу по алиасу
-                table = self.alias_analyzer.get_table_by_alias(script_content, alias)
+                table = self._table_by_alias(script_content, alias, usage)
                 if table:
                     print(f"[replace_params] Параметр {param} используется в сравнении с {alias}.{column} (таблица: {table})")
                     # Подбираем значение в зависимости от имени колонки
@@ -180,8 +176,8 @@ class SQLParser:
                 
         # 3. Анализируем контекст использования параметров
         for param in all_params:
-            if param not in params_dict:
-                val = self.analyze_param_context(script_content, param)
+            if param not in params_dict and param not in from_dictionary:
+                val = self.analyze_param_context(script_content, param, index)
                 if val is not None:
                     params_dict[param] = val
                     print(f"[replace_params] На основе анализа контекста: {param} = {val}")
@@ -195,9 +191,9 @@ class SQLParser:
                     print(f"[replace_params] По шаблону имени: {param} = {val}")
         
         # 5. Для остальных — пробуем через БД
-        missing_params = [p for p in all_params if p not in params_dict]
+        missing_params = [p for p in all_params if p not in params_dict and p not in from_dictionary]
         if missing_params:
-            db_param_types = self.guess_param_type_from_db(script_content)
+            db_param_types = self.guess_param_type_from_db(parsed, index)
             for p in missing_params:
                 if p in db_param_types and db_param_types[p] is not None:
                     params_dict[p] = db_param_types[p]
@@ -209,110 +205,55 @@ class SQLParser:
                 params_dict[param] = f"'default_{param}'"
                 print(f"[replace_params] Fallback на строку: {param} = {params_dict[param]}")
         
-        # 7. Подстановка
-        for param in all_params:
-            script_content = script_content.replace(f'{{{param}}}', str(params_dict[param]))
-        
-        return script_content
+        # 7. Подстановка одним проходом по позициям параметров
+        return index.substitute(params_dict)
 
-    def guess_param_type_from_db(self, script_content):
+    def guess_param_type_from_db(self, script_content, index=None):
         """
         Возвращает словарь {param_name: value} для подстановки, основываясь на типах полей в БД.
         Если не удалось определить тип — value = None.
-        Требует self.config.DB_CONN (psycopg2 connection) или self.config.PG_CONFIG для создания соединения.
+        Поля, с которыми сравниваются параметры, берутся из индекса параметров (ParamIndex).
+        Типы колонок берутся из снимка каталога схемы (src/schema_catalog.py), который загружается
+        через self.config.DB_CONN, self.config.PG_CONFIG или из файла SCHEMA_CATALOG_FILE.
         Теперь учитывает alias -> table_name для FROM/JOIN.
         """
-        import sqlparse
         param_types = {}
-        pattern = r'([a-zA-Z_][\w\.]*)\s*=\s*\{([^\}]+)\}'
-        conn = getattr(self.config, 'DB_CONN', None)
-        close_conn = False
-        print("[guess_param_type_from_db] Пытаюсь получить соединение с БД...")
-        if conn is None and hasattr(self.config, 'PG_CONFIG'):
-            try:
-                import psycopg2
-                pg = self.config.PG_CONFIG
-                conn = psycopg2.connect(
-                    host=pg['host'], port=pg['port'], database=pg['database'], user=pg['user'], password=pg['password']
-                )
-                close_conn = True
-                print("[guess_param_type_from_db] Соединение с БД установлено.")
-            except Exception as e:
-                print(f"[guess_param_type_from_db] Не удалось создать соединение с БД: {e}")
-                conn = None
-        if conn is None:
-            print("[guess_param_type_from_db] Нет соединения с БД, возвращаю пустой словарь.")
+        # Типы колонок берутся из общего снимка каталога схемы (один запрос на весь процесс)
+        catalog = get_schema_catalog(self.config)
+        if not catalog.ensure_loaded(getattr(self.config, 'DB_CONN', None)):
+            print("[guess_param_type_from_db] Каталог схемы недоступен, возвращаю пустой словарь.")
             return param_types
-        # --- Новый блок: строим alias_map ---
-        def extract_alias_map(sql):
-            from sqlparse.sql import Identifier, IdentifierList
-            from sqlparse.tokens import Keyword
-            alias_map = {}
-            parsed = sqlparse.parse(sql)
-            for stmt in parsed:
-                from_seen = False
-                def process_token(token):
-                    nonlocal from_seen
-                    if from_seen:
-                        if isinstance(token, IdentifierList):
-                            for identifier in token.get_identifiers():
-                                real = identifier.get_real_name()
-                                alias = identifier.get_alias()
-                                if alias:
-                                    alias_map[alias] = real
-                        elif isinstance(token, Identifier):
-                            real = token.get_real_name()
-                            alias = token.get_alias()
-                            if alias:
-                                alias_map[alias] = real
-                        elif hasattr(token, 'is_group') and token.is_group:
-                            for t in token.tokens:
-                                process_token(t)
-                        # Не break — ищем все FROM/JOIN
-                    elif token.ttype is Keyword and token.value.upper() in ('FROM', 'JOIN'):
-                        from_seen = True
-                for token in stmt.tokens:
-                    process_token(token)
-            return alias_map
+        # alias -> table_name для FROM/JOIN по токенам sqlparse (запоминается в ParsedScript)
+        parsed = ParsedScript.of(script_content)
         try:
-            alias_map = extract_alias_map(script_content)
+            alias_map = parsed.alias_map
         except Exception as e:
             print(f"[guess_param_type_from_db] Ошибка при парсинге алиасов: {e}")
             alias_map = {}
         print(f"[guess_param_type_from_db] alias_map: {alias_map}")
-        # --- Конец блока alias_map ---
-        # Новый универсальный паттерн: ищет field op {param} и {param} op field
-        pattern = r'([a-zA-Z_][\w\.]*)\s*(=|<|>|<=|>=|!=|<>)\s*\{([^\}]+)\}|\{([^\}]+)\}\s*(=|<|>|<=|>=|!=|<>)\s*([a-zA-Z_][\w\.]*)'
-        for match in re.finditer(pattern, script_content):
-            if match.group(1) and match.group(3):
-                field_expr, param_name = match.group(1), match.group(3)
-            elif match.group(4) and match.group(6):
-                field_expr, param_name = match.group(6), match.group(4)
-            else:
+        if index is None:
+            index = parsed.param_index
+        # Поле, с которым параметр сравнивается: field op {param} или {param} op field
+        for usage in index.usages:
+            fields = [operand.field for operand in usage.operands() if operand.field]
+            if not fields:
                 continue
+            field_expr, param_name = fields[0], usage.name
             if param_name in param_types:
                 continue
             if '.' in field_expr:
                 alias, field = field_expr.split('.', 1)
-                table = alias_map.get(alias, alias)  # если алиас не найден — fallback на alias
+                # Алиас ищется в области видимости параметра, затем в карте алиасов FROM/JOIN;
+                # если алиас не найден — fallback на alias
+                table = (self.alias_analyzer.get_table_by_alias(parsed, alias, usage.start)
+                         or alias_map.get(alias, alias))
             else:
                 table, field = None, field_expr
             col_type = None
             if table:
-                try:
-                    with conn.cursor() as cur:
-                        cur.execute("""
-                            SELECT data_type
-                            FROM information_schema.columns
-                            WHERE table_name = %s AND column_name = %s
-                            LIMIT 1
-                        """, (table.lower(), field.lower()))
-                        row = cur.fetchone()
-                        if row:
-                            col_type = row[0]
-                            print(f"[guess_param_type_from_db] {table}.{field} (param: {param_name}) — тип: {col_type}")
-                except Exception as e:
-                    print(f"[guess_param_type_from_db] Не удалось получить тип для {table}.{field}: {e}")
+                col_type = catalog.get_column_type(table, field)
+                if col_type:
+                    print(f"[guess_param_type_from_db] {table}.{field} (param: {param_name}) — тип: {col_type}")
             if col_type is not None:
                 if col_type in ('integer', 'bigint', 'smallint'):
                     param_types[param_name] = 1
@@ -330,8 +271,5 @@ class SQLParser:
             else:
                 param_types[param_name] = None
                 print(f"[guess_param_type_from_db] Не удалось определить тип для {param_name}, value=None")
-        if close_conn:
-            conn.close()
-            print("[guess_param_type_from_db] Соединение с БД закрыто.")
         print(f"[guess_param_type_from_db] Итоговый param_types: {param_types}")
         return param_types
@@ -0,0 +1,223 @@
+"""
+Модуль для выполнения SQL-скриптов в PostgreSQL внутри процесса через пул соединений.
+Заменяет запуск внешнего процесса psql на каждую проверку скрипта, сохраняя
+семантику ON_ERROR_STOP и формат сообщений об ошибках psql.
+"""
+
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple, Union
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.pool
+
+from src.parsed_script import ParsedScript
+from src.regex_registry import regex
+
+# Пулы соединений по параметрам подключения, общие для всех потоков
+_pools: Dict[tuple, psycopg2.pool.ThreadedConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+_COMMENT_RE = regex('pg_pool.comment', r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+_PG_LINE_RE = regex('pg_pool.line', r'^(?:LINE|СТРОКА) (\d+):', re.MULTILINE)
+
+
+def _pool_key(pg_config: dict) -> tuple:
+    return (pg_config['host'], int(pg_config['port']), pg_config['database'], pg_config['user'])
+
+
+def get_pool(pg_config: dict, max_connections: int = 8) -> psycopg2.pool.ThreadedConnectionPool:
+    """
+    Возвращает пул соединений для указанных параметров подключения, создавая его при необходимости
+
+    Args:
+        pg_config: Словарь с параметрами подключения (host, port, database, user, password)
+        max_connections: Максимальное количество соединений в пуле
+
+    Returns:
+        ThreadedConnectionPool: Потокобезопасный пул соединений
+    """
+    key = _pool_key(pg_config)
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = psycopg2.pool.ThreadedConnectionPool(
+                0, max_connections,
+                host=pg_config['host'],
+                port=pg_config['port'],
+                database=pg_config['database'],
+                user=pg_config['user'],
+                password=pg_config['password']
+            )
+            _pools[key] = pool
+        return pool
+
+
+def close_all_pools():
+    """Закрывает все соединения во всех пулах"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
+
+
+@contextmanager
+def pooled_connection(pg_config: dict, max_connections: int = 8):
+    """
+    Выдает соединение из пула и возвращает его обратно с очисткой состояния сессии.
+    Временные таблицы, настройки и подготовленные запросы сбрасываются через DISCARD ALL,
+    поэтому каждая проверка видит «чистую» сессию, как при новом запуске psql.
+    """
+    pool = get_pool(pg_config, max_connections)
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        if conn.closed:
+            broken = True
+        if not broken:
+            try:
+                if not conn.autocommit:
+                    conn.rollback()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute("DISCARD ALL")
+                conn.autocommit = False
+            except psycopg2.Error:
+                broken = True
+        pool.putconn(conn, close=broken)
+
+
+def statement_spans(script: Union[str, ParsedScript]) -> List[Tuple[int, int, int]]:
+    """
+    Находит границы операторов скрипта
+
+    Границы запоминаются в ParsedScript, поэтому выполнение скрипта и поиск
+    оператора с ошибкой разбирают одну версию скрипта один раз
+
+    Args:
+        script: SQL скрипт (строка или ParsedScript)
+
+    Returns:
+        List[Tuple[int, int, int]]: Список (начало, конец, номер_первой_строки); операторы,
+        состоящие только из комментариев, пропускаются
+    """
+    parsed = ParsedScript.of(script)
+    return parsed.cached('spans', lambda: _find_spans(parsed))
+
+
+def _find_spans(parsed: ParsedScript) -> List[Tuple[int, int, int]]:
+    script = parsed.text
+    spans = []
+    line_start = 0
+    line = 1
+    for statement, position in zip(parsed.statements, parsed.statement_offsets):
+        line += script.count('\n', line_start, position)
+        line_start = position
+        if _COMMENT_RE.sub('', statement).strip().strip(';').strip():
+            spans.append((position, position + len(statement), line))
+    return spans
+
+
+def split_statements(script: Union[str, ParsedScript]) -> List[Tuple[int, str]]:
+    """
+    Разделяет скрипт на отдельные операторы с номерами строк их начала
+
+    Args:
+        script: SQL скрипт (строка или ParsedScript)
+
+    Returns:
+        List[Tuple[int, str]]: Список (номер_первой_строки, оператор)
+    """
+    text = ParsedScript.of(script).text
+    return [(line, text[start:end]) for start, end, line in statement_spans(script)]
+
+
+def format_psql_error(error: psycopg2.Error, source: str, statement_line: int) -> str:
+    """
+    Формирует сообщение об ошибке в том же виде, в котором его выводит psql:
+    ``psql:<файл>:<строка>: ERROR:  ...`` с последующими строками LINE/HINT
+
+    Args:
+        error: Исключение psycopg2
+        source: Имя «файла» для префикса
+        statement_line: Номер строки начала оператора в скрипте
+
+    Returns:
+        str: Текст ошибки
+    """
+    message = error.pgerror or str(error)
+    line = statement_line
+    match = _PG_LINE_RE.search(message)
+    if match:
+        line = statement_line + int(match.group(1)) - 1
+    return f"psql:{source}:{line}: {message.rstrip()}\n"
+
+
+def execute_script(script: str, pg_config: dict, timeout_seconds: Optional[int] = None,
+                   max_connections: int = 8, source: str = 'script.sql') -> Tuple[bool, str]:
+    """
+    Выполняет скрипт оператор за оператором с семантикой psql ``-v ON_ERROR_STOP=1``:
+    каждый оператор фиксируется сразу, выполнение прекращается на первой ошибке
+
+    Args:
+        script: SQL скрипт
+        pg_config: Параметры подключения к PostgreSQL
+        timeout_seconds: Ограничение времени выполнения одного оператора
+        max_connections: Размер пула соединений
+        source: Имя «файла» для сообщений об ошибках
+
+    Returns:
+        Tuple[bool, str]: (успех, сообщение об ошибке в формате psql)
+
+    Raises:
+        psycopg2.OperationalError: Если не удалось подключиться к серверу
+    """
+    statements = split_statements(script)
+    with pooled_connection(pg_config, max_connections) as conn:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            if timeout_seconds:
+                cursor.execute("SET statement_timeout = %s", (int(timeout_seconds * 1000),))
+            for statement_line, statement in statements:
+                try:
+                    cursor.execute(statement)
+                except psycopg2.errors.QueryCanceled:
+                    return False, f"Превышен таймаут выполнения ({timeout_seconds} секунд)"
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    raise
+                except psycopg2.Error as e:
+                    return False, format_psql_error(e, source, statement_line)
+    return True, ""
+
+
+class ExecutionStats:
+    """Потокобезопасная статистика времени проверок скриптов"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.total_time = 0.0
+
+    def record(self, elapsed: float):
+        with self._lock:
+            self.calls += 1
+            self.total_time += elapsed
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'total_time': self.total_time,
+                'average_time': self.total_time / self.calls if self.calls else 0.0,
+            }
+
@@ -4,12 +4,25 @@ import re
 import docker
 from contextlib import contextmanager
 from src.ai_converter import AIConverter
+from src.fix_rules import get_fix_rule_book
+from src.regex_registry import regex, template_regex
+
+_MISSING_COLUMN_RE = regex('postgres_tester.missing_column', r'column "(.*?)" does not exist')
+_MISSING_RELATION_RE = regex('postgres_tester.missing_relation', r'relation "(.*?)" does not exist')
+_TOP_NUMBER_RE = regex('postgres_tester.top_number', r'SELECT\s+TOP\s+(\d+)', re.IGNORECASE)
+_TOP_RE = regex('postgres_tester.top', r'SELECT\s+TOP\s+\d+', re.IGNORECASE)
+_SCRIPT_END_RE = regex('postgres_tester.script_end', r';?\s*$')
+_DECLARE_RE = regex('postgres_tester.declare', r'DECLARE\s+@(\w+)\s+([^=;]+)(?:\s*=\s*([^;]+))?;', re.IGNORECASE)
+_DECLARE_TABLE_RE = regex('postgres_tester.declare_table', r'DECLARE\s+@(\w+)\s+TABLE\s*\(([\s\S]+?)\);', re.IGNORECASE)
 
 class PostgresTester:
     def __init__(self, config):
         self.config = config
         self.pg_config = config.PG_CONFIG
         self.ai_converter = None  # Ленивая инициализация AI конвертера
+        # Правила, выученные на исправлениях нейросети, и правила, примененные последними
+        self.fix_rules = get_fix_rule_book(config)
+        self.applied_learned_rules = []
         
     @contextmanager
     def get_connection(self):
@@ -154,6 +167,8 @@ class PostgresTester:
         
         # Если стандартные методы помогли, возвращаем результат
         if test_result['success']:
+            if self.fix_rules is not None:
+                self.fix_rules.mark_hit(self.applied_learned_rules)
             return fixed_script
         
         # Если стандартные методы не помогли и разрешено использование AI
@@ -215,31 +230,36 @@ class PostgresTester:
                 
         elif "column" in error_message and "does not exist" in error_message:
             # Проблема с именем столбца
-            match = re.search(r'column "(.*?)" does not exist', error_message)
+            match = _MISSING_COLUMN_RE.search(error_message)
             if match:
                 column_name = match.group(1)
                 fixed_script = self._fix_column_name(fixed_script, column_name)
         
         elif "relation" in error_message and "does not exist" in error_message:
             # Проблема с именем таблицы
-            match = re.search(r'relation "(.*?)" does not exist', error_message)
+            match = _MISSING_RELATION_RE.search(error_message)
             if match:
                 table_name = match.group(1)
                 fixed_script = self._fix_table_name(fixed_script, table_name)
         
         # Дополнительные правила исправления можно добавлять здесь
+        
+        # Правила, выученные на исправлениях нейросети для ошибки с той же сигнатурой
+        self.applied_learned_rules = []
+        if self.fix_rules is not None:
+            fixed_script, self.applied_learned_rules = self.fix_rules.apply(fixed_script, error_message)
                 
         return fixed_script
     
     def _convert_top_to_limit(self, script):
         """Преобразует TOP в LIMIT"""
         # Находим TOP и заменяем на эквивалент LIMIT
-        match = re.search(r'SELECT\s+TOP\s+(\d+)', script, re.IGNORECASE)
+        match = _TOP_NUMBER_RE.search(script)
         if match:
             limit = match.group(1)
-            script = re.sub(r'SELECT\s+TOP\s+\d+', 'SELECT', script, flags=re.IGNORECASE)
+            script = _TOP_RE.sub('SELECT', script)
             # Добавляем LIMIT в конец запроса
-            script = re.sub(r';?\s*$', f' LIMIT {limit};', script)
+            script = _SCRIPT_END_RE.sub(f' LIMIT {limit};', script)
         return script
     
     def _fix_column_name(self, script, column_name):
@@ -251,7 +271,7 @@ class PostgresTester:
         """Пытается исправить имя таблицы"""
         # Добавляем двойные кавычки вокруг имени таблицы
         pattern = r'\b' + re.escape(table_name) + r'\b'
-        return re.sub(pattern, f'"{table_name}"', script)
+        return template_regex('postgres_tester.table_name', pattern).sub(f'"{table_name}"', script)
     
     def _fix_variable_declarations(self, script):
         """Исправляет объявления переменных в PostgreSQL"""
@@ -259,7 +279,7 @@ class PostgresTester:
         # Заменяем на DO блок с объявлениями переменных внутри
         
         # Ищем все объявления переменных
-        declarations = re.findall(r'DECLARE\s+@(\w+)\s+([^=;]+)(?:\s*=\s*([^;]+))?;', script, re.IGNORECASE)
+        declarations = _DECLARE_RE.findall(script)
         
         if declarations:
             # Формируем DO блок
@@ -277,7 +297,7 @@ class PostgresTester:
                 if var_value:
                     pattern += r'\s*=\s*' + re.escape(var_value)
                 pattern += r';'
-                script = re.sub(pattern, '', script, flags=re.IGNORECASE)
+                script = template_regex('postgres_tester.declaration', pattern, re.IGNORECASE).sub('', script)
             
             # Добавляем конец DO блока
             script = do_block + script.strip() + "\nEND $$;"
@@ -287,7 +307,7 @@ class PostgresTester:
     def _fix_temp_tables(self, script):
         """Исправляет временные таблицы в PostgreSQL"""
         # Заменяем @TempTable на временные таблицы PostgreSQL
-        temp_tables = re.findall(r'DECLARE\s+@(\w+)\s+TABLE\s*\(([\s\S]+?)\);', script, re.IGNORECASE)
+        temp_tables = _DECLARE_TABLE_RE.findall(script)
         
         if temp_tables:
             for table_name, columns in temp_tables:
@@ -296,9 +316,9 @@ class PostgresTester:
                 
                 # Заменяем оригинальное объявление
                 pattern = r'DECLARE\s+@' + re.escape(table_name) + r'\s+TABLE\s*\(' + re.escape(columns) + r'\);'
-                script = re.sub(pattern, create_stmt, script, flags=re.IGNORECASE)
+                script = template_regex('postgres_tester.declare_table_name', pattern, re.IGNORECASE).sub(create_stmt, script)
                 
                 # Также заменяем все упоминания @table_name на table_name
-                script = re.sub(r'@' + re.escape(table_name), table_name, script)
+                script = template_regex('postgres_tester.table_variable', r'@' + re.escape(table_name)).sub(table_name, script)
                 
         return script
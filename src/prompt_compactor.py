@@ -0,0 +1,256 @@
+"""
+Модуль для обратимого сжатия SQL перед отправкой нейросети.
+Из скрипта удаляются комментарии, отступы, пустые строки и повторяющиеся пробелы
+вне строковых литералов, идентификаторов в кавычках и тел в долларовых кавычках ($$...$$).
+Комментарии запоминаются
+вместе со строкой кода, к которой относятся, и после конвертации возвращаются
+на место: строки сжатого скрипта сопоставляются со строками результата.
+"""
+
+import difflib
+import re
+from typing import Dict, List, Optional
+
+_NORMALIZE_RE = re.compile(r'[\[\]"`]')
+# Открывающая долларовая кавычка PostgreSQL: $$ или $тег$
+_DOLLAR_QUOTE_RE = re.compile(r'\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$')
+
+
+class SQLComment:
+    """Комментарий исходного скрипта и строка сжатого скрипта, к которой он относится"""
+
+    def __init__(self, text: str, line: int, inline: bool):
+        self.text = text
+        # Номер строки сжатого скрипта: перед ней (inline=False) или в ее конце (inline=True)
+        self.line = line
+        self.inline = inline
+
+    def __repr__(self):
+        return f"SQLComment({self.line}, {'inline' if self.inline else 'before'}, {self.text!r})"
+
+
+def _literal_end(script: str, start: int) -> int:
+    """Индекс символа после строкового литерала или идентификатора в кавычках"""
+    opening = script[start]
+    closing = ']' if opening == '[' else opening
+    # E'...' в PostgreSQL допускает экранирование обратной косой чертой
+    backslash = opening == "'" and start > 0 and script[start - 1] in 'eE' and (
+        start < 2 or not (script[start - 2].isalnum() or script[start - 2] == '_'))
+    i = start + 1
+    n = len(script)
+    while i < n:
+        ch = script[i]
+        if backslash and ch == '\\':
+            i += 2
+            continue
+        if ch == closing:
+            # Удвоенная кавычка — экранирование внутри литерала
+            if i + 1 < n and script[i + 1] == closing:
+                i += 2
+                continue
+            return i + 1
+        i += 1
+    return n
+
+
+def _dollar_quote_end(script: str, start: int) -> Optional[int]:
+    """
+    Индекс символа после тела в долларовых кавычках, начинающегося в start,
+    или None, если в start нет открывающей кавычки
+    """
+    # $ внутри имени (a$b$) долларовую кавычку не открывает
+    if start > 0 and (script[start - 1].isalnum() or script[start - 1] in '_$'):
+        return None
+    match = _DOLLAR_QUOTE_RE.match(script, start)
+    if match is None:
+        return None
+    end = script.find(match.group(0), match.end())
+    return len(script) if end == -1 else end + len(match.group(0))
+
+
+def _block_comment_end(script: str, start: int) -> int:
+    """Индекс символа после блочного комментария (в T-SQL комментарии могут быть вложенными)"""
+    depth = 0
+    i = start
+    n = len(script)
+    while i < n:
+        if script.startswith('/*', i):
+            depth += 1
+            i += 2
+        elif script.startswith('*/', i):
+            depth -= 1
+            i += 2
+            if depth == 0:
+                return i
+        else:
+            i += 1
+    return n
+
+
+class CompactedScript:
+    """Сжатый скрипт и удаленные из него комментарии"""
+
+    def __init__(self, original: str, text: str, comments: List[SQLComment]):
+        self.original = original
+        self.text = text
+        self.comments = comments
+
+    @property
+    def saved_chars(self) -> int:
+        return len(self.original) - len(self.text)
+
+    def restore(self, converted: str) -> str:
+        """
+        Возвращает комментарии в сконвертированный скрипт
+
+        Строки сжатого скрипта сопоставляются со строками результата (без учета регистра,
+        пробелов и кавычек идентификаторов); комментарий вставляется перед строкой
+        результата, соответствующей его строке, или в конец этой строки. Если строка
+        была удалена при конвертации, используется ближайшая следующая.
+
+        Args:
+            converted: Сконвертированный сжатый скрипт
+
+        Returns:
+            str: Скрипт с комментариями
+        """
+        if not self.comments:
+            return converted
+
+        source_lines = self.text.split('\n')
+        converted_lines = converted.split('\n')
+        mapping = _map_lines(source_lines, converted_lines)
+
+        before: Dict[int, List[str]] = {}
+        inline: Dict[int, List[str]] = {}
+        for comment in self.comments:
+            target = _resolve_target(mapping, comment.line, len(source_lines))
+            if target is None:
+                # Строку и все следующие сопоставить не удалось — комментарий в конец
+                before.setdefault(len(converted_lines), []).append(comment.text)
+            elif comment.inline:
+                inline.setdefault(target, []).append(comment.text)
+            else:
+                before.setdefault(target, []).append(comment.text)
+
+        result = []
+        for index, line in enumerate(converted_lines):
+            indent = line[:len(line) - len(line.lstrip())]
+            for text in before.get(index, []):
+                result.append(indent + text)
+            for text in inline.get(index, []):
+                line = f"{line}  {text}" if text.startswith('--') else f"{line} {text}"
+            result.append(line)
+        result.extend(before.get(len(converted_lines), []))
+        return '\n'.join(result)
+
+
+def _normalize_line(line: str) -> str:
+    return _NORMALIZE_RE.sub('', ' '.join(line.lower().split()))
+
+
+def _map_lines(source_lines: List[str], converted_lines: List[str]) -> Dict[int, int]:
+    """Сопоставляет строки сжатого скрипта строкам результата"""
+    matcher = difflib.SequenceMatcher(
+        None,
+        [_normalize_line(line) for line in source_lines],
+        [_normalize_line(line) for line in converted_lines],
+        autojunk=False,
+    )
+    mapping = {}
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            for offset in range(i2 - i1):
+                mapping[i1 + offset] = j1 + offset
+        elif tag == 'replace':
+            # Измененные строки распределяем пропорционально
+            for offset in range(i2 - i1):
+                mapping[i1 + offset] = j1 + offset * (j2 - j1) // (i2 - i1)
+    return mapping
+
+
+def _resolve_target(mapping: Dict[int, int], line: int, total: int) -> Optional[int]:
+    for source_line in range(line, total):
+        if source_line in mapping:
+            return mapping[source_line]
+    return None
+
+
+def compact_sql(script: str) -> CompactedScript:
+    """
+    Удаляет комментарии и лишние пробелы вне строковых литералов и тел в долларовых кавычках
+
+    Строки кода сохраняются (без отступов и пустых строк), чтобы номера строк
+    в ответе и сообщениях об ошибках оставались осмысленными.
+
+    Args:
+        script: SQL-скрипт
+
+    Returns:
+        CompactedScript: Сжатый скрипт и комментарии для восстановления
+    """
+    out: List[str] = []
+    comments: List[SQLComment] = []
+    line = 0
+    line_has_code = False
+    pending_space = False
+    i = 0
+    n = len(script)
+
+    while i < n:
+        ch = script[i]
+        if ch == '\n':
+            if line_has_code:
+                out.append('\n')
+                line += 1
+            line_has_code = False
+            pending_space = False
+            i += 1
+        elif ch in ' \t\r\f\v':
+            pending_space = line_has_code
+            i += 1
+        elif script.startswith('--', i):
+            end = script.find('\n', i)
+            end = n if end == -1 else end
+            comments.append(SQLComment(script[i:end].rstrip(), line, line_has_code))
+            i = end
+        elif script.startswith('/*', i):
+            end = _block_comment_end(script, i)
+            text = script[i:end]
+            if line_has_code:
+                comments.append(SQLComment(text, line, True))
+                # Комментарий между лексемами разделяет их
+                pending_space = True
+            else:
+                comments.append(SQLComment(text, line, False))
+            i = end
+        elif ch in '\'"[$':
+            # Тело в долларовых кавычках (функции, DO-блоки) сохраняется как есть, с отступами
+            end = _literal_end(script, i) if ch != '$' else _dollar_quote_end(script, i)
+            if end is None:
+                if pending_space:
+                    out.append(' ')
+                    pending_space = False
+                out.append(ch)
+                line_has_code = True
+                i += 1
+                continue
+            if pending_space:
+                out.append(' ')
+                pending_space = False
+            literal = script[i:end]
+            out.append(literal)
+            line += literal.count('\n')
+            line_has_code = True
+            i = end
+        else:
+            if pending_space:
+                out.append(' ')
+                pending_space = False
+            out.append(ch)
+            line_has_code = True
+            i += 1
+
+    text = ''.join(out).rstrip('\n')
+    return CompactedScript(script, text, comments)
+
@@ -0,0 +1,165 @@
+"""
+Модуль общего реестра скомпилированных регулярных выражений.
+Постоянные шаблоны регистрируются под именем при импорте модуля (regex) и
+компилируются один раз на процесс. Шаблоны с подстановкой значений (имя типа,
+таблицы, переменной) компилируются при первом использовании и хранятся в небольшом
+LRU (template_regex), а статистика по ним собирается под общим именем.
+
+В режиме замеров (REGEX_TIMING или enable_timing) для каждого имени считаются
+количество вызовов и суммарное время, regex_stats возвращает самые медленные
+выражения. Без замеров методы шаблона — методы скомпилированного выражения,
+поэтому дополнительных расходов нет.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Количество различных шаблонов с подстановкой значений, которые хранятся скомпилированными
+TEMPLATE_CACHE_SIZE = 512
+
+_METHODS = ('search', 'match', 'fullmatch', 'findall', 'finditer', 'sub', 'subn', 'split')
+
+_lock = threading.Lock()
+_timing = False
+_registry: Dict[str, 'RegexPattern'] = {}
+_templates: 'OrderedDict[Tuple[str, int], RegexPattern]' = OrderedDict()
+# Статистика по именам: [количество вызовов, суммарное время в секундах, шаблон]
+_stats: Dict[str, list] = {}
+
+
+class RegexPattern:
+    """
+    Скомпилированное выражение реестра. Поддерживает методы re.Pattern
+    (search, match, fullmatch, findall, finditer, sub, subn, split)
+
+    Args:
+        name: Имя, под которым собирается статистика
+        pattern: Текст регулярного выражения
+        flags: Флаги re
+    """
+
+    def __init__(self, name: str, pattern: str, flags: int = 0):
+        self.name = name
+        self.regex = re.compile(pattern, flags)
+        self.pattern = pattern
+        self.flags = flags
+        # То же выражение, скомпилированное модулем regex для выполнения с бюджетом времени (src/rule_guard.py)
+        self.guarded = None
+        self._bind(_timing)
+
+    def _bind(self, timing: bool):
+        for method in _METHODS:
+            function = getattr(self.regex, method)
+            setattr(self, method, _timed(self.name, function, method == 'finditer') if timing else function)
+
+    def __repr__(self):
+        return f"RegexPattern({self.name!r}, {self.pattern!r})"
+
+
+def _timed(name: str, function, materialize: bool = False):
+    """Обертка, учитывающая вызов в статистике name. Время включает функции замены sub"""
+    def call(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+            # finditer ищет совпадения при обходе, поэтому в режиме замеров обходится сразу
+            return iter(list(result)) if materialize else result
+        finally:
+            elapsed = time.perf_counter() - start
+            with _lock:
+                entry = _stats[name]
+                entry[0] += 1
+                entry[1] += elapsed
+    return call
+
+
+def regex(name: str, pattern: str, flags: int = 0) -> RegexPattern:
+    """
+    Регистрирует постоянное выражение под именем name и компилирует его
+
+    Повторная регистрация того же шаблона возвращает уже скомпилированное выражение,
+    другого шаблона под тем же именем — ValueError
+    """
+    with _lock:
+        compiled = _registry.get(name)
+        if compiled is not None:
+            if (compiled.pattern, compiled.flags) != (pattern, flags):
+                raise ValueError(f"Имя регулярного выражения уже занято другим шаблоном: {name}")
+            return compiled
+        compiled = RegexPattern(name, pattern, flags)
+        _registry[name] = compiled
+        _stats.setdefault(name, [0, 0.0, pattern])
+        return compiled
+
+
+def template_regex(name: str, pattern: str, flags: int = 0) -> RegexPattern:
+    """
+    Выражение, собранное из шаблона с подстановкой значений.
+    Компилируется при первом использовании, статистика собирается под общим именем name
+    """
+    key = (pattern, flags)
+    with _lock:
+        compiled = _templates.get(key)
+        if compiled is not None and compiled.name == name:
+            _templates.move_to_end(key)
+            return compiled
+        compiled = RegexPattern(name, pattern, flags)
+        _templates[key] = compiled
+        while len(_templates) > TEMPLATE_CACHE_SIZE:
+            _templates.popitem(last=False)
+        _stats.setdefault(name, [0, 0.0, pattern])
+        return compiled
+
+
+def enable_timing(enabled: bool = True):
+    """Включает или выключает замер времени для всех выражений реестра"""
+    global _timing
+    with _lock:
+        _timing = enabled
+        for compiled in list(_registry.values()) + list(_templates.values()):
+            compiled._bind(enabled)
+
+
+def timing_enabled() -> bool:
+    return _timing
+
+
+def configure(config):
+    """Включает замеры, если в конфигурации задан REGEX_TIMING"""
+    enable_timing(bool(getattr(config, 'REGEX_TIMING', False)))
+
+
+def regex_stats(top: Optional[int] = None) -> List[dict]:
+    """
+    Статистика вызовов выражений, начиная с самых медленных по суммарному времени
+
+    Returns:
+        List[dict]: name, pattern, calls, total_time, average_time (в секундах)
+    """
+    with _lock:
+        stats = [{'name': name, 'pattern': pattern, 'calls': calls, 'total_time': total,
+                  'average_time': total / calls if calls else 0.0}
+                 for name, (calls, total, pattern) in _stats.items() if calls]
+    stats.sort(key=lambda entry: entry['total_time'], reverse=True)
+    return stats[:top] if top is not None else stats
+
+
+def reset_regex_stats():
+    """Обнуляет статистику вызовов"""
+    with _lock:
+        for entry in _stats.values():
+            entry[0] = 0
+            entry[1] = 0.0
+
+
+def format_regex_stats(stats: List[dict]) -> str:
+    """Таблица статистики regex_stats для вывода в консоль"""
+    lines = []
+    for entry in stats:
+        lines.append(f"  {entry['name']:<48} вызовов {entry['calls']:>8}  "
+                     f"всего {entry['total_time'] * 1000:>9.1f} мс  "
+                     f"в среднем {entry['average_time'] * 1e6:>8.1f} мкс")
+    return "\n".join(lines)
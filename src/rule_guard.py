@@ -0,0 +1,168 @@
+"""
+Модуль выполнения правил переписывания SQL с бюджетом времени.
+Одно регулярное выражение конвертера или постобработки на неудачном скрипте может
+выполняться минутами из-за возвратов и остановить поток пакетной обработки.
+RuleGuard ограничивает время каждого правила на один скрипт:
+- с модулем regex (необязательная зависимость) выражение выполняется с timeout и
+  освобождает GIL, поэтому ограничение действует в любом потоке;
+- без него правило прерывается сигналом SIGALRM, но только в главном потоке;
+  в остальных потоках превышение фиксируется после завершения правила.
+Правило, превысившее бюджет, пропускается (текст остается таким, каким был до правила),
+событие записывается в events, а входной текст сохраняется в каталог для разбора.
+"""
+
+import hashlib
+import os
+import signal
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from src.regex_registry import RegexPattern
+
+REGEX_MODULE_AVAILABLE = False
+try:
+    import regex as regex_module
+    REGEX_MODULE_AVAILABLE = True
+except ImportError:
+    regex_module = None
+
+# Бюджет по умолчанию, если в конфигурации не задан RULE_TIME_BUDGET (секунды)
+DEFAULT_RULE_TIME_BUDGET = 5.0
+
+_SIGNALS_AVAILABLE = hasattr(signal, 'setitimer') and hasattr(signal, 'SIGALRM')
+
+
+class RuleTimeout(Exception):
+    """Правило прервано по истечении бюджета времени"""
+
+
+class RuleGuard:
+    """
+    Выполнение правил одного скрипта с бюджетом времени на каждое правило
+
+    Args:
+        budget: Бюджет времени на правило в секундах (0 — без ограничения)
+        log_dir: Каталог, куда сохраняются входные тексты правил, превысивших бюджет
+    """
+
+    def __init__(self, budget: float = DEFAULT_RULE_TIME_BUDGET, log_dir: Optional[str] = None):
+        self.budget = budget
+        self.log_dir = log_dir
+        # События превышения бюджета: rule, elapsed, length, skipped, input
+        self.events: List[dict] = []
+        self._lock = threading.Lock()
+
+    @property
+    def skipped_rules(self) -> List[str]:
+        """Имена правил, пропущенных из-за превышения бюджета"""
+        return [event['rule'] for event in self.events if event['skipped']]
+
+    def merge(self, other: 'RuleGuard'):
+        """Добавляет события другого RuleGuard (например, части скрипта из другого потока)"""
+        with self._lock:
+            self.events.extend(other.events)
+
+    def sub(self, pattern: RegexPattern, repl, string: str) -> str:
+        """pattern.sub с бюджетом времени; при превышении возвращает string без изменений"""
+        return self.subn(pattern, repl, string)[0]
+
+    def subn(self, pattern: RegexPattern, repl, string: str) -> Tuple[str, int]:
+        """pattern.subn с бюджетом времени; при превышении возвращает (string, 0)"""
+        if self.budget <= 0:
+            return pattern.subn(repl, string)
+        if not REGEX_MODULE_AVAILABLE:
+            return self._call(pattern.name, lambda: pattern.subn(repl, string), string, (string, 0))
+        if pattern.guarded is None:
+            pattern.guarded = regex_module.compile(pattern.pattern, pattern.flags)
+        start = time.perf_counter()
+        try:
+            return pattern.guarded.subn(repl, string, timeout=self.budget, concurrent=True)
+        except TimeoutError:
+            self._record(pattern.name, time.perf_counter() - start, string, skipped=True)
+            return string, 0
+
+    def run(self, name: str, function: Callable[[str], str], sql: str) -> str:
+        """
+        Правило, заданное функцией от текста (например, сканер CASE).
+        Прерывается только в главном потоке; при превышении возвращает sql без изменений
+        """
+        if self.budget <= 0:
+            return function(sql)
+        return self._call(name, lambda: function(sql), sql, sql)
+
+    def _call(self, name: str, call: Callable, string: str, skipped_result):
+        start = time.perf_counter()
+        if _SIGNALS_AVAILABLE and threading.current_thread() is threading.main_thread():
+            try:
+                result = _call_with_alarm(call, self.budget)
+            except RuleTimeout:
+                self._record(name, time.perf_counter() - start, string, skipped=True)
+                return skipped_result
+        else:
+            result = call()
+        elapsed = time.perf_counter() - start
+        if elapsed > self.budget:
+            # Прервать правило в этом потоке нельзя: результат сохраняется, правило отмечается как медленное
+            self._record(name, elapsed, string, skipped=False)
+        return result
+
+    def _record(self, rule: str, elapsed: float, string: str, skipped: bool):
+        event = {'rule': rule, 'elapsed': elapsed, 'length': len(string), 'skipped': skipped,
+                 'input': self._save_input(rule, string)}
+        with self._lock:
+            self.events.append(event)
+        print(f"⏱️ Правило {rule} {'пропущено' if skipped else 'выполнялось'} "
+              f"после {elapsed:.2f} с (бюджет {self.budget:.2f} с, {len(string)} символов)")
+
+    def _save_input(self, rule: str, string: str) -> Optional[str]:
+        if not self.log_dir:
+            return None
+        digest = hashlib.blake2b(string.encode('utf-8'), digest_size=8).hexdigest()
+        path = os.path.join(self.log_dir, f"{rule}_{digest}.sql")
+        try:
+            os.makedirs(self.log_dir, exist_ok=True)
+            if not os.path.exists(path):
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(string)
+        except OSError as e:
+            print(f"Не удалось сохранить входной текст правила {rule}: {e}")
+            return None
+        return path
+
+
+def _call_with_alarm(call: Callable, budget: float):
+    """Выполняет call, прерывая его исключением RuleTimeout через budget секунд"""
+    def interrupt(signum, frame):
+        raise RuleTimeout()
+
+    previous = signal.signal(signal.SIGALRM, interrupt)
+    signal.setitimer(signal.ITIMER_REAL, budget)
+    try:
+        return call()
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def warn_if_unguarded(config) -> bool:
+    """
+    Предупреждает при запуске, что без модуля regex бюджет RULE_TIME_BUDGET
+    не действует в рабочих потоках
+
+    Returns:
+        bool: True, если предупреждение выведено
+    """
+    budget = float(getattr(config, 'RULE_TIME_BUDGET', DEFAULT_RULE_TIME_BUDGET))
+    if budget <= 0 or REGEX_MODULE_AVAILABLE:
+        return False
+    print(f"⚠️ Модуль regex не установлен: бюджет времени правил ({budget:g} с) прерывает правила только "
+          f"в главном потоке. В рабочих потоках зависшее правило остановит поток; установите regex "
+          f"(pip install -r requirements.txt)")
+    return True
+
+
+def make_rule_guard(config) -> RuleGuard:
+    """RuleGuard с бюджетом RULE_TIME_BUDGET и каталогом RULE_TIMEOUT_DIR из конфигурации"""
+    return RuleGuard(float(getattr(config, 'RULE_TIME_BUDGET', DEFAULT_RULE_TIME_BUDGET)),
+                     getattr(config, 'RULE_TIMEOUT_DIR', None) or None)
@@ -0,0 +1,250 @@
+"""
+Модуль для кэширования каталога схемы PostgreSQL (таблица, колонка, тип).
+Загружает information_schema.columns одним запросом в индекс в памяти, который
+используется всеми потоками и модулями; снимок можно сохранить в файл и
+использовать повторно между запусками или без подключения к базе данных.
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import psycopg2
+
+from src.pg_pool import pooled_connection
+
+CATALOG_QUERY = """
+    SELECT table_schema, table_name, column_name, data_type
+    FROM information_schema.columns
+    WHERE table_schema NOT IN ('pg_catalog', 'information_schema')
+    ORDER BY table_schema, table_name, ordinal_position
+"""
+
+SNAPSHOT_VERSION = 1
+
+
+class SchemaCatalog:
+    """
+    Снимок каталога схемы: {схема.таблица: {колонка: тип}}.
+    Имена хранятся в нижнем регистре; таблица доступна как по короткому имени,
+    так и по имени со схемой.
+    """
+
+    def __init__(self, pg_config: Optional[dict] = None, snapshot_path: Optional[str] = None,
+                 max_connections: int = 8, max_age: float = 0, retry_interval: float = 60):
+        """
+        Args:
+            pg_config: Параметры подключения к PostgreSQL
+            snapshot_path: Путь к файлу снимка (None — без сохранения на диск)
+            max_connections: Размер пула соединений
+            max_age: Возраст снимка в секундах, после которого он перечитывается из базы (0 — без ограничения)
+            retry_interval: Пауза в секундах перед повторной загрузкой из базы после ошибки
+        """
+        self.pg_config = pg_config
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.max_connections = max_connections
+        self.max_age = max_age
+        self.retry_interval = retry_interval
+        self._lock = threading.RLock()
+        self._tables: Dict[str, Dict[str, str]] = {}
+        self._short_names: Dict[str, str] = {}
+        self._loaded = False
+        # Время, раньше которого загрузка из базы после ошибки не повторяется
+        self._retry_at = 0.0
+        self.loaded_at = None
+        self.source = None
+
+    def ensure_loaded(self, conn=None) -> bool:
+        """
+        Загружает каталог при первом обращении: из файла снимка, если он есть и не старше
+        max_age, иначе из базы данных (с сохранением снимка в файл). Если база недоступна,
+        используется устаревший снимок, а загрузка повторяется не чаще раза в retry_interval
+
+        Args:
+            conn: Готовое соединение psycopg2 (необязательно)
+
+        Returns:
+            bool: True, если каталог содержит данные
+        """
+        if self._loaded or time.monotonic() < self._retry_at:
+            return bool(self._tables)
+        with self._lock:
+            if self._loaded or time.monotonic() < self._retry_at:
+                return bool(self._tables)
+            if self.snapshot_path and self.snapshot_path.exists() and self.load(self.snapshot_path):
+                if not self._is_stale():
+                    return bool(self._tables)
+                print(f"[schema_catalog] Снимок каталога {self.snapshot_path} старше "
+                      f"{self.max_age:.0f} с, перечитываем из базы данных")
+                # Если база недоступна, до следующей попытки используется устаревший снимок
+                self.refresh(conn)
+            else:
+                self.refresh(conn)
+            return bool(self._tables)
+
+    def _is_stale(self) -> bool:
+        """Снимок из файла старше max_age и его можно обновить из базы"""
+        if self.max_age <= 0 or self.pg_config is None:
+            return False
+        return self.loaded_at is None or time.time() - self.loaded_at > self.max_age
+
+    def refresh(self, conn=None) -> bool:
+        """
+        Перечитывает каталог из базы данных одним запросом и сохраняет снимок в файл.
+        После ошибки каталог не считается загруженным: следующая попытка — через retry_interval
+
+        Args:
+            conn: Готовое соединение psycopg2 (необязательно)
+
+        Returns:
+            bool: True, если каталог успешно загружен
+        """
+        failed = False
+        try:
+            if conn is not None:
+                rows = self._fetch(conn)
+            elif self.pg_config:
+                with pooled_connection(self.pg_config, self.max_connections) as pooled:
+                    rows = self._fetch(pooled)
+            else:
+                rows = None
+        except psycopg2.Error as e:
+            print(f"[schema_catalog] Не удалось загрузить каталог схемы: {e}")
+            rows = None
+            failed = True
+
+        with self._lock:
+            if failed:
+                self._loaded = False
+                self._retry_at = time.monotonic() + self.retry_interval
+                return False
+            # Без подключения к базе повторять загрузку бессмысленно
+            self._loaded = True
+            if rows is None:
+                return False
+            self._set_rows(rows)
+            self.source = 'database'
+            print(f"[schema_catalog] Загружено колонок: {len(rows)}, таблиц: {self.table_count}")
+            if self.snapshot_path:
+                self.save(self.snapshot_path)
+            return True
+
+    def _fetch(self, conn) -> list:
+        with conn.cursor() as cursor:
+            cursor.execute(CATALOG_QUERY)
+            rows = cursor.fetchall()
+        if not conn.autocommit:
+            conn.rollback()
+        return rows
+
+    def _set_rows(self, rows):
+        tables: Dict[str, Dict[str, str]] = {}
+        short_names: Dict[str, str] = {}
+        for schema, table, column, data_type in rows:
+            qualified = f"{schema.lower()}.{table.lower()}"
+            tables.setdefault(qualified, {}).setdefault(column.lower(), data_type)
+            # Короткое имя указывает на таблицу из первой по порядку схемы
+            short_names.setdefault(table.lower(), qualified)
+        self._tables = tables
+        self._short_names = short_names
+        self.loaded_at = time.time()
+
+    def get_column_type(self, table: str, column: str) -> Optional[str]:
+        """
+        Возвращает тип колонки без обращения к базе данных
+
+        Args:
+            table: Имя таблицы (допускается схема и кавычки)
+            column: Имя колонки
+
+        Returns:
+            Optional[str]: Тип данных из information_schema или None
+        """
+        self.ensure_loaded()
+        table_key = table.replace('"', '').lower()
+        table_columns = self._tables.get(table_key)
+        if table_columns is None:
+            qualified = self._short_names.get(table_key.rsplit('.', 1)[-1])
+            table_columns = self._tables.get(qualified) if qualified else None
+        if table_columns is None:
+            return None
+        return table_columns.get(column.replace('"', '').lower())
+
+    @property
+    def table_count(self) -> int:
+        return len(self._tables)
+
+    def save(self, path) -> None:
+        """Сохраняет снимок каталога в JSON-файл"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            tables = {key: dict(cols) for key, cols in self._tables.items()}
+            snapshot = {'version': SNAPSHOT_VERSION, 'loaded_at': self.loaded_at, 'tables': tables}
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=1, sort_keys=True)
+        tmp_path.replace(path)
+
+    def load(self, path) -> bool:
+        """
+        Загружает снимок каталога из JSON-файла
+
+        Returns:
+            bool: True, если снимок успешно прочитан
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[schema_catalog] Не удалось прочитать снимок каталога {path}: {e}")
+            return False
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            print(f"[schema_catalog] Неподдерживаемая версия снимка каталога: {snapshot.get('version')}")
+            return False
+
+        rows = []
+        for qualified, cols in snapshot.get('tables', {}).items():
+            schema, table = qualified.split('.', 1)
+            rows.extend((schema, table, col, data_type) for col, data_type in cols.items())
+        with self._lock:
+            self._set_rows(sorted(rows))
+            self.loaded_at = snapshot.get('loaded_at')
+            self.source = 'file'
+            self._loaded = True
+        print(f"[schema_catalog] Каталог схемы загружен из {path}: таблиц {self.table_count}")
+        return True
+
+
+_catalogs: Dict[tuple, SchemaCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_schema_catalog(config) -> SchemaCatalog:
+    """
+    Возвращает общий для всех потоков и модулей каталог схемы для текущей конфигурации
+
+    Args:
+        config: Модуль или объект конфигурации (PG_CONFIG, SCHEMA_CATALOG_FILE)
+
+    Returns:
+        SchemaCatalog: Каталог схемы
+    """
+    pg_config = getattr(config, 'PG_CONFIG', None)
+    snapshot_path = getattr(config, 'SCHEMA_CATALOG_FILE', None) or None
+    pg_key = (pg_config['host'], str(pg_config['port']), pg_config['database']) if pg_config else None
+    key = (pg_key, str(snapshot_path) if snapshot_path else None)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = SchemaCatalog(
+                pg_config,
+                snapshot_path,
+                getattr(config, 'PG_POOL_MAX_CONNECTIONS', 8),
+                getattr(config, 'SCHEMA_CATALOG_MAX_AGE', 0),
+                getattr(config, 'SCHEMA_CATALOG_RETRY_INTERVAL', 60)
+            )
+            _catalogs[key] = catalog
+        return catalog
@@ -0,0 +1,234 @@
+"""
+Модуль для предварительной классификации скриптов перед конвертацией.
+Шаблоны из configs/script_classes.yaml собираются в одно скомпилированное
+регулярное выражение, которое за один проход по скрипту находит все признаки
+и относит скрипт к одной из категорий:
+
+    skip     — требует ручной обработки
+    rules    — достаточно конвертации правилами
+    ai_small — конвертация нейросетью целиком
+    ai_large — конвертация нейросетью по частям
+
+Это дает дешевую маршрутизацию больших наборов скриптов и гистограмму
+нагрузки до начала конвертации:
+
+    python -m src.script_classifier scripts/input [--json]
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import yaml
+
+SKIP = 'skip'
+RULES = 'rules'
+AI_SMALL = 'ai_small'
+AI_LARGE = 'ai_large'
+CATEGORIES = (SKIP, RULES, AI_SMALL, AI_LARGE)
+
+CATEGORY_TITLES = {
+    SKIP: 'Ручная обработка',
+    RULES: 'Только правила',
+    AI_SMALL: 'Нейросеть целиком',
+    AI_LARGE: 'Нейросеть по частям',
+}
+
+DEFAULT_CLASSES_FILE = Path(__file__).resolve().parent.parent / 'configs' / 'script_classes.yaml'
+
+
+class ScriptClass:
+    """Результат классификации скрипта"""
+
+    def __init__(self, category: str, reason: str = '', constructs: List[str] = None, lines: int = 0):
+        self.category = category
+        # Причина ручной обработки (первый по приоритету найденный шаблон skip)
+        self.reason = reason
+        # Найденные конструкции, которые правила не обрабатывают
+        self.constructs = constructs or []
+        self.lines = lines
+
+    def as_dict(self) -> dict:
+        return {'category': self.category, 'reason': self.reason, 'constructs': self.constructs, 'lines': self.lines}
+
+
+class ScriptClassifier:
+    """
+    Классификатор скриптов на одном скомпилированном регулярном выражении
+
+    Все шаблоны объединяются в одну альтернативу без групп: именованные группы
+    мешают движку re быстро отбрасывать позиции по первому символу ветви.
+    Какой шаблон сработал, определяется только в найденной позиции. Поиск
+    продолжается со следующего символа, поэтому пересекающиеся совпадения
+    разных шаблонов не теряются, и заканчивается, когда найдены все шаблоны.
+
+    Args:
+        skip: [{'pattern', 'reason', 'ignore_case'}] в порядке приоритета
+        unsupported: [{'name', 'pattern', 'ignore_case'}]
+        large_script_lines: Порог большого скрипта в строках
+    """
+
+    def __init__(self, skip: List[dict], unsupported: List[dict], large_script_lines: int = 1000):
+        self.large_script_lines = large_script_lines
+        # (вид, причина или название, отдельный шаблон)
+        self._labels = []
+        branches = []
+        for kind, entries in ((SKIP, skip or []), (RULES, unsupported or [])):
+            for entry in entries:
+                flags = re.IGNORECASE if entry.get('ignore_case', True) else 0
+                pattern = re.compile(entry['pattern'], flags)
+                # ^ в шаблонах означает начало скрипта, как в re.search без MULTILINE
+                branches.append(f"(?i:{entry['pattern']})" if flags else f"(?:{entry['pattern']})")
+                self._labels.append((kind, entry.get('reason') or entry.get('name') or entry['pattern'], pattern))
+        self._regex = re.compile('|'.join(branches)) if branches else None
+
+    @classmethod
+    def from_yaml(cls, path, large_script_lines: int = 1000) -> 'ScriptClassifier':
+        """
+        Загружает шаблоны из YAML-файла
+
+        Args:
+            path: Путь к файлу классов
+            large_script_lines: Порог большого скрипта, если в файле он не задан
+
+        Returns:
+            ScriptClassifier: Классификатор
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = yaml.safe_load(f) or {}
+        return cls(data.get('skip'), data.get('unsupported'),
+                   data.get('large_script_lines') or large_script_lines)
+
+    def scan(self, text: str) -> List[int]:
+        """Номера найденных шаблонов в порядке их объявления"""
+        if self._regex is None:
+            return []
+        found = set()
+        search = self._regex.search
+        match = search(text)
+        while match is not None:
+            position = match.start()
+            for index, (_, _, pattern) in enumerate(self._labels):
+                if index not in found and pattern.match(text, position):
+                    found.add(index)
+            if len(found) == len(self._labels):
+                break
+            match = search(text, position + 1)
+        return sorted(found)
+
+    def classify(self, text: str) -> ScriptClass:
+        """
+        Классифицирует скрипт за один проход регулярного выражения
+
+        Args:
+            text: Текст скрипта
+
+        Returns:
+            ScriptClass: Категория, причина ручной обработки и найденные конструкции
+        """
+        lines = len(text.splitlines())
+        reason = ''
+        constructs = []
+        for index in self.scan(text):
+            kind, label, _ = self._labels[index]
+            if kind == SKIP:
+                reason = reason or label
+            else:
+                constructs.append(label)
+        if reason:
+            category = SKIP
+        elif not constructs:
+            category = RULES
+        elif lines > self.large_script_lines:
+            category = AI_LARGE
+        else:
+            category = AI_SMALL
+        return ScriptClass(category, reason, constructs, lines)
+
+    def histogram(self, texts: Iterable[str]) -> Dict[str, int]:
+        """Количество скриптов в каждой категории"""
+        counts = Counter(self.classify(text).category for text in texts)
+        return {category: counts.get(category, 0) for category in CATEGORIES}
+
+
+def format_histogram(histogram: Dict[str, int], width: int = 30) -> str:
+    """Текстовая гистограмма категорий"""
+    total = sum(histogram.values()) or 1
+    peak = max(histogram.values()) or 1
+    lines = []
+    for category in CATEGORIES:
+        count = histogram.get(category, 0)
+        bar = '█' * round(width * count / peak)
+        lines.append(f"  {CATEGORY_TITLES[category]:<20} {count:>6} ({count / total:>4.0%}) {bar}")
+    return '\n'.join(lines)
+
+
+_classifiers: Dict[tuple, ScriptClassifier] = {}
+_classifiers_lock = threading.Lock()
+
+
+def get_script_classifier(config) -> ScriptClassifier:
+    """
+    Возвращает общий для всех потоков классификатор для файла SCRIPT_CLASSES_FILE
+
+    Args:
+        config: Объект конфигурации
+
+    Returns:
+        ScriptClassifier: Классификатор
+    """
+    path = str(getattr(config, 'SCRIPT_CLASSES_FILE', '') or DEFAULT_CLASSES_FILE)
+    threshold = getattr(config, 'LARGE_SCRIPT_THRESHOLD', 1000)
+    key = (path, threshold)
+    with _classifiers_lock:
+        classifier = _classifiers.get(key)
+        if classifier is None:
+            classifier = ScriptClassifier.from_yaml(path, threshold)
+            _classifiers[key] = classifier
+        return classifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Классификация SQL-скриптов перед конвертацией')
+    parser.add_argument('input_dir', help='Директория со скриптами *.sql')
+    parser.add_argument('--file', default=None, help='Файл классов (по умолчанию SCRIPT_CLASSES_FILE)')
+    parser.add_argument('--json', action='store_true', help='Вывести категорию каждого скрипта в JSON')
+    args = parser.parse_args()
+
+    import config
+    if args.file:
+        classifier = ScriptClassifier.from_yaml(args.file, getattr(config, 'LARGE_SCRIPT_THRESHOLD', 1000))
+    else:
+        classifier = get_script_classifier(config)
+
+    scripts = sorted(Path(args.input_dir).glob('*.sql'), key=lambda p: p.name)
+    start_time = time.time()
+    classes = {}
+    for path in scripts:
+        classes[path.name] = classifier.classify(path.read_text(encoding='utf-8', errors='replace'))
+    elapsed_time = time.time() - start_time
+
+    if args.json:
+        print(json.dumps({name: script_class.as_dict() for name, script_class in classes.items()},
+                         indent=2, ensure_ascii=False))
+        return 0
+
+    histogram = Counter(script_class.category for script_class in classes.values())
+    print(f"Классифицировано {len(classes)} скриптов за {elapsed_time:.2f} с")
+    print(format_histogram({category: histogram.get(category, 0) for category in CATEGORIES}))
+    constructs = Counter(name for script_class in classes.values() for name in script_class.constructs)
+    if constructs:
+        print("Конструкции, не поддерживаемые правилами:")
+        for name, count in constructs.most_common():
+            print(f"  - {name}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+Модуль потоковой конвертации очень больших скриптов.
+Файл читается частями, лексер StatementLexer сохраняет состояние между частями
+(строка, идентификатор в кавычках или скобках, комментарий) и выделяет запросы по ';'
+и пакеты по строкам GO вне строк и комментариев. Каждый запрос конвертируется
+SQLConverter отдельно и сразу записывается в выходной файл, поэтому пиковая память
+ограничена самым большим запросом (и самой длинной строкой), а не размером файла.
+Тот же лексер делит уже загруженный скрипт на пакеты GO (split_batches), которые
+конвертируются независимо и собираются обратно join_batches.
+"""
+
+import os
+import re
+import time
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+from src.param_index import PLACEHOLDER_RE
+from src.regex_registry import regex
+
+# Виды сегментов лексера: запрос и строка-разделитель пакетов GO
+STATEMENT = 'statement'
+BATCH_SEPARATOR = 'go'
+
+# Размер части файла, читаемой за один раз (символов)
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+_NORMAL, _STRING, _QUOTED, _BRACKET, _LINE_COMMENT, _BLOCK_COMMENT = range(6)
+
+# Лексемы вне строк и комментариев: начало строки, идентификатора, комментария, конец запроса
+# и строка GO [количество] (только целая строка, как у sqlcmd)
+_NORMAL_RE = regex('script_stream.normal',
+                   r"""'|"|\[|--|/\*|;|^[ \t]*GO(?:[ \t]+\d+)?[ \t]*(?:--[^\n]*)?\r?(?:\n|\Z)""",
+                   re.IGNORECASE | re.MULTILINE)
+_BLOCK_COMMENT_RE = regex('script_stream.block_comment', r'/\*|\*/')
+# Быстрая проверка, есть ли в тексте строка, похожая на GO (без нее лексер для пакетов не нужен)
+_GO_LINE_RE = regex('script_stream.go_line', r'^[ \t]*GO\b', re.IGNORECASE | re.MULTILINE)
+_COMMENT_RE = regex('script_stream.comment', r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+
+# Закрывающий символ для строки и идентификаторов; удвоенный символ экранирует сам себя
+_CLOSING = {_STRING: "'", _QUOTED: '"', _BRACKET: ']'}
+_OPENING = {"'": _STRING, '"': _QUOTED, '[': _BRACKET}
+
+Segment = Tuple[str, str]
+
+
+class StatementLexer:
+    """
+    Лексер, разбивающий текст на запросы и разделители пакетов GO по мере поступления частей.
+    Части передаются в feed, после последней вызывается finish.
+    Сегменты — пары (STATEMENT, текст запроса с ';') или (BATCH_SEPARATOR, строка GO);
+    текст всех сегментов по порядку совпадает с исходным
+    """
+
+    def __init__(self):
+        self._state = _NORMAL
+        self._depth = 0
+        # Уже просмотренные части текущего запроса
+        self._pending: List[str] = []
+        # Части, которые еще не просмотрены (последняя строка без перевода строки)
+        self._tail: List[str] = []
+
+    def feed(self, chunk: str) -> List[Segment]:
+        """Добавляет часть текста и возвращает запросы, завершенные в ней"""
+        self._tail.append(chunk)
+        if '\n' not in chunk:
+            return []
+        buffer = ''.join(self._tail)
+        # Просматриваются только целые строки: лексемы вне строк и комментариев не переходят
+        # через перевод строки, а строку GO можно распознать только целиком
+        limit = buffer.rfind('\n') + 1
+        self._tail = [buffer[limit:]] if limit < len(buffer) else []
+        return self._scan(buffer, limit)
+
+    def finish(self) -> List[Segment]:
+        """Завершает разбор и возвращает оставшиеся сегменты"""
+        buffer = ''.join(self._tail)
+        self._tail = []
+        segments = self._scan(buffer, len(buffer))
+        if self._pending:
+            segments.append((STATEMENT, ''.join(self._pending)))
+            self._pending = []
+        return segments
+
+    def _scan(self, buffer: str, limit: int) -> List[Segment]:
+        segments = []
+        position = 0
+        start = 0
+        while position < limit:
+            state = self._state
+            if state == _NORMAL:
+                match = _NORMAL_RE.search(buffer, position, limit)
+                if match is None:
+                    break
+                token = match.group(0)
+                position = match.end()
+                if token == ';':
+                    segments.append(self._emit(buffer, start, position))
+                    start = position
+                elif token in _OPENING:
+                    self._state = _OPENING[token]
+                elif token == '--':
+                    self._state = _LINE_COMMENT
+                elif token == '/*':
+                    self._state = _BLOCK_COMMENT
+                    self._depth = 1
+                else:
+                    # Строка GO: завершает текущий запрос и выделяется отдельным сегментом
+                    if self._pending or match.start() > start:
+                        segments.append(self._emit(buffer, start, match.start()))
+                    segments.append((BATCH_SEPARATOR, token))
+                    start = position
+            elif state == _LINE_COMMENT:
+                end = buffer.find('\n', position, limit)
+                if end == -1:
+                    break
+                position = end + 1
+                self._state = _NORMAL
+            elif state == _BLOCK_COMMENT:
+                match = _BLOCK_COMMENT_RE.search(buffer, position, limit)
+                if match is None:
+                    break
+                position = match.end()
+                # Комментарии T-SQL могут быть вложенными
+                self._depth += 1 if match.group(0) == '/*' else -1
+                if self._depth == 0:
+                    self._state = _NORMAL
+            else:
+                closing = _CLOSING[state]
+                end = buffer.find(closing, position, limit)
+                if end == -1:
+                    break
+                # В части просматриваются целые строки, поэтому символ после закрывающего уже прочитан
+                if end + 1 < limit and buffer[end + 1] == closing:
+                    position = end + 2
+                else:
+                    position = end + 1
+                    self._state = _NORMAL
+        if start < limit:
+            self._pending.append(buffer[start:limit])
+        return segments
+
+    def _emit(self, buffer: str, start: int, end: int) -> Segment:
+        self._pending.append(buffer[start:end])
+        text = ''.join(self._pending)
+        self._pending = []
+        return STATEMENT, text
+
+
+def iter_segments(source: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Segment]:
+    """Сегменты текстового файла, прочитанного частями по chunk_size символов"""
+    lexer = StatementLexer()
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        yield from lexer.feed(chunk)
+    yield from lexer.finish()
+
+
+def split_segments(text: str) -> List[Segment]:
+    """Сегменты текста, уже загруженного в память"""
+    lexer = StatementLexer()
+    return lexer.feed(text) + lexer.finish()
+
+
+def split_batches(text: str) -> List[str]:
+    """
+    Пакеты скрипта, разделенные строками GO вне строк и комментариев (сами строки GO не входят).
+    Количество повторов GO n не учитывается: каждый пакет конвертируется один раз
+    """
+    if not _GO_LINE_RE.search(text):
+        return [text]
+    batches = []
+    current = []
+    for kind, segment in split_segments(text):
+        if kind == BATCH_SEPARATOR:
+            batches.append(''.join(current))
+            current = []
+        else:
+            current.append(segment)
+    batches.append(''.join(current))
+    return batches
+
+
+def ends_with_code(text: str) -> bool:
+    """True, если после последнего ';' вне строк и комментариев в тексте есть код"""
+    segments = split_segments(text)
+    if not segments:
+        return False
+    tail = segments[-1][1]
+    if tail.rstrip().endswith(';'):
+        return False
+    return bool(_COMMENT_RE.sub('', tail).strip())
+
+
+def batch_separator(converted_batch: str) -> str:
+    """
+    Замена строки GO после сконвертированного пакета: ';', если последний запрос пакета
+    не завершен (в PostgreSQL его иначе продолжит следующий пакет), иначе пустая строка
+    """
+    return ';' if ends_with_code(converted_batch) else ''
+
+
+def join_batches(batches: List[str]) -> str:
+    """Собирает сконвертированные пакеты в исходном порядке, заменяя строки GO (см. batch_separator)"""
+    parts = []
+    for number, batch in enumerate(batches):
+        parts.append(batch)
+        if number < len(batches) - 1:
+            # Разделитель всегда на отдельной строке, чтобы не попасть в строчный комментарий
+            parts.append(('\n' if batch and not batch.endswith('\n') else '') + batch_separator(batch) + '\n')
+    return ''.join(parts)
+
+
+def convert_stream(source: TextIO, target: TextIO, converter, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Конвертирует скрипт по запросам: каждый запрос конвертируется отдельно и сразу записывается.
+    Строки GO в PostgreSQL не нужны и заменяются пустыми строками или ';' (см. batch_separator),
+    чтобы номера строк результата совпадали с исходными
+
+    Args:
+        source: Исходный скрипт (текстовый поток)
+        target: Поток для результата
+        converter: SQLConverter
+        chunk_size: Размер читаемой части в символах
+
+    Returns:
+        dict: statements, batches, largest_statement, params, chars_read, chars_written, elapsed_time
+    """
+    start_time = time.time()
+    stats = {'statements': 0, 'batches': 1, 'largest_statement': 0, 'params': set(),
+             'chars_read': 0, 'chars_written': 0}
+    # Последний сконвертированный запрос с кодом: по нему выбирается замена строки GO
+    last_statement = ''
+    for kind, text in iter_segments(source, chunk_size):
+        stats['chars_read'] += len(text)
+        if kind == BATCH_SEPARATOR:
+            stats['batches'] += 1
+            converted = batch_separator(last_statement) + ('\n' if text.endswith('\n') else '')
+            last_statement = ''
+        else:
+            stats['statements'] += bool(text.strip())
+            stats['largest_statement'] = max(stats['largest_statement'], len(text))
+            stats['params'].update(match.group(1) for match in PLACEHOLDER_RE.finditer(text))
+            converted = converter.convert({'original': text})
+            if text.strip():
+                last_statement = converted
+        target.write(converted)
+        stats['chars_written'] += len(converted)
+    stats['params'] = sorted(stats['params'])
+    stats['elapsed_time'] = time.time() - start_time
+    return stats
+
+
+def convert_file_streaming(input_path: str, output_path: str, converter,
+                           chunk_size: Optional[int] = None) -> dict:
+    """
+    Потоковая конвертация файла input_path в output_path (см. convert_stream).
+    Размер части берется из STREAM_CHUNK_SIZE конфигурации конвертера
+    """
+    if chunk_size is None:
+        chunk_size = int(getattr(converter.config, 'STREAM_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # newline='' сохраняет переводы строк исходного файла без преобразования
+    with open(input_path, 'r', encoding='utf-8', errors='replace', newline='') as source, \
+            open(output_path, 'w', encoding='utf-8', newline='') as target:
+        return convert_stream(source, target, converter, chunk_size)
@@ -1,125 +1,430 @@
 """
 Модуль для анализа SQL скриптов и определения алиасов таблиц.
-Использует sqlglot для более точного анализа, с запасными методами при необходимости.
+Каждый запрос скрипта разбирается sqlglot в диалекте T-SQL; регулярными выражениями
+анализируются только запросы, которые sqlglot не разобрал. Результат — дерево областей
+видимости (запрос скрипта → запрос/подзапрос → алиасы), поэтому алиас, повторно
+использованный в подзапросе, определяется по месту его использования.
+Скрипт может быть передан строкой или разобранным (src/parsed_script.py): AST sqlglot
+берется из ParsedScript и не строится повторно. Найденные алиасы хранятся в общем
+для всех анализаторов и потоков кэше (AliasCache): LRU в памяти с ограниченным
+числом записей, ключ — стабильный дайджест текста скрипта, необязательный уровень
+на диске переиспользуется между процессами и запусками.
 """
 
+import os
 import re
-from collections import defaultdict
-from typing import Dict, List, Tuple, Optional, Set
+import json
+import threading
+from collections import OrderedDict, defaultdict, deque
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional, Set, Union
+
+from src.parsed_script import ParsedScript
+from src.regex_registry import regex
 
 # Пытаемся импортировать sqlglot
 SQLGLOT_AVAILABLE = False
 try:
-    import sqlglot
-    from sqlglot import parse as sqlglot_parse
+    from sqlglot import exp
     SQLGLOT_AVAILABLE = True
 except ImportError:
     print("Библиотека sqlglot не установлена. Будет использоваться запасной метод анализа алиасов.")
 
+# Версия записей кэша алиасов на диске: при изменении способа извлечения алиасов
+# записи предыдущей версии не используются
+ALIAS_CACHE_VERSION = 2
+DEFAULT_ALIAS_CACHE_SIZE = 2048
+
+# Виды областей видимости: запрос скрипта, запрос верхнего уровня, подзапрос и запрос,
+# разобранный регулярными выражениями
+STATEMENT = 'statement'
+QUERY = 'query'
+SUBQUERY = 'subquery'
+REGEX = 'regex'
+
+# Узлы AST, которые открывают собственную область видимости алиасов
+_SCOPE_NODES = (exp.Select, exp.Update, exp.Delete, exp.Insert) if SQLGLOT_AVAILABLE else ()
+
+_COLUMN_RE = regex('alias_analyzer.column', r'([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)')
+
+# Запасной разбор регулярными выражениями: "имя_таблицы AS алиас" или "имя_таблицы алиас",
+# алиасы подзапросов и таблицы без алиасов
+_TABLE_ALIAS_RE = regex('alias_analyzer.table_alias',
+                        r'(?:FROM|JOIN)\s+([a-zA-Z0-9_]+(?:\.[a-zA-Z0-9_]+)?)\s+(?:AS\s+)?([a-zA-Z0-9_]+)',
+                        re.IGNORECASE)
+_SUBQUERY_ALIAS_RE = regex('alias_analyzer.subquery_alias', r'\)\s+(?:AS\s+)?([a-zA-Z0-9_]+)', re.IGNORECASE)
+_TABLE_RE = regex('alias_analyzer.table',
+                  r'(?:FROM|JOIN)\s+([a-zA-Z0-9_]+(?:\.[a-zA-Z0-9_]+)?)\s+'
+                  r'(?:WHERE|ON|GROUP|ORDER|HAVING|UNION|INTERSECT|EXCEPT|$)',
+                  re.IGNORECASE)
+
+
+class AliasCache:
+    """
+    Потокобезопасный кэш алиасов таблиц по дайджесту текста скрипта
+
+    Args:
+        max_entries: Максимальное количество скриптов в памяти (вытесняются давно не использованные)
+        directory: Каталог уровня на диске (None — только память)
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_ALIAS_CACHE_SIZE, directory: Optional[str] = None):
+        self.max_entries = max(1, max_entries)
+        self.directory = Path(directory) if directory else None
+        self._entries: 'OrderedDict[str, Dict[str, List[str]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, digest: str) -> Path:
+        return self.directory / digest[:2] / f"{digest}.json"
+
+    def _store(self, digest: str, aliases: Dict[str, List[str]]):
+        self._entries[digest] = aliases
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, digest: str) -> Optional[Dict[str, List[str]]]:
+        """Алиасы скрипта из памяти или с диска; None, если скрипт еще не анализировался"""
+        with self._lock:
+            aliases = self._entries.get(digest)
+            if aliases is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return aliases
+        if self.directory is not None:
+            try:
+                with open(self._path(digest), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = None
+            if isinstance(data, dict) and data.get('version') == ALIAS_CACHE_VERSION:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(digest, data['aliases'])
+                return data['aliases']
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, digest: str, aliases: Dict[str, List[str]]):
+        """Сохраняет алиасы скрипта в памяти и, если задан каталог, на диске"""
+        with self._lock:
+            self._store(digest, aliases)
+        if self.directory is None:
+            return
+        path = self._path(digest)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Временный файл у каждого потока свой, замена файла атомарна
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': ALIAS_CACHE_VERSION, 'aliases': aliases}, f, ensure_ascii=False)
+            tmp_path.replace(path)
+        except OSError as e:
+            print(f"⚠️ Не удалось сохранить алиасы в кэш на диске: {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Статистика обращений: попадания в памяти и на диске, промахи и доля попаданий"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+_caches: Dict[tuple, AliasCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_alias_cache(config=None) -> AliasCache:
+    """
+    Возвращает общий для всех анализаторов и потоков кэш алиасов
+
+    Args:
+        config: Объект конфигурации (ALIAS_CACHE_SIZE, ALIAS_CACHE_DIR); None — значения по умолчанию
+
+    Returns:
+        AliasCache: Кэш алиасов
+    """
+    max_entries = int(getattr(config, 'ALIAS_CACHE_SIZE', DEFAULT_ALIAS_CACHE_SIZE))
+    directory = str(getattr(config, 'ALIAS_CACHE_DIR', '') or '')
+    key = (max_entries, directory)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = AliasCache(max_entries, directory or None)
+            _caches[key] = cache
+        return cache
+
+
+class AliasScope:
+    """
+    Область видимости алиасов: запрос скрипта, запрос или подзапрос
+
+    Args:
+        kind: Вид области (STATEMENT, QUERY, SUBQUERY или REGEX)
+        start: Позиция начала области в тексте скрипта
+        end: Позиция конца области в тексте скрипта
+        parent: Внешняя область видимости
+    """
+
+    def __init__(self, kind: str, start: int, end: int, parent: Optional['AliasScope'] = None):
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.parent = parent
+        self.children: List['AliasScope'] = []
+        # Алиас (и имя таблицы без алиаса) в нижнем регистре -> таблица
+        self.tables: Dict[str, str] = {}
+        # Алиасы подзапросов в FROM: они не относятся ни к одной таблице
+        self.derived: Set[str] = set()
+        if parent is not None:
+            parent.children.append(self)
+
+    def add_table(self, table: str, alias: Optional[str] = None):
+        if alias:
+            self.tables.setdefault(alias.lower(), table)
+        self.tables.setdefault(table.lower(), table)
+
+    def innermost(self, position: int) -> 'AliasScope':
+        """Самая вложенная область, содержащая позицию"""
+        scope = self
+        while True:
+            for child in scope.children:
+                if child.start <= position < child.end:
+                    scope = child
+                    break
+            else:
+                return scope
+
+    def resolve(self, alias: str) -> Tuple[bool, Optional[str]]:
+        """
+        Ищет алиас в этой области и во внешних
+
+        Returns:
+            Tuple[bool, Optional[str]]: (алиас найден, таблица или None для подзапроса)
+        """
+        alias = alias.lower()
+        scope = self
+        while scope is not None:
+            if alias in scope.tables:
+                return True, scope.tables[alias]
+            if alias in scope.derived:
+                return True, None
+            scope = scope.parent
+        return False, None
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+class AliasScopeTree:
+    """
+    Дерево областей видимости алиасов скрипта и прямой словарь {таблица: [алиасы]}
+
+    Args:
+        statements: Области видимости запросов скрипта (по одной на запрос)
+        table_aliases: Словарь {имя_таблицы: [список_алиасов]} по всем запросам
+    """
+
+    def __init__(self, statements: List[AliasScope], table_aliases: Dict[str, List[str]]):
+        self.statements = statements
+        self.table_aliases = table_aliases
+
+    @property
+    def fallbacks(self) -> int:
+        """Количество запросов, разобранных регулярными выражениями"""
+        return sum(1 for scope in self.statements if scope.kind == REGEX)
+
+    def scope_at(self, position: int) -> Optional[AliasScope]:
+        """Самая вложенная область видимости, содержащая позицию скрипта"""
+        for scope in self.statements:
+            if scope.start <= position < scope.end:
+                return scope.innermost(position)
+        return None
+
+    def resolve(self, alias: str, position: int) -> Tuple[bool, Optional[str]]:
+        """Таблица алиаса в области видимости позиции: (алиас найден, таблица)"""
+        scope = self.scope_at(position)
+        if scope is None:
+            return False, None
+        return scope.resolve(alias)
+
+
+def _statement_scope(expressions: list, start: int, end: int,
+                     table_aliases: Dict[str, List[str]]) -> AliasScope:
+    """
+    Область видимости запроса, разобранного sqlglot, с вложенными запросами и подзапросами.
+    AST обходится один раз в ширину; границы области — позиции первого и последнего
+    идентификатора в ней и во вложенных областях
+    """
+    statement = AliasScope(STATEMENT, start, end)
+    scopes = []
+    spans: Dict[int, List[int]] = {}
+    queue = deque((expression, statement) for expression in expressions)
+    while queue:
+        node, scope = queue.popleft()
+        if isinstance(node, _SCOPE_NODES):
+            scope = AliasScope(QUERY if scope is statement else SUBQUERY, start, start, scope)
+            scopes.append(scope)
+        elif isinstance(node, exp.Table):
+            table_name = node.name
+            alias = node.alias
+            scope.add_table(table_name, alias)
+            if alias and alias not in table_aliases[table_name]:
+                table_aliases[table_name].append(alias)
+        elif isinstance(node, exp.Subquery):
+            if node.alias:
+                scope.derived.add(node.alias.lower())
+        elif isinstance(node, exp.Identifier) and 'start' in node.meta:
+            span = spans.setdefault(id(scope), [node.meta['start'], node.meta['end']])
+            span[0] = min(span[0], node.meta['start'])
+            span[1] = max(span[1], node.meta['end'])
+        queue.extend((child, scope) for child in node.iter_expressions())
+
+    # Вложенные области созданы после внешних: границы собираются от вложенных к внешним
+    for scope in reversed(scopes):
+        positions = [(child.start, child.end) for child in scope.children if child.end > child.start]
+        span = spans.get(id(scope))
+        if span:
+            positions.append((start + span[0], start + span[1] + 1))
+        if positions:
+            scope.start = min(position for position, _ in positions)
+            scope.end = max(position for _, position in positions)
+    return statement
+
+
 class SQLAliasAnalyzer:
     """
     Анализатор SQL скриптов для определения алиасов таблиц и их связей.
     Поддерживает основной метод с использованием sqlglot и запасные методы с регулярными выражениями.
     """
     
-    def __init__(self):
-        """Инициализация анализатора"""
+    def __init__(self, cache: Optional[AliasCache] = None):
+        """
+        Инициализация анализатора
+
+        Args:
+            cache: Кэш алиасов (по умолчанию общий кэш процесса, см. get_alias_cache)
+        """
         # Кэш алиасов для скриптов, чтобы не перепарсить один и тот же скрипт
-        self.alias_cache = {}
+        self.alias_cache = cache if cache is not None else get_alias_cache()
         
-    def get_table_aliases(self, sql_script: str) -> Dict[str, List[str]]:
+    def get_table_aliases(self, sql_script: Union[str, ParsedScript]) -> Dict[str, List[str]]:
         """
         Получает соответствие таблиц и их алиасов из SQL скрипта.
         
         Args:
-            sql_script: SQL скрипт для анализа
+            sql_script: SQL скрипт для анализа (строка или ParsedScript)
             
         Returns:
             Dict[str, List[str]]: Словарь {имя_таблицы: [список_алиасов]}
         """
+        parsed = ParsedScript.of(sql_script)
+        # Внутри одной версии скрипта кэш алиасов запрашивается один раз
+        return parsed.cached('table_aliases', lambda: self._cached_table_aliases(parsed))
+
+    def _cached_table_aliases(self, parsed: ParsedScript) -> Dict[str, List[str]]:
         # Проверяем, есть ли результат в кэше
-        script_hash = hash(sql_script)
-        if script_hash in self.alias_cache:
-            return self.alias_cache[script_hash]
-            
-        # Основной метод - использование sqlglot если доступен
-        if SQLGLOT_AVAILABLE:
-            try:
-                aliases = self._extract_aliases_with_sqlglot(sql_script)
-                # Если нет ошибок, сохраняем результат в кэш и возвращаем
-                if "Error" not in aliases:
-                    self.alias_cache[script_hash] = aliases
-                    return aliases
-            except Exception as e:
-                print(f"Ошибка при разборе SQL с sqlglot: {e}")
-                # Продолжаем с запасным методом
-        
-        # Запасной метод - регулярные выражения
-        aliases = self._extract_aliases_with_regex(sql_script)
-        self.alias_cache[script_hash] = aliases
+        aliases = self.alias_cache.get(parsed.digest)
+        if aliases is None:
+            aliases = self.get_scope_tree(parsed).table_aliases
+            self.alias_cache.put(parsed.digest, aliases)
         return aliases
+
+    def get_scope_tree(self, sql_script: Union[str, ParsedScript]) -> AliasScopeTree:
+        """
+        Строит дерево областей видимости алиасов (один раз на версию скрипта).
+        Каждый запрос разбирается sqlglot отдельно; регулярные выражения применяются
+        только к запросам, которые sqlglot не разобрал
+        
+        Args:
+            sql_script: SQL скрипт для анализа (строка или ParsedScript)
+            
+        Returns:
+            AliasScopeTree: Дерево областей видимости
+        """
+        parsed = ParsedScript.of(sql_script)
+        return parsed.cached('alias_scopes', lambda: self._build_scope_tree(parsed))
+
+    def _build_scope_tree(self, parsed: ParsedScript) -> AliasScopeTree:
+        table_aliases = defaultdict(list)
+        statements = []
+        for statement, start, expressions in zip(parsed.statements, parsed.statement_offsets, parsed.ast):
+            end = start + len(statement)
+            if expressions is not None:
+                statements.append(_statement_scope(expressions, start, end, table_aliases))
+                continue
+            # Запасной метод для одного запроса - регулярные выражения
+            scope = AliasScope(REGEX, start, end)
+            for table, aliases in self._extract_aliases_with_regex(statement).items():
+                if table == "SUBQUERY":
+                    scope.derived.update(alias.lower() for alias in aliases)
+                    continue
+                scope.add_table(table)
+                for alias in aliases:
+                    scope.add_table(table, alias)
+                    if alias not in table_aliases[table]:
+                        table_aliases[table].append(alias)
+            statements.append(scope)
+        return AliasScopeTree(statements, dict(table_aliases))
     
-    def get_table_by_alias(self, sql_script: str, alias: str) -> Optional[str]:
+    def get_table_by_alias(self, sql_script: Union[str, ParsedScript], alias: str,
+                           position: Optional[int] = None) -> Optional[str]:
         """
         Определяет таблицу по алиасу в SQL скрипте.
         
         Args:
-            sql_script: SQL скрипт для анализа
+            sql_script: SQL скрипт для анализа (строка или ParsedScript)
             alias: Алиас таблицы
+            position: Позиция использования алиаса в скрипте: алиас ищется в области
+                видимости этой позиции и во внешних областях
             
         Returns:
-            Optional[str]: Имя таблицы или None, если алиас не найден
+            Optional[str]: Имя таблицы или None, если алиас не найден или относится к подзапросу
         """
-        table_aliases = self.get_table_aliases(sql_script)
-        
-        # Приводим алиас к нижнему регистру для сравнения
-        alias_lower = alias.lower()
-        
-        # Ищем совпадение в словаре алиасов
-        for table, aliases in table_aliases.items():
-            # Приводим список алиасов к нижнему регистру
-            aliases_lower = [a.lower() for a in aliases]
-            if alias_lower in aliases_lower:
+        if position is not None:
+            found, table = self.get_scope_tree(sql_script).resolve(alias, position)
+            if found:
                 return table
-        
-        return None
-    
-    def _extract_aliases_with_sqlglot(self, sql_script: str) -> Dict[str, List[str]]:
+        # Обратный индекс строится один раз на версию скрипта
+        return self.get_alias_index(sql_script).get(alias.lower())
+
+    def get_alias_index(self, sql_script: Union[str, ParsedScript]) -> Dict[str, str]:
         """
-        Извлечение алиасов таблиц с помощью библиотеки sqlglot
+        Обратный индекс алиасов {алиас в нижнем регистре: имя таблицы}.
+        Строится один раз на версию скрипта рядом с прямым словарем get_table_aliases
         
         Args:
-            sql_script: SQL скрипт для анализа
+            sql_script: SQL скрипт для анализа (строка или ParsedScript)
             
         Returns:
-            Dict[str, List[str]]: Словарь соответствия имен таблиц их алиасам
+            Dict[str, str]: Словарь {алиас: имя_таблицы}
         """
-        if not SQLGLOT_AVAILABLE:
-            return {"Error": "Библиотека sqlglot не установлена"}
-        
-        try:
-            # Разбор SQL скрипта
-            parsed = sqlglot_parse(sql_script)
-            
-            # Словарь для хранения результатов (таблица -> список алиасов)
-            table_aliases = defaultdict(list)
-            
-            # Извлечение всех ссылок на таблицы с их алиасами
-            for statement in parsed:
-                tables = statement.find_all(sqlglot.exp.Table)
-                
-                for table in tables:
-                    table_name = table.name
-                    alias = table.alias
-                    
-                    if alias and alias not in table_aliases[table_name]:
-                        table_aliases[table_name].append(alias)
-            
-            # Преобразуем в обычный словарь
-            return dict(table_aliases)
-        except Exception as e:
-            print(f"Ошибка разбора SQL с помощью sqlglot: {e}")
-            return {"Error": f"Ошибка разбора SQL с помощью sqlglot: {e}"}
+        parsed = ParsedScript.of(sql_script)
+        return parsed.cached('alias_index', lambda: self._build_alias_index(self.get_table_aliases(parsed)))
+
+    @staticmethod
+    def _build_alias_index(table_aliases: Dict[str, List[str]]) -> Dict[str, str]:
+        alias_index = {}
+        for table, aliases in table_aliases.items():
+            for alias in aliases:
+                # Если алиас встречается у нескольких таблиц, используется первая
+                alias_index.setdefault(alias.lower(), table)
+        return alias_index
     
     def _extract_aliases_with_regex(self, sql_script: str) -> Dict[str, List[str]]:
         """
@@ -134,28 +439,20 @@ class SQLAliasAnalyzer:
         # Словарь для хранения результатов (таблица -> список алиасов)
         table_aliases = defaultdict(list)
         
-        # Регулярные выражения для обнаружения таблиц и алиасов
-        # Шаблон 1: "имя_таблицы AS алиас" или "имя_таблицы алиас"
-        pattern1 = r'(?:FROM|JOIN)\s+([a-zA-Z0-9_]+(?:\.[a-zA-Z0-9_]+)?)\s+(?:AS\s+)?([a-zA-Z0-9_]+)'
-        
-        # Шаблон 2: Для подзапросов с алиасами
-        pattern2 = r'\)\s+(?:AS\s+)?([a-zA-Z0-9_]+)'
-        
-        # Находим все совпадения по шаблону 1
-        for match in re.finditer(pattern1, sql_script, re.IGNORECASE):
+        # Находим все совпадения "имя_таблицы AS алиас" или "имя_таблицы алиас"
+        for match in _TABLE_ALIAS_RE.finditer(sql_script):
             table, alias = match.groups()
             if alias not in table_aliases[table]:
                 table_aliases[table].append(alias)
         
         # Находим подзапросы с алиасами
-        for match in re.finditer(pattern2, sql_script, re.IGNORECASE):
+        for match in _SUBQUERY_ALIAS_RE.finditer(sql_script):
             alias = match.group(1)
             # Для подзапросов используем специальный ключ
             table_aliases["SUBQUERY"].append(alias)
         
         # Ищем все таблицы без алиасов
-        tables_pattern = r'(?:FROM|JOIN)\s+([a-zA-Z0-9_]+(?:\.[a-zA-Z0-9_]+)?)\s+(?:WHERE|ON|GROUP|ORDER|HAVING|UNION|INTERSECT|EXCEPT|$)'
-        for match in re.finditer(tables_pattern, sql_script, re.IGNORECASE):
+        for match in _TABLE_RE.finditer(sql_script):
             table = match.group(1)
             # Если таблица еще не в словаре и не является частью ключевых слов SQL
             if table not in table_aliases and not any(kw == table.upper() for kw in ['SELECT', 'WHERE', 'GROUP', 'ORDER']):
@@ -164,37 +461,32 @@ class SQLAliasAnalyzer:
         # Преобразуем в обычный словарь
         return dict(table_aliases)
     
-    def get_column_to_table_mapping(self, sql_script: str) -> Dict[str, str]:
+    def get_column_to_table_mapping(self, sql_script: Union[str, ParsedScript]) -> Dict[str, str]:
         """
         Определяет соответствие колонок таблицам на основе алиасов
         
         Args:
-            sql_script: SQL скрипт для анализа
+            sql_script: SQL скрипт для анализа (строка или ParsedScript)
             
         Returns:
             Dict[str, str]: Словарь {полное_имя_колонки: имя_таблицы}
         """
-        # Получаем алиасы таблиц
-        table_aliases = self.get_table_aliases(sql_script)
-        
-        # Словарь соответствия {алиас: таблица}
-        alias_to_table = {}
-        for table, aliases in table_aliases.items():
-            for alias in aliases:
-                alias_to_table[alias.lower()] = table
+        parsed = ParsedScript.of(sql_script)
+        return parsed.cached('column_to_table', lambda: self._map_columns(parsed))
+
+    def _map_columns(self, parsed: ParsedScript) -> Dict[str, str]:
+        alias_index = self.get_alias_index(parsed)
         
         # Словарь соответствия {полное_имя_колонки: имя_таблицы}
         column_to_table = {}
         
         # Находим все колонки с алиасами в скрипте
-        column_pattern = r'([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)'
-        for match in re.finditer(column_pattern, sql_script):
+        for match in _COLUMN_RE.finditer(parsed.text):
             alias, column = match.groups()
-            alias_lower = alias.lower()
+            table = alias_index.get(alias.lower())
             
             # Если алиас найден, добавляем сопоставление колонки с таблицей
-            if alias_lower in alias_to_table:
-                full_column_name = f"{alias}.{column}"
-                column_to_table[full_column_name] = alias_to_table[alias_lower]
+            if table is not None:
+                column_to_table[f"{alias}.{column}"] = table
         
-        return column_to_table 
\ No newline at end of file
+        return column_to_table
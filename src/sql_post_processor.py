@@ -0,0 +1,327 @@
+"""
+Модуль постобработки SQL, полученного от нейросети.
+Правила компилируются один раз на процесс и объединяются в проходы: правила,
+которые не могут пересекаться, применяются одним регулярным выражением.
+Выражения CASE обрабатываются сканером, учитывающим вложенность.
+"""
+
+import re
+import threading
+from typing import Callable, List, Optional, Union
+
+from src.regex_registry import regex
+from src.rule_guard import RuleGuard
+
+# Поля, которые считаются целочисленными/вещественными при очистке COALESCE
+INT_FIELDS = {'a_status', 'status', 'petitionid', 'id', 'ouid', 'from_id', 'to_id', 'a_ouid', 'a_id',
+              'a_count_all_work_day'}
+FLOAT_FIELDS = {'a_regioncoeff'}
+
+NUMERIC_TYPES = {'double precision', 'numeric', 'integer', 'float', 'real', 'bigint', 'smallint', 'decimal'}
+
+_TEXT_CAST_RE = regex('post_processor.text_cast', r'::(text|varchar|citext)', re.IGNORECASE)
+_INT_RE = regex('post_processor.int', r'\d+')
+_FLOAT_RE = regex('post_processor.float', r'\d+\.\d+')
+_ISNULL_RE = regex('post_processor.isnull', r'ISNULL\s*\(', re.IGNORECASE)
+
+# Лексемы, важные для поиска границ CASE ... END: строки и комментарии пропускаются целиком,
+# END IF и END LOOP блоков PL/pgSQL не закрывают CASE
+_CASE_TOKEN_RE = regex(
+    'post_processor.case_token',
+    r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/|\"[^\"]*\"|\b(CASE|END(?!\s+(?:IF|LOOP)\b))\b(?:\s+CASE\b)?",
+    re.IGNORECASE | re.DOTALL
+)
+_THEN_ELSE_RE = regex('post_processor.then_else', r'\b(THEN|ELSE)(\s+)(\S+)', re.IGNORECASE)
+_THEN_ELSE_INT_RE = regex('post_processor.then_else_int', r'\b(THEN|ELSE)(\s+)(\d+)(?![\w.])', re.IGNORECASE)
+
+Replacement = Union[str, Callable[[re.Match, dict], str]]
+
+
+class Rule:
+    """Правило постобработки: шаблон и замена (строка или функция от совпадения и контекста)"""
+
+    def __init__(self, name: str, pattern: str, replacement: Replacement, flags: int = 0):
+        self.name = name
+        self.pattern = pattern
+        self.flags = flags
+        self.regex = regex(f'post_processor.{name}', pattern, flags)
+        self.replacement = replacement
+
+    def apply(self, match: re.Match, context: dict) -> str:
+        if callable(self.replacement):
+            return self.replacement(match, context)
+        return match.expand(self.replacement)
+
+
+class RulePass:
+    """
+    Один проход по тексту: несколько правил объединяются в альтернативу с именованными
+    группами, после совпадения группы правила извлекаются его собственным выражением
+    """
+
+    def __init__(self, rules: List[Rule], hints: Optional[List[str]] = None):
+        self.rules = rules
+        self.name = 'post_processor.' + '+'.join(rule.name for rule in rules)
+        # Ключевые слова, без которых проход можно пропустить (проверяются в верхнем регистре)
+        self.hints = [hint.upper() for hint in hints] if hints else None
+        if len(rules) == 1:
+            self.regex = rules[0].regex
+        else:
+            branches = []
+            for index, rule in enumerate(rules):
+                inline = 'i' if rule.flags & re.IGNORECASE else ''
+                body = f'(?{inline}:{rule.pattern})' if inline else f'(?:{rule.pattern})'
+                # Нумерованные группы правил превращаются в незахватывающие, чтобы не сбить нумерацию
+                branches.append(f'(?P<r{index}>{_strip_groups(body)})')
+            self.regex = regex(self.name, '|'.join(branches))
+
+    def applies_to(self, upper_sql: str) -> bool:
+        return self.hints is None or any(hint in upper_sql for hint in self.hints)
+
+    def run(self, sql: str, context: dict, guard: Optional[RuleGuard] = None) -> tuple:
+        subn = guard.subn if guard is not None else lambda pattern, repl, string: pattern.subn(repl, string)
+        if len(self.rules) == 1:
+            rule = self.rules[0]
+            return subn(self.regex, lambda m: rule.apply(m, context), sql)
+
+        def dispatch(match):
+            rule = self.rules[int(match.lastgroup[1:])]
+            return rule.apply(rule.regex.fullmatch(match.group(0)), context)
+
+        return subn(self.regex, dispatch, sql)
+
+
+def _strip_groups(pattern: str) -> str:
+    """Заменяет захватывающие группы ``(`` на ``(?:`` с учетом экранирования и классов символов"""
+    result = []
+    i = 0
+    in_class = False
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            result.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if in_class:
+            if char == ']':
+                in_class = False
+        elif char == '[':
+            in_class = True
+        elif char == '(' and not pattern.startswith('?', i + 1):
+            result.append('(?:')
+            i += 1
+            continue
+        result.append(char)
+        i += 1
+    return ''.join(result)
+
+
+# --- Функции замены ---
+
+def _is_numeric_arg(arg: str) -> bool:
+    name = arg.split('.')[-1].lower()
+    return (name in INT_FIELDS or name in FLOAT_FIELDS
+            or arg.replace('.', '', 1).isdigit() or bool(_FLOAT_RE.fullmatch(arg)))
+
+
+def _clean_coalesce_casts(match, context):
+    arg1 = match.group(1).strip()
+    arg2 = match.group(2).strip()
+    # Если оба аргумента — int/float-поля или числа, убираем ::text/::varchar
+    if _is_numeric_arg(arg1) and _is_numeric_arg(arg2):
+        return f"COALESCE({_TEXT_CAST_RE.sub('', arg1)}, {_TEXT_CAST_RE.sub('', arg2)})"
+    return match.group(0)
+
+
+def _quote_number(match, context):
+    return f"{match.group(1)} = '{match.group(2)}'"
+
+
+def _datediff_to_datepart(match, context):
+    if match.group(1) is None:
+        # Аргументы не разобраны — только нормализуем единицу измерения
+        return "DATEDIFF('day',"
+    x = _ISNULL_RE.sub('COALESCE(', match.group(1).strip())
+    y = _ISNULL_RE.sub('COALESCE(', match.group(2).strip())
+    return f"DATE_PART('day', {y} - {x})"
+
+
+def _fix_empty_string_comparison(match, context):
+    field = match.group(1)
+    catalog = context['catalog']
+    # Без каталога схемы тип колонки неизвестен — разбирать алиасы незачем
+    if catalog is None or not catalog.ensure_loaded():
+        return match.group(0)
+    table = None
+    column = field
+    if '.' in field:
+        alias, column = field.split('.', 1)
+        table = context['alias_analyzer'].get_table_by_alias(context['sql'], alias, match.start(1))
+    col_type = catalog.get_column_type(table, column) if table else None
+    # Если числовой тип — сравнение с пустой строкой заменяется на IS NULL
+    if col_type and col_type.lower() in NUMERIC_TYPES:
+        return f"{field} IS NULL"
+    return match.group(0)
+
+
+# --- Выражения CASE ---
+
+def _find_case_spans(sql: str) -> List[tuple]:
+    """
+    Возвращает границы CASE ... END верхнего уровня: (начало CASE, конец CASE, начало END, конец END)
+    """
+    spans = []
+    stack = []
+    for match in _CASE_TOKEN_RE.finditer(sql):
+        keyword = match.group(1)
+        if not keyword:
+            continue
+        if keyword.upper() == 'CASE':
+            stack.append(match)
+        elif stack:
+            start = stack.pop()
+            if not stack:
+                spans.append((start.start(), start.end(), match.start(), match.end()))
+    return spans
+
+
+def rewrite_case_expressions(sql: str) -> str:
+    """
+    Если среди значений THEN/ELSE одного CASE есть и строки, и целые числа,
+    приводит числа к ::text. Вложенные CASE обрабатываются отдельно.
+    """
+    if 'CASE' not in sql.upper():
+        return sql
+    spans = _find_case_spans(sql)
+    if not spans:
+        return sql
+
+    parts = []
+    position = 0
+    for case_start, body_start, end_start, end_end in spans:
+        body = rewrite_case_expressions(sql[body_start:end_start])
+        parts.append(sql[position:body_start])
+        parts.append(_cast_case_values(body))
+        parts.append(sql[end_start:end_end])
+        position = end_end
+    parts.append(sql[position:])
+    return ''.join(parts)
+
+
+def _cast_case_values(body: str) -> str:
+    # Вложенные CASE маскируются, чтобы учитывать только значения текущего уровня
+    masked = body
+    for case_start, _, _, end_end in _find_case_spans(body):
+        masked = masked[:case_start] + ' ' * (end_end - case_start) + masked[end_end:]
+
+    values = [m.group(3) for m in _THEN_ELSE_RE.finditer(masked)]
+    has_number = any(_INT_RE.fullmatch(value) for value in values)
+    has_string = any("'" in value for value in values)
+    if not (has_string and has_number):
+        return body
+
+    result = []
+    position = 0
+    for match in _THEN_ELSE_INT_RE.finditer(masked):
+        result.append(body[position:match.end()])
+        result.append('::text')
+        position = match.end()
+    result.append(body[position:])
+    return ''.join(result)
+
+
+class SQLPostProcessor:
+    """
+    Постобработчик SQL: набор проходов по правилам и сканер CASE.
+    Проходы выполняются в исходном порядке правил; правила, совпадения которых
+    могут вкладываться друг в друга, остаются в отдельных проходах.
+    """
+
+    def __init__(self, passes: List[Union[RulePass, Callable[[str], str]]]):
+        self.passes = passes
+
+    def process(self, sql: str, alias_analyzer=None, catalog=None, guard: Optional[RuleGuard] = None) -> str:
+        """
+        Применяет все проходы к SQL-коду
+
+        Args:
+            sql: SQL-код
+            alias_analyzer: Анализатор алиасов (для правил, зависящих от таблиц)
+            catalog: Каталог схемы с типами колонок
+            guard: Бюджет времени на каждый проход (правило, превысившее его, пропускается)
+
+        Returns:
+            str: Обработанный SQL-код
+        """
+        context = {'alias_analyzer': alias_analyzer, 'catalog': catalog, 'sql': sql}
+        upper_sql = sql.upper()
+        for rule_pass in self.passes:
+            if not isinstance(rule_pass, RulePass):
+                new_sql = guard.run(f'post_processor.{rule_pass.__name__}', rule_pass, sql) if guard else rule_pass(sql)
+                if new_sql != sql:
+                    sql = new_sql
+                    upper_sql = sql.upper()
+                continue
+            if not rule_pass.applies_to(upper_sql):
+                continue
+            context['sql'] = sql
+            sql, count = rule_pass.run(sql, context, guard)
+            if count:
+                upper_sql = sql.upper()
+        return sql
+
+
+def build_default_post_processor() -> SQLPostProcessor:
+    """Создает постобработчик с правилами для результатов нейросети"""
+    return SQLPostProcessor([
+        RulePass([
+            # Исправляем неправильное использование ::TIMESTAMP в операторах SET
+            Rule('set_timestamp', r"(SET\s+\w+\s*=\s*'[^']*')::TIMESTAMP", r"SET \1::TIMESTAMP"),
+            # Убираем ::text/::varchar у COALESCE, если оба аргумента — числовые поля или числа
+            Rule('coalesce_casts', r"COALESCE\s*\(\s*([^,]+?)\s*,\s*([^\)]+?)\s*\)", _clean_coalesce_casts),
+        ], hints=['SET', 'COALESCE']),
+        RulePass([
+            # Текстовое поле сравнивается с числом
+            Rule('text_field_number', r"([\w.]+(?:::(?:ci)?text|::varchar))\s*=\s*(\d+)(?!\s*::)", _quote_number),
+            # Строковый литерал сравнивается с числом
+            Rule('string_number', r"('[^']*')\s*=\s*(\d+)(?!\s*::)", _quote_number),
+        ], hints=['=']),
+        rewrite_case_expressions,
+        RulePass([
+            # COALESCE с текстовым результатом сравнивается с числом
+            Rule('coalesce_comparison', r"(COALESCE\s*\([^)]*?::text[^)]*\))\s*=\s*(\d+)(?!\s*::)", _quote_number),
+        ], hints=['COALESCE']),
+        RulePass([
+            # DATEDIFF(DAY, X, Y) и DATEDIFF('day', X, Y) -> DATE_PART('day', Y - X)
+            Rule('datediff',
+                 r"DATEDIFF\s*\(\s*(?:DAY|'day')\s*,\s*([^,]+?)\s*,\s*([^)]+?)\s*\)|DATEDIFF\s*\(\s*DAY\s*,",
+                 _datediff_to_datepart, re.IGNORECASE),
+        ], hints=['DATEDIFF']),
+        RulePass([
+            Rule('year', r"YEAR\s*\(\s*([^\)]+)\s*\)", r"EXTRACT(YEAR FROM \1::timestamp)", re.IGNORECASE),
+        ], hints=['YEAR']),
+        RulePass([
+            Rule('month', r"MONTH\s*\(\s*([^\)]+)\s*\)", r"EXTRACT(MONTH FROM \1::timestamp)", re.IGNORECASE),
+        ], hints=['MONTH']),
+        RulePass([
+            Rule('to_timestamp_day', r"TO_TIMESTAMP\(([^)]+?)::text,\s*'YYYY-MM-DD'\)", r"DATE_TRUNC('day', \1)"),
+        ], hints=['TO_TIMESTAMP']),
+        RulePass([
+            # Числовое поле сравнивается с пустой строкой -> IS NULL
+            Rule('empty_string_comparison', r"([\w\.]+)\s*=\s*''(::text)?", _fix_empty_string_comparison),
+        ], hints=["''"]),
+    ])
+
+
+_default_post_processor = None
+_default_lock = threading.Lock()
+
+
+def get_post_processor() -> SQLPostProcessor:
+    """Возвращает постобработчик по умолчанию, скомпилированный один раз на процесс"""
+    global _default_post_processor
+    if _default_post_processor is None:
+        with _default_lock:
+            if _default_post_processor is None:
+                _default_post_processor = build_default_post_processor()
+    return _default_post_processor
@@ -77,4 +77,37 @@ class TestAIConverter:
         assert should_skip is False
         assert reason == ""
     
-    # Здесь могут быть другие тесты для класса AIConverter 
\ No newline at end of file
+    # Здесь могут быть другие тесты для класса AIConverter 
+    def test_large_script_converts_go_batches_in_parallel(self, converter, monkeypatch, tmp_path):
+        """Части большого скрипта не переходят через GO, конвертируются параллельно и собираются по порядку"""
+        import threading
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(converter, 'ai_provider', 'openai')
+        monkeypatch.setattr(converter.config, 'GO_BATCH_WORKERS', 4)
+        monkeypatch.setattr(converter.config, 'LARGE_SCRIPT_CHUNK_SIZE', 1000, raising=False)
+        threads = set()
+        workers = []
+        def convert_part(self, chunk, part_index, total_parts, error_message):
+            threads.add(threading.current_thread().name)
+            # У каждой части свое состояние скрипта
+            workers.append(self)
+            self.examples_used += 1
+            return True, chunk.lower(), ''
+        monkeypatch.setattr(AIConverter, '_convert_part', convert_part)
+        monkeypatch.setattr(converter, '_post_process_large_script', lambda script: script)
+        script = "\nGO\n".join(f"SELECT A{n} FROM T{n}" for n in range(8))
+        success, converted, _ = converter.convert_large_script(script)
+        assert success
+        assert converted == "\n;\n".join(f"select a{n} from t{n}" for n in range(8))
+        assert len(threads) > 1
+        assert len({id(worker) for worker in workers}) == 8 and converter not in workers
+        assert converter.examples_used == 8
+        # Промежуточные файлы каждого вызова — в своем временном каталоге, а не в общем chunks/
+        assert not (tmp_path / 'chunks').exists()
+
+    def test_script_with_error_is_not_compacted(self, converter):
+        """Номера строк в сообщении об ошибке относятся к несжатому скрипту"""
+        script = "-- заголовок\n\nSELECT  1;\n\nSELECT  x;"
+        assert converter._compact_for_prompt(script).text == "SELECT 1;\nSELECT x;"
+        compacted = converter._compact_for_prompt(script, 'psql:script.sql:5: ERROR:  column "x" does not exist')
+        assert compacted.text == script
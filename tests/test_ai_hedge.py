@@ -0,0 +1,142 @@
+import sys
+import time
+from pathlib import Path
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config
+import batch_process
+from src.ai_converter import AIConverter
+from src.ai_hedge import HEDGE_CANCELLED_MESSAGE, build_candidates
+
+
+class _HedgedConverter(AIConverter):
+    """Конвертер с заданной задержкой и результатом проверки для каждого варианта"""
+
+    def __init__(self, plan, ignore_cancel=False):
+        super().__init__(config)
+        # plan: {температура: (задержка, проходит ли проверку)}
+        self.plan = plan
+        self.hedge_candidates = len(plan)
+        # Ответ дочитывается до конца и без отмены (как без потокового чтения)
+        self.ignore_cancel = ignore_cancel
+        self.active_tests = 0
+        self.max_active_tests = 0
+        self.tested_scripts = []
+
+    def _convert_script(self, original_script, error_message=None, candidate=None):
+        delay, _ = self.plan[candidate.temperature]
+        deadline = time.time() + delay
+        while time.time() < deadline:
+            if candidate.cancelled and not self.ignore_cancel:
+                return False, original_script, HEDGE_CANCELLED_MESSAGE
+            time.sleep(0.005)
+        self._record_usage('openai', 100, 50, candidate)
+        return True, f"SELECT {candidate.temperature}", "ok"
+
+    def _test_script_in_postgres(self, script):
+        self.tested_scripts.append(script)
+        self.active_tests += 1
+        self.max_active_tests = max(self.max_active_tests, self.active_tests)
+        time.sleep(0.02)
+        self.active_tests -= 1
+        temperature = float(script.split()[1])
+        works = self.plan[temperature][1]
+        return works, None if works else 'ERROR: syntax error'
+
+
+class TestAIHedge:
+    """Тесты для параллельной генерации вариантов конвертации"""
+
+    def test_build_candidates_cycles_and_clamps(self):
+        candidates = build_candidates(4, 'anthropic', [0.1, 1.5], ['anthropic', 'openai'])
+        assert [c.provider for c in candidates] == ['anthropic', 'openai', 'anthropic', 'openai']
+        assert [c.temperature for c in candidates] == [0.1, 1.5, 0.1, 1.5]
+        assert build_candidates(2, 'anthropic', [1.5])[0].temperature == 1.0
+
+    def test_first_passing_candidate_wins(self, monkeypatch):
+        monkeypatch.setattr(config, 'AI_HEDGE_TEMPERATURES', [0.1, 0.5, 0.9])
+        converter = _HedgedConverter({0.1: (0.3, True), 0.5: (0.05, True), 0.9: (2.0, True)})
+        started = time.time()
+        success, script, message, verified, tested = converter._hedged_conversion("SELECT 1", None, 'openai')
+        assert time.time() - started < 1.5
+        assert success and verified
+        assert script == "SELECT 0.5"
+        stats = converter.hedge_stats
+        assert stats['winner'] == 1
+        # Медленные варианты отменены и не потратили токенов ответа
+        assert stats['cancelled'] == 2
+        assert stats['extra_output_tokens'] == 0
+
+    def test_winner_returns_without_waiting_for_losers(self, monkeypatch):
+        monkeypatch.setattr(config, 'AI_HEDGE_TEMPERATURES', [0.1, 0.5])
+        converter = _HedgedConverter({0.1: (0.05, True), 0.5: (0.6, True)}, ignore_cancel=True)
+        started = time.time()
+        success, script, message, verified, tested = converter._hedged_conversion("SELECT 1", None, 'openai')
+        assert time.time() - started < 0.4
+        assert verified and script == "SELECT 0.1"
+        stats = converter.hedge_stats
+        assert stats['extra_output_tokens'] == 0
+        # Токены дочитанного проигравшего варианта учитываются в сводке по его завершении
+        deadline = time.time() + 5
+        while stats['extra_output_tokens'] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert stats['extra_output_tokens'] == 50
+
+    def test_candidates_are_tested_one_at_a_time(self, monkeypatch):
+        monkeypatch.setattr(config, 'AI_HEDGE_TEMPERATURES', [0.1, 0.5, 0.9])
+        converter = _HedgedConverter({0.1: (0.01, False), 0.5: (0.01, False), 0.9: (0.01, False)})
+        converter._hedged_conversion("SELECT 1", None, 'openai')
+        assert converter.max_active_tests == 1
+
+    def test_hedging_requires_streaming(self, monkeypatch):
+        monkeypatch.setattr(config, 'AI_STREAMING', False)
+        converter = _HedgedConverter({0.1: (0.01, True), 0.5: (0.01, True)})
+        monkeypatch.setattr(converter, 'should_skip_conversion', lambda script: (False, ''))
+        monkeypatch.setattr(converter, 'is_large_script', lambda script: False)
+        monkeypatch.setattr(converter, 'ai_provider', 'openai')
+        calls = []
+        monkeypatch.setattr(converter, '_hedged_conversion', lambda *args: calls.append(args))
+        monkeypatch.setattr(converter, '_convert_script',
+                            lambda script, error=None, candidate=None: (False, script, 'нет ответа'))
+        converter.convert_with_ai("SELECT 1")
+        # Параллельная генерация отключается только для этого вызова
+        assert calls == [] and converter.hedge_candidates == 2
+
+    def test_failed_candidates_fall_back(self, monkeypatch):
+        monkeypatch.setattr(config, 'AI_HEDGE_TEMPERATURES', [0.1, 0.5])
+        converter = _HedgedConverter({0.1: (0.05, False), 0.5: (0.1, False)})
+        success, script, message, verified, tested = converter._hedged_conversion("SELECT 1", None, 'openai')
+        assert success and not verified
+        assert script == "SELECT 0.1"
+        assert tested == (False, 'ERROR: syntax error')
+        stats = converter.hedge_stats
+        assert stats['sequential_time'] >= stats['wall_time'] * 0.9
+        assert stats['extra_output_tokens'] == 50
+
+    def test_fallback_is_not_tested_twice(self, monkeypatch):
+        monkeypatch.setattr(config, 'AI_HEDGE_TEMPERATURES', [0.1, 0.5])
+        monkeypatch.setattr(config, 'AI_STREAMING', True)
+        converter = _HedgedConverter({0.1: (0.01, False), 0.5: (0.05, False)})
+        monkeypatch.setattr(converter, 'should_skip_conversion', lambda script: (False, ''))
+        monkeypatch.setattr(converter, 'is_large_script', lambda script: False)
+        monkeypatch.setattr(converter, 'ai_provider', 'openai')
+        monkeypatch.setattr(converter, '_fix_script_with_ai', lambda script, error: (False, script, 'нет ответа'))
+        success, script, message = converter.convert_with_ai("SELECT 1", max_iterations=1)
+        assert not success and script == "SELECT 0.1"
+        # Каждый вариант проверен один раз, результат проверки запасного варианта использован повторно
+        assert sorted(converter.tested_scripts) == ["SELECT 0.1", "SELECT 0.5"]
+
+    def test_hedging_summary(self):
+        results = [
+            {'success': True, 'hedge': {'verified': True, 'winner': 1, 'wall_time': 2.0, 'sequential_time': 5.0,
+                                        'time_saved': 3.0, 'cancelled': 1, 'extra_input_tokens': 200,
+                                        'extra_output_tokens': 80}},
+            {'success': True, 'hedge': None},
+        ]
+        summary = batch_process.summarize_hedging(results)
+        assert summary['count'] == 1
+        assert summary['wins_by_candidate'] == {'1': 1}
+        assert summary['time_saved'] == 3.0
+        assert summary['extra_input_tokens'] == 200
@@ -0,0 +1,114 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config
+from src.ai_converter import AIConverter
+from src.ai_router import ProviderEndpoint, ProviderRouter, parse_endpoints, route_key
+from src.mock_llm_server import MockLLMServer
+
+OPENAI = ProviderEndpoint('openai', 'gpt-4o')
+ANTHROPIC = ProviderEndpoint('anthropic', 'claude-3-5-sonnet')
+
+
+class TestProviderRouter:
+    """Тесты для маршрутизатора запросов между провайдерами"""
+
+    def test_route_is_deterministic_and_spreads_load(self):
+        router = ProviderRouter([OPENAI, ANTHROPIC])
+        key = route_key('system', 'SELECT 1')
+        assert [e.name for e in router.route(key)] == [e.name for e in router.route(key)]
+        first = {router.route(route_key(str(i)))[0].name for i in range(50)}
+        assert first == {OPENAI.name, ANTHROPIC.name}
+
+    def test_provider_filter(self):
+        router = ProviderRouter([OPENAI, ANTHROPIC])
+        assert router.route('key', ['anthropic']) == [ANTHROPIC]
+
+    def test_rate_limited_endpoint_goes_last(self):
+        router = ProviderRouter([OPENAI, ANTHROPIC])
+        key = next(route_key(str(i)) for i in range(100) if router.route(route_key(str(i)))[0] is OPENAI)
+        router.record(OPENAI, 0.1, False, 429, {'retry-after': '60'})
+        assert router.route(key) == [ANTHROPIC, OPENAI]
+        assert router.snapshot()[OPENAI.name]['cooling_down']
+
+    def test_error_rate_and_latency_degrade(self):
+        router = ProviderRouter([OPENAI, ANTHROPIC], min_samples=3, slow_factor=3.0)
+        for _ in range(3):
+            router.record(ANTHROPIC, 0.5, True)
+            router.record(OPENAI, 5.0, True)
+        assert all(router.route(route_key(str(i)))[0] is ANTHROPIC for i in range(20))
+        for _ in range(3):
+            router.record(ANTHROPIC, 0.5, False, 500)
+        assert router.snapshot()[ANTHROPIC.name]['error_rate'] == 0.5
+        for _ in range(2):
+            router.record(ANTHROPIC, 0.5, False, 500)
+        assert all(router.route(route_key(str(i)))[0] is OPENAI for i in range(20))
+
+    def test_quota_headers(self):
+        router = ProviderRouter([OPENAI, ANTHROPIC])
+        router.record(ANTHROPIC, 0.2, True, 200, {'anthropic-ratelimit-requests-remaining': '0',
+                                                  'anthropic-ratelimit-tokens-remaining': '1500'})
+        stats = router.snapshot()[ANTHROPIC.name]
+        assert stats['remaining_requests'] == 0
+        assert stats['remaining_tokens'] == 1500
+        assert stats['cooling_down']
+
+    def test_parse_endpoints(self):
+        cfg = SimpleNamespace(OPENAI_MODEL='gpt-4', ANTHROPIC_MODEL='claude',
+                              OPENAI_BASE_URL='http://proxy', ANTHROPIC_BASE_URL=None)
+        default = parse_endpoints('', cfg)
+        assert [e.name for e in default] == ['openai:gpt-4', 'anthropic:claude']
+        assert default[0].url == 'http://proxy/v1/chat/completions'
+        endpoints = parse_endpoints('anthropic:claude-3-haiku@http://127.0.0.1:9000/, openai', cfg)
+        assert endpoints[0].url == 'http://127.0.0.1:9000/v1/messages'
+        assert endpoints[1].model == 'gpt-4'
+        with pytest.raises(ValueError):
+            parse_endpoints('mistral:large', cfg)
+
+
+class TestRoutedConversion:
+    """Переключение между провайдерами на локальной имитации API"""
+
+    @pytest.mark.parametrize('streaming', [True, False])
+    def test_failover_to_second_provider(self, monkeypatch, streaming):
+        monkeypatch.setattr(config, 'AI_STREAMING', streaming)
+        with MockLLMServer(statuses=[503, 503]) as failing, MockLLMServer() as healthy:
+            openai = ProviderEndpoint('openai', 'gpt-4o', failing.url)
+            anthropic = ProviderEndpoint('anthropic', 'claude-3-5-sonnet', healthy.url)
+            converter = AIConverter(config, ai_provider='openai')
+            converter.api_keys = {'openai': 'test', 'anthropic': 'test'}
+            converter.routing = True
+            converter.router = ProviderRouter([openai, anthropic])
+            # Первой выбирается точка OpenAI, которая отвечает ошибкой
+            key = next(i for i in range(100)
+                       if converter.router.route(route_key(converter._get_system_prompt(), f"SELECT {i}"))[0] is openai)
+
+            success, text, message = converter._request_ai(f"SELECT {key}")
+
+            assert success
+            assert text.strip().startswith('```sql')
+            assert 'Anthropic' in message
+            assert len(failing.requests) == 1
+            assert healthy.requests[0]['payload']['model'] == 'claude-3-5-sonnet'
+            snapshot = converter.router.snapshot()
+            assert snapshot[openai.name]['errors'] == 1
+            assert snapshot[anthropic.name]['requests'] == 1
+            assert converter.usage.by_provider['anthropic']['input_tokens'] > 0
+
+    def test_client_error_does_not_fail_over(self):
+        with MockLLMServer(statuses=[400]) as server:
+            endpoint = ProviderEndpoint('anthropic', 'claude', server.url)
+            other = ProviderEndpoint('anthropic', 'claude-haiku', server.url)
+            converter = AIConverter(config, ai_provider='anthropic')
+            converter.api_keys = {'anthropic': 'test'}
+            converter.router = ProviderRouter([endpoint, other])
+            success, _, message = converter._request_ai("SELECT 1")
+            assert not success
+            assert '400' in message
+            assert len(server.requests) == 1
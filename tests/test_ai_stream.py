@@ -0,0 +1,96 @@
+import json
+import sys
+from pathlib import Path
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.ai_stream import CodeBlockExtractor, iter_sse_events, read_stream
+
+
+class FakeStreamResponse:
+    """Имитация ответа requests, открытого с stream=True"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.consumed = 0
+        self.closed = False
+
+    def iter_lines(self, decode_unicode=True):
+        for line in self.lines:
+            self.consumed += 1
+            yield line
+
+    def close(self):
+        self.closed = True
+
+
+def openai_events(deltas, finish_reason='stop', usage=None):
+    lines = []
+    for delta in deltas:
+        lines += ['data: ' + json.dumps({'choices': [{'delta': {'content': delta}, 'finish_reason': None}]}), '']
+    lines += ['data: ' + json.dumps({'choices': [{'delta': {}, 'finish_reason': finish_reason}]}), '']
+    if usage:
+        lines += ['data: ' + json.dumps({'choices': [], 'usage': usage}), '']
+    lines += ['data: [DONE]', '']
+    return lines
+
+
+def anthropic_events(deltas, stop_reason='end_turn'):
+    def event(kind, payload):
+        payload['type'] = kind
+        return [f'event: {kind}', 'data: ' + json.dumps(payload), '']
+    lines = event('message_start', {'message': {'usage': {'input_tokens': 42, 'output_tokens': 1}}})
+    lines += [': ping', '']
+    for delta in deltas:
+        lines += event('content_block_delta', {'index': 0, 'delta': {'type': 'text_delta', 'text': delta}})
+    lines += event('message_delta', {'delta': {'stop_reason': stop_reason}, 'usage': {'output_tokens': 17}})
+    lines += event('message_stop', {})
+    return lines
+
+
+class TestAIStream:
+    """Тесты для чтения потоковых ответов нейросетей"""
+
+    def test_sse_parsing(self):
+        response = FakeStreamResponse(['event: a', 'data: 1', 'data: 2', '', ': comment', 'data:3'])
+        assert list(iter_sse_events(response)) == [('a', '1\n2'), (None, '3')]
+
+    def test_code_block_extractor_across_chunks(self):
+        extractor = CodeBlockExtractor()
+        for delta in ['Вот код:\n``', '`sql\nSELECT 1;\n', 'SELECT 2;\n`', '``\nПояснение']:
+            done = extractor.feed(delta)
+        assert done
+        assert extractor.code == 'SELECT 1;\nSELECT 2;'
+
+    def test_openai_stream_usage(self):
+        response = FakeStreamResponse(openai_events(
+            ['```sql\nSELECT', ' 1;\n```'], usage={'prompt_tokens': 10, 'completion_tokens': 5}))
+        result = read_stream(response, 'openai', stop_after_code_block=False)
+        assert result.text == '```sql\nSELECT 1;\n```'
+        assert result.finish_reason == 'stop'
+        assert not result.truncated
+        assert (result.input_tokens, result.output_tokens) == (10, 5)
+        assert result.time_to_first_token is not None
+        assert response.closed
+
+    def test_openai_truncation(self):
+        response = FakeStreamResponse(openai_events(['```sql\nSELECT 1,\n'], finish_reason='length'))
+        result = read_stream(response, 'openai')
+        assert result.truncated
+        # Количество токенов оценивается, если API его не прислал
+        assert result.output_tokens > 0
+
+    def test_anthropic_stream_stops_after_code_block(self):
+        response = FakeStreamResponse(anthropic_events(['```sql\nSELECT 1;\n```\n', 'Длинное пояснение']))
+        result = read_stream(response, 'anthropic')
+        assert result.stopped_early
+        assert 'Длинное пояснение' not in result.text
+        assert result.input_tokens == 42
+        assert response.consumed < len(response.lines)
+
+    def test_anthropic_max_tokens(self):
+        response = FakeStreamResponse(anthropic_events(['```sql\nSELECT'], stop_reason='max_tokens'))
+        result = read_stream(response, 'anthropic')
+        assert result.truncated
+        assert result.output_tokens == 17
@@ -0,0 +1,82 @@
+import sys
+from pathlib import Path
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config
+import batch_process
+from src.ai_usage import AIUsage, extract_usage
+from src.converter import SQLConverter
+
+
+class _FakeTester:
+    def __init__(self, success, error=None):
+        self.success = success
+        self.error = error
+        self.scripts = []
+
+    def test_script(self, script):
+        self.scripts.append(script)
+        return {'success': self.success, 'error': self.error, 'execution_time': 0.0, 'row_count': 0}
+
+
+class TestBatchRouting:
+    """Тесты для маршрутизации пакетной обработки (правила → нейросеть)"""
+
+    def test_plain_select_goes_through_rules(self):
+        parser = batch_process.SQLParser(config)
+        tester = _FakeTester(True)
+        script = "SELECT [A_NAME] FROM WM_PERSONAL_CARD WHERE OUID = {params.id}"
+        converted, reason = batch_process.try_rule_conversion(
+            parser.parse_script(script), parser, SQLConverter(config), tester, config.DEFAULT_PARAMS
+        )
+        assert reason is None
+        assert '"A_NAME"' in converted
+        assert '{params.id}' not in tester.scripts[0]
+
+    def test_unsupported_constructs_escalate_without_testing(self):
+        parser = batch_process.SQLParser(config)
+        tester = _FakeTester(True)
+        script = "DECLARE @d DATETIME\nSELECT DATEADD(day, 1, @d)"
+        converted, reason = batch_process.try_rule_conversion(
+            parser.parse_script(script), parser, SQLConverter(config), tester, {}
+        )
+        assert converted is None
+        assert 'переменные' in reason
+        assert tester.scripts == []
+
+    def test_failed_test_escalates(self):
+        parser = batch_process.SQLParser(config)
+        tester = _FakeTester(False, 'column "x" does not exist')
+        converted, reason = batch_process.try_rule_conversion(
+            parser.parse_script("SELECT x FROM t"), parser, SQLConverter(config), tester, {}
+        )
+        assert converted is None
+        assert 'column "x" does not exist' in reason
+
+    def test_routing_summary(self):
+        results = [
+            {'success': True, 'route': 'rules', 'rule_time': 0.5, 'ai_time': 0.0, 'ai_usage': {}},
+            {'success': True, 'route': 'ai', 'rule_time': 0.5, 'ai_time': 10.0,
+             'ai_usage': {'requests': 2, 'input_tokens': 1000, 'output_tokens': 500, 'cost': 0.01}},
+            {'success': False, 'route': 'ai', 'rule_time': 0.0, 'ai_time': 5.0,
+             'ai_usage': {'requests': 1, 'input_tokens': 100, 'output_tokens': 50, 'cost': 0.001}},
+        ]
+        summary = batch_process.summarize_routing(results)
+        assert summary['rules']['count'] == 1
+        assert summary['ai']['count'] == 2
+        assert summary['ai']['success_count'] == 1
+        assert summary['ai']['escalated_count'] == 1
+        assert summary['ai']['input_tokens'] == 1100
+        assert summary['ai']['total_time'] == 15.5
+
+    def test_usage_cost(self):
+        usage = AIUsage()
+        usage.record('openai', **extract_usage('openai', {'usage': {'prompt_tokens': 1000, 'completion_tokens': 200}}))
+        usage.record('anthropic', **extract_usage('anthropic', {'usage': {'input_tokens': 500, 'output_tokens': 100}}))
+        prices = {'openai': {'input': 1.0, 'output': 2.0}, 'anthropic': {'input': 3.0, 'output': 4.0}}
+        result = usage.as_dict(prices)
+        assert result['requests'] == 2
+        assert result['input_tokens'] == 1500
+        assert abs(result['cost'] - (0.001 + 0.0004 + 0.0015 + 0.0004)) < 1e-9
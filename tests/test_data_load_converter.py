@@ -0,0 +1,119 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config
+from src.data_load_converter import DataLoadConverter, normalize_date_literal
+from src.ai_converter import AIConverter
+from src.converter import SQLConverter
+from src.parser import SQLParser
+
+
+CREATE_TABLE = """
+CREATE TABLE [dbo].[PERSON] (
+  ID INT NOT NULL
+ ,NAME NVARCHAR(100) NULL /* ФИО */
+ ,ACTIVE BIT NULL
+ ,BIRTHDATE DATETIME NULL
+ ,PHOTO VARBINARY(MAX) NULL
+ ,CONSTRAINT PK_PERSON PRIMARY KEY CLUSTERED (ID)
+)
+"""
+
+INSERT_BLOCK = """INSERT INTO [dbo].[PERSON] ([ID], [NAME], [ACTIVE], [BIRTHDATE], [PHOTO]) VALUES
+(1, N'О''Нил', 1, '19800131', 0x0A0B),
+(2, NULL, 0, CONVERT(DATETIME, '01/31/1990', 101), NULL)
+GO
+"""
+
+
+class TestDataLoadConverter:
+    """Тесты для детерминированной конвертации INSERT ... VALUES"""
+
+    @pytest.fixture
+    def converter(self):
+        return DataLoadConverter(SimpleNamespace(DATA_LOAD_BATCH_ROWS=1000))
+
+    def test_collect_column_types(self, converter):
+        types = converter.collect_column_types(CREATE_TABLE)
+        assert types['dbo.person'] == [('ID', 'INT'), ('NAME', 'NVARCHAR'), ('ACTIVE', 'BIT'),
+                                       ('BIRTHDATE', 'DATETIME'), ('PHOTO', 'VARBINARY')]
+        assert 'person' in types
+
+    def test_convert_to_insert(self, converter):
+        types = converter.collect_column_types(CREATE_TABLE)
+        result = converter.convert_block(INSERT_BLOCK, types)
+        assert result == (
+            'INSERT INTO "dbo"."PERSON" ("ID", "NAME", "ACTIVE", "BIRTHDATE", "PHOTO") VALUES\n'
+            "(1, 'О''Нил', true, '1980-01-31', '\\x0A0B'::bytea),\n"
+            "(2, NULL, false, '1990-01-31'::timestamp, NULL);"
+        )
+
+    def test_convert_to_copy(self, converter):
+        types = converter.collect_column_types(CREATE_TABLE)
+        result = converter.convert_block(INSERT_BLOCK, types, output_format='copy')
+        assert result.splitlines() == [
+            'COPY "dbo"."PERSON" ("ID", "NAME", "ACTIVE", "BIRTHDATE", "PHOTO") FROM STDIN;',
+            "1\tО'Нил\tt\t1980-01-31\t\\\\x0A0B",
+            "2\t\\N\tf\t1990-01-31\t\\N",
+            "\\.",
+        ]
+
+    def test_identifiers_are_quoted(self, converter):
+        block = "INSERT INTO [dbo].[Order] ([User], [Full Name], \"Note\", user_id, Total, ORDER_NO) VALUES (1, N'x', 'y', 2, 3, 4)"
+        assert converter.convert_block(block) == (
+            'INSERT INTO "dbo"."Order" ("User", "Full Name", "Note", user_id, Total, ORDER_NO) VALUES\n'
+            "(1, 'x', 'y', 2, 3, 4);"
+        )
+        # Зарезервированные слова берутся в кавычки и без скобок, в том числе при выводе COPY
+        result = converter.convert_block("INSERT INTO dbo.orders (user, [from], amount) VALUES (1, 2, 3)",
+                                         output_format='copy')
+        assert result.splitlines()[0] == 'COPY dbo.orders ("user", "from", amount) FROM STDIN;'
+
+    def test_batches_rows(self):
+        converter = DataLoadConverter(SimpleNamespace(DATA_LOAD_BATCH_ROWS=2))
+        block = "INSERT INTO t (a) VALUES (1), (2), (3);"
+        result = converter.convert_block(block)
+        assert result.count("INSERT INTO t (a) VALUES") == 2
+
+    @pytest.mark.parametrize("block", [
+        "INSERT INTO #tmp (a) VALUES (1)",
+        "INSERT INTO t (a) SELECT a FROM s",
+        "INSERT INTO t (a) VALUES (@var)",
+        "INSERT INTO t (a) VALUES (1)\nUPDATE t SET a = 2",
+        "INSERT INTO t (a, b) VALUES (1)",
+    ])
+    def test_non_literal_blocks_go_to_ai(self, converter, block):
+        assert converter.convert_block(block) is None
+
+    def test_normalize_date_literal(self):
+        assert normalize_date_literal('20230131 10:20:30.123') == '2023-01-31 10:20:30.123'
+        assert normalize_date_literal('2023-01-31T10:20') == '2023-01-31 10:20'
+        assert normalize_date_literal('12/31/2023') == '2023-12-31'
+        assert normalize_date_literal('вчера') is None
+
+    def test_large_script_separates_data_blocks(self):
+        ai = AIConverter(SimpleNamespace())
+        script = CREATE_TABLE + "\n" + INSERT_BLOCK + "SELECT * FROM dbo.PERSON\n"
+        blocks = ai._split_to_logical_blocks(script)
+        segments = ai._separate_data_load_blocks(script, blocks)
+        assert [kind for kind, _ in segments] == ['ai', 'data', 'ai']
+        assert segments[1][1].startswith('INSERT INTO "dbo"."PERSON"')
+
+    def test_mixed_case_names_match_converted_ddl(self):
+        create_table = "CREATE TABLE dbo.Users (\n  Id INT NOT NULL\n ,FirstName NVARCHAR(50) NULL\n)\nGO\n"
+        insert = "INSERT INTO dbo.Users (Id, FirstName) VALUES (1, N'Анна')\nGO\n"
+        ddl = SQLConverter(config).convert(SQLParser(config).parse_script(create_table))
+        assert 'CREATE TABLE dbo.Users' in ddl and 'FirstName VARCHAR(50)' in ddl
+
+        ai = AIConverter(SimpleNamespace())
+        script = create_table + insert
+        segments = ai._separate_data_load_blocks(script, ai._split_to_logical_blocks(script))
+        # Имена без кавычек приводятся PostgreSQL к нижнему регистру так же, как в DDL
+        assert [kind for kind, _ in segments] == ['ai', 'data']
+        assert segments[1][1] == "INSERT INTO dbo.Users (Id, FirstName) VALUES\n(1, 'Анна');"
@@ -0,0 +1,76 @@
+import sys
+from pathlib import Path
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.error_localizer import estimate_tokens, locate_error
+
+SCRIPT = """CREATE TEMP TABLE t (id integer, name text);
+
+INSERT INTO t VALUES (1, 'a');
+
+SELECT id,
+       name
+FROM t
+WHERE name = 1;
+
+DROP TABLE t;"""
+
+
+class TestErrorLocalizer:
+    """Тесты для локализации ошибок PostgreSQL"""
+
+    def test_locate_by_psql_line(self):
+        fragment = locate_error(SCRIPT, 'psql:script.sql:8: ERROR:  operator does not exist: text = integer')
+        assert fragment.index == 2
+        assert fragment.total == 4
+        assert fragment.start_line == 5
+        assert fragment.end_line == 8
+        assert fragment.text.startswith('SELECT id,')
+
+    def test_locate_by_line_snippet(self):
+        error = 'ERROR:  operator does not exist: text = integer\nLINE 4: WHERE name = 1;\n                   ^'
+        fragment = locate_error(SCRIPT, error)
+        assert fragment.index == 2
+
+    def test_unknown_location(self):
+        assert locate_error(SCRIPT, 'ERROR:  something went wrong') is None
+
+    def test_splice_and_context(self):
+        fragment = locate_error(SCRIPT, 'psql:script.sql:6: ERROR: ...')
+        before, after = fragment.context(1)
+        assert before == "INSERT INTO t VALUES (1, 'a');"
+        assert after == 'DROP TABLE t;'
+        fixed = fragment.splice("SELECT id, name FROM t WHERE name = '1'")
+        assert "WHERE name = '1';\n\nDROP TABLE t;" in fixed
+        assert fixed.startswith('CREATE TEMP TABLE t')
+
+    def test_estimate_tokens(self):
+        assert estimate_tokens('') == 0
+        assert estimate_tokens('abcd' * 10) == 10
+
+
+class TestFragmentFix:
+    """Тесты для исправления только оператора с ошибкой"""
+
+    def test_fix_sends_only_failing_statement(self):
+        import config
+        from src.ai_converter import AIConverter
+
+        converter = AIConverter(config)
+        prompts = []
+
+        def fake_chunk_call(chunk, prompt):
+            prompts.append(prompt)
+            return True, "SELECT id, name FROM t WHERE name = '1';", "ok"
+
+        converter._convert_chunk = fake_chunk_call
+        success, fixed, _ = converter._fix_script_with_ai(
+            SCRIPT, 'psql:script.sql:8: ERROR:  operator does not exist: text = integer'
+        )
+        assert success
+        assert "WHERE name = '1';\n\nDROP TABLE t;" in fixed
+        assert 'CREATE TEMP TABLE' in fixed
+        assert 'WHERE name = 1;' in prompts[0]
+        assert "INSERT INTO t VALUES" in prompts[0]
@@ -0,0 +1,84 @@
+import sys
+from pathlib import Path
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config
+from batch_process import summarize_retrieval
+from src.ai_converter import AIConverter
+from src.example_store import ExampleStore, normalize_sql
+
+REPORT = """
+SELECT TOP 10 c.[Name], ISNULL(o.Total, 0) AS Total
+FROM dbo.Clients c
+LEFT JOIN dbo.Orders o ON o.ClientId = c.Id
+WHERE c.CreatedAt > GETDATE() - 30 AND c.Region = N'Москва'
+ORDER BY o.Total DESC
+"""
+REPORT_CONVERTED = """
+SELECT c.name, COALESCE(o.total, 0) AS total
+FROM public.clients c
+LEFT JOIN public.orders o ON o.clientid = c.id
+WHERE c.createdat > CURRENT_TIMESTAMP - INTERVAL '30 days' AND c.region = 'Москва'
+ORDER BY o.total DESC
+LIMIT 10;
+"""
+SIMILAR = REPORT.replace('TOP 10', 'TOP 5').replace("N'Москва'", "N'Казань'").replace('- 30', '- 7')
+UNRELATED = "CREATE TABLE #tmp (id INT IDENTITY(1,1) PRIMARY KEY, payload NVARCHAR(MAX)); DROP TABLE #tmp;"
+
+
+class TestExampleStore:
+    """Тесты для поиска похожих проверенных конвертаций"""
+
+    def test_normalization_ignores_literals_comments_and_brackets(self):
+        assert normalize_sql("SELECT [A] -- c\nFROM T WHERE x = N'a' AND y = 5") == \
+            normalize_sql("select a from t where x = N'b' and y = 7")
+
+    def test_finds_similar_and_skips_unrelated(self):
+        store = ExampleStore()
+        assert store.add(REPORT, REPORT_CONVERTED)
+        found = store.search(SIMILAR)
+        assert len(found) == 1
+        assert found[0][0] > 0.9
+        assert found[0][1].converted == REPORT_CONVERTED
+        assert store.search(UNRELATED) == []
+
+    def test_duplicates_and_long_pairs_are_not_stored(self):
+        store = ExampleStore(max_chars=1000)
+        assert store.add(REPORT, REPORT_CONVERTED)
+        assert not store.add(SIMILAR.replace("N'Казань'", "N'Москва'").replace('TOP 5', 'TOP 10')
+                             .replace('- 7', '- 30'), REPORT_CONVERTED)
+        assert not store.add(REPORT + ' ' * 1000, REPORT_CONVERTED)
+        assert len(store) == 1
+
+    def test_persistence(self, tmp_path):
+        path = tmp_path / 'examples.jsonl'
+        ExampleStore(path).add(REPORT, REPORT_CONVERTED)
+        reloaded = ExampleStore(path)
+        assert len(reloaded) == 1
+        assert reloaded.search(SIMILAR)[0][1].original == REPORT
+
+    def test_examples_are_inserted_after_static_rules(self):
+        converter = AIConverter(config)
+        converter.example_store = ExampleStore()
+        converter.example_store.add(REPORT, REPORT_CONVERTED)
+
+        prompt = converter._create_improved_prompt(SIMILAR)
+        assert prompt.startswith(converter._get_conversion_rules())
+        assert 'Пример 1' in prompt and 'LIMIT 10;' in prompt
+        assert prompt.rstrip().endswith('```')
+        assert converter.examples_used == 1
+        # При исправлении ошибки примеры не добавляются
+        assert 'Пример 1' not in converter._create_improved_prompt(SIMILAR, 'ERROR: syntax error')
+
+    def test_summarize_retrieval(self):
+        results = [
+            {'success': True, 'ai_iterations': 1, 'examples_used': 2},
+            {'success': True, 'ai_iterations': 3, 'examples_used': 0},
+            {'success': False, 'ai_iterations': 2, 'examples_used': 0},
+            {'success': True, 'route': 'rules'},
+        ]
+        summary = summarize_retrieval(results)
+        assert summary['with_examples'] == {'count': 1, 'success_count': 1, 'average_iterations': 1.0}
+        assert summary['without_examples']['average_iterations'] == 2.5
@@ -0,0 +1,114 @@
+import sys
+from pathlib import Path
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config
+from batch_process import summarize_learned_fixes
+from src.ai_converter import AIConverter
+from src.fix_rules import STATUS_DISABLED, STATUS_ENABLED, FixRuleBook, error_signature, minimal_edits
+
+ISNULL_ERROR = ('psql:/tmp/script.sql:3: ERROR:  function isnull(integer, integer) does not exist\n'
+                'LINE 3: SELECT isnull(a, 0) FROM "Orders"')
+
+
+class TestFixRules:
+    """Тесты для правил исправления, выученных на исправлениях нейросети"""
+
+    def test_error_signature(self):
+        assert error_signature(ISNULL_ERROR) == 'function isnull(integer, integer) does not exist'
+        assert error_signature('ОШИБКА:  столбец "abc" не существует (строка 12)') == \
+            error_signature('ОШИБКА:  столбец "xyz" не существует (строка 7)')
+
+    def test_minimal_edits(self):
+        assert minimal_edits("SELECT ISNULL(a, 0)\nFROM t;", "/* было: ISNULL */\nSELECT COALESCE(a, 0)\nFROM t;") == \
+            [('ISNULL', 'COALESCE')]
+        assert minimal_edits("SELECT a FROM t WHERE d > 1", "SELECT a FROM t WHERE d::int > 1") == [('d', 'd::int')]
+        assert minimal_edits("SELECT 1", "CREATE TABLE x (id INT, name TEXT, created TIMESTAMP, flag BOOLEAN)") is None
+
+    def test_promotion_apply_and_persistence(self, tmp_path):
+        path = tmp_path / 'rules.json'
+        book = FixRuleBook(path, promote_after=2)
+        before, after = "SELECT ISNULL(a, 0) FROM t", "SELECT COALESCE(a, 0) FROM t"
+        assert book.record_fix(ISNULL_ERROR, before, after) == []
+        assert book.apply("SELECT isnull(b, 1)", ISNULL_ERROR) == ("SELECT isnull(b, 1)", [])
+        promoted = book.record_fix(ISNULL_ERROR, before, after)
+        assert [rule.status for rule in promoted] == [STATUS_ENABLED]
+
+        script, applied = book.apply("SELECT isnull (b, 1), my_isnull(c)", ISNULL_ERROR)
+        assert script == "SELECT COALESCE (b, 1), my_isnull(c)"
+        assert applied == [promoted[0].id]
+        # Для другой ошибки правило не применяется
+        assert book.apply("SELECT isnull(b, 1)", 'ERROR:  syntax error at or near "TOP"')[1] == []
+
+        reloaded = FixRuleBook(path)
+        rule = reloaded.find(promoted[0].id[:6])
+        assert rule.count == 2 and rule.applied == 1
+        reloaded.set_status(rule.id, STATUS_DISABLED)
+        assert FixRuleBook(path).matching(ISNULL_ERROR) == []
+
+    def test_converter_learns_and_skips_ai(self):
+        converter = AIConverter(config)
+        converter.example_store = None
+        converter.fix_rules = FixRuleBook(promote_after=1)
+        ai_fixes = []
+
+        def convert_script(script_text, error_message=None, candidate=None):
+            return True, script_text.replace('[', '').replace(']', ''), 'ok'
+
+        def fix_script(script, error):
+            ai_fixes.append(script)
+            return True, script.replace('ISNULL', 'COALESCE'), 'ok'
+
+        def test_script(script):
+            if 'isnull' in script.lower():
+                return False, ISNULL_ERROR
+            return True, ''
+
+        converter._convert_script = convert_script
+        converter._fix_script_with_ai = fix_script
+        converter._test_script_in_postgres = test_script
+
+        success, script, _ = converter.convert_with_ai("SELECT ISNULL([a], 0) FROM t")
+        assert success and script == "SELECT COALESCE(a, 0) FROM t"
+        assert len(ai_fixes) == 1
+        assert converter.learned_fix_stats['learned'] == 1
+
+        success, script, message = converter.convert_with_ai("SELECT ISNULL([b], '') FROM u")
+        assert success and script == "SELECT COALESCE(b, '') FROM u"
+        assert len(ai_fixes) == 1
+        assert 'выученными правилами' in message
+        assert converter.learned_fix_stats == {'errors': 2, 'applied': 1, 'hits': 1, 'learned': 1}
+
+        summary = summarize_learned_fixes([{'learned_fixes': converter.learned_fix_stats}, {'route': 'rules'}])
+        assert summary['hit_rate'] == 0.5
+
+    def test_converter_learns_only_fixes_that_pass(self):
+        converter = AIConverter(config)
+        converter.example_store = None
+        converter.fix_rules = FixRuleBook(promote_after=1)
+        converter._convert_script = lambda script_text, error_message=None, candidate=None: (True, script_text, 'ok')
+        # Исправление заменяет ISNULL на функцию, которой нет: ошибка меняется, но скрипт не работает
+        converter._fix_script_with_ai = lambda script, error: (True, script.replace('ISNULL', 'NVL'), 'ok')
+        def failing_test(script):
+            return False, ISNULL_ERROR if 'ISNULL' in script else 'ERROR:  function nvl(integer, integer) does not exist'
+        converter._test_script_in_postgres = failing_test
+
+        success, _, _ = converter.convert_with_ai("SELECT ISNULL(a, 0) FROM t", max_iterations=2)
+        assert not success
+        assert converter.learned_fix_stats['learned'] == 0
+        assert converter.fix_rules.matching(ISNULL_ERROR) == []
+
+        # Цепочка исправлений, после которой скрипт прошел проверку, запоминается целиком
+        fixes = {'ISNULL': 'NVL', 'NVL': 'COALESCE'}
+        def fix_script(script, error):
+            name = 'ISNULL' if 'ISNULL' in script else 'NVL'
+            return True, script.replace(name, fixes[name]), 'ok'
+        converter._fix_script_with_ai = fix_script
+        converter._test_script_in_postgres = lambda script: (
+            (True, '') if 'COALESCE' in script else failing_test(script))
+        success, script, _ = converter.convert_with_ai("SELECT ISNULL(b, 0) FROM u")
+        assert success and script == "SELECT COALESCE(b, 0) FROM u"
+        assert converter.learned_fix_stats['learned'] == 2
+
@@ -0,0 +1,89 @@
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.mock_llm_server import LatencyModel, MockLLMServer, prompt_text
+
+
+class TestMockLLMServer:
+    """Тесты для локальной имитации API нейросетей"""
+
+    def test_latency_models(self):
+        assert LatencyModel.parse(0.25).sample() == 0.25
+        assert LatencyModel.parse('0.5').sample() == 0.5
+        uniform = LatencyModel.parse('uniform:0.1,0.2', seed=1)
+        assert all(0.1 <= uniform.sample() <= 0.2 for _ in range(50))
+        assert LatencyModel.parse('lognormal:-1,0.5', seed=1).sample() > 0
+        normal = LatencyModel.parse('normal:0,1', seed=1)
+        assert min(normal.sample() for _ in range(50)) == 0.0
+        with pytest.raises(ValueError):
+            LatencyModel.parse('pareto:1')
+
+    def test_error_injection_is_reproducible(self):
+        counts = []
+        for _ in range(2):
+            server = MockLLMServer(error_rate=0.2, rate_limit_rate=0.2, seed=7)
+            counts.append([server._next_status() for _ in range(50)])
+            server.stop()
+        assert counts[0] == counts[1]
+        assert {200, 429, 500} <= set(counts[0])
+
+    def test_rule_based_answer_shapes(self):
+        prompt = "Конвертируй:\n```sql\nSELECT TOP 5 [A_NAME] FROM T\n```\n"
+        with MockLLMServer(responder='rules') as server:
+            openai = requests.post(server.url + '/v1/chat/completions', json={
+                'model': 'gpt-4', 'messages': [{'role': 'user', 'content': prompt}]}).json()
+            anthropic = requests.post(server.url + '/v1/messages', json={
+                'model': 'claude', 'messages': [{'role': 'user', 'content': [{'type': 'text', 'text': prompt}]}]}).json()
+        text = openai['choices'][0]['message']['content']
+        assert text.startswith('```sql') and '"A_NAME"' in text and 'LIMIT 5' in text
+        assert anthropic['content'][0]['text'] == text
+        assert openai['usage']['prompt_tokens'] > 0
+        assert anthropic['usage']['output_tokens'] > 0
+
+    def test_prompt_text_blocks(self):
+        payload = {'messages': [{'role': 'user', 'content': [{'type': 'text', 'text': 'a'},
+                                                             {'type': 'text', 'text': 'b'}]}]}
+        assert prompt_text(payload) == 'a\nb'
+
+
+class TestPromptCaching:
+    """Кэширование неизменной части промпта на имитации API"""
+
+    @pytest.mark.parametrize('streaming', [True, False])
+    def test_anthropic_prefix_is_cached(self, monkeypatch, streaming):
+        import config
+        from src.ai_converter import AIConverter
+        from src.ai_router import ProviderEndpoint, ProviderRouter
+
+        monkeypatch.setattr(config, 'AI_STREAMING', streaming)
+        monkeypatch.setattr(config, 'AI_PROMPT_CACHING', True)
+        with MockLLMServer() as server:
+            converter = AIConverter(config, ai_provider='anthropic')
+            converter.api_keys = {'anthropic': 'test'}
+            converter.router = ProviderRouter([ProviderEndpoint('anthropic', 'claude', server.url)])
+            for script in ('SELECT 1', 'SELECT 2'):
+                assert converter._request_ai(converter._create_improved_prompt(script))[0]
+
+        payload = server.requests[0]['payload']
+        assert payload['system'][0]['cache_control'] == {'type': 'ephemeral'}
+        rules, script_block = payload['messages'][0]['content']
+        assert rules['text'] == converter._get_conversion_rules() and 'cache_control' in rules
+        assert 'SELECT 1' in script_block['text'] and 'cache_control' not in script_block
+        stats = converter.usage.by_provider['anthropic']
+        assert stats['cache_write_tokens'] > 0
+        assert stats['cache_read_tokens'] == stats['cache_write_tokens']
+
+    def test_openai_automatic_prefix_cache(self):
+        with MockLLMServer(cache_min_tokens=10) as server:
+            prefix = 'правила ' * 200
+            usage = [server.prompt_usage('openai', {'messages': [{'role': 'user', 'content': prefix + tail}]})
+                     for tail in ('SELECT 1', 'SELECT 2')]
+        assert usage[0]['prompt_tokens_details']['cached_tokens'] == 0
+        assert usage[1]['prompt_tokens_details']['cached_tokens'] % 128 == 0
+        assert usage[1]['prompt_tokens_details']['cached_tokens'] > 0
@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.param_index import ParamIndex
+from src.parser import SQLParser
+
+SCRIPT = """
+SELECT * FROM WM_PERSONAL_CARD pc
+WHERE pc.A_ID = {params.cardId}
+  AND {params.limit} >= 5
+  AND 'Иванов' LIKE {params.name}
+  AND pc.A_STATUS IN ({DOC.statuses})
+  AND {params.codes} IN ('a', 'b')
+  AND {params.count}::integer > 0
+  AND {params.a} = {params.b}
+  AND CASE WHEN pc.A_FLAG = 1 THEN {PPRCONST.flag} END = 1
+  AND pc.A_SUM * {PPRCONST.koef} > 0
+  AND {params.cardId} <> 0
+"""
+
+
+class TestParamIndex:
+    """Тесты для индекса параметров и подстановки"""
+
+    def test_context(self):
+        index = ParamIndex(SCRIPT)
+        assert index.names[:3] == ['params.cardId', 'params.limit', 'params.name']
+        assert len(index.usages_of('params.cardId')) == 2
+
+        card_id = index.usages_of('params.cardId')[0]
+        assert card_id.columns() == [('pc', 'A_ID')]
+        assert index.usages_of('params.limit')[0].is_number()
+        assert index.usages_of('params.name')[0].is_string()
+        assert index.usages_of('params.codes')[0].in_list == 'string'
+        assert index.usages_of('params.count')[0].cast == 'integer'
+        assert index.param_pairs() == [('params.a', 'params.b')]
+        assert index.usages_of('PPRCONST.flag')[0].after_then
+        assert index.usages_of('PPRCONST.koef')[0].arithmetic
+        assert index.usages_of('params.limit')[0].left is None
+
+    def test_substitute_in_one_pass(self):
+        index = ParamIndex("SELECT {a}, {b}, {a} FROM t WHERE x = '{c}'")
+        assert index.substitute({'a': 1, 'b': "'{a}'"}) == "SELECT 1, '{a}', 1 FROM t WHERE x = '{c}'"
+
+    def test_replace_params(self):
+        parser = SQLParser(SimpleNamespace(PG_CONFIG=None, DB_CONN=None, SCHEMA_CATALOG_FILE=None))
+        parser.guess_param_type_from_db = lambda script, index=None: {}
+        result = parser.replace_params(SCRIPT)
+        assert '{' not in result
+        assert "{params.a}" not in result and "1 = 1" in result
+        assert "'Иванов' LIKE 'test'" in result
+        assert "IN ((1,1))" in result
+        assert "THEN 1 END" in result and "* 1 > 0" in result
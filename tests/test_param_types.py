@@ -0,0 +1,113 @@
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.param_types import (DECIMAL, DICTIONARY_VERSION, NUMBER, STRING, TIMESTAMP, ParamTypeDictionary,
+                             build_param_types, column_kind, ensure_param_types, get_param_types,
+                             script_evidence)
+from src.parser import SQLParser
+from src.schema_catalog import SchemaCatalog
+
+SCRIPTS = [
+    "SELECT * FROM WM_PERSONAL_CARD pc WHERE pc.A_ID = {params.cardId} AND pc.A_NOTE = {params.note}",
+    "SELECT * FROM WM_PERSONAL_CARD c WHERE {params.cardId} = 5 AND {params.regDate} <= c.A_DATE_REG",
+    "SELECT * FROM SPR_DOC d WHERE d.A_TITLE LIKE {params.cardId} AND {params.unknown} IS NULL",
+]
+
+
+def make_catalog():
+    catalog = SchemaCatalog()
+    catalog._set_rows([('public', 'wm_personal_card', 'a_note', 'text')])
+    return catalog
+
+
+class TestParamTypes:
+    """Тесты для словаря типов параметров по набору скриптов"""
+
+    def test_script_evidence(self):
+        evidence = script_evidence(SCRIPTS[0])
+        assert evidence['params.cardId']['kinds'] == {NUMBER: 1}
+        assert evidence['params.note']['fields'] == {'wm_personal_card.a_note': 1}
+
+    def test_column_kind_checks_field_lists_first(self):
+        assert column_kind('a_regioncoeff') == DECIMAL
+        assert column_kind('a_status') == NUMBER
+        assert column_kind('a_date_reg') == TIMESTAMP
+        assert column_kind('regdate') == TIMESTAMP
+        assert column_kind('a_region') is None
+
+    def test_build_votes_and_persistence(self, tmp_path):
+        paths = []
+        for number, script in enumerate(SCRIPTS):
+            path = tmp_path / f"{number}.sql"
+            path.write_text(script, encoding='utf-8')
+            paths.append(path)
+
+        dictionary = build_param_types(paths, workers=2, catalog=make_catalog())
+        assert dictionary.scripts == 3
+        # Два голоса за число против одного (LIKE с колонкой без контекста)
+        assert dictionary.kind('params.cardId') == NUMBER
+        assert dictionary.params['params.cardId']['scripts'] == 3
+        assert dictionary.kind('params.regDate') == TIMESTAMP
+        assert dictionary.kind('params.note') == STRING
+        assert dictionary.kind('params.unknown') is None and 'params.unknown' in dictionary
+
+        path = tmp_path / 'param_types.json'
+        dictionary.save(path)
+        reloaded = ParamTypeDictionary.load(path)
+        assert reloaded.value('params.cardId') == 1 and reloaded.fingerprint == dictionary.fingerprint
+
+        data = json.loads(path.read_text(encoding='utf-8'))
+        data['version'] = DICTIONARY_VERSION + 1
+        path.write_text(json.dumps(data), encoding='utf-8')
+        assert ParamTypeDictionary.load(path) is None
+
+    def test_ensure_rebuilds_only_when_scripts_change(self, tmp_path):
+        script = tmp_path / 'a.sql'
+        script.write_text(SCRIPTS[1], encoding='utf-8')
+        config = SimpleNamespace(PARAM_TYPES=True, PARAM_TYPES_FILE=str(tmp_path / 'types.json'),
+                                 PG_CONFIG=None, DB_CONN=None, SCHEMA_CATALOG_FILE=None)
+        dictionary, rebuilt = ensure_param_types(config, [script], workers=1)
+        assert rebuilt and get_param_types(config) is dictionary
+        assert ensure_param_types(config, [script], workers=1) == (dictionary, False)
+
+        script.write_text(SCRIPTS[1] + ' AND {params.extra} = 1', encoding='utf-8')
+        dictionary, rebuilt = ensure_param_types(config, [script], workers=1)
+        assert rebuilt and dictionary.kind('params.extra') == NUMBER
+
+    def test_dictionary_is_used_only_after_check_against_scripts(self, tmp_path):
+        script = tmp_path / 'a.sql'
+        script.write_text(SCRIPTS[1], encoding='utf-8')
+        path = tmp_path / 'types.json'
+        # Словарь, оставшийся от запуска на другом наборе скриптов
+        build_param_types([script], workers=1).save(path)
+        config = SimpleNamespace(PARAM_TYPES=True, PARAM_TYPES_FILE=str(path),
+                                 PG_CONFIG=None, DB_CONN=None, SCHEMA_CATALOG_FILE=None)
+        assert get_param_types(config) is None
+        assert SQLParser(config).param_types is None
+
+        dictionary, rebuilt = ensure_param_types(config, [script], workers=1)
+        assert not rebuilt and get_param_types(config) is dictionary
+
+        other = tmp_path / 'b.sql'
+        other.write_text(SCRIPTS[0], encoding='utf-8')
+        dictionary, rebuilt = ensure_param_types(config, [other], workers=1)
+        assert rebuilt and get_param_types(config) is dictionary
+
+    def test_parser_uses_dictionary_before_script_inference(self):
+        parser = SQLParser(SimpleNamespace(PG_CONFIG=None, DB_CONN=None, SCHEMA_CATALOG_FILE=None))
+        parser.param_types = ParamTypeDictionary({
+            'params.cardId': {'kind': TIMESTAMP, 'votes': {TIMESTAMP: 3}, 'scripts': 3},
+            'params.unknown': {'kind': None, 'votes': {}, 'scripts': 1},
+        })
+
+        def no_db(script, index=None):
+            raise AssertionError("Параметры из словаря не должны проверяться по БД")
+        parser.guess_param_type_from_db = no_db
+
+        result = parser.replace_params("SELECT 1 FROM t WHERE t.id = {params.cardId} AND x = {params.unknown}")
+        assert result == "SELECT 1 FROM t WHERE t.id = '2023-01-01'::timestamp AND x = 'default_params.unknown'"
@@ -0,0 +1,91 @@
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import src.parsed_script as parsed_script_module
+from src.converter import SQLConverter
+from src.parsed_script import ParsedScript
+from src.parser import SQLParser
+from src.pg_pool import split_statements
+from src.sql_alias_analyzer import SQLAliasAnalyzer
+import config
+
+SCRIPT = """SELECT pc.A_ID FROM WM_PERSONAL_CARD pc WHERE pc.A_ID = {params.cardId};
+SELECT d.A_NAME FROM SPR_DOC d JOIN WM_PERSONAL_CARD c ON c.A_ID = d.A_CARD WHERE d.A_DATE_REG >= {params.regDate};
+"""
+
+
+def count_calls(monkeypatch, target, name):
+    calls = []
+    original = getattr(target, name)
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+    monkeypatch.setattr(target, name, counted)
+    return calls
+
+
+class TestParsedScript:
+    """Тесты для общего разобранного скрипта"""
+
+    def test_lazy_artefacts_and_mapping_access(self):
+        parsed = ParsedScript("SELECT 1 FROM t WHERE a = {params.x} AND b = {params.x};\nSELECT 2;")
+        assert parsed.computed == []
+        assert parsed['original'] == parsed.text
+        assert parsed['params'] == ['params.x']
+        assert len(parsed['statements']) == 2
+        # Запросы выделяются по пакетам GO, токены и AST не вычисляются
+        assert set(parsed.computed) == {'param_index', 'batches', 'batch_statements', 'statements'}
+        assert dict(parsed) == {'original': parsed.text, 'params': ['params.x'], 'statements': parsed.statements}
+
+    def test_statements_split_by_go_batches(self):
+        parsed = ParsedScript("SELECT 'GO' AS x\nGO\n/*\nGO\n*/ SELECT 2\ngo 3\nSELECT 3")
+        assert parsed.batches == ["SELECT 'GO' AS x\n", "/*\nGO\n*/ SELECT 2\n", "SELECT 3"]
+        assert parsed.statements == ["SELECT 'GO' AS x", "/*\nGO\n*/ SELECT 2", "SELECT 3"]
+
+    def test_same_text_shares_one_parse(self):
+        text = SCRIPT + "-- test_same_text_shares_one_parse"
+        assert ParsedScript.of(text) is ParsedScript.of(text)
+        assert ParsedScript.of({'original': text}) is ParsedScript.of(text)
+        assert ParsedScript.of(text + ' ') is not ParsedScript.of(text)
+
+    def test_stages_parse_each_artefact_once(self, monkeypatch):
+        splits = count_calls(monkeypatch, parsed_script_module.sqlparse, 'split')
+        asts = count_calls(monkeypatch, parsed_script_module.sqlglot, 'parse')
+        sql_parser = SQLParser(SimpleNamespace(PG_CONFIG=None, DB_CONN=None, SCHEMA_CATALOG_FILE=None))
+        sql_parser.guess_param_type_from_db = lambda script, index=None: {}
+
+        parsed = sql_parser.parse_script(SCRIPT + "-- test_stages_parse_each_artefact_once")
+        assert not SQLConverter(config).find_unsupported_constructs(parsed)
+        aliases = SQLAliasAnalyzer().get_table_aliases(parsed)
+        assert aliases['WM_PERSONAL_CARD'] == ['pc', 'c']
+        result = sql_parser.replace_params(parsed)
+        assert '{' not in result
+        # Строковые вызовы получают тот же разбор из кэша последних версий
+        assert SQLAliasAnalyzer().get_table_by_alias(parsed.text, 'd') == 'SPR_DOC'
+        assert [line for line, _ in split_statements(parsed.text)] == [1, 2]
+
+        # sqlglot разбирает каждый запрос скрипта один раз
+        assert len(splits) == 1 and len(asts) == len(parsed.statements)
+
+    def test_shared_object_computes_artefacts_once_across_threads(self, monkeypatch):
+        original = parsed_script_module.sqlglot.parse
+        asts = []
+
+        def slow_parse(*args, **kwargs):
+            asts.append(args)
+            time.sleep(0.01)
+            return original(*args, **kwargs)
+        monkeypatch.setattr(parsed_script_module.sqlglot, 'parse', slow_parse)
+
+        parsed = ParsedScript(SCRIPT)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: parsed.ast, range(8)))
+        assert all(result is results[0] for result in results)
+        assert len(asts) == len(parsed.statements)
@@ -0,0 +1,46 @@
+import sys
+from pathlib import Path
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.pg_pool import split_statements, format_psql_error
+
+
+class _FakeError(Exception):
+    def __init__(self, pgerror):
+        super().__init__(pgerror)
+        self.pgerror = pgerror
+
+
+class TestPgPool:
+    """Тесты для выполнения скриптов через пул соединений"""
+
+    def test_split_statements_tracks_lines(self):
+        script = "SELECT 1;\nSELECT 1;\n\n-- комментарий\nSELECT\n  2;"
+        assert split_statements(script) == [
+            (1, "SELECT 1;"),
+            (2, "SELECT 1;"),
+            (4, "-- комментарий\nSELECT\n  2;"),
+        ]
+
+    def test_split_statements_skips_comment_only(self):
+        script = "SELECT 1;\n/* только комментарий */"
+        assert split_statements(script) == [(1, "SELECT 1;")]
+
+    def test_split_statements_keeps_dollar_quoted_blocks(self):
+        script = "DO $$\nBEGIN\n  PERFORM 1;\nEND $$;\nSELECT 2;"
+        statements = split_statements(script)
+        assert len(statements) == 2
+        assert statements[1][0] == 5
+
+    def test_format_psql_error(self):
+        error = _FakeError('ERROR:  column "x" does not exist\nLINE 2:   x\n          ^\n')
+        message = format_psql_error(error, 'script.sql', 10)
+        assert message.startswith('psql:script.sql:11: ERROR:  column "x" does not exist')
+        assert 'LINE 2:' in message
+
+    def test_format_psql_error_russian_locale(self):
+        error = _FakeError('ОШИБКА:  столбец "x" не существует\nСТРОКА 3:   x\n            ^\n')
+        message = format_psql_error(error, 'script.sql', 10)
+        assert message.startswith('psql:script.sql:12: ОШИБКА:')
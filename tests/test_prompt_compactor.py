@@ -0,0 +1,70 @@
+import sys
+from pathlib import Path
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.prompt_compactor import compact_sql
+
+SCRIPT = """-- Отчет по клиентам
+/* Многострочный
+   комментарий */
+SELECT  c.id,        -- идентификатор
+        'a  --  b' AS [Имя  клиента],
+        N'/* не комментарий */' AS note
+FROM    dbo.Clients c   /* основная таблица */
+
+WHERE   c.id = 1
+-- конец"""
+
+
+class TestPromptCompactor:
+    """Тесты для обратимого сжатия SQL перед отправкой нейросети"""
+
+    def test_strips_comments_and_whitespace_outside_literals(self):
+        compacted = compact_sql(SCRIPT)
+        assert compacted.text == (
+            "SELECT c.id,\n"
+            "'a  --  b' AS [Имя  клиента],\n"
+            "N'/* не комментарий */' AS note\n"
+            "FROM dbo.Clients c\n"
+            "WHERE c.id = 1"
+        )
+        assert len(compacted.comments) == 5
+        assert compacted.saved_chars > 0
+
+    def test_nested_block_comment_and_escaped_quotes(self):
+        compacted = compact_sql("SELECT 'it''s' /* a /* b */ c */ , 1")
+        assert compacted.text == "SELECT 'it''s' , 1"
+        assert compacted.comments[0].text == "/* a /* b */ c */"
+
+    def test_dollar_quoted_bodies_are_kept(self):
+        body = "$body$\nBEGIN\n    -- шаг 1\n    PERFORM 1;\n\nEND;\n$body$"
+        compacted = compact_sql(f"CREATE FUNCTION f() RETURNS void AS {body}   LANGUAGE plpgsql;\n-- конец")
+        assert compacted.text == f"CREATE FUNCTION f() RETURNS void AS {body} LANGUAGE plpgsql;"
+        # $ внутри имени не открывает долларовую кавычку
+        assert compact_sql("SELECT a$b$c ,  1").text == "SELECT a$b$c , 1"
+
+    def test_restore_reattaches_comments_to_converted_lines(self):
+        compacted = compact_sql(SCRIPT)
+        converted = (
+            "SELECT c.id,\n"
+            "'a  --  b' AS \"Имя  клиента\",\n"
+            "'/* не комментарий */' AS note\n"
+            "FROM public.clients c\n"
+            "WHERE c.id = 1;"
+        )
+        restored = compacted.restore(converted).split('\n')
+        assert restored[0] == "-- Отчет по клиентам"
+        assert restored[3] == "SELECT c.id,  -- идентификатор"
+        assert restored[6] == "FROM public.clients c /* основная таблица */"
+        assert restored[-1] == "-- конец"
+
+    def test_restore_when_lines_are_removed(self):
+        compacted = compact_sql("SET NOCOUNT ON\n-- выборка\nSELECT 1")
+        assert compacted.restore("SELECT 1;") == "-- выборка\nSELECT 1;"
+
+    def test_script_without_comments_is_unchanged(self):
+        compacted = compact_sql("SELECT 1")
+        assert compacted.text == "SELECT 1"
+        assert compacted.restore("SELECT 1;") == "SELECT 1;"
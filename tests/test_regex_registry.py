@@ -0,0 +1,56 @@
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import src.regex_registry as regex_registry
+from src.regex_registry import enable_timing, regex, regex_stats, reset_regex_stats, template_regex
+
+
+@pytest.fixture
+def timing():
+    reset_regex_stats()
+    enable_timing()
+    yield
+    enable_timing(False)
+    reset_regex_stats()
+
+
+class TestRegexRegistry:
+    """Тесты для общего реестра регулярных выражений"""
+
+    def test_registered_once_and_without_overhead(self):
+        pattern = regex('test.word', r'\w+', re.IGNORECASE)
+        assert regex('test.word', r'\w+', re.IGNORECASE) is pattern
+        with pytest.raises(ValueError):
+            regex('test.word', r'\d+')
+        # Без замеров методы — методы скомпилированного выражения
+        assert pattern.findall.__self__ is pattern.regex
+        assert pattern.sub('x', 'a b') == 'x x'
+
+    def test_timing_counts_calls_per_name(self, timing):
+        pattern = regex('test.number', r'\d+')
+        assert [m.group(0) for m in pattern.finditer('1 22 333')] == ['1', '22', '333']
+        assert pattern.search('a1') is not None
+        for name in ('a', 'b', 'c'):
+            template_regex('test.template', r'\b' + re.escape(name) + r'\b').sub('x', 'a b c')
+        stats = {entry['name']: entry for entry in regex_stats()}
+        assert stats['test.number']['calls'] == 2
+        assert stats['test.template']['calls'] == 3
+        assert stats['test.number']['total_time'] >= 0
+
+        enable_timing(False)
+        assert pattern.search.__self__ is pattern.regex
+
+    def test_template_cache_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(regex_registry, 'TEMPLATE_CACHE_SIZE', 3)
+        first = template_regex('test.bounded', 'x0')
+        assert template_regex('test.bounded', 'x0') is first
+        for n in range(1, 5):
+            template_regex('test.bounded', f'x{n}')
+        assert len(regex_registry._templates) <= 3
+        assert template_regex('test.bounded', 'x0') is not first
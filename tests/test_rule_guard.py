@@ -0,0 +1,61 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import src.rule_guard as rule_guard_module
+from src.regex_registry import regex
+from src.rule_guard import RuleGuard, warn_if_unguarded
+from src.sql_post_processor import Rule, RulePass, SQLPostProcessor
+
+# Выражение с экспоненциальным числом возвратов на строке из одних 'a'
+SLOW = regex('test.rule_guard_slow', r'(a|aa)+b')
+SLOW_INPUT = 'a' * 60
+
+
+class TestRuleGuard:
+    """Тесты для выполнения правил с бюджетом времени"""
+
+    def test_slow_rule_is_skipped_in_worker_thread(self, tmp_path):
+        pytest.importorskip('regex')
+        guard = RuleGuard(0.2, str(tmp_path))
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(guard.sub, SLOW, 'x', SLOW_INPUT).result(timeout=30)
+        assert result == SLOW_INPUT
+        assert guard.skipped_rules == ['test.rule_guard_slow']
+        event = guard.events[0]
+        assert event['length'] == len(SLOW_INPUT) and event['elapsed'] >= 0.2
+        assert Path(event['input']).read_text(encoding='utf-8') == SLOW_INPUT
+
+    def test_alarm_fallback_without_regex_module(self, monkeypatch):
+        monkeypatch.setattr(rule_guard_module, 'REGEX_MODULE_AVAILABLE', False)
+        guard = RuleGuard(0.2)
+        assert guard.subn(SLOW, 'x', SLOW_INPUT) == (SLOW_INPUT, 0)
+        assert guard.skipped_rules == ['test.rule_guard_slow']
+        # Быстрые правила выполняются как обычно
+        assert guard.sub(regex('test.rule_guard_fast', r'b+'), 'c', 'abba') == 'aca'
+
+    def test_warns_when_worker_threads_have_no_budget(self, monkeypatch, capsys):
+        monkeypatch.setattr(rule_guard_module, 'REGEX_MODULE_AVAILABLE', False)
+        assert warn_if_unguarded(SimpleNamespace(RULE_TIME_BUDGET=5))
+        assert 'regex' in capsys.readouterr().out
+        assert not warn_if_unguarded(SimpleNamespace(RULE_TIME_BUDGET=0))
+        monkeypatch.setattr(rule_guard_module, 'REGEX_MODULE_AVAILABLE', True)
+        assert not warn_if_unguarded(SimpleNamespace(RULE_TIME_BUDGET=5))
+
+    def test_post_processor_skips_only_slow_pass(self):
+        processor = SQLPostProcessor([
+            RulePass([Rule('test_slow', SLOW.pattern, 'x')]),
+            RulePass([Rule('test_year', r"YEAR\(([^)]+)\)", r"EXTRACT(YEAR FROM \1)")]),
+        ])
+        sql = f"SELECT YEAR(d) FROM t WHERE c = '{SLOW_INPUT}'"
+        guard = RuleGuard(0.2)
+        assert processor.process(sql, guard=guard) == sql.replace('YEAR(d)', 'EXTRACT(YEAR FROM d)')
+        assert guard.skipped_rules == ['post_processor.test_slow']
+        # Без бюджета проходы выполняются без ограничения
+        assert RuleGuard(0).sub(regex('test.rule_guard_fast', r'b+'), 'c', 'abba') == 'aca'
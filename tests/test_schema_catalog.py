@@ -0,0 +1,118 @@
+import sys
+import json
+import time
+from pathlib import Path
+
+import psycopg2
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.schema_catalog import SchemaCatalog
+
+
+class _FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, query, params=None):
+        self.connection.queries += 1
+
+    def fetchall(self):
+        return self.connection.rows
+
+
+class _FakeConnection:
+    autocommit = True
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+
+class _FailingConnection:
+    def cursor(self):
+        raise psycopg2.OperationalError('нет связи с базой')
+
+
+ROWS = [
+    ('public', 'orders', 'id', 'integer'),
+    ('public', 'orders', 'Amount', 'numeric'),
+    ('sales', 'orders', 'id', 'bigint'),
+    ('sales', 'clients', 'name', 'character varying'),
+]
+
+
+class TestSchemaCatalog:
+    """Тесты для снимка каталога схемы"""
+
+    def test_lookup_after_single_bulk_query(self):
+        conn = _FakeConnection(ROWS)
+        catalog = SchemaCatalog()
+        assert catalog.ensure_loaded(conn)
+        assert catalog.get_column_type('orders', 'amount') == 'numeric'
+        assert catalog.get_column_type('"Orders"', 'ID') == 'integer'
+        assert catalog.get_column_type('sales.orders', 'id') == 'bigint'
+        assert catalog.get_column_type('dbo.clients', 'name') == 'character varying'
+        assert catalog.get_column_type('orders', 'missing') is None
+        assert catalog.get_column_type('missing', 'id') is None
+        assert conn.queries == 1
+
+    def test_snapshot_round_trip(self, tmp_path):
+        snapshot = tmp_path / 'catalog.json'
+        source = SchemaCatalog(snapshot_path=str(snapshot))
+        source.refresh(_FakeConnection(ROWS))
+        assert snapshot.exists()
+
+        offline = SchemaCatalog(snapshot_path=str(snapshot))
+        assert offline.ensure_loaded()
+        assert offline.source == 'file'
+        assert offline.get_column_type('orders', 'id') == 'integer'
+        assert offline.get_column_type('sales.clients', 'name') == 'character varying'
+
+    def test_unavailable_without_database_or_snapshot(self):
+        catalog = SchemaCatalog()
+        assert not catalog.ensure_loaded()
+        assert catalog.get_column_type('orders', 'id') is None
+
+    def test_retries_after_database_error(self):
+        catalog = SchemaCatalog(retry_interval=0)
+        assert not catalog.ensure_loaded(_FailingConnection())
+        # Ошибка не делает пустой каталог окончательным
+        assert catalog.ensure_loaded(_FakeConnection(ROWS))
+        assert catalog.get_column_type('orders', 'id') == 'integer'
+
+    def test_waits_before_retry(self):
+        catalog = SchemaCatalog(retry_interval=60)
+        catalog._retry_at = time.monotonic() + 60
+        conn = _FakeConnection(ROWS)
+        assert not catalog.ensure_loaded(conn)
+        assert conn.queries == 0
+
+    def test_stale_snapshot_is_refreshed(self, tmp_path):
+        snapshot = tmp_path / 'catalog.json'
+        SchemaCatalog(snapshot_path=str(snapshot)).refresh(_FakeConnection(ROWS[:1]))
+        data = json.loads(snapshot.read_text(encoding='utf-8'))
+        data['loaded_at'] = time.time() - 7200
+        snapshot.write_text(json.dumps(data), encoding='utf-8')
+
+        fresh = SchemaCatalog({'host': 'db'}, snapshot_path=str(snapshot), max_age=3600)
+        conn = _FakeConnection(ROWS)
+        assert fresh.ensure_loaded(conn)
+        assert fresh.source == 'database' and conn.queries == 1
+        assert fresh.get_column_type('sales.clients', 'name') == 'character varying'
+
+        # Снимок моложе max_age читается без обращения к базе
+        cached = SchemaCatalog({'host': 'db'}, snapshot_path=str(snapshot), max_age=3600)
+        conn = _FakeConnection(ROWS)
+        assert cached.ensure_loaded(conn)
+        assert cached.source == 'file' and conn.queries == 0
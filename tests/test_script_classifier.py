@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config
+from src.converter import SQLConverter
+from src.ai_converter import AIConverter
+from src.script_classifier import AI_LARGE, AI_SMALL, RULES, SKIP, ScriptClassifier, get_script_classifier
+
+
+class TestScriptClassifier:
+    """Тесты для предварительной классификации скриптов"""
+
+    def test_categories(self):
+        classifier = get_script_classifier(config)
+        assert classifier.classify("SELECT a FROM dbo.Orders WHERE id = 1").category == RULES
+
+        small = classifier.classify("DECLARE @d DATE = DATEADD(day, -1, GETDATE())\nSELECT * INTO #t FROM Orders")
+        assert small.category == AI_SMALL
+        assert small.constructs == ['временные таблицы', 'переменные', 'функции дат']
+
+        large_text = "SELECT ISNULL(a, 0) FROM #t\n" * (classifier.large_script_lines + 1)
+        assert classifier.classify(large_text).category == AI_LARGE
+
+        skipped = classifier.classify("SELECT {SQL.getDate} FROM #t WHERE x = ALG.value")
+        assert skipped.category == SKIP
+        # Причина — первый по приоритету шаблон, даже если совпадения пересекаются
+        assert skipped.reason == 'Скрипт содержит специфическую функцию SQL.getDate'
+
+    def test_start_anchor_and_case_sensitivity(self):
+        classifier = ScriptClassifier(
+            skip=[{'pattern': r'^\s*case', 'reason': 'фрагмент'}],
+            unsupported=[{'name': 'GO', 'pattern': r'\bGO\b', 'ignore_case': False}],
+        )
+        assert classifier.classify("  CASE WHEN a THEN b END").reason == 'фрагмент'
+        assert classifier.classify("SELECT CASE WHEN a THEN b END").category == RULES
+        assert classifier.classify("SELECT 1\nGO").constructs == ['GO']
+        assert classifier.classify("SELECT 1 AS go").category == RULES
+
+    def test_converter_uses_classifier(self):
+        converter = SQLConverter(config)
+        assert converter.find_unsupported_constructs("SELECT TOP 1 a FROM t; SELECT b FROM u") == ['несколько TOP']
+        assert converter.find_unsupported_constructs("SELECT a FROM t", constructs=['MERGE']) == ['MERGE']
+
+    def test_ai_converter_reuses_given_class(self, monkeypatch):
+        converter = AIConverter(config)
+        given = converter.classifier.classify("MERGE INTO t USING s ON 1 = 1")
+
+        def fail(text):
+            raise AssertionError("скрипт классифицирован повторно")
+
+        monkeypatch.setattr(converter.classifier, 'classify', fail)
+        assert converter.classify_script("MERGE INTO t USING s ON 1 = 1", given) is given
+        assert converter.classify_script("MERGE INTO t USING s ON 1 = 1") is given
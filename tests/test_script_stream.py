@@ -0,0 +1,81 @@
+import io
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import config
+from src.converter import SQLConverter
+from src.script_stream import (BATCH_SEPARATOR, STATEMENT, convert_stream, iter_segments, join_batches,
+                               split_batches, split_segments)
+
+SCRIPT = ("SELECT 'a;b''GO\n;' AS [x;]]y], \"q;\" FROM t; -- c;\n"
+          "/* /* вложенный; */ GO\n; */ UPDATE t SET a = {params.a};\n"
+          "go 2 -- пакет\n"
+          "DELETE FROM t WHERE b = {params.b}\n"
+          "GO")
+
+
+class _Converter:
+    """Конвертер, помечающий каждый переданный запрос"""
+
+    def __init__(self):
+        self.calls = []
+
+    def convert(self, parsed_script):
+        self.calls.append(parsed_script['original'])
+        return parsed_script['original'].upper()
+
+
+class TestScriptStream:
+    """Тесты для потоковой конвертации по запросам"""
+
+    def test_segments_ignore_separators_in_strings_and_comments(self):
+        segments = split_segments(SCRIPT)
+        assert ''.join(text for _, text in segments) == SCRIPT
+        assert [kind for kind, _ in segments] == [STATEMENT, STATEMENT, STATEMENT, BATCH_SEPARATOR,
+                                                  STATEMENT, BATCH_SEPARATOR]
+        assert segments[0][1].endswith('FROM t;')
+        assert segments[1][1].endswith('{params.a};')
+        # Перевод строки перед GO остается отдельным пустым запросом
+        assert segments[2][1] == '\n'
+        assert segments[3][1] == 'go 2 -- пакет\n'
+
+    def test_segments_do_not_depend_on_chunk_size(self):
+        expected = split_segments(SCRIPT)
+        for chunk_size in (1, 2, 5, 17, 1000):
+            assert list(iter_segments(io.StringIO(SCRIPT), chunk_size)) == expected
+
+    def test_convert_stream_converts_each_statement(self):
+        converter = _Converter()
+        target = io.StringIO()
+        stats = convert_stream(io.StringIO(SCRIPT), target, converter, chunk_size=8)
+        assert len(converter.calls) == 4
+        assert 'GO' not in target.getvalue().replace("'A;B''GO", '').replace('/* /* ВЛОЖЕННЫЙ; */ GO', '')
+        assert target.getvalue().count('\n') == SCRIPT.count('\n')
+        assert stats['statements'] == 3 and stats['batches'] == 3
+        assert stats['params'] == ['params.a', 'params.b']
+        assert stats['chars_read'] == len(SCRIPT)
+
+    def test_split_and_join_batches(self):
+        batches = split_batches("SELECT 1\nGO\nSELECT 2; -- конец\nGO\nSELECT 3")
+        assert batches == ["SELECT 1\n", "SELECT 2; -- конец\n", "SELECT 3"]
+        # После незавершенного запроса строка GO заменяется ';', иначе пустой строкой
+        assert join_batches(batches) == "SELECT 1\n;\nSELECT 2; -- конец\n\nSELECT 3"
+        assert split_batches("SELECT 'GO'\n") == ["SELECT 'GO'\n"]
+
+    def test_converter_converts_batches_independently(self):
+        batches = [f"SELECT TOP {n} [A] FROM [T]\n" for n in range(1, 6)]
+        script = "GO\n".join(batches)
+        results = []
+        for workers in (1, 4):
+            converter = SQLConverter(SimpleNamespace(DATA_TYPE_MAPPING=config.DATA_TYPE_MAPPING,
+                                                     FUNCTION_MAPPING=config.FUNCTION_MAPPING,
+                                                     GO_BATCH_WORKERS=workers))
+            results.append(converter.convert({'original': script}))
+        assert results[0] == results[1]
+        # TOP каждого пакета заменяется своим LIMIT
+        assert results[0] == join_batches([converter.convert({'original': batch}) for batch in batches])
+        assert 'LIMIT 5' in results[0] and 'GO' not in results[0]
@@ -0,0 +1,113 @@
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.parsed_script import ParsedScript
+from src.sql_alias_analyzer import ALIAS_CACHE_VERSION, AliasCache, SQLAliasAnalyzer, get_alias_cache
+
+SCRIPT = "SELECT pc.A_ID FROM WM_PERSONAL_CARD pc JOIN SPR_DOC d ON d.A_CARD = pc.A_ID"
+
+
+class TestAliasCache:
+    """Тесты для общего кэша алиасов таблиц"""
+
+    def test_lru_is_bounded(self):
+        cache = AliasCache(max_entries=2)
+        cache.put('a', {'t': ['a']})
+        cache.put('b', {'t': ['b']})
+        assert cache.get('a') == {'t': ['a']}
+        cache.put('c', {'t': ['c']})
+        # Вытесняется давно не использованная запись 'b'
+        assert cache.get('b') is None and cache.get('a') is not None and len(cache) == 2
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses']) == (2, 1)
+        assert abs(stats['hit_ratio'] - 2 / 3) < 1e-9
+
+    def test_analyzers_share_cache_by_stable_digest(self):
+        cache = AliasCache()
+        first = SQLAliasAnalyzer(cache).get_table_aliases(ParsedScript(SCRIPT))
+        # Новый разбор того же текста и новый анализатор: результат берется из кэша
+        second = SQLAliasAnalyzer(cache).get_table_aliases(ParsedScript(SCRIPT))
+        assert first == second == {'WM_PERSONAL_CARD': ['pc'], 'SPR_DOC': ['d']}
+        assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+        assert ParsedScript(SCRIPT).digest == ParsedScript.of(SCRIPT).digest
+
+    def test_disk_tier(self, tmp_path):
+        digest = ParsedScript(SCRIPT).digest
+        SQLAliasAnalyzer(AliasCache(directory=str(tmp_path))).get_table_aliases(ParsedScript(SCRIPT))
+        path = tmp_path / digest[:2] / f"{digest}.json"
+        assert json.loads(path.read_text(encoding='utf-8'))['version'] == ALIAS_CACHE_VERSION
+
+        cold = AliasCache(directory=str(tmp_path))
+        assert SQLAliasAnalyzer(cold).get_table_by_alias(ParsedScript(SCRIPT), 'D') == 'SPR_DOC'
+        assert cold.stats()['disk_hits'] == 1 and cold.stats()['misses'] == 0
+
+        path.write_text(json.dumps({'version': ALIAS_CACHE_VERSION + 1, 'aliases': {}}), encoding='utf-8')
+        assert AliasCache(directory=str(tmp_path)).get(digest) is None
+
+    def test_thread_safety_and_shared_instance(self):
+        config = SimpleNamespace(ALIAS_CACHE_SIZE=8, ALIAS_CACHE_DIR='')
+        cache = get_alias_cache(config)
+        assert get_alias_cache(config) is cache
+
+        def analyze(n):
+            script = ParsedScript(f"SELECT t{n}.x FROM T{n % 20} t{n}")
+            return SQLAliasAnalyzer(cache).get_table_aliases(script)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(analyze, range(200)))
+        assert results[5] == {'T5': ['t5']}
+        assert len(cache) <= 8
+        stats = cache.stats()
+        assert stats['hits'] + stats['misses'] == 200
+
+
+class TestAliasIndex:
+    """Тесты для обратного индекса алиасов"""
+
+    def test_lookup_is_case_insensitive_and_first_table_wins(self):
+        analyzer = SQLAliasAnalyzer(AliasCache())
+        parsed = ParsedScript("SELECT 1 FROM T1 a JOIN T2 B ON B.x = a.x WHERE EXISTS (SELECT 1 FROM T3 a)")
+        assert analyzer.get_alias_index(parsed) == {'a': 'T1', 'b': 'T2'}
+        assert analyzer.get_table_by_alias(parsed, 'A') == 'T1'
+        assert analyzer.get_table_by_alias(parsed, 'b') == 'T2'
+        assert analyzer.get_table_by_alias(parsed, 'missing') is None
+
+    def test_column_mapping_is_lazy_and_memoised(self):
+        analyzer = SQLAliasAnalyzer(AliasCache())
+        parsed = ParsedScript(SCRIPT)
+        analyzer.get_table_by_alias(parsed, 'pc')
+        assert 'column_to_table' not in parsed.computed
+        mapping = analyzer.get_column_to_table_mapping(parsed)
+        assert mapping == {'pc.A_ID': 'WM_PERSONAL_CARD', 'd.A_CARD': 'SPR_DOC'}
+        assert analyzer.get_column_to_table_mapping(parsed) is mapping
+
+
+class TestAliasScopes:
+    """Тесты для определения таблиц по областям видимости запросов"""
+
+    def test_same_alias_resolves_by_position(self):
+        text = ("SELECT t.A_ID FROM WM_PERSONAL_CARD t\n"
+                "JOIN (SELECT t.A_OWNER FROM SPR_DOC t) x ON x.A_OWNER = t.A_ID\n"
+                "WHERE EXISTS (SELECT 1 FROM PPR_CALC t WHERE t.A_CARD = 1)")
+        analyzer = SQLAliasAnalyzer(AliasCache())
+        parsed = ParsedScript(text)
+        for column, table in (('t.A_ID', 'WM_PERSONAL_CARD'), ('t.A_OWNER', 'SPR_DOC'), ('t.A_CARD', 'PPR_CALC')):
+            assert analyzer.get_table_by_alias(parsed, 't', text.index(column)) == table
+        # Алиас производной таблицы не относится ни к одной таблице
+        assert analyzer.get_table_by_alias(parsed, 'x', text.index('x.A_OWNER')) is None
+
+    def test_regex_fallback_is_per_statement(self):
+        text = ("SELECT a.A_ID FROM WM_PERSONAL_CARD a;\n"
+                "SELECT b.A_ID FROM SPR_DOC b WHERE b.A_ID IN (SELECT a.A_ID FROM PPR_CALC a;")
+        analyzer = SQLAliasAnalyzer(AliasCache())
+        parsed = ParsedScript(text)
+        tree = analyzer.get_scope_tree(parsed)
+        assert tree.fallbacks == 1
+        assert analyzer.get_table_by_alias(parsed, 'a', text.index('a.A_ID')) == 'WM_PERSONAL_CARD'
+        assert analyzer.get_table_by_alias(parsed, 'b', text.index('b.A_ID')) == 'SPR_DOC'
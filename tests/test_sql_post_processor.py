@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+
+# Добавляем путь к пакету src для импорта
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.schema_catalog import SchemaCatalog
+from src.sql_alias_analyzer import SQLAliasAnalyzer
+from src.sql_post_processor import get_post_processor, rewrite_case_expressions
+
+
+def _process(sql, catalog=None):
+    return get_post_processor().process(sql, SQLAliasAnalyzer(), catalog)
+
+
+class TestSQLPostProcessor:
+    """Тесты для постобработки SQL, полученного от нейросети"""
+
+    def test_case_with_mixed_values_casts_numbers(self):
+        sql = "SELECT CASE WHEN a = 1 THEN 'x' ELSE 0 END, CASE WHEN b THEN 1 ELSE 2 END FROM t"
+        assert rewrite_case_expressions(sql) == (
+            "SELECT CASE WHEN a = 1 THEN 'x' ELSE 0::text END, CASE WHEN b THEN 1 ELSE 2 END FROM t"
+        )
+
+    def test_nested_case_is_processed_per_level(self):
+        sql = "CASE WHEN a THEN 'x' ELSE CASE WHEN b THEN 1 ELSE 2 END END"
+        assert rewrite_case_expressions(sql) == sql
+        sql = "CASE WHEN a THEN 1 ELSE CASE WHEN b THEN 'y' ELSE 2 END END"
+        assert rewrite_case_expressions(sql) == "CASE WHEN a THEN 1 ELSE CASE WHEN b THEN 'y' ELSE 2::text END END"
+
+    def test_case_scanner_ignores_strings_and_end_case(self):
+        sql = "SELECT 'CASE END' AS s, a_end FROM t; CASE WHEN v THEN x := 1; END CASE;"
+        assert rewrite_case_expressions(sql) == sql
+
+    def test_comparisons_with_numbers_are_quoted(self):
+        sql = "WHERE p.a_code::text = 1 AND 'a' = 3 AND COALESCE(x::text, 'a') = 5"
+        assert _process(sql) == "WHERE p.a_code::text = '1' AND 'a' = '3' AND COALESCE(x::text, 'a') = '5'"
+
+    def test_date_functions(self):
+        sql = "SELECT DATEDIFF(DAY, a, b), YEAR(d), MONTH(e), TO_TIMESTAMP(f::text, 'YYYY-MM-DD')"
+        assert _process(sql) == (
+            "SELECT DATE_PART('day', b - a), EXTRACT(YEAR FROM d::timestamp), "
+            "EXTRACT(MONTH FROM e::timestamp), DATE_TRUNC('day', f)"
+        )
+
+    def test_end_if_and_end_loop_do_not_close_case(self):
+        sql = ("CASE v WHEN 1 THEN\n  IF a THEN x := 1; END IF;\n  LOOP EXIT; END LOOP;\n"
+               "  y := CASE WHEN b THEN 'z' ELSE 0 END;\nEND CASE;")
+        assert rewrite_case_expressions(sql) == sql.replace("ELSE 0 END", "ELSE 0::text END")
+
+    def test_empty_string_comparison_uses_catalog(self):
+        catalog = SchemaCatalog()
+        catalog.ensure_loaded()
+        catalog._set_rows([('public', 'orders', 'amount', 'numeric'), ('public', 'orders', 'name', 'text')])
+        sql = "SELECT * FROM orders o WHERE o.amount = '' AND o.name = ''"
+        assert _process(sql, catalog) == "SELECT * FROM orders o WHERE o.amount IS NULL AND o.name = ''"
+        assert _process(sql) == sql